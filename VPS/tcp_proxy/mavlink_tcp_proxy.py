@@ -3,193 +3,979 @@
 MAVLink TCP Proxy for VPS
 Provides TCP proxy functionality for Mission Planner connections
 
+All connections are served by one asyncio event loop: each forwarding
+direction is driven by socket readiness callbacks, keeps unsent data in its
+own buffer (sendall semantics) and stops reading from the source while the
+destination is behind (backpressure). On Linux the bytes are moved with
+os.splice() through a kernel pipe and never enter Python.
+
+In multiplex mode (--multiplex) the proxy holds a single upstream link for
+all clients instead: upstream telemetry is split into MAVLink frames and
+fanned out to every client, client frames are merged upstream with their
+sequence numbers rewritten per source, so WAN traffic does not grow with
+the number of ground stations.
+
 Author: Manus AI
 Date: 2025-08-19
-Version: 1.0
+Version: 2.1
 """
 
+import argparse
+import asyncio
+import os
 import socket
-import threading
 import time
 import logging
+from dataclasses import dataclass, asdict, field
 from datetime import datetime
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Set, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Not Linux: no pipe resizing, no splice
+    fcntl = None
+
+# Kernel forwarding socket -> pipe -> socket (Linux, Python 3.10+)
+SPLICE_AVAILABLE = hasattr(os, 'splice') and fcntl is not None
+SPLICE_FLAGS = getattr(os, 'SPLICE_F_MOVE', 1) | getattr(os, 'SPLICE_F_NONBLOCK', 2)
+F_SETPIPE_SZ = getattr(fcntl, 'F_SETPIPE_SZ', 1031)
+F_GETPIPE_SZ = getattr(fcntl, 'F_GETPIPE_SZ', 1032)
+
+LOG_FILE = '/var/log/ironbrain/tcp_proxy.log'
+
+# MAVLink framing; this file is deployed to the VPS on its own, so no shared parser
+MAVLINK_STX_V1 = 0xFE
+MAVLINK_STX_V2 = 0xFD
+MAVLINK_IFLAG_SIGNED = 0x01
+MAVLINK_SIGNATURE_LEN = 13
+
+@dataclass
+class DirectionStats:
+    """Статистика одного направления пересылки"""
+    bytes: int = 0
+    reads: int = 0
+    pauses: int = 0            # Чтение остановлено: получатель не успевает
+    max_buffered: int = 0      # Максимум байт в буфере направления
+    max_stall_ms: float = 0.0  # Максимальное время ожидания данных в буфере
+
+@dataclass
+class ConnectionStats:
+    """Статистика одного подключения Mission Planner"""
+    client: str
+    mode: str
+    opened_at: float = field(default_factory=time.time)
+    connect_ms: float = 0.0
+    closed_at: Optional[float] = None
+    error: Optional[str] = None
+    upstream: DirectionStats = field(default_factory=DirectionStats)    # Client -> Target
+    downstream: DirectionStats = field(default_factory=DirectionStats)  # Target -> Client
+
+    def forwarded(self) -> int:
+        return self.upstream.bytes + self.downstream.bytes
+
+    def summary(self) -> str:
+        stall_ms = max(self.upstream.max_stall_ms, self.downstream.max_stall_ms)
+        return (f"{self.client}: ↑{self.upstream.bytes} ↓{self.downstream.bytes} bytes, "
+                f"max stall {stall_ms:.1f} ms")
+
+    def to_dict(self) -> Dict[str, Any]:
+        stats = asdict(self)
+        stats['duration'] = (self.closed_at or time.time()) - self.opened_at
+        return stats
+
+@dataclass
+class ClientStats:
+    """Статистика клиента в режиме мультиплексирования"""
+    client: str
+    mode: str = 'mavlink'
+    opened_at: float = field(default_factory=time.time)
+    closed_at: Optional[float] = None
+    error: Optional[str] = None
+    frames_sent: int = 0        # Телеметрия клиенту
+    bytes_sent: int = 0
+    frames_received: int = 0    # Кадры клиента, отправленные в upstream
+    bytes_received: int = 0
+    dropped: int = 0            # Кадры, не поместившиеся в буфер медленного клиента
+    rate_limited: int = 0       # Кадры, пропущенные ограничением частоты
+    max_buffered: int = 0
+
+    def forwarded(self) -> int:
+        return self.bytes_sent + self.bytes_received
+
+    def summary(self) -> str:
+        return (f"{self.client}: ↑{self.frames_received} ↓{self.frames_sent} frames, "
+                f"dropped {self.dropped}, rate limited {self.rate_limited}")
+
+    def to_dict(self) -> Dict[str, Any]:
+        stats = asdict(self)
+        stats['duration'] = (self.closed_at or time.time()) - self.opened_at
+        return stats
+
+@dataclass
+class UpstreamStats:
+    """Статистика общего соединения с целевым сервером (режим мультиплексирования)"""
+    connected: bool = False
+    connects: int = 0
+    connect_ms: float = 0.0
+    frames_received: int = 0
+    bytes_received: int = 0
+    frames_sent: int = 0
+    bytes_sent: int = 0
+    frames_dropped: int = 0     # Кадры клиентов, пришедшие без связи с целевым сервером
+    garbage_bytes: int = 0      # Байты вне кадров MAVLink
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+def _crc_accumulate(byte: int, crc: int) -> int:
+    """Один байт CRC-16/MCRF4XX (X.25), как в MAVLink"""
+    tmp = (byte ^ crc) & 0xFF
+    tmp = (tmp ^ (tmp << 4)) & 0xFF
+    return ((crc >> 8) ^ (tmp << 8) ^ (tmp << 3) ^ (tmp >> 4)) & 0xFFFF
+
+@lru_cache(maxsize=8192)
+def _sequence_crc_delta(delta: int, tail: int) -> int:
+    """
+    Изменение CRC при замене байта sequence (XOR delta), за которым идут tail байт
+    CRC линейна: crc(a) ^ crc(b) = crc₀(a ^ b), поэтому CRC_EXTRA сообщения не нужен.
+    """
+    crc = _crc_accumulate(delta, 0)
+    for _ in range(tail):
+        crc = _crc_accumulate(0, crc)
+    return crc
+
+def rewrite_sequence(frame: bytearray, sequence: int) -> bool:
+    """Заменить sequence кадра и поправить CRC; подписанные кадры не изменяются"""
+    payload_len = frame[1]
+    if frame[0] == MAVLINK_STX_V2:
+        if frame[2] & MAVLINK_IFLAG_SIGNED:
+            return False  # The signature covers the sequence byte
+        sequence_offset, crc_offset = 4, 10 + payload_len
+    else:
+        sequence_offset, crc_offset = 2, 6 + payload_len
+
+    delta = frame[sequence_offset] ^ sequence
+    if delta:
+        # Bytes after the sequence up to the CRC, plus CRC_EXTRA
+        tail = crc_offset - sequence_offset
+        crc = (frame[crc_offset] | (frame[crc_offset + 1] << 8)) ^ _sequence_crc_delta(delta, tail)
+        frame[sequence_offset] = sequence
+        frame[crc_offset] = crc & 0xFF
+        frame[crc_offset + 1] = crc >> 8
+    return True
+
+def frame_message_id(frame) -> int:
+    if frame[0] == MAVLINK_STX_V2:
+        return frame[7] | (frame[8] << 8) | (frame[9] << 16)
+    return frame[5]
+
+def frame_source(frame) -> Tuple[int, int]:
+    """(system_id, component_id) отправителя"""
+    if frame[0] == MAVLINK_STX_V2:
+        return frame[5], frame[6]
+    return frame[3], frame[4]
+
+class MAVLinkFrameSplitter:
+    """
+    Деление TCP потока на кадры MAVLink v1/v2 по заголовку
+    CRC не проверяется (нет таблицы CRC_EXTRA): кадры пересылаются как есть.
+    """
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.garbage_bytes = 0
+
+    def feed(self, data) -> List[bytes]:
+        """Добавить данные, вернуть все полные кадры"""
+        buffer = self.buffer
+        buffer += data
+        size = len(buffer)
+        frames = []
+        position = 0
+
+        while position < size:
+            stx = buffer[position]
+            if stx == MAVLINK_STX_V2:
+                if size - position < 10:
+                    break
+                incompat_flags = buffer[position + 2]
+                if incompat_flags & ~MAVLINK_IFLAG_SIGNED:
+                    position = self._resync(position)
+                    continue
+                frame_len = 12 + buffer[position + 1]
+                if incompat_flags & MAVLINK_IFLAG_SIGNED:
+                    frame_len += MAVLINK_SIGNATURE_LEN
+            elif stx == MAVLINK_STX_V1:
+                if size - position < 6:
+                    break
+                frame_len = 8 + buffer[position + 1]
+            else:
+                position = self._resync(position)
+                continue
+
+            if size - position < frame_len:
+                break
+            frames.append(bytes(buffer[position:position + frame_len]))
+            position += frame_len
+
+        del buffer[:position]
+        return frames
+
+    def _resync(self, position: int) -> int:
+        """Пропустить байты до следующего маркера начала кадра"""
+        candidates = [index for index in (self.buffer.find(MAVLINK_STX_V2, position + 1),
+                                          self.buffer.find(MAVLINK_STX_V1, position + 1)) if index >= 0]
+        next_position = min(candidates) if candidates else len(self.buffer)
+        self.garbage_bytes += next_position - position
+        return next_position
+
+class _Direction:
+    """
+    Одно направление: source -> destination
+    Непереданные данные остаются в буфере; пока буфер полон, source не читается.
+    """
+
+    def __init__(self, session: '_ProxySession', source: socket.socket, destination: socket.socket,
+                 stats: DirectionStats):
+        self.session = session
+        self.loop = session.loop
+        self.source = source
+        self.destination = destination
+        self.src_fd = source.fileno()
+        self.dst_fd = destination.fileno()
+        self.stats = stats
+        self.capacity = 0
+        self.pending = 0
+        self.eof = False
+        self.reading = False
+        self.writing = False
+        self.stalled_since: Optional[float] = None
+
+    def start(self):
+        self._resume_reading()
+
+    def stop(self):
+        if self.reading:
+            self.loop.remove_reader(self.src_fd)
+            self.reading = False
+        if self.writing:
+            self.loop.remove_writer(self.dst_fd)
+            self.writing = False
+
+    def close(self):
+        pass
+
+    def _fill(self) -> int:
+        """Прочитать из source в буфер; 0 - конец потока"""
+        raise NotImplementedError
+
+    def _drain(self) -> int:
+        """Записать из буфера в destination (BlockingIOError - получатель занят)"""
+        raise NotImplementedError
+
+    def _resume_reading(self):
+        if not self.reading and not self.eof:
+            self.loop.add_reader(self.src_fd, self._on_readable)
+            self.reading = True
 
-# Настройка логирования
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('/var/log/ironbrain/tcp_proxy.log'),
-        logging.StreamHandler()
-    ]
-)
+    def _pause_reading(self):
+        if self.reading:
+            self.loop.remove_reader(self.src_fd)
+            self.reading = False
+            self.stats.pauses += 1
+
+    def _on_readable(self):
+        if self.pending >= self.capacity:
+            self._pause_reading()
+            return
+
+        try:
+            count = self._fill()
+        except BlockingIOError:
+            # Nothing to read, or the pipe ran out of page slots before reaching capacity
+            if self.pending:
+                self._pause_reading()
+            return
+        except OSError as e:
+            self.session.close(f"{e.__class__.__name__}: {e}")
+            return
+
+        if count == 0:
+            # Source closed: deliver what is left, then end the session
+            self.eof = True
+            self.loop.remove_reader(self.src_fd)
+            self.reading = False
+            if not self.pending:
+                self.session.close()
+            return
+
+        self.stats.bytes += count
+        self.stats.reads += 1
+        if self.pending > self.stats.max_buffered:
+            self.stats.max_buffered = self.pending
+        if self.stalled_since is None:
+            self.stalled_since = time.perf_counter()
+        self._on_writable()
+
+    def _on_writable(self):
+        try:
+            while self.pending:
+                self._drain()
+        except BlockingIOError:
+            # sendall semantics: keep the rest, continue when writable
+            if not self.writing:
+                self.loop.add_writer(self.dst_fd, self._on_writable)
+                self.writing = True
+            if self.pending >= self.capacity:
+                self._pause_reading()
+            return
+        except OSError as e:
+            self.session.close(f"{e.__class__.__name__}: {e}")
+            return
+
+        if self.writing:
+            self.loop.remove_writer(self.dst_fd)
+            self.writing = False
+        if self.stalled_since is not None:
+            stall_ms = (time.perf_counter() - self.stalled_since) * 1000
+            self.stalled_since = None
+            if stall_ms > self.stats.max_stall_ms:
+                self.stats.max_stall_ms = stall_ms
+
+        if self.eof:
+            self.session.close()
+        else:
+            self._resume_reading()
+
+class _SpliceDirection(_Direction):
+    """Пересылка через pipe ядра (os.splice): данные не копируются в Python"""
+
+    def __init__(self, session, source, destination, stats, buffer_size: int):
+        super().__init__(session, source, destination, stats)
+        self.pipe_r, self.pipe_w = os.pipe2(os.O_NONBLOCK | os.O_CLOEXEC)
+        try:
+            fcntl.fcntl(self.pipe_w, F_SETPIPE_SZ, buffer_size)
+        except OSError:
+            pass  # Above /proc/sys/fs/pipe-max-size: keep the default
+        self.capacity = fcntl.fcntl(self.pipe_w, F_GETPIPE_SZ)
+
+    def _fill(self) -> int:
+        count = os.splice(self.src_fd, self.pipe_w, self.capacity - self.pending, flags=SPLICE_FLAGS)
+        self.pending += count
+        return count
+
+    def _drain(self) -> int:
+        count = os.splice(self.pipe_r, self.dst_fd, self.pending, flags=SPLICE_FLAGS)
+        self.pending -= count
+        return count
+
+    def close(self):
+        os.close(self.pipe_r)
+        os.close(self.pipe_w)
+
+class _BufferedDirection(_Direction):
+    """Пересылка через предвыделенный буфер (recv_into / send без лишних копий)"""
+
+    def __init__(self, session, source, destination, stats, buffer_size: int):
+        super().__init__(session, source, destination, stats)
+        self.buffer = bytearray(buffer_size)
+        self.view = memoryview(self.buffer)
+        self.capacity = buffer_size
+        self.start_offset = 0
+        self.end_offset = 0
+
+    def _fill(self) -> int:
+        if self.end_offset == self.capacity:
+            # Move the unsent tail to the front
+            self.view[:self.pending] = self.view[self.start_offset:self.end_offset]
+            self.start_offset, self.end_offset = 0, self.pending
+        count = self.source.recv_into(self.view[self.end_offset:])
+        self.end_offset += count
+        self.pending += count
+        return count
+
+    def _drain(self) -> int:
+        count = self.destination.send(self.view[self.start_offset:self.end_offset])
+        self.start_offset += count
+        self.pending -= count
+        if not self.pending:
+            self.start_offset = self.end_offset = 0
+        return count
+
+    def close(self):
+        self.view.release()
+
+class _ProxySession:
+    """Подключение клиента и его соединение с целевым сервером"""
+
+    def __init__(self, proxy: 'MAVLinkTCPProxy', client_socket: socket.socket, client_address):
+        self.proxy = proxy
+        self.loop = asyncio.get_running_loop()
+        self.client_socket = client_socket
+        self.target_socket: Optional[socket.socket] = None
+        self.stats = ConnectionStats(
+            client=f"{client_address[0]}:{client_address[1]}",
+            mode='splice' if proxy.use_splice else 'buffered'
+        )
+        self.directions: List[_Direction] = []
+        self.closed = self.loop.create_future()
+
+    async def run(self):
+        """Подключение к целевому серверу и пересылка до закрытия"""
+        try:
+            started = time.perf_counter()
+            self.target_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.target_socket.setblocking(False)
+            await asyncio.wait_for(
+                self.loop.sock_connect(self.target_socket, (self.proxy.target_host, self.proxy.target_port)),
+                timeout=self.proxy.connect_timeout
+            )
+            self.stats.connect_ms = (time.perf_counter() - started) * 1000
+            logging.info(f"🔗 Connected to target {self.proxy.target_host}:{self.proxy.target_port} "
+                         f"for {self.stats.client} ({self.stats.connect_ms:.1f} ms)")
+
+            for sock in (self.client_socket, self.target_socket):
+                sock.setblocking(False)
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            direction_type = _SpliceDirection if self.proxy.use_splice else _BufferedDirection
+            self.directions = [
+                direction_type(self, self.client_socket, self.target_socket, self.stats.upstream,
+                               self.proxy.buffer_size),
+                direction_type(self, self.target_socket, self.client_socket, self.stats.downstream,
+                               self.proxy.buffer_size)
+            ]
+            for direction in self.directions:
+                direction.start()
+
+            await self.closed
+
+        except asyncio.CancelledError:
+            self.close('cancelled')
+        except (OSError, asyncio.TimeoutError) as e:
+            logging.error(f"❌ Client handling error: {e.__class__.__name__}: {e}")
+            self.close(f"connect: {e.__class__.__name__}: {e}")
+
+    def close(self, error: Optional[str] = None):
+        """Закрыть оба сокета (идемпотентно)"""
+        if self.closed.done():
+            return
+
+        for direction in self.directions:
+            direction.stop()
+            direction.close()
+        for sock in (self.client_socket, self.target_socket):
+            if sock is not None:
+                sock.close()
+
+        self.stats.closed_at = time.time()
+        self.stats.error = error
+        self.closed.set_result(None)
+        self.proxy._session_closed(self)
+        logging.info(f"📱 Connection from {self.stats.client} closed")
+
+class _MuxClient:
+    """Клиент мультиплексора: телеметрия из общего потока, свои кадры в общий upstream"""
+
+    def __init__(self, mux: '_MAVLinkMultiplexer', client_socket: socket.socket, client_address):
+        self.mux = mux
+        self.loop = mux.loop
+        self.socket = client_socket
+        self.fd = client_socket.fileno()
+        self.stats = ClientStats(client=f"{client_address[0]}:{client_address[1]}")
+        self.splitter = MAVLinkFrameSplitter()
+        self.buffer = bytearray()
+        self.buffer_limit = mux.proxy.client_buffer_size
+        self.last_sent: Dict[int, float] = {}
+        self.reading = False
+        self.writing = False
+        self.closed = False
+
+    def start(self):
+        self.socket.setblocking(False)
+        self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.resume_reading()
+
+    def resume_reading(self):
+        if not self.reading and not self.closed:
+            self.loop.add_reader(self.fd, self._on_readable)
+            self.reading = True
+
+    def pause_reading(self):
+        if self.reading:
+            self.loop.remove_reader(self.fd)
+            self.reading = False
+
+    def queue(self, frame: bytes, message_id: int, now: float):
+        """Поставить кадр телеметрии в буфер клиента (без блокировки)"""
+        interval = self.mux.intervals.get(message_id)
+        if interval is not None:
+            if now - self.last_sent.get(message_id, -interval) < interval:
+                self.stats.rate_limited += 1
+                return
+
+        if len(self.buffer) + len(frame) > self.buffer_limit and not self.writing:
+            self.flush()  # Large upstream read: hand the batch so far to the socket first
+        if len(self.buffer) + len(frame) > self.buffer_limit:
+            # Slow client: drop whole frames so its stream stays frame-aligned
+            self.stats.dropped += 1
+            return
+
+        if interval is not None:
+            self.last_sent[message_id] = now
+        self.buffer += frame
+        self.stats.frames_sent += 1
+        self.stats.bytes_sent += len(frame)
+        if len(self.buffer) > self.stats.max_buffered:
+            self.stats.max_buffered = len(self.buffer)
+
+    def flush(self):
+        if self.buffer and not self.writing and not self.closed:
+            self._on_writable()
+
+    def _on_writable(self):
+        try:
+            sent = self.socket.send(self.buffer)
+        except BlockingIOError:
+            sent = 0
+        except OSError as e:
+            self.close(f"{e.__class__.__name__}: {e}")
+            return
+
+        del self.buffer[:sent]
+        if self.buffer:
+            if not self.writing:
+                self.loop.add_writer(self.fd, self._on_writable)
+                self.writing = True
+        elif self.writing:
+            self.loop.remove_writer(self.fd)
+            self.writing = False
+
+    def _on_readable(self):
+        try:
+            data = self.socket.recv(65536)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            self.close(f"{e.__class__.__name__}: {e}")
+            return
+
+        if not data:
+            self.close()
+            return
+
+        self.stats.bytes_received += len(data)
+        frames = self.splitter.feed(data)
+        if frames:
+            self.stats.frames_received += len(frames)
+            self.mux.send_upstream(self, frames)
+
+    def close(self, error: Optional[str] = None):
+        """Закрыть подключение клиента (идемпотентно)"""
+        if self.closed:
+            return
+
+        self.pause_reading()
+        if self.writing:
+            self.loop.remove_writer(self.fd)
+            self.writing = False
+        self.closed = True
+        self.socket.close()
+        self.mux.paused.discard(self)
+
+        self.stats.closed_at = time.time()
+        self.stats.error = error
+        self.mux.proxy._session_closed(self)
+        logging.info(f"📱 Connection from {self.stats.client} closed")
+
+class _MAVLinkMultiplexer:
+    """
+    Одно соединение с целевым сервером на всех клиентов
+    Телеметрия раздаётся всем клиентам, кадры клиентов сливаются в upstream с новой
+    нумерацией sequence для каждого отправителя (system_id, component_id).
+    """
+
+    def __init__(self, proxy: 'MAVLinkTCPProxy'):
+        self.proxy = proxy
+        self.loop = asyncio.get_running_loop()
+        self.stats = UpstreamStats()
+        self.splitter = MAVLinkFrameSplitter()
+        self.socket: Optional[socket.socket] = None
+        self.fd = -1
+        self.buffer = bytearray()
+        self.writing = False
+        self.disconnected: Optional[asyncio.Future] = None
+        self.sequences: Dict[Tuple[int, int], int] = {}
+        self.paused: Set[_MuxClient] = set()
+        self.intervals = {message_id: 1.0 / rate for message_id, rate in proxy.rate_limits.items() if rate > 0}
+
+    async def run(self):
+        """Держать соединение с целевым сервером, переподключаясь после разрыва"""
+        try:
+            while self.proxy.running:
+                try:
+                    await self._connect()
+                    await self.disconnected
+                except (OSError, asyncio.TimeoutError) as e:
+                    logging.error(f"❌ Upstream connection error: {e.__class__.__name__}: {e}")
+                    self.proxy.stats['errors'] += 1
+                await asyncio.sleep(self.proxy.reconnect_delay)
+        finally:
+            self._disconnect()
+
+    async def _connect(self):
+        started = time.perf_counter()
+        upstream = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        upstream.setblocking(False)
+        try:
+            await asyncio.wait_for(
+                self.loop.sock_connect(upstream, (self.proxy.target_host, self.proxy.target_port)),
+                timeout=self.proxy.connect_timeout
+            )
+        except BaseException:
+            upstream.close()
+            raise
+        upstream.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        self.socket = upstream
+        self.fd = upstream.fileno()
+        self.splitter = MAVLinkFrameSplitter()
+        self.disconnected = self.loop.create_future()
+        self.stats.connected = True
+        self.stats.connects += 1
+        self.stats.connect_ms = (time.perf_counter() - started) * 1000
+        self.loop.add_reader(self.fd, self._on_readable)
+        logging.info(f"🔗 Upstream connected to {self.proxy.target_host}:{self.proxy.target_port} "
+                     f"({self.stats.connect_ms:.1f} ms)")
+
+    def _disconnect(self, error: Optional[str] = None):
+        if self.socket is None:
+            return
+
+        self.loop.remove_reader(self.fd)
+        if self.writing:
+            self.loop.remove_writer(self.fd)
+            self.writing = False
+        self.socket.close()
+        self.socket = None
+        self.buffer.clear()
+        self.stats.connected = False
+        self.stats.garbage_bytes += self.splitter.garbage_bytes
+        self._resume_clients()
+
+        if error:
+            logging.warning(f"⚠️ Upstream disconnected: {error}")
+            self.proxy.stats['errors'] += 1
+        if self.disconnected is not None and not self.disconnected.done():
+            self.disconnected.set_result(None)
+
+    def _on_readable(self):
+        try:
+            data = self.socket.recv(65536)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            self._disconnect(f"{e.__class__.__name__}: {e}")
+            return
+
+        if not data:
+            self._disconnect('target closed connection')
+            return
+
+        self.stats.bytes_received += len(data)
+        frames = self.splitter.feed(data)
+        if not frames:
+            return
+        self.stats.frames_received += len(frames)
+
+        # One pass per client, one send() per client per upstream read
+        now = time.monotonic()
+        message_ids = [frame_message_id(frame) for frame in frames]
+        for client in list(self.proxy.sessions.values()):
+            for frame, message_id in zip(frames, message_ids):
+                client.queue(frame, message_id, now)
+            client.flush()
+
+    def send_upstream(self, client: _MuxClient, frames: List[bytes]):
+        """Отправить кадры клиента в общий upstream с новой нумерацией sequence"""
+        if self.socket is None:
+            self.stats.frames_dropped += len(frames)
+            return
+
+        for frame in frames:
+            frame = bytearray(frame)
+            source = frame_source(frame)
+            sequence = self.sequences.get(source, 0)
+            if rewrite_sequence(frame, sequence):
+                self.sequences[source] = (sequence + 1) & 0xFF
+            self.buffer += frame
+            self.stats.frames_sent += 1
+            self.stats.bytes_sent += len(frame)
+
+        if len(self.buffer) >= self.proxy.buffer_size:
+            # Upstream is behind: stop reading this client until the buffer drains
+            client.pause_reading()
+            self.paused.add(client)
+        if not self.writing:
+            self._on_writable()
+
+    def _on_writable(self):
+        try:
+            sent = self.socket.send(self.buffer)
+        except BlockingIOError:
+            sent = 0
+        except OSError as e:
+            self._disconnect(f"{e.__class__.__name__}: {e}")
+            return
+
+        del self.buffer[:sent]
+        if self.buffer:
+            if not self.writing:
+                self.loop.add_writer(self.fd, self._on_writable)
+                self.writing = True
+            return
+
+        if self.writing:
+            self.loop.remove_writer(self.fd)
+            self.writing = False
+        self._resume_clients()
+
+    def _resume_clients(self):
+        for client in self.paused:
+            client.resume_reading()
+        self.paused.clear()
 
 class MAVLinkTCPProxy:
-    def __init__(self, listen_port=14551, target_host='7.tcp.eu.ngrok.io', target_port=10317):
+    def __init__(self, listen_port=14551, target_host='7.tcp.eu.ngrok.io', target_port=10317,
+                 listen_host='0.0.0.0', use_splice=SPLICE_AVAILABLE, buffer_size=65536,
+                 max_connections=1024, connect_timeout=10.0, stats_interval=60.0,
+                 multiplex=False, rate_limits=None, client_buffer_size=262144, reconnect_delay=2.0):
+        """
+        Args:
+            listen_port: Порт для Mission Planner (0 - выбрать свободный)
+            target_host: Целевой сервер (ngrok туннель к Jetson)
+            target_port: Порт целевого сервера
+            listen_host: Адрес прослушивания
+            use_splice: Пересылка через os.splice (только Linux)
+            buffer_size: Буфер каждого направления, байт
+            max_connections: Одновременных подключений (остальные отклоняются)
+            connect_timeout: Таймаут подключения к целевому серверу, с
+            stats_interval: Период отчёта статистики в лог, с
+            multiplex: Одно соединение с целевым сервером на всех клиентов (разбор кадров MAVLink)
+            rate_limits: {message_id: Гц} - ограничение частоты телеметрии для каждого клиента
+            client_buffer_size: Буфер телеметрии клиента в режиме multiplex, байт
+            reconnect_delay: Пауза перед переподключением upstream в режиме multiplex, с
+        """
         self.listen_port = listen_port
+        self.listen_host = listen_host
         self.target_host = target_host
         self.target_port = target_port
+        self.use_splice = use_splice and SPLICE_AVAILABLE
+        self.buffer_size = buffer_size
+        self.max_connections = max_connections
+        self.connect_timeout = connect_timeout
+        self.stats_interval = stats_interval
+        self.multiplex = multiplex
+        self.rate_limits: Dict[int, float] = dict(rate_limits or {})
+        self.client_buffer_size = client_buffer_size
+        self.reconnect_delay = reconnect_delay
         self.running = False
         self.server_socket = None
-        self.client_connections = []
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._serve_task: Optional[asyncio.Task] = None
+        self._mux: Optional[_MAVLinkMultiplexer] = None
+
+        # Per-connection statistics; only the event loop thread updates them
+        self.sessions: Dict[int, Any] = {}
         self.stats = {
             'connections_total': 0,
-            'connections_active': 0,
-            'bytes_forwarded': 0,
+            'connections_rejected': 0,
             'errors': 0,
+            'bytes_closed': 0,  # Bytes forwarded by connections that are already closed
             'start_time': datetime.now()
         }
-        
+
     def start(self):
-        """Запуск TCP прокси сервера"""
+        """Запуск TCP прокси сервера (блокирует до stop())"""
         try:
-            self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            self.server_socket.bind(('0.0.0.0', self.listen_port))
-            self.server_socket.listen(5)
-            
-            self.running = True
-            logging.info(f"🚀 MAVLink TCP Proxy started on port {self.listen_port}")
-            logging.info(f"📡 Forwarding to {self.target_host}:{self.target_port}")
-            
-            # Запуск потока статистики
-            stats_thread = threading.Thread(target=self._stats_reporter, daemon=True)
-            stats_thread.start()
-            
-            while self.running:
-                try:
-                    client_socket, client_address = self.server_socket.accept()
-                    logging.info(f"📱 New connection from {client_address}")
-                    
-                    # Создание потока для обработки клиента
-                    client_thread = threading.Thread(
-                        target=self._handle_client,
-                        args=(client_socket, client_address),
-                        daemon=True
-                    )
-                    client_thread.start()
-                    
-                except socket.error as e:
-                    if self.running:
-                        logging.error(f"❌ Accept error: {e}")
-                        self.stats['errors'] += 1
-                        
+            asyncio.run(self.serve())
         except Exception as e:
             logging.error(f"❌ Proxy start error: {e}")
             self.stats['errors'] += 1
-            
-    def _handle_client(self, client_socket, client_address):
-        """Обработка клиентского подключения"""
-        target_socket = None
-        
-        try:
-            self.stats['connections_total'] += 1
-            self.stats['connections_active'] += 1
-            
-            # Подключение к целевому серверу (ngrok)
-            target_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            target_socket.settimeout(10)
-            target_socket.connect((self.target_host, self.target_port))
-            
-            logging.info(f"🔗 Connected to target {self.target_host}:{self.target_port}")
-            
-            # Создание потоков для двусторонней передачи данных
-            client_to_target = threading.Thread(
-                target=self._forward_data,
-                args=(client_socket, target_socket, "Client->Target"),
-                daemon=True
-            )
-            target_to_client = threading.Thread(
-                target=self._forward_data,
-                args=(target_socket, client_socket, "Target->Client"),
-                daemon=True
-            )
-            
-            client_to_target.start()
-            target_to_client.start()
-            
-            # Ожидание завершения потоков
-            client_to_target.join()
-            target_to_client.join()
-            
-        except Exception as e:
-            logging.error(f"❌ Client handling error: {e}")
-            self.stats['errors'] += 1
-            
-        finally:
-            # Закрытие соединений
-            try:
-                if client_socket:
-                    client_socket.close()
-                if target_socket:
-                    target_socket.close()
-                    
-                self.stats['connections_active'] -= 1
-                logging.info(f"📱 Connection from {client_address} closed")
-                
-            except Exception as e:
-                logging.error(f"❌ Connection cleanup error: {e}")
-                
-    def _forward_data(self, source_socket, destination_socket, direction):
-        """Пересылка данных между сокетами"""
+
+    async def serve(self):
+        """Приём подключений; все соединения обслуживаются этим event loop"""
+        self.loop = asyncio.get_running_loop()
+        self._serve_task = asyncio.current_task()
+
+        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server_socket.bind((self.listen_host, self.listen_port))
+        self.server_socket.listen(512)
+        self.server_socket.setblocking(False)
+        self.listen_port = self.server_socket.getsockname()[1]
+
+        self.running = True
+        logging.info(f"🚀 MAVLink TCP Proxy started on port {self.listen_port}")
+        logging.info(f"📡 Forwarding to {self.target_host}:{self.target_port} ({self.mode})")
+
+        stats_task = asyncio.ensure_future(self._stats_reporter())
+        tasks = set()
+        if self.multiplex:
+            self._mux = _MAVLinkMultiplexer(self)
+            tasks.add(asyncio.ensure_future(self._mux.run()))
         try:
             while self.running:
                 try:
-                    data = source_socket.recv(4096)
-                    if not data:
-                        break
-                        
-                    destination_socket.send(data)
-                    self.stats['bytes_forwarded'] += len(data)
-                    
-                    if len(data) > 0:
-                        logging.debug(f"📦 {direction}: {len(data)} bytes")
-                        
-                except socket.timeout:
+                    client_socket, client_address = await self.loop.sock_accept(self.server_socket)
+                except OSError as e:
+                    if self.running:
+                        logging.error(f"❌ Accept error: {e}")
+                        self.stats['errors'] += 1
+                        await asyncio.sleep(0.1)
                     continue
-                except socket.error:
-                    break
-                    
-        except Exception as e:
-            logging.error(f"❌ Data forwarding error ({direction}): {e}")
+
+                if len(self.sessions) >= self.max_connections:
+                    logging.warning(f"⚠️ Connection limit reached, rejecting {client_address}")
+                    self.stats['connections_rejected'] += 1
+                    client_socket.close()
+                    continue
+
+                logging.info(f"📱 New connection from {client_address}")
+                self.stats['connections_total'] += 1
+                if self._mux is not None:
+                    client = _MuxClient(self._mux, client_socket, client_address)
+                    self.sessions[id(client)] = client
+                    client.start()
+                    continue
+
+                session = _ProxySession(self, client_socket, client_address)
+                self.sessions[id(session)] = session
+
+                task = asyncio.ensure_future(session.run())
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self.running = False
+            stats_task.cancel()
+            for session in list(self.sessions.values()):
+                session.close('proxy stopped')
+            for task in list(tasks):
+                task.cancel()
+            await asyncio.gather(stats_task, *tasks, return_exceptions=True)
+            self.server_socket.close()
+
+    @property
+    def mode(self) -> str:
+        if self.multiplex:
+            return 'mavlink'
+        return 'splice' if self.use_splice else 'buffered'
+
+    def _session_closed(self, session):
+        self.sessions.pop(id(session), None)
+        self.stats['bytes_closed'] += session.stats.forwarded()
+        if session.stats.error and session.stats.error != 'proxy stopped':
             self.stats['errors'] += 1
-            
-    def _stats_reporter(self):
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Сводная статистика и статистика каждого активного подключения"""
+        sessions = list(self.sessions.values())
+        stats = {
+            'connections_total': self.stats['connections_total'],
+            'connections_active': len(sessions),
+            'connections_rejected': self.stats['connections_rejected'],
+            'bytes_forwarded': self.stats['bytes_closed'] + sum(session.stats.forwarded() for session in sessions),
+            'errors': self.stats['errors'],
+            'mode': self.mode,
+            'uptime': str(datetime.now() - self.stats['start_time']),
+            'connections': [session.stats.to_dict() for session in sessions]
+        }
+        if self._mux is not None:
+            stats['upstream'] = self._mux.stats.to_dict()
+        return stats
+
+    async def _stats_reporter(self):
         """Периодический отчет о статистике"""
         while self.running:
+            await asyncio.sleep(self.stats_interval)  # Отчет каждую минуту
             try:
-                time.sleep(60)  # Отчет каждую минуту
-                
-                uptime = datetime.now() - self.stats['start_time']
-                
+                stats = self.get_stats()
+
                 logging.info("📊 === TCP PROXY STATISTICS ===")
-                logging.info(f"⏱️ Uptime: {uptime}")
-                logging.info(f"🔗 Total connections: {self.stats['connections_total']}")
-                logging.info(f"👥 Active connections: {self.stats['connections_active']}")
-                logging.info(f"📦 Bytes forwarded: {self.stats['bytes_forwarded']}")
-                logging.info(f"❌ Errors: {self.stats['errors']}")
+                logging.info(f"⏱️ Uptime: {stats['uptime']}")
+                logging.info(f"🔗 Total connections: {stats['connections_total']}")
+                logging.info(f"👥 Active connections: {stats['connections_active']}")
+                logging.info(f"📦 Bytes forwarded: {stats['bytes_forwarded']}")
+                logging.info(f"❌ Errors: {stats['errors']}")
+                if 'upstream' in stats:
+                    upstream = stats['upstream']
+                    logging.info(f"📡 Upstream: {'connected' if upstream['connected'] else 'disconnected'}, "
+                                 f"↓{upstream['bytes_received']} ↑{upstream['bytes_sent']} bytes")
+                for session in list(self.sessions.values()):
+                    logging.info(f"   {session.stats.summary()}")
                 logging.info("================================")
-                
+
             except Exception as e:
                 logging.error(f"❌ Stats reporter error: {e}")
-                
+
     def stop(self):
-        """Остановка прокси сервера"""
+        """Остановка прокси сервера (из любого потока)"""
         logging.info("🛑 Stopping TCP proxy...")
         self.running = False
-        
-        if self.server_socket:
+
+        if self.loop is not None and self._serve_task is not None and not self.loop.is_closed():
             try:
-                self.server_socket.close()
-            except Exception as e:
-                logging.error(f"❌ Server socket close error: {e}")
-                
+                self.loop.call_soon_threadsafe(self._serve_task.cancel)
+            except RuntimeError:
+                pass  # Loop already finished
+
         logging.info("✅ TCP proxy stopped")
 
+def _configure_logging():
+    handlers = [logging.StreamHandler()]
+    try:
+        handlers.append(logging.FileHandler(LOG_FILE))
+    except OSError:
+        pass
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=handlers
+    )
+
 def main():
     """Главная функция"""
-    proxy = MAVLinkTCPProxy()
-    
+    parser = argparse.ArgumentParser(description='MAVLink TCP Proxy')
+    parser.add_argument('--listen-port', type=int, default=int(os.environ.get('MAVLINK_PROXY_PORT', 14551)))
+    parser.add_argument('--target-host', default='7.tcp.eu.ngrok.io')
+    parser.add_argument('--target-port', type=int, default=10317)
+    parser.add_argument('--max-connections', type=int, default=1024)
+    parser.add_argument('--no-splice', action='store_true', help='Forward through user-space buffers')
+    parser.add_argument('--multiplex', action='store_true',
+                        help='Share one upstream link between all clients (MAVLink frame level)')
+    parser.add_argument('--rate-limit', action='append', default=[], metavar='MSG_ID:HZ',
+                        help='Per-client telemetry rate limit in multiplex mode, e.g. 30:10')
+    args = parser.parse_args()
+
+    rate_limits = {}
+    for limit in args.rate_limit:
+        message_id, _, rate = limit.partition(':')
+        rate_limits[int(message_id)] = float(rate)
+
+    _configure_logging()
+    proxy = MAVLinkTCPProxy(
+        listen_port=args.listen_port,
+        target_host=args.target_host,
+        target_port=args.target_port,
+        use_splice=not args.no_splice,
+        max_connections=args.max_connections,
+        multiplex=args.multiplex,
+        rate_limits=rate_limits
+    )
+
     try:
         proxy.start()
     except KeyboardInterrupt:
@@ -201,4 +987,3 @@ def main():
 
 if __name__ == '__main__':
     main()
-
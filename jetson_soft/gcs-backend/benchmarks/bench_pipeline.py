@@ -0,0 +1,359 @@
+"""
+Benchmark: MAVLink pipeline stages with JSON baselines and regression thresholds
+
+Cases (synthetic traffic, or a recorded capture with --tlog; no autopilot needed):
+  decode               MAVLinkFrameDecoder throughput, µs per frame
+  bridge_ingest        MAVLinkBridge receive path: decode + handler dispatch + history
+  buffer_add_<n>       TelemetryBuffer.add_telemetry with n records (ring + write-ahead log)
+  buffer_pending_<n>   get_pending_records over the same n records in 500-record batches
+  buffer_ack_<n>       mark_synced of those batches
+  broadcast_<n>        TelemetryBroadcaster.publish to n SocketIO clients, µs per snapshot
+  sync_encode_batch    uplink body (encode_batch + deflate), µs per record
+  sync_encode_json     JSON fallback uplink body, µs per record
+
+Each case runs --rounds times; results carry min/median/mean/stddev per operation.
+--save writes them as a baseline; --compare exits with status 1 when a case's median
+is slower than the baseline median by more than --tolerance. Baselines are only
+comparable on the machine (and Python) they were recorded on.
+
+Run: python benchmarks/bench_pipeline.py [--quick] [--tlog capture.tlog] [--json]
+     python benchmarks/bench_pipeline.py --save benchmarks/baseline.json
+     python benchmarks/bench_pipeline.py --compare benchmarks/baseline.json --tolerance 0.25
+"""
+
+import argparse
+import json
+import logging
+import platform
+import shutil
+import statistics
+import sys
+import os
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from bench_wire_codec import FRAMES, build_v2_frame
+from src.services.mavlink_bridge import MAVLinkBridge
+from src.services.telemetry_broadcaster import TelemetryBroadcaster
+from src.services.telemetry_buffer import TelemetryBuffer
+from src.utils import wire_codec
+from src.utils.mavlink_messages import decode_message
+from src.utils.mavlink_parser import MAVLinkFrameDecoder, MAVLinkFramePool
+from src.utils.telemetry_codec import compress_batch, encode_batch
+from src.utils.tlog import read_tlog
+
+RECV_CHUNK = 1024       # Bytes per simulated socket read
+SYNC_BATCH = 500        # TelemetryBuffer max_batch_records default
+BUFFER_SIZES = (1000, 10000, 100000)
+BROADCAST_CLIENTS = (10, 100)
+
+# --quick: same cases at a size that finishes in a few seconds (CI, tests)
+QUICK = {'frames': 2000, 'buffer_sizes': (1000,), 'broadcast_clients': (10,), 'snapshots': 50, 'rounds': 3}
+FULL = {'frames': 50000, 'buffer_sizes': BUFFER_SIZES, 'broadcast_clients': BROADCAST_CLIENTS,
+        'snapshots': 500, 'rounds': 5}
+
+
+def measure(name: str, ops: int, run: Callable[[Any], None], setup: Callable[[], Any] = lambda: None,
+            rounds: int = 5, teardown: Callable[[Any], None] = lambda state: None,
+            **extra) -> Dict[str, Any]:
+    """Time run(setup()) per round; setup and teardown stay outside the timed region"""
+    samples = []
+    for _ in range(rounds):
+        state = setup()
+        started = time.perf_counter()
+        run(state)
+        samples.append((time.perf_counter() - started) / ops * 1e6)
+        teardown(state)
+
+    median = statistics.median(samples)
+    return {
+        'name': name,
+        'ops': ops,
+        'rounds': rounds,
+        'min_us': min(samples),
+        'median_us': median,
+        'mean_us': statistics.fmean(samples),
+        'stddev_us': statistics.stdev(samples) if rounds > 1 else 0.0,
+        'ops_per_sec': 1e6 / median if median else 0.0,
+        **extra
+    }
+
+
+# ----------------------------------------------------------------------
+# Traffic
+# ----------------------------------------------------------------------
+
+def synthetic_stream(count: int) -> bytes:
+    """count frames cycling through the typical telemetry set, sequence numbers wrapping"""
+    return b''.join(build_v2_frame(msg_id, payload, seq % 256)
+                    for seq, (_, msg_id, payload) in zip(range(count), _cycle(FRAMES)))
+
+
+def _cycle(items):
+    while True:
+        yield from items
+
+
+def chunked(stream: bytes, size: int = RECV_CHUNK) -> List[bytes]:
+    return [stream[offset:offset + size] for offset in range(0, len(stream), size)]
+
+
+def telemetry_sample(index: int) -> Dict[str, Any]:
+    """Flat telemetry dict as ModularMAVLinkService records it"""
+    return {
+        'battery_level': 76 - index % 50 * 0.1,
+        'battery_voltage': 12.4 - index % 100 * 0.001,
+        'altitude_meters': 152.0 + index % 300 * 0.1,
+        'speed_ms': 12.3,
+        'location_latitude': 55.7512345 + index * 1e-7,
+        'location_longitude': 37.6123456 - index * 1e-7,
+        'heading_degrees': float(index % 360),
+        'armed': True,
+        'flight_mode': 'AUTO',
+        'gps_satellites': 14,
+        'timestamp': 1760000000.0 + index * 0.1
+    }
+
+
+# ----------------------------------------------------------------------
+# Cases
+# ----------------------------------------------------------------------
+
+def bench_decode(chunks: List[bytes], frames: int, rounds: int) -> Dict[str, Any]:
+    def setup():
+        pool = MAVLinkFramePool()
+        return MAVLinkFrameDecoder(pool=pool), pool
+
+    def run(state):
+        decoder, pool = state
+        for chunk in chunks:
+            decoder.feed(chunk)
+            for frame in decoder:
+                pool.release(frame)
+
+    return measure('decode', frames, run, setup, rounds)
+
+
+def bench_bridge_ingest(chunks: List[bytes], frames: int, rounds: int) -> Dict[str, Any]:
+    """Production receive path, handlers decode payloads like ModularMAVLinkService"""
+    def handler(frame):
+        decode_message(frame.message_id, frame.payload)
+
+    def setup():
+        bridge = MAVLinkBridge(max_history=100)
+        for _, msg_id, _ in FRAMES:
+            bridge.register_message_handler(msg_id, handler)
+        return bridge
+
+    def run(bridge):
+        buffer = bridge._rx_buffer
+        for chunk in chunks:
+            size = len(chunk)
+            buffer[:size] = chunk
+            bridge._process_received(size)
+
+    return measure('bridge_ingest', frames, run, setup, rounds)
+
+
+def bench_buffer(records: int, rounds: int) -> List[Dict[str, Any]]:
+    """add / pending / ack over one buffer per round, the sync loop kept idle"""
+    samples = [telemetry_sample(index) for index in range(records)]
+    rounds_state: List[Dict[str, Any]] = []
+
+    def setup_buffer():
+        tmpdir = tempfile.mkdtemp()
+        buffer = TelemetryBuffer(max_memory_records=records,
+                                 buffer_file=os.path.join(tmpdir, 'telemetry_buffer.json'),
+                                 sync_interval=3600.0, fsync_interval=3600.0)
+        state = {'tmpdir': tmpdir, 'buffer': buffer, 'batches': []}
+        rounds_state.append(state)
+        return state
+
+    def add(state):
+        buffer = state['buffer']
+        for data in samples:
+            buffer.add_telemetry('bench_drone', data)
+
+    def pending(state):
+        buffer = state['buffer']
+        batches = state['batches']
+        while True:
+            batch = buffer.get_pending_records(SYNC_BATCH)
+            if not batch:
+                break
+            batches.append(batch)
+
+    def ack(state):
+        buffer = state['buffer']
+        for batch in state['batches']:
+            buffer.mark_synced(batch)
+
+    def close(state):
+        state['buffer'].stop()
+        shutil.rmtree(state['tmpdir'], ignore_errors=True)
+
+    # Each stage runs on the buffer left by the previous one
+    results = [measure(f'buffer_add_{records}', records, add, setup_buffer, rounds)]
+    states = iter(rounds_state)
+    results.append(measure(f'buffer_pending_{records}', records, pending, lambda: next(states), rounds))
+    states = iter(rounds_state)
+    results.append(measure(f'buffer_ack_{records}', records, ack, lambda: next(states), rounds, close))
+    return results
+
+
+def bench_broadcast(clients: int, snapshots: int, rounds: int) -> Dict[str, Any]:
+    """Every client due on every snapshot; encodings spread over what this process can produce"""
+    encodings = wire_codec.available_encodings()
+    sections = [{'telemetry': telemetry_sample(index),
+                 'connection': {'connected': True, 'messages_received': index * 50}}
+                for index in range(snapshots)]
+
+    def setup():
+        broadcaster = TelemetryBroadcaster(emit=lambda event, frame, sid: None)
+        for index in range(clients):
+            broadcaster.subscribe(f'client{index}', rate=20.0, encoding=encodings[index % len(encodings)])
+        return broadcaster
+
+    def run(broadcaster):
+        for now, snapshot in enumerate(sections):
+            broadcaster.publish(snapshot, now=float(now))
+
+    return measure(f'broadcast_{clients}', snapshots, run, setup, rounds, encodings=encodings)
+
+
+def bench_sync_encoding(rounds: int) -> List[Dict[str, Any]]:
+    rows = [(data['timestamp'], 'bench_drone', data)
+            for data in (telemetry_sample(index) for index in range(SYNC_BATCH))]
+    body = compress_batch(encode_batch(rows), 'deflate')
+    records = [{'timestamp': timestamp, 'drone_id': drone_id, 'data': data} for timestamp, drone_id, data in rows]
+
+    def encode_json():
+        return json.dumps({'records': records, 'timestamp': time.time(), 'source': 'jetson_gcs'}).encode('utf-8')
+
+    return [
+        measure('sync_encode_batch', SYNC_BATCH, lambda _: compress_batch(encode_batch(rows), 'deflate'),
+                rounds=rounds * 4, bytes=len(body)),
+        measure('sync_encode_json', SYNC_BATCH, lambda _: encode_json(), rounds=rounds * 4, bytes=len(encode_json())),
+    ]
+
+
+def run(quick: bool = False, tlog: Optional[str] = None, rounds: Optional[int] = None) -> List[Dict[str, Any]]:
+    config = QUICK if quick else FULL
+    rounds = rounds or config['rounds']
+
+    if tlog:
+        captured = read_tlog(tlog)
+        stream = b''.join(frame for _, frame in captured)
+        frames = len(captured)
+    else:
+        stream = synthetic_stream(config['frames'])
+        frames = config['frames']
+    chunks = chunked(stream)
+
+    results = [bench_decode(chunks, frames, rounds), bench_bridge_ingest(chunks, frames, rounds)]
+    for records in config['buffer_sizes']:
+        results += bench_buffer(records, rounds)
+    for clients in config['broadcast_clients']:
+        results.append(bench_broadcast(clients, config['snapshots'], rounds))
+    results += bench_sync_encoding(rounds)
+    return results
+
+
+# ----------------------------------------------------------------------
+# Baselines
+# ----------------------------------------------------------------------
+
+def make_baseline(results: List[Dict[str, Any]], quick: bool) -> Dict[str, Any]:
+    return {
+        'created': time.time(),
+        'host': platform.node(),
+        'python': platform.python_version(),
+        'quick': quick,
+        'results': results
+    }
+
+
+def save_baseline(path: str, results: List[Dict[str, Any]], quick: bool = False):
+    with open(path, 'w') as f:
+        json.dump(make_baseline(results, quick), f, indent=2)
+
+
+def load_baseline(path: str) -> Dict[str, Any]:
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(results: List[Dict[str, Any]], baseline: Dict[str, Any], tolerance: float,
+            min_delta_us: float = 0.05) -> List[Dict[str, Any]]:
+    """
+    Per-case ratio to the baseline median; 'regressed' when slower by more than tolerance
+    and by more than min_delta_us (sub-microsecond cases jitter by more than 25%)
+    """
+    previous = {result['name']: result for result in baseline.get('results', [])}
+    comparison = []
+    for result in results:
+        base = previous.get(result['name'])
+        if base is None or not base['median_us']:
+            continue
+        ratio = result['median_us'] / base['median_us']
+        comparison.append({
+            'name': result['name'],
+            'baseline_us': base['median_us'],
+            'median_us': result['median_us'],
+            'ratio': ratio,
+            'regressed': ratio > 1.0 + tolerance and result['median_us'] - base['median_us'] > min_delta_us
+        })
+    return comparison
+
+
+def main():
+    parser = argparse.ArgumentParser(description='MAVLink pipeline benchmark')
+    parser.add_argument('--quick', action='store_true', help='Small sizes, a few seconds in total')
+    parser.add_argument('--rounds', type=int, help='Rounds per case (default 5, 3 with --quick)')
+    parser.add_argument('--tlog', help='Decode/ingest a recorded capture instead of synthetic traffic')
+    parser.add_argument('--save', metavar='PATH', help='Write results as a JSON baseline')
+    parser.add_argument('--compare', metavar='PATH', help='Fail when slower than this JSON baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed slowdown, 0.25 = 25%%')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    # Buffer start/stop and bridge logging are not part of the measurement
+    logging.basicConfig(level=logging.WARNING)
+
+    results = run(args.quick, args.tlog, args.rounds)
+    comparison = []
+    baseline = None
+    if args.compare:
+        baseline = load_baseline(args.compare)
+        comparison = compare(results, baseline, args.tolerance)
+    if args.save:
+        save_baseline(args.save, results, args.quick)
+
+    if args.json:
+        print(json.dumps({'results': results, 'comparison': comparison}, indent=2))
+    else:
+        ratios = {entry['name']: entry for entry in comparison}
+        print(f"{'case':<22} {'ops':>7} {'median µs':>10} {'min µs':>9} {'stddev':>8} {'ops/s':>11} {'vs base':>8}")
+        for result in results:
+            entry = ratios.get(result['name'])
+            versus = f"{entry['ratio']:.2f}x{' !' if entry['regressed'] else ''}" if entry else '-'
+            print(f"{result['name']:<22} {result['ops']:>7} {result['median_us']:>10.2f} {result['min_us']:>9.2f} "
+                  f"{result['stddev_us']:>8.2f} {result['ops_per_sec']:>11.0f} {versus:>8}")
+
+    if baseline is not None and baseline.get('host') != platform.node():
+        print(f"warning: baseline recorded on {baseline.get('host')}, not this machine", file=sys.stderr)
+
+    regressions = [entry for entry in comparison if entry['regressed']]
+    if regressions:
+        for entry in regressions:
+            print(f"REGRESSION {entry['name']}: {entry['median_us']:.2f} µs vs {entry['baseline_us']:.2f} µs "
+                  f"({entry['ratio']:.2f}x, tolerance {args.tolerance:.0%})", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
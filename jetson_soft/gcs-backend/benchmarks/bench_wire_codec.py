@@ -0,0 +1,119 @@
+"""
+Benchmark: wire size and encode time of realtime messages per encoding
+
+Frames: typical MAVLink messages as the WebSocket bridge broadcasts them
+(message wrapper + payload + raw frame) and a SocketIO telemetry delta frame.
+'json-hex' is the previous bridge format (payload and raw frame as hex strings).
+
+Run: python benchmarks/bench_wire_codec.py [--iterations 20000] [--json]
+"""
+
+import argparse
+import json
+import struct
+import sys
+import os
+import time
+from typing import Dict, Any, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.utils import wire_codec
+from src.utils.mavlink_parser import MAVLinkFrameDecoder, CRC_EXTRA, crc_x25, crc_accumulate
+
+
+def build_v2_frame(msg_id: int, payload: bytes, seq: int = 0) -> bytes:
+    header = bytes([len(payload), 0, 0, seq, 1, 1]) + msg_id.to_bytes(3, 'little')
+    crc = crc_accumulate(CRC_EXTRA[msg_id], crc_x25(header + payload))
+    return b'\xfd' + header + payload + crc.to_bytes(2, 'little')
+
+
+# (name, message id, payload) as seen in flight at 4-50 Hz
+FRAMES = [
+    ('HEARTBEAT', 0, struct.pack('<IBBBBB', 4, 2, 3, 0x81, 4, 3)),
+    ('SYS_STATUS', 1, struct.pack('<IIIHHhHHHHHHb', 0x3f, 0x3f, 0x3f, 350, 12400, 1530, 0, 0, 0, 0, 0, 0, 76)),
+    ('GPS_RAW_INT', 24, struct.pack('<QiiiHHHHBB', 123456789, 557512345, 376123456, 152000, 90, 120, 1250, 18000, 3, 14)),
+    ('ATTITUDE', 30, struct.pack('<Iffffff', 123456, 0.0123, -0.0456, 1.5708, 0.001, -0.002, 0.0005)),
+    ('VFR_HUD', 74, struct.pack('<ffffhH', 12.3, 12.1, 152.0, -0.4, 90, 55)),
+]
+
+TELEMETRY_DELTA = {
+    'seq': 1234, 'base': 1233,
+    'telemetry': {'altitude_meters': 152.4, 'location_latitude': 55.7512345, 'heading_degrees': 91.0},
+    'timestamp': 1760000000.123
+}
+
+
+def bridge_message(frame) -> Dict[str, Any]:
+    """What WebSocketMAVLinkBridge broadcasts for one frame"""
+    return {
+        'type': 'mavlink_message',
+        'message': {
+            'msg_type': f"MSG_{frame.message_id}",
+            'system_id': frame.system_id,
+            'component_id': frame.component_id,
+            'timestamp': 1760000000.123,
+            'data': {
+                'msg_id': frame.message_id,
+                'seq': frame.sequence,
+                'payload_length': frame.payload_length,
+                'payload': bytes(frame.payload)
+            },
+            'raw_bytes': bytes(frame.raw)
+        }
+    }
+
+
+def legacy_json(message: Dict[str, Any]) -> str:
+    """Previous bridge encoding: hex strings, default separators"""
+    return json.dumps(message, default=lambda value: value.hex())
+
+
+def measure(encode, message, iterations: int) -> Dict[str, float]:
+    encoded = encode(message)
+    started = time.perf_counter()
+    for _ in range(iterations):
+        encode(message)
+    elapsed = time.perf_counter() - started
+    size = len(encoded.encode('utf-8') if isinstance(encoded, str) else encoded)
+    return {'bytes': size, 'encode_us': elapsed / iterations * 1e6}
+
+
+def run(iterations: int) -> List[Dict[str, Any]]:
+    decoder = MAVLinkFrameDecoder()
+    messages = []
+    for seq, (name, msg_id, payload) in enumerate(FRAMES):
+        decoder.feed(build_v2_frame(msg_id, payload, seq))
+        frame = next(iter(decoder))
+        messages.append((name, bridge_message(frame)))
+    messages.append(('TELEMETRY_DELTA', TELEMETRY_DELTA))
+
+    encoders = {'json-hex': legacy_json}
+    for encoding in wire_codec.available_encodings():
+        encoders[encoding] = lambda message, encoding=encoding: wire_codec.encode(message, encoding)
+
+    results = []
+    for name, message in messages:
+        for encoding, encode in encoders.items():
+            results.append({'frame': name, 'encoding': encoding, **measure(encode, message, iterations)})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Wire codec benchmark')
+    parser.add_argument('--iterations', type=int, default=20000)
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    results = run(args.iterations)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'frame':<16} {'encoding':<10} {'bytes':>6} {'encode µs':>10}")
+    for result in results:
+        print(f"{result['frame']:<16} {result['encoding']:<10} {result['bytes']:>6} {result['encode_us']:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
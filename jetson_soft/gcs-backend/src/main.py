@@ -26,6 +26,7 @@ from src.services.modular_mavlink_service import mavlink_service
 from src.services.video_service import VideoService
 from src.services.mission_service import MissionService
 from src.services.system_monitor import SystemMonitor
+from src.services.telemetry_broadcaster import TelemetryBroadcaster
 
 # Configure logging for production
 logging.basicConfig(
@@ -58,6 +59,11 @@ video_service = VideoService()
 mission_service = MissionService()
 system_monitor = SystemMonitor()
 
+# Per-client delta telemetry (rate/delta set by 'subscribe_telemetry')
+telemetry_broadcaster = TelemetryBroadcaster(
+    emit=lambda event, data, sid: socketio.emit(event, data, to=sid)
+)
+
 class OptimizedGCSBackend:
     """
     Main GCS Backend class optimized for Jetson Nano
@@ -140,25 +146,23 @@ class OptimizedGCSBackend:
         self.system_monitor_thread.start()
     
     def _telemetry_loop(self):
-        """Real-time telemetry broadcasting (10Hz)"""
+        """Real-time telemetry broadcasting (changed fields only, per-client rate)"""
         while self.is_running:
             try:
-                if len(self.connected_clients) > 0:
+                if telemetry_broadcaster.client_count > 0:
                     # Get telemetry data
                     telemetry = mavlink_service.get_telemetry()
                     connection_stats = mavlink_service.get_connection_stats()
                     
-                    # Broadcast to all connected clients
-                    socketio.emit('telemetry_update', {
+                    # Send to every client that is due
+                    if telemetry_broadcaster.publish({
                         'telemetry': telemetry,
-                        'connection': connection_stats,
-                        'timestamp': time.time()
-                    })
-                    
-                    self.metrics['telemetry_updates'] += 1
+                        'connection': connection_stats
+                    }):
+                        self.metrics['telemetry_updates'] += 1
                 
-                # 10Hz update rate (100ms)
-                eventlet.sleep(0.1)
+                # Fastest subscribed client rate (10Hz by default)
+                eventlet.sleep(telemetry_broadcaster.tick_interval())
                 
             except Exception as e:
                 logger.error(f"Error in telemetry loop: {e}")
@@ -240,11 +244,12 @@ def mavlink_command():
     data = request.get_json()
     command = data.get('command')
     params = data.get('params', {})
+    drone_id = data.get('drone_id')
     
     if not command:
         return jsonify({'success': False, 'message': 'Command required'}), 400
     
-    success = mavlink_service.send_command(command, params)
+    success = mavlink_service.send_command(command, params, drone_id)
     gcs_backend.metrics['commands_sent'] += 1
     
     return jsonify({
@@ -257,7 +262,7 @@ def mavlink_command():
 @app.route('/api/mavlink/telemetry')
 def get_telemetry():
     """Get current telemetry data"""
-    telemetry = mavlink_service.get_telemetry()
+    telemetry = mavlink_service.get_telemetry(request.args.get('drone_id'))
     connection_stats = mavlink_service.get_connection_stats()
     
     return jsonify({
@@ -266,6 +271,15 @@ def get_telemetry():
         'timestamp': time.time()
     })
 
+@app.route('/api/mavlink/vehicles')
+def get_vehicles():
+    """Get telemetry of every vehicle seen on the link"""
+    return jsonify({
+        'vehicles': mavlink_service.get_vehicles(),
+        'router': mavlink_service.router.get_router_stats(),
+        'timestamp': time.time()
+    })
+
 @app.route('/api/video/start', methods=['POST'])
 def start_video():
     """Start video streaming"""
@@ -343,6 +357,7 @@ def system_stats():
     return jsonify({
         'system': stats,
         'metrics': gcs_backend.metrics,
+        'broadcast': telemetry_broadcaster.get_stats(),
         'timestamp': time.time()
     })
 
@@ -354,6 +369,7 @@ def system_stats():
 def handle_connect():
     """Handle client connection"""
     gcs_backend.connected_clients.add(request.sid)
+    telemetry_broadcaster.subscribe(request.sid)
     logger.info(f"Client connected: {request.sid}")
     
     # Send initial status
@@ -367,19 +383,31 @@ def handle_connect():
 def handle_disconnect():
     """Handle client disconnection"""
     gcs_backend.connected_clients.discard(request.sid)
+    telemetry_broadcaster.unsubscribe(request.sid)
     logger.info(f"Client disconnected: {request.sid}")
 
 @socketio.on('request_telemetry')
 def handle_telemetry_request():
-    """Handle telemetry data request"""
-    telemetry = mavlink_service.get_telemetry()
-    connection_stats = mavlink_service.get_connection_stats()
+    """Handle telemetry data request (full snapshot with the next frame)"""
+    telemetry_broadcaster.request_keyframe(request.sid)
+
+@socketio.on('subscribe_telemetry')
+def handle_telemetry_subscription(data=None):
+    """Set telemetry rate (Hz), delta mode and encoding (json/msgpack/cbor) for this client"""
+    data = data or {}
+    subscription = telemetry_broadcaster.subscribe(
+        request.sid,
+        rate=data.get('rate'),
+        delta=bool(data.get('delta', False)),
+        encoding=data.get('encoding')
+    )
     
-    emit('telemetry_update', {
-        'telemetry': telemetry,
-        'connection': connection_stats,
-        'timestamp': time.time()
-    })
+    emit('telemetry_subscription', subscription)
+
+@socketio.on('telemetry_resync')
+def handle_telemetry_resync():
+    """Client missed a frame: resend everything"""
+    telemetry_broadcaster.request_keyframe(request.sid)
 
 @socketio.on('send_command')
 def handle_command(data):
@@ -388,7 +416,7 @@ def handle_command(data):
     params = data.get('params', {})
     
     if command:
-        success = mavlink_service.send_command(command, params)
+        success = mavlink_service.send_command(command, params, data.get('drone_id'))
         gcs_backend.metrics['commands_sent'] += 1
         
         emit('command_result', {
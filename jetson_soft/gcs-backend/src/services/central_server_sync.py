@@ -4,16 +4,21 @@ Handles communication with Tiger CRM central server
 """
 
 import asyncio
+import itertools
 import json
 import logging
 import threading
 import time
-from typing import Dict, Any, List, Optional, Callable
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Callable, Tuple
 import websockets
-import requests
 from dataclasses import dataclass, asdict
 
+from .http_pool import HTTPPool
 from ..utils.serialization import SerializationUtils
+from ..utils.telemetry_codec import (
+    Row, encode_batch, compress_batch, BATCH_CONTENT_TYPE, BATCH_ENCODINGS
+)
 
 logger = logging.getLogger(__name__)
 
@@ -27,32 +32,85 @@ class SyncStats:
     failed_syncs: int = 0
     bytes_sent: int = 0
     bytes_received: int = 0
-    latency_ms: float = 0
+    records_sent: int = 0
+    uplink_format: str = 'batch'
+    realtime_sent: int = 0
+    realtime_bytes_sent: int = 0  # Kept out of bytes_sent: that one measures upload compression
+    realtime_conflated: int = 0
+    realtime_dropped: int = 0
+    realtime_queue: int = 0
     
     def to_dict(self) -> Dict[str, Any]:
         return asdict(self)
 
 
+# Response header listing batch encodings the ingest function can decode
+ENCODINGS_HEADER = 'X-Telemetry-Encodings'
+# Ingest function refusing the batch body itself; 5xx / 401 / 403 are not a format problem
+FORMAT_REJECTED_STATUSES = (400, 415, 422)
+
+# websockets >= 14 renamed connect(extra_headers=) to additional_headers=
+_WS_HEADERS_ARG = 'additional_headers' if int(websockets.__version__.split('.')[0]) >= 14 else 'extra_headers'
+
+
 class CentralServerSync:
     """
     Handles sync with Tiger CRM central server (Supabase)
     Manages WebSocket real-time communication and REST API calls
+    
+    Telemetry uplink format (uplink_format):
+    - 'batch': columnar, delta-encoded, compressed (utils.telemetry_codec)
+    - 'json':  list of record dicts
+    - 'auto':  batch, falling back to JSON while the server rejects it
+    
+    REST calls go through a pooled keep-alive client (services.http_pool) with a
+    queue per endpoint, so status and mission requests never wait behind a
+    telemetry backlog.
+    
+    Realtime updates (send_realtime_update) are queued from any thread and sent
+    by the WebSocket loop. The queue holds one entry per topic/event/drone:
+    while the socket is busy a newer update replaces (delta updates: merges
+    into) the pending one, and the oldest entry is dropped when the queue is full.
     """
     
     def __init__(self, 
                  server_url: str = "https://zqnjgwrvvrqaenzmlvfx.supabase.co",
                  websocket_url: str = "wss://zqnjgwrvvrqaenzmlvfx.supabase.co/realtime/v1/websocket",
-                 api_key: str = ""):
+                 api_key: str = "",
+                 uplink_format: str = 'auto',
+                 uplink_encoding: str = 'deflate',
+                 format_probe_interval: float = 600.0,
+                 endpoint_concurrency: Optional[Dict[str, int]] = None,
+                 realtime_queue_size: int = 256,
+                 realtime_batching: bool = False):
         
         self.server_url = server_url.rstrip('/')
         self.websocket_url = websocket_url
         self.api_key = api_key
         
+        # Uplink negotiation
+        self.uplink_format = uplink_format
+        self.uplink_encoding = uplink_encoding if uplink_encoding in BATCH_ENCODINGS else 'deflate'
+        self.format_probe_interval = format_probe_interval
+        self._batch_rejected_at: Optional[float] = None
+        
         # Connection management
         self.websocket: Optional[websockets.WebSocketServerProtocol] = None
-        self.session = requests.Session()
+        self.http = HTTPPool(
+            self.server_url,
+            endpoints=endpoint_concurrency or {'telemetry': 4, 'status': 2, 'missions': 1, 'health': 1}
+        )
         self._running = False
         self._ws_thread: Optional[threading.Thread] = None
+        self._ws_loop: Optional[asyncio.AbstractEventLoop] = None
+        
+        # Realtime outbound queue: (topic, event, key) -> payload, oldest first
+        self.realtime_queue_size = realtime_queue_size
+        self.realtime_batching = realtime_batching
+        self._outbound: 'OrderedDict[Tuple[str, str, Any], Dict[str, Any]]' = OrderedDict()
+        self._outbound_lock = threading.Lock()
+        self._outbound_wakeup: Optional[asyncio.Event] = None
+        self._refs = itertools.count(1)
         
         # Statistics
         self.stats = SyncStats()
@@ -60,12 +118,12 @@ class CentralServerSync:
         # Message handlers
         self.message_handlers: Dict[str, Callable] = {}
         
-        # Setup HTTP session
+        # Setup HTTP client
         self._setup_session()
     
     def _setup_session(self):
-        """Setup HTTP session with headers"""
-        self.session.headers.update({
+        """Setup HTTP client default headers"""
+        self.http.headers.update({
             'Content-Type': 'application/json',
             'apikey': self.api_key,
             'Authorization': f'Bearer {self.api_key}'
@@ -92,13 +150,17 @@ class CentralServerSync:
         """Stop central server sync"""
         self._running = False
         
-        if self.websocket:
-            asyncio.create_task(self.websocket.close())
+        websocket, loop = self.websocket, self._ws_loop
+        if websocket and loop:
+            try:
+                asyncio.run_coroutine_threadsafe(websocket.close(), loop)
+            except RuntimeError:
+                pass  # Loop already finished
         
         if self._ws_thread and self._ws_thread.is_alive():
             self._ws_thread.join(timeout=3.0)
         
-        self.session.close()
+        self.http.close()
         self.stats.websocket_connected = False
         
         logger.info("🛑 Central server sync stopped")
@@ -107,33 +169,33 @@ class CentralServerSync:
         """Register handler for specific message types"""
         self.message_handlers[message_type] = handler
     
-    def sync_telemetry_batch(self, telemetry_records: List[Dict[str, Any]]) -> bool:
-        """Sync batch of telemetry records via REST API"""
+    def sync_telemetry_batch(self, telemetry_records: List[Any]) -> bool:
+        """Sync batch of telemetry records via REST API (record dicts or (timestamp, drone_id, data) rows)"""
         try:
-            start_time = time.time()
-            
-            # Prepare payload
-            payload = {
-                'records': telemetry_records,
-                'timestamp': time.time(),
-                'source': 'jetson_gcs'
-            }
-            
-            # Send to Supabase Edge Function
-            response = self.session.post(
-                f"{self.server_url}/functions/v1/ingest-telemetry",
-                json=payload,
-                timeout=10.0
-            )
+            if self._use_batch_format():
+                response, sent = self._post_batch(telemetry_records)
+                if response.status_code == 415 and self._accept_server_encodings(response):
+                    # Server named the encodings it can decode: resend once
+                    self.stats.bytes_sent += sent
+                    response, sent = self._post_batch(telemetry_records)
+                elif (response.status_code in FORMAT_REJECTED_STATUSES and self.uplink_format == 'auto'
+                      and not isinstance(response.headers.get(ENCODINGS_HEADER), str)):
+                    # Ingest function without batch support: JSON until the next probe
+                    self._batch_rejected_at = time.time()
+                    self.stats.bytes_sent += sent
+                    logger.warning(f"⚠️ Batch uplink rejected ({response.status_code}), falling back to JSON")
+                    response, sent = self._post_json(telemetry_records)
+            else:
+                response, sent = self._post_json(telemetry_records)
             
             # Update statistics
-            self.stats.bytes_sent += len(json.dumps(payload).encode('utf-8'))
-            self.stats.latency_ms = (time.time() - start_time) * 1000
+            self.stats.bytes_sent += sent
             
             if response.status_code == 200:
                 self.stats.total_syncs += 1
+                self.stats.records_sent += len(telemetry_records)
                 self.stats.last_sync_time = time.time()
-                logger.debug(f"✅ Synced {len(telemetry_records)} telemetry records")
+                logger.debug(f"✅ Synced {len(telemetry_records)} telemetry records ({sent} bytes)")
                 return True
             else:
                 self.stats.failed_syncs += 1
@@ -145,6 +207,75 @@ class CentralServerSync:
             logger.error(f"❌ Telemetry sync error: {e}")
             return False
     
+    def _use_batch_format(self) -> bool:
+        if self.uplink_format == 'json':
+            return False
+        if self.uplink_format == 'auto' and self._batch_rejected_at is not None:
+            if time.time() - self._batch_rejected_at < self.format_probe_interval:
+                return False
+            self._batch_rejected_at = None  # Probe again, the function may have been redeployed
+        return True
+    
+    def _post_batch(self, telemetry_records: List[Any]):
+        batch = encode_batch(self._to_row(record) for record in telemetry_records)
+        body = compress_batch(batch, self.uplink_encoding)
+        self.stats.uplink_format = f"batch+{self.uplink_encoding}"
+        
+        response = self.http.request(
+            'telemetry', 'POST', '/functions/v1/ingest-telemetry',
+            body=body,
+            headers={'Content-Type': BATCH_CONTENT_TYPE, 'Content-Encoding': self.uplink_encoding},
+            timeout=10.0
+        )
+        return response, len(body)
+    
+    def _post_json(self, telemetry_records: List[Any]):
+        payload = {
+            'records': [
+                record if isinstance(record, dict)
+                else {'timestamp': record[0], 'drone_id': record[1], 'data': record[2]}
+                for record in telemetry_records
+            ],
+            'timestamp': time.time(),
+            'source': 'jetson_gcs'
+        }
+        body = json.dumps(payload).encode('utf-8')
+        self.stats.uplink_format = 'json'
+        
+        # Send to Supabase Edge Function
+        response = self.http.request(
+            'telemetry', 'POST', '/functions/v1/ingest-telemetry',
+            body=body,
+            timeout=10.0
+        )
+        return response, len(body)
+    
+    def _accept_server_encodings(self, response) -> bool:
+        """Switch to an encoding the server advertises; False if nothing changed"""
+        advertised = response.headers.get(ENCODINGS_HEADER)
+        if not isinstance(advertised, str):
+            return False
+        
+        accepted = [e.strip() for e in advertised.split(',')]
+        if self.uplink_encoding in accepted:
+            return False
+        for encoding in BATCH_ENCODINGS:
+            if encoding in accepted:
+                logger.info(f"🔄 Uplink encoding {self.uplink_encoding} -> {encoding}")
+                self.uplink_encoding = encoding
+                return True
+        return False
+    
+    @staticmethod
+    def _to_row(record: Any) -> Row:
+        """TelemetryRecord.to_dict() or a flat telemetry dict as (timestamp, drone_id, data)"""
+        if isinstance(record, tuple):
+            return record
+        data = record.get('data')
+        if not isinstance(data, dict):
+            data = {key: value for key, value in record.items() if key not in ('timestamp', 'drone_id')}
+        return float(record.get('timestamp') or time.time()), str(record.get('drone_id', '')), data
+    
     def send_drone_status(self, drone_id: str, status_data: Dict[str, Any]) -> bool:
         """Send drone status update"""
         try:
@@ -154,9 +285,9 @@ class CentralServerSync:
                 'timestamp': time.time()
             }
             
-            response = self.session.post(
-                f"{self.server_url}/rest/v1/drones",
-                json=payload,
+            response = self.http.request(
+                'status', 'POST', '/rest/v1/drones',
+                body=json.dumps(payload).encode('utf-8'),
                 timeout=5.0
             )
             
@@ -169,8 +300,8 @@ class CentralServerSync:
     def get_mission_updates(self, drone_id: str) -> Optional[List[Dict[str, Any]]]:
         """Get mission updates from central server"""
         try:
-            response = self.session.get(
-                f"{self.server_url}/rest/v1/missions_extended",
+            response = self.http.request(
+                'missions', 'GET', '/rest/v1/missions_extended',
                 params={'org_id': 'eq.your-org-id'},  # Replace with actual org ID
                 timeout=5.0
             )
@@ -197,18 +328,22 @@ class CentralServerSync:
     
     async def _websocket_handler(self):
         """Handle WebSocket connection"""
+        sender = None
         try:
             async with websockets.connect(
                 self.websocket_url,
-                extra_headers={'apikey': self.api_key}
+                **{_WS_HEADERS_ARG: {'apikey': self.api_key}}
             ) as websocket:
                 
                 self.websocket = websocket
+                self._ws_loop = asyncio.get_running_loop()
+                self._outbound_wakeup = asyncio.Event()
                 self.stats.websocket_connected = True
                 logger.info("🔗 WebSocket connected to central server")
                 
                 # Send join message
                 await self._join_realtime_channel()
+                sender = asyncio.create_task(self._realtime_sender(websocket))
                 
                 # Listen for messages
                 async for message in websocket:
@@ -216,7 +351,15 @@ class CentralServerSync:
                     
         except Exception as e:
             logger.error(f"WebSocket handler error: {e}")
+        finally:
             self.stats.websocket_connected = False
+            self.websocket = None
+            if sender:
+                sender.cancel()
+            # Realtime updates are stale after a reconnect: the buffer keeps the history
+            with self._outbound_lock:
+                self._outbound.clear()
+                self.stats.realtime_queue = 0
     
     async def _join_realtime_channel(self):
         """Join realtime channels for drone data"""
@@ -280,37 +423,92 @@ class CentralServerSync:
             }
             await self.websocket.send(json.dumps(pong_message))
     
-    def send_realtime_update(self, channel: str, event: str, data: Dict[str, Any]) -> bool:
-        """Send real-time update via WebSocket"""
-        if not self.stats.websocket_connected or not self.websocket:
+    def send_realtime_update(self, channel: str, event: str, data: Dict[str, Any], key: Any = None) -> bool:
+        """
+        Queue real-time update for the WebSocket (thread-safe, never blocks)
+        
+        Updates with the same channel, event and key (default: data['drone_id'])
+        are conflated while they wait for the socket.
+        """
+        loop, wakeup = self._ws_loop, self._outbound_wakeup
+        if not self.stats.websocket_connected or not loop or not wakeup:
             return False
         
-        try:
-            message = {
-                "topic": f"realtime:{channel}",
-                "event": event,
-                "payload": data,
-                "ref": str(int(time.time()))
-            }
+        entry = (f"realtime:{channel}", event, data.get('drone_id') if key is None else key)
+        with self._outbound_lock:
+            pending = self._outbound.get(entry)
+            if pending is not None:
+                self._outbound[entry] = self._conflate(pending, data)
+                self.stats.realtime_conflated += 1
+                return True  # Sender is already woken for this entry
             
-            # Send async
-            asyncio.create_task(self.websocket.send(json.dumps(message)))
+            if len(self._outbound) >= self.realtime_queue_size:
+                self._outbound.popitem(last=False)
+                self.stats.realtime_dropped += 1
+            self._outbound[entry] = data
+            self.stats.realtime_queue = len(self._outbound)
+        
+        try:
+            loop.call_soon_threadsafe(wakeup.set)
             return True
+        except RuntimeError:
+            return False  # Loop closed with the connection
+    
+    @staticmethod
+    def _conflate(pending: Dict[str, Any], data: Dict[str, Any]) -> Dict[str, Any]:
+        """Newer update replaces the pending one; a delta is merged so no field change is lost"""
+        if data.get('delta') and isinstance(pending.get('telemetry'), dict) and isinstance(data.get('telemetry'), dict):
+            merged = dict(pending)
+            merged['telemetry'] = {**pending['telemetry'], **data['telemetry']}
+            return merged
+        return data
+    
+    async def _realtime_sender(self, websocket):
+        """Drain the outbound queue; while send() waits on the socket, updates conflate"""
+        while True:
+            await self._outbound_wakeup.wait()
+            self._outbound_wakeup.clear()
             
-        except Exception as e:
-            logger.error(f"Real-time send error: {e}")
-            return False
+            with self._outbound_lock:
+                pending, self._outbound = self._outbound, OrderedDict()
+                self.stats.realtime_queue = 0
+            
+            for frame, count in self._realtime_frames(pending):
+                await websocket.send(frame)
+                self.stats.realtime_sent += count
+                self.stats.realtime_bytes_sent += len(frame)
+    
+    def _realtime_frames(self, pending: 'OrderedDict[Tuple[str, str, Any], Dict[str, Any]]') -> List[Tuple[str, int]]:
+        """Phoenix frames as (json, updates); with realtime_batching one frame per topic/event"""
+        groups: 'OrderedDict[Tuple, List[Dict[str, Any]]]' = OrderedDict()
+        for (topic, event, key), payload in pending.items():
+            group = (topic, event) if self.realtime_batching else (topic, event, key)
+            groups.setdefault(group, []).append(payload)
+        
+        frames = []
+        for group, payloads in groups.items():
+            message = {
+                "topic": group[0],
+                "event": group[1],
+                "payload": payloads[0] if len(payloads) == 1 else {"batch": payloads},
+                "ref": str(next(self._refs))
+            }
+            frames.append((json.dumps(message), len(payloads)))
+        return frames
     
     def get_sync_stats(self) -> Dict[str, Any]:
-        """Get synchronization statistics"""
-        return SerializationUtils.add_timestamp(self.stats.to_dict())
+        """Get synchronization statistics (with per-endpoint latency histograms)"""
+        stats = self.stats.to_dict()
+        stats['http'] = self.http.get_stats()
+        return SerializationUtils.add_timestamp(stats)
     
     def health_check(self) -> Dict[str, Any]:
         """Check connection health"""
         try:
-            response = self.session.get(
-                f"{self.server_url}/rest/v1/",
-                timeout=3.0
+            response = self.http.request(
+                'health', 'GET', '/rest/v1/',
+                timeout=3.0,
+                queue_timeout=2.0
             )
             
             api_healthy = response.status_code == 200
@@ -0,0 +1,342 @@
+"""
+Command Tracker - Outbound MAVLink commands with reply correlation
+Encodes COMMAND_LONG/INT, SET_MODE, MISSION_* and PARAM_* messages, matches
+each one to the autopilot's reply (COMMAND_ACK, MISSION_ACK / MISSION_REQUEST,
+PARAM_VALUE, ...) through a table of outstanding requests and retries on
+timeout. Any number of requests can be in flight; only requests expecting
+the same reply from the same target wait for each other.
+"""
+
+import asyncio
+import time
+import logging
+from typing import Dict, Any, Callable, Hashable, List, Optional, Tuple
+from dataclasses import dataclass, asdict, field, fields as dataclass_fields
+
+from ..utils.latency_histogram import LatencyHistogram
+from ..utils.mavlink_encoder import MAVLinkFrameEncoder
+from ..utils.mavlink_messages import (
+    MessageDefinition, MAVLinkRecord, get_message_definition, decode_message,
+    MAV_COMP_ID_AUTOPILOT1, COMMAND_LONG
+)
+
+logger = logging.getLogger(__name__)
+
+MAV_RESULT_IN_PROGRESS = 5
+
+MAV_RESULT = {
+    0: 'ACCEPTED', 1: 'TEMPORARILY_REJECTED', 2: 'DENIED', 3: 'UNSUPPORTED', 4: 'FAILED',
+    5: 'IN_PROGRESS', 6: 'CANCELLED', 7: 'COMMAND_LONG_ONLY', 8: 'COMMAND_INT_ONLY',
+    9: 'COMMAND_UNSUPPORTED_MAV_FRAME'
+}
+
+MAV_MISSION_RESULT = {
+    0: 'ACCEPTED', 1: 'ERROR', 2: 'UNSUPPORTED_FRAME', 3: 'UNSUPPORTED', 4: 'NO_SPACE',
+    5: 'INVALID', 6: 'INVALID_PARAM1', 7: 'INVALID_PARAM2', 8: 'INVALID_PARAM3',
+    9: 'INVALID_PARAM4', 10: 'INVALID_PARAM5_X', 11: 'INVALID_PARAM6_Y', 12: 'INVALID_PARAM7',
+    13: 'INVALID_SEQUENCE', 14: 'DENIED', 15: 'OPERATION_CANCELLED'
+}
+
+# (reply message ID, replying system or None for any, discriminator)
+ReplyKey = Tuple[int, Optional[int], Hashable]
+
+
+def _param_key(value: Any) -> str:
+    if isinstance(value, (bytes, bytearray)):
+        value = bytes(value).split(b'\x00', 1)[0].decode('ascii', 'replace')
+    return value or ''
+
+
+def _expected_replies(message_id: int, values: Dict[str, Any]) -> List[Tuple[int, Hashable]]:
+    """Replies that complete an outbound message: [(reply message ID, discriminator)]"""
+    mission_type = int(values.get('mission_type') or 0)
+    seq = int(values.get('seq') or 0)
+
+    if message_id in (75, 76):  # COMMAND_INT / COMMAND_LONG -> COMMAND_ACK
+        return [(77, int(values.get('command') or 0))]
+    if message_id == 11:  # SET_MODE -> COMMAND_ACK carrying the message ID
+        return [(77, 11)]
+    if message_id in (20, 23):  # PARAM_REQUEST_READ / PARAM_SET -> PARAM_VALUE
+        param_id = _param_key(values.get('param_id'))
+        if param_id:
+            return [(22, param_id)]
+        return [(22, ('index', int(values.get('param_index', -1))))]
+    if message_id == 41:  # MISSION_SET_CURRENT -> MISSION_CURRENT
+        return [(42, seq)]
+    if message_id == 43:  # MISSION_REQUEST_LIST -> MISSION_COUNT
+        return [(44, mission_type)]
+    if message_id == 44:  # MISSION_COUNT -> request for item 0 (or ACK for an empty / refused upload)
+        return [(51, (mission_type, 0)), (40, (mission_type, 0)), (47, mission_type)]
+    if message_id == 45:  # MISSION_CLEAR_ALL -> MISSION_ACK
+        return [(47, mission_type)]
+    if message_id == 51:  # MISSION_REQUEST_INT -> MISSION_ITEM_INT
+        return [(73, (mission_type, seq))]
+    if message_id == 73:  # MISSION_ITEM_INT -> request for the next item, ACK after the last
+        return [(51, (mission_type, seq + 1)), (40, (mission_type, seq + 1)), (47, mission_type)]
+    return []  # PARAM_REQUEST_LIST, MISSION_ACK, ...: no single reply
+
+
+# Reply message ID -> discriminators of a received reply
+_REPLY_KEYS: Dict[int, Callable[[MAVLinkRecord], List[Hashable]]] = {
+    77: lambda record: [record.command],
+    22: lambda record: [record.param_id, ('index', record.param_index)],
+    42: lambda record: [record.seq],
+    44: lambda record: [record.mission_type],
+    47: lambda record: [record.mission_type],
+    40: lambda record: [(record.mission_type, record.seq)],
+    51: lambda record: [(record.mission_type, record.seq)],
+    73: lambda record: [(record.mission_type, record.seq)],
+}
+
+# Replies addressed to a GCS: ones for another GCS on the link are ignored
+_ADDRESSED_REPLIES = frozenset({40, 44, 47, 51, 73, 77})
+
+
+@dataclass
+class CommandResult:
+    """Outcome of one outbound request"""
+    message: str
+    status: str = 'sent'  # sent | accepted | rejected | completed | timeout | failed
+    attempts: int = 0
+    latency_ms: float = 0.0
+    result: Optional[int] = None
+    result_name: Optional[str] = None
+    reply: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+@dataclass
+class CommandStats:
+    """Command statistics"""
+    frames_sent: int = 0
+    retries: int = 0
+    accepted: int = 0
+    rejected: int = 0
+    completed: int = 0
+    timeouts: int = 0
+    failed: int = 0
+    waited: int = 0  # Requests that queued behind one expecting the same reply
+    in_flight: int = 0
+    latency: LatencyHistogram = field(default_factory=LatencyHistogram)
+
+    def to_dict(self) -> Dict[str, Any]:
+        stats = {item.name: getattr(self, item.name) for item in dataclass_fields(self) if item.name != 'latency'}
+        stats['latency'] = self.latency.to_dict()
+        return stats
+
+
+class _Pending:
+    __slots__ = ('message', 'keys', 'future', 'started', 'attempts', 'in_progress', 'progress')
+
+    def __init__(self, message: str, keys: List[ReplyKey], future: asyncio.Future):
+        self.message = message
+        self.keys = keys
+        self.future = future
+        self.started = time.perf_counter()
+        self.attempts = 0
+        self.in_progress = False
+        self.progress = 0
+
+
+class CommandTracker:
+    """
+    Outstanding request table for one MAVLink link
+
+    execute() runs on an asyncio loop and never blocks it: a request is one
+    non-blocking send plus a wait on its own future. handle_frame() is called
+    for every received frame and only decodes the few reply message types
+    while requests are outstanding.
+    """
+
+    def __init__(self,
+                 send: Callable[[bytes], bool],
+                 encoder: Optional[MAVLinkFrameEncoder] = None,
+                 timeout: float = 1.5,
+                 retries: int = 3,
+                 target: Tuple[int, int] = (1, MAV_COMP_ID_AUTOPILOT1)):
+        """
+        Args:
+            send: Writes an encoded frame to the link; False when it is down
+            encoder: Frame encoder (GCS system/component ID, sequence numbers)
+            timeout: Seconds to wait for a reply per attempt
+            retries: Resends after the first attempt times out
+            target: Default (target_system, target_component) for requests without one
+        """
+        self.send = send
+        self.encoder = encoder or MAVLinkFrameEncoder()
+        self.timeout = timeout
+        self.retries = retries
+        self.default_target = target
+        self.stats = CommandStats()
+        self._pending: Dict[ReplyKey, _Pending] = {}
+
+    def prepare(self, message: Any, values: Optional[Dict[str, Any]] = None) -> Tuple[MessageDefinition, Dict[str, Any]]:
+        """Resolve message and field values ('params' list -> param1..N, default target)"""
+        definition = get_message_definition(message)
+        if definition is None or definition.crc_extra is None:
+            raise ValueError(f"Unknown MAVLink message: {message}")
+
+        values = dict(values or {})
+        params = values.pop('params', None)
+        if params is not None:
+            for index, value in enumerate(params, 1):
+                values[f'param{index}'] = value
+        if 'target_system' in definition.fieldnames:
+            values.setdefault('target_system', self.default_target[0])
+        if 'target_component' in definition.fieldnames:
+            values.setdefault('target_component', self.default_target[1])
+        if definition.message_id == 20 and values.get('param_id'):
+            # PARAM_REQUEST_READ: the autopilot only looks at param_id when param_index is -1
+            values.setdefault('param_index', -1)
+
+        definition.encode(values)  # Reject bad fields before anything is queued
+        return definition, values
+
+    async def execute(self, message: Any = 'COMMAND_LONG', values: Optional[Dict[str, Any]] = None,
+                      timeout: Optional[float] = None, retries: Optional[int] = None) -> CommandResult:
+        """Send a request and wait for its reply (raises ValueError for unknown messages / fields)"""
+        definition, values = self.prepare(message, values)
+        timeout = self.timeout if timeout is None else timeout
+        retries = self.retries if retries is None else retries
+        result = CommandResult(definition.name)
+
+        target = values.get('target_system') or None
+        keys = [(reply_id, target, discriminator)
+                for reply_id, discriminator in _expected_replies(definition.message_id, values)]
+
+        if not keys:
+            result.attempts = 1
+            if not self._send(definition, values):
+                return self._finish(result, 'failed', error='Link not connected')
+            return result
+
+        # One outstanding request per expected reply: later ones wait their turn
+        while True:
+            busy = [self._pending[key].future for key in keys
+                    if key in self._pending and not self._pending[key].future.done()]
+            if not busy:
+                break
+            self.stats.waited += 1
+            await asyncio.wait(busy)
+
+        pending = _Pending(definition.name, keys, asyncio.get_running_loop().create_future())
+        for key in keys:
+            self._pending[key] = pending
+        self.stats.in_flight += 1
+
+        try:
+            reply = None
+            for attempt in range(retries + 1):
+                if definition is COMMAND_LONG:
+                    values['confirmation'] = attempt  # Retransmissions are numbered
+                if attempt:
+                    self.stats.retries += 1
+                result.attempts = pending.attempts = attempt + 1
+
+                if not self._send(definition, values):
+                    return self._finish(result, 'failed', error='Link not connected')
+
+                reply = await self._wait_reply(pending, timeout)
+                if reply is not None:
+                    break
+
+            if reply is None:
+                logger.warning(f"⏱️ {definition.name} timed out after {result.attempts} attempt(s)")
+                return self._finish(result, 'timeout', pending, error=f"No reply after {result.attempts} attempt(s)")
+            return self._finish_reply(result, pending, reply)
+
+        finally:
+            for key in keys:
+                if self._pending.get(key) is pending:
+                    del self._pending[key]
+            if not pending.future.done():
+                pending.future.cancel()
+            self.stats.in_flight -= 1
+
+    def _send(self, definition: MessageDefinition, values: Dict[str, Any]) -> bool:
+        if not self.send(self.encoder.encode_message(definition, values)):
+            return False
+        self.stats.frames_sent += 1
+        return True
+
+    async def _wait_reply(self, pending: _Pending, timeout: float) -> Optional[MAVLinkRecord]:
+        """Reply record, or None on timeout; IN_PROGRESS acks extend the wait without a resend"""
+        while True:
+            pending.in_progress = False
+            try:
+                return await asyncio.wait_for(asyncio.shield(pending.future), timeout)
+            except asyncio.TimeoutError:
+                if not pending.in_progress:
+                    return None
+
+    def _finish_reply(self, result: CommandResult, pending: _Pending, record: MAVLinkRecord) -> CommandResult:
+        result.reply = {'msg_type': record.name, **record.to_dict()}
+        if record.message_id == 77:
+            result.result = record.result
+            result.result_name = MAV_RESULT.get(record.result)
+            status = 'accepted' if record.result == 0 else 'rejected'
+        elif record.message_id == 47:
+            result.result = record.type
+            result.result_name = MAV_MISSION_RESULT.get(record.type)
+            status = 'accepted' if record.type == 0 else 'rejected'
+        else:
+            status = 'completed'
+        return self._finish(result, status, pending)
+
+    def _finish(self, result: CommandResult, status: str, pending: Optional[_Pending] = None,
+                error: Optional[str] = None) -> CommandResult:
+        result.status = status
+        result.error = error
+        counter = 'timeouts' if status == 'timeout' else status
+        setattr(self.stats, counter, getattr(self.stats, counter) + 1)
+        if pending is not None:
+            result.latency_ms = (time.perf_counter() - pending.started) * 1000
+            if status != 'timeout':
+                self.stats.latency.observe(result.latency_ms)
+        return result
+
+    def handle_frame(self, frame) -> bool:
+        """Match a received frame against outstanding requests; True when it was a reply"""
+        if not self._pending:
+            return False
+        reply_keys = _REPLY_KEYS.get(frame.message_id)
+        if reply_keys is None:
+            return False
+
+        record = decode_message(frame.message_id, frame.payload)
+        if frame.message_id in _ADDRESSED_REPLIES and record.target_system not in (0, self.encoder.system_id):
+            return False
+
+        for discriminator in reply_keys(record):
+            for source in (frame.system_id, None):
+                pending = self._pending.get((frame.message_id, source, discriminator))
+                if pending is None or pending.future.done():
+                    continue
+                if frame.message_id == 77 and record.result == MAV_RESULT_IN_PROGRESS:
+                    pending.in_progress = True
+                    pending.progress = record.progress
+                else:
+                    pending.future.set_result(record)
+                return True
+        return False
+
+    def outstanding(self) -> List[Dict[str, Any]]:
+        """Requests waiting for a reply"""
+        now = time.perf_counter()
+        requests = {id(pending): pending for pending in self._pending.values() if not pending.future.done()}
+        return [{
+            'message': pending.message,
+            'attempts': pending.attempts,
+            'age_ms': (now - pending.started) * 1000,
+            'in_progress': pending.in_progress,
+            'progress': pending.progress,
+            'awaiting': [f"{reply_id}:{source or '*'}:{discriminator}" for reply_id, source, discriminator in pending.keys]
+        } for pending in requests.values()]
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = self.stats.to_dict()
+        stats['outstanding'] = self.outstanding()
+        return stats
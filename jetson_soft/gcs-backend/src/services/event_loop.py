@@ -0,0 +1,112 @@
+"""
+Event Loop Service - Shared asyncio loop for MAVLink I/O
+One background thread drives every link instead of 2 threads per connection
+"""
+
+import asyncio
+import logging
+import threading
+from typing import Any, Callable, Coroutine, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class EventLoopThread:
+    """
+    Runs a single asyncio event loop in a daemon thread
+    Other threads hand work to it with call_soon / call / run_coroutine
+    """
+
+    def __init__(self, name: str = "MAVLink-Event-Loop"):
+        self.name = name
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._started = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """Running loop (started on first use)"""
+        self.start()
+        return self._loop
+
+    @property
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def in_loop_thread(self) -> bool:
+        """True when called from the loop thread itself"""
+        return self._thread is not None and threading.current_thread() is self._thread
+
+    def start(self):
+        """Start loop thread (idempotent)"""
+        with self._lock:
+            if self.is_running:
+                return
+
+            self._started.clear()
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+        self._started.wait()
+        logger.info(f"🔁 Event loop started: {self.name}")
+
+    def stop(self, timeout: float = 2.0):
+        """Stop loop thread"""
+        with self._lock:
+            if not self.is_running:
+                return
+
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            thread = self._thread
+
+        if not self.in_loop_thread():
+            thread.join(timeout=timeout)
+        logger.info(f"🛑 Event loop stopped: {self.name}")
+
+    def _run(self):
+        """Loop thread body"""
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._started.set()
+
+        try:
+            self._loop.run_forever()
+        finally:
+            try:
+                pending = asyncio.all_tasks(self._loop)
+                for task in pending:
+                    task.cancel()
+                if pending:
+                    self._loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            finally:
+                self._loop.close()
+
+    def call_soon(self, callback: Callable, *args: Any):
+        """Schedule callback on the loop from any thread (fire and forget)"""
+        self.loop.call_soon_threadsafe(callback, *args)
+
+    def call_later(self, delay: float, callback: Callable, *args: Any):
+        """Schedule callback after delay seconds from any thread (fire and forget)"""
+        if self.in_loop_thread():
+            self._loop.call_later(delay, callback, *args)
+        else:
+            self.loop.call_soon_threadsafe(self._loop.call_later, delay, callback, *args)
+
+    def call(self, callback: Callable, *args: Any, timeout: float = 2.0) -> Any:
+        """Run callback on the loop and wait for its result"""
+        if self.in_loop_thread():
+            return callback(*args)
+
+        async def _invoke():
+            return callback(*args)
+
+        return self.run_coroutine(_invoke()).result(timeout=timeout)
+
+    def run_coroutine(self, coro: Coroutine):
+        """Submit coroutine from another thread; returns concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+
+# Shared loop for all MAVLink links
+mavlink_event_loop = EventLoopThread()
@@ -0,0 +1,373 @@
+"""
+HTTP Pool Service - Pooled async HTTP client for central server calls
+Keep-alive connections on a dedicated event loop, a request queue per endpoint
+with its own concurrency, and a latency histogram per endpoint.
+Uses httpx (HTTP/2 when h2 is installed) if available, otherwise a built-in
+HTTP/1.1 keep-alive pool on asyncio streams.
+"""
+
+import asyncio
+import json
+import ssl
+import time
+import logging
+import concurrent.futures
+from typing import Dict, Any, List, Optional
+from urllib.parse import urlsplit, urlencode
+from dataclasses import dataclass, field
+
+from .event_loop import EventLoopThread
+from ..utils.latency_histogram import LatencyHistogram
+
+try:
+    import httpx  # Optional: pip install httpx[http2]
+    try:
+        import h2  # noqa: F401
+        HTTP2_AVAILABLE = True
+    except ImportError:
+        HTTP2_AVAILABLE = False
+except ImportError:
+    httpx = None
+    HTTP2_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class EndpointStats:
+    """Per-endpoint request statistics"""
+    concurrency: int = 1
+    requests: int = 0
+    errors: int = 0
+    timeouts: int = 0
+    queued: int = 0
+    in_flight: int = 0
+    latency: LatencyHistogram = field(default_factory=LatencyHistogram)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'concurrency': self.concurrency,
+            'requests': self.requests,
+            'errors': self.errors,
+            'timeouts': self.timeouts,
+            'queued': self.queued,
+            'in_flight': self.in_flight,
+            'latency': self.latency.to_dict()
+        }
+
+
+class HTTPHeaders(dict):
+    """Case-insensitive response headers"""
+
+    def __init__(self, items=()):
+        super().__init__((key.lower(), value) for key, value in items)
+
+    def __getitem__(self, key: str) -> str:
+        return super().__getitem__(key.lower())
+
+    def __contains__(self, key: object) -> bool:
+        return isinstance(key, str) and super().__contains__(key.lower())
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return super().get(key.lower(), default)
+
+
+class HTTPResponse:
+    """Response with the subset of the requests.Response API used by the services"""
+
+    __slots__ = ('status_code', 'headers', 'content')
+
+    def __init__(self, status_code: int, headers: HTTPHeaders, content: bytes):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+    @property
+    def text(self) -> str:
+        return self.content.decode('utf-8', errors='replace')
+
+    def json(self) -> Any:
+        return json.loads(self.content)
+
+
+class _Request:
+    __slots__ = ('method', 'target', 'headers', 'body', 'timeout', 'future')
+
+    def __init__(self, method, target, headers, body, timeout, future):
+        self.method = method
+        self.target = target
+        self.headers = headers
+        self.body = body
+        self.timeout = timeout
+        self.future = future
+
+
+class _Connection:
+    """One HTTP/1.1 keep-alive connection (built-in transport)"""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.reusable = True
+        self.requests = 0
+
+    async def request(self, method: str, target: str, headers: Dict[str, str], body: bytes) -> HTTPResponse:
+        lines = [f"{method} {target} HTTP/1.1"]
+        lines.extend(f"{key}: {value}" for key, value in headers.items())
+        self.writer.write(("\r\n".join(lines) + "\r\n\r\n").encode('latin-1') + body)
+        await self.writer.drain()
+        self.requests += 1
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionResetError("Connection closed before response")
+        version, status = status_line.decode('latin-1').split(None, 2)[:2]
+        status_code = int(status)
+
+        raw_headers = []
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            key, _, value = line.decode('latin-1').partition(':')
+            raw_headers.append((key.strip(), value.strip()))
+        response_headers = HTTPHeaders(raw_headers)
+
+        connection = response_headers.get('connection', '').lower()
+        if connection == 'close' or (version == 'HTTP/1.0' and connection != 'keep-alive'):
+            self.reusable = False
+
+        if method == 'HEAD' or status_code in (204, 304) or 100 <= status_code < 200:
+            content = b''
+        elif response_headers.get('transfer-encoding', '').lower() == 'chunked':
+            content = await self._read_chunked()
+        elif 'content-length' in response_headers:
+            content = await self.reader.readexactly(int(response_headers['content-length']))
+        else:
+            content = await self.reader.read()
+            self.reusable = False
+
+        return HTTPResponse(status_code, response_headers, content)
+
+    async def _read_chunked(self) -> bytes:
+        chunks = []
+        while True:
+            size = int((await self.reader.readline()).split(b';')[0].strip(), 16)
+            if size == 0:
+                # Trailers until the blank line
+                while (await self.reader.readline()) not in (b'\r\n', b'\n', b''):
+                    pass
+                return b''.join(chunks)
+            chunks.append(await self.reader.readexactly(size))
+            await self.reader.readexactly(2)
+
+    def close(self):
+        self.reusable = False
+        try:
+            self.writer.close()
+        except Exception:
+            pass
+
+
+class HTTPPool:
+    """
+    Pooled async HTTP client for one server
+
+    - Requests are queued per endpoint; each endpoint has its own number of
+      workers, so a backlog on one endpoint never delays another
+    - Connections are kept alive and shared (HTTP/2 multiplexes them with httpx)
+    - Callers in any thread use submit() (future) or request() (blocking)
+    """
+
+    def __init__(self,
+                 base_url: str,
+                 headers: Optional[Dict[str, str]] = None,
+                 endpoints: Optional[Dict[str, int]] = None,
+                 default_concurrency: int = 1,
+                 max_idle_connections: int = 8,
+                 connect_timeout: float = 5.0,
+                 event_loop: Optional[EventLoopThread] = None):
+        parsed = urlsplit(base_url)
+        self.base_url = base_url.rstrip('/')
+        self.scheme = parsed.scheme or 'http'
+        self.host = parsed.hostname or 'localhost'
+        self.port = parsed.port or (443 if self.scheme == 'https' else 80)
+        self.base_path = parsed.path.rstrip('/')
+
+        self.headers: Dict[str, str] = dict(headers or {})
+        self.default_concurrency = default_concurrency
+        self.max_idle_connections = max_idle_connections
+        self.connect_timeout = connect_timeout
+        self._owns_loop = event_loop is None
+        self._event_loop = event_loop or EventLoopThread(name="HTTP-Pool")
+
+        self.stats: Dict[str, EndpointStats] = {
+            name: EndpointStats(concurrency=concurrency) for name, concurrency in (endpoints or {}).items()
+        }
+        self.connections_opened = 0
+
+        # Loop thread only
+        self._queues: Dict[str, asyncio.Queue] = {}
+        self._workers: List[asyncio.Task] = []
+        self._idle: List[_Connection] = []
+        self._client = None
+
+    # ------------------------------------------------------------------
+    # Public API (any thread)
+    # ------------------------------------------------------------------
+
+    def submit(self, endpoint: str, method: str, path: str,
+               body: bytes = b'', params: Optional[Dict[str, Any]] = None,
+               headers: Optional[Dict[str, str]] = None, timeout: float = 10.0) -> concurrent.futures.Future:
+        """Queue request on endpoint; returns concurrent.futures.Future[HTTPResponse]"""
+        target = self.base_path + path
+        if params:
+            target += '?' + urlencode(params)
+
+        merged = dict(self.headers)
+        if headers:
+            merged.update(headers)
+
+        future: concurrent.futures.Future = concurrent.futures.Future()
+        self._event_loop.call_soon(self._enqueue, endpoint, _Request(method, target, merged, body, timeout, future))
+        return future
+
+    def request(self, endpoint: str, method: str, path: str,
+                body: bytes = b'', params: Optional[Dict[str, Any]] = None,
+                headers: Optional[Dict[str, str]] = None, timeout: float = 10.0,
+                queue_timeout: float = 30.0) -> HTTPResponse:
+        """Blocking request; waits at most queue_timeout for a free worker"""
+        future = self.submit(endpoint, method, path, body, params, headers, timeout)
+        try:
+            return future.result(timeout=timeout + queue_timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise TimeoutError(f"{endpoint}: no response within {timeout + queue_timeout:.0f}s")
+
+    def close(self):
+        """Close connections and workers (the pool restarts on next use)"""
+        if not self._event_loop.is_running:
+            return
+        try:
+            self._event_loop.run_coroutine(self._close()).result(timeout=2.0)
+        except Exception as e:
+            logger.debug(f"HTTP pool close error: {e}")
+        if self._owns_loop:
+            self._event_loop.stop()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'transport': 'httpx-http2' if HTTP2_AVAILABLE else ('httpx' if httpx is not None else 'http/1.1'),
+            'connections_opened': self.connections_opened,
+            'idle_connections': len(self._idle),
+            'endpoints': {name: stats.to_dict() for name, stats in list(self.stats.items())}
+        }
+
+    # ------------------------------------------------------------------
+    # Loop thread
+    # ------------------------------------------------------------------
+
+    def _enqueue(self, endpoint: str, request: _Request):
+        queue = self._queues.get(endpoint)
+        if queue is None:
+            stats = self.stats.get(endpoint)
+            if stats is None:
+                stats = self.stats[endpoint] = EndpointStats(concurrency=self.default_concurrency)
+            queue = self._queues[endpoint] = asyncio.Queue()
+            loop = asyncio.get_running_loop()
+            for _ in range(stats.concurrency):
+                self._workers.append(loop.create_task(self._worker(endpoint, queue, stats)))
+
+        stats = self.stats[endpoint]
+        stats.queued += 1
+        queue.put_nowait(request)
+
+    async def _worker(self, endpoint: str, queue: asyncio.Queue, stats: EndpointStats):
+        while True:
+            request = await queue.get()
+            stats.queued -= 1
+            if not request.future.set_running_or_notify_cancel():
+                continue  # Caller gave up while queued
+
+            stats.requests += 1
+            stats.in_flight += 1
+            started = time.monotonic()
+            try:
+                response = await asyncio.wait_for(self._send(request), request.timeout)
+                stats.latency.observe((time.monotonic() - started) * 1000)
+                request.future.set_result(response)
+            except asyncio.TimeoutError:
+                stats.timeouts += 1
+                request.future.set_exception(TimeoutError(f"{endpoint}: {request.method} {request.target} timed out"))
+            except asyncio.CancelledError:
+                request.future.set_exception(ConnectionAbortedError("HTTP pool closed"))
+                raise
+            except Exception as e:
+                stats.errors += 1
+                request.future.set_exception(e)
+            finally:
+                stats.in_flight -= 1
+
+    async def _send(self, request: _Request) -> HTTPResponse:
+        if httpx is not None:
+            return await self._send_httpx(request)
+
+        # A reused keep-alive connection may have been closed by the server: retry once fresh
+        for attempt in range(2):
+            reused = bool(self._idle)
+            connection = self._idle.pop() if reused else await self._connect()
+            try:
+                headers = dict(request.headers)
+                headers['Host'] = self.host if self.port in (80, 443) else f"{self.host}:{self.port}"
+                headers['Content-Length'] = str(len(request.body))
+                headers.setdefault('Connection', 'keep-alive')
+                response = await connection.request(request.method, request.target, headers, request.body)
+            except (ConnectionError, asyncio.IncompleteReadError, ValueError) as e:
+                connection.close()
+                if reused and attempt == 0:
+                    logger.debug(f"Stale keep-alive connection, reconnecting: {e}")
+                    continue
+                raise
+            except BaseException:
+                connection.close()  # Timeout or cancel mid-response: the stream is unusable
+                raise
+
+            if connection.reusable and len(self._idle) < self.max_idle_connections:
+                self._idle.append(connection)
+            else:
+                connection.close()
+            return response
+
+    async def _connect(self) -> _Connection:
+        ssl_context = ssl.create_default_context() if self.scheme == 'https' else None
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, ssl=ssl_context),
+            self.connect_timeout
+        )
+        self.connections_opened += 1
+        return _Connection(reader, writer)
+
+    async def _send_httpx(self, request: _Request) -> HTTPResponse:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                http2=HTTP2_AVAILABLE,
+                limits=httpx.Limits(max_keepalive_connections=self.max_idle_connections),
+                timeout=None
+            )
+        url = f"{self.scheme}://{self.host}:{self.port}{request.target}"
+        response = await self._client.request(request.method, url, content=request.body, headers=request.headers)
+        return HTTPResponse(response.status_code, HTTPHeaders(response.headers.items()), response.content)
+
+    async def _close(self):
+        workers, self._workers = self._workers, []
+        for worker in workers:
+            worker.cancel()
+        self._queues = {}
+
+        idle, self._idle = self._idle, []
+        for connection in idle:
+            connection.close()
+
+        client, self._client = self._client, None
+        if client is not None:
+            await client.aclose()
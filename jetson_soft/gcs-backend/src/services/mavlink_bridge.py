@@ -3,15 +3,22 @@ MAVLink Bridge Service - Modular MAVLink Communication
 Extracted from mavlink_service.py for better separation of concerns
 """
 
+import asyncio
 import socket
+import struct
 import time
 import logging
 import threading
-from typing import Dict, Any, Optional, Callable
+from typing import Dict, Any, List, Optional, Callable, Deque, Tuple, Union
 from dataclasses import dataclass, asdict
 from collections import deque
 
 from ..utils.serialization import SerializationUtils
+from ..utils.mavlink_parser import MAVLinkFrameDecoder, MAVLinkFrame, MAVLinkFramePool
+from ..utils.mavlink_encoder import MAVLinkFrameEncoder
+from ..utils.mavlink_messages import HEARTBEAT, MAV_TYPE_GCS, MAV_AUTOPILOT_INVALID
+from ..utils.tlog import TlogWriter
+from .event_loop import EventLoopThread, mavlink_event_loop
 
 logger = logging.getLogger(__name__)
 
@@ -28,26 +35,65 @@ class ConnectionStats:
     last_heartbeat: float = 0
     connection_string: str = ""
     
+    # Ingestion path
+    recv_syscalls: int = 0
+    recv_batches: int = 0
+    datagrams_received: int = 0
+    truncated_datagrams: int = 0
+    kernel_drops: int = 0
+    rcvbuf_bytes: int = 0
+    
     def to_dict(self) -> Dict[str, Any]:
         return asdict(self)
 
 
+# Linux: per-socket count of datagrams dropped by the kernel (ancillary data)
+SO_RXQ_OVFL = getattr(socket, 'SO_RXQ_OVFL', 40)
+SO_RCVBUFFORCE = getattr(socket, 'SO_RCVBUFFORCE', 33)
+
+
 class MAVLinkBridge:
     """
     Modular MAVLink communication bridge
     Handles connection, message parsing, and command sending
     """
     
-    def __init__(self, max_history: int = 100):
+    def __init__(self,
+                 max_history: int = 100,
+                 frame_pool_size: int = 64,
+                 receive_buffer_size: int = 65536,
+                 max_datagram_size: int = 4096,
+                 socket_rcvbuf: int = 4 * 1024 * 1024,
+                 heartbeat_target: Tuple[str, int] = ('127.0.0.1', 14551),
+                 event_loop: Optional[EventLoopThread] = None):
         # Connection management
         self.connection: Optional[socket.socket] = None
         self.is_connected: bool = False
         self.connection_string: str = ""
+        self._transport: str = ""
         
-        # Threading
-        self._message_thread: Optional[threading.Thread] = None
-        self._heartbeat_thread: Optional[threading.Thread] = None
+        # Ingestion: one preallocated buffer, drained per wakeup
+        self.max_datagram_size = max_datagram_size
+        self.socket_rcvbuf = socket_rcvbuf
+        self._rx_buffer = bytearray(max(receive_buffer_size, max_datagram_size * 2))
+        self._rx_view = memoryview(self._rx_buffer)
+        self._use_recvmsg = False
+        self._ancbufsize = socket.CMSG_SPACE(4) if hasattr(socket, 'CMSG_SPACE') else 0
+        
+        # Event loop (shared by all links)
+        self._event_loop = event_loop or mavlink_event_loop
         self._running: bool = False
+        self._attached: bool = False
+        self._reader_fd: Optional[int] = None
+        self._stream_transport: Optional[asyncio.Transport] = None
+        self._stream_task: Optional[asyncio.Task] = None
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        self.heartbeat_target = heartbeat_target
+        self._peer_address: Optional[Tuple[str, int]] = None
+        
+        # Optional router: every received frame is also routed to other endpoints
+        self.router = None
+        self.router_endpoint = None
         self._lock = threading.Lock()
         
         # Statistics
@@ -55,7 +101,20 @@ class MAVLinkBridge:
         
         # Message handlers
         self.message_handlers: Dict[str, Callable] = {}
-        self.raw_message_history = deque(maxlen=max_history)
+        self.raw_message_history: Deque[MAVLinkFrame] = deque(maxlen=max_history)
+        
+        # Shared streaming frame decoder (v1/v2, CRC checked) with recycled frames
+        self._frame_pool = MAVLinkFramePool(max_history + frame_pool_size)
+        self._decoder = MAVLinkFrameDecoder(pool=self._frame_pool)
+        
+        # Outgoing frames (GCS heartbeat) carry the GCS identity and a sequence number
+        self._encoder = MAVLinkFrameEncoder()
+        
+        # Frame timestamps are monotonic; offset maps them to wall clock
+        self._clock_offset = time.time() - time.monotonic()
+        
+        # Optional .tlog capture of every decoded frame
+        self.recorder: Optional[TlogWriter] = None
         
         # Flight mode mapping (consolidated)
         self.flight_modes = {
@@ -67,10 +126,33 @@ class MAVLinkBridge:
             20: "SMART_RTL", 21: "FLOWHOLD", 22: "FOLLOW", 23: "ZIGZAG"
         }
     
-    def register_message_handler(self, message_type: str, handler: Callable[[Dict[str, Any]], None]):
-        """Register a handler for specific message types"""
+    def register_message_handler(self, message_type: str, handler: Callable[[MAVLinkFrame], None]):
+        """
+        Register a handler for specific message types
+        Handlers receive a pooled MAVLinkFrame and must not keep it after returning
+        Handlers run on the event loop thread; the dict is replaced, never mutated,
+        so dispatch reads it without locking
+        """
         with self._lock:
-            self.message_handlers[message_type] = handler
+            handlers = dict(self.message_handlers)
+            handlers[message_type] = handler
+            self.message_handlers = handlers
+    
+    def start_recording(self, path: str) -> TlogWriter:
+        """Record every received frame to a .tlog file (Mission Planner / MAVProxy format)"""
+        recorder = TlogWriter(path)
+        previous, self.recorder = self.recorder, recorder
+        if previous is not None:
+            previous.close()
+        logger.info(f"📼 Recording MAVLink to {path}")
+        return recorder
+    
+    def stop_recording(self):
+        """Stop recording and flush the capture"""
+        recorder, self.recorder = self.recorder, None
+        if recorder is not None:
+            recorder.close()
+            logger.info(f"📼 Recording stopped: {recorder.stats.frames} frames in {recorder.path}")
     
     def connect(self, connection_string: str = "udp:127.0.0.1:14550") -> bool:
         """
@@ -94,8 +176,8 @@ class MAVLinkBridge:
                 self.stats.connection_time = time.time()
                 self.stats.is_connected = True
                 
-                # Start communication threads
-                self._start_threads()
+                # Hand the socket to the shared event loop
+                self._start_transport()
                 logger.info(f"✅ MAVLink bridge connected: {connection_string}")
                 return True
             
@@ -112,11 +194,35 @@ class MAVLinkBridge:
         port = int(parts[1]) if len(parts) > 1 else 14550
         
         self.connection = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.connection.settimeout(1.0)
+        self._tune_udp_socket(self.connection)
         self.connection.bind((host, port))
+        self._transport = "udp"
         
         return True
     
+    def _tune_udp_socket(self, sock: socket.socket):
+        """Raise kernel receive buffer and enable drop accounting (Linux)"""
+        try:
+            try:
+                # Needs CAP_NET_ADMIN, ignores net.core.rmem_max
+                sock.setsockopt(socket.SOL_SOCKET, SO_RCVBUFFORCE, self.socket_rcvbuf)
+            except OSError:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.socket_rcvbuf)
+            
+            self.stats.rcvbuf_bytes = int(sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF))
+            if self.stats.rcvbuf_bytes < self.socket_rcvbuf:
+                logger.warning(f"⚠️ UDP receive buffer capped at {self.stats.rcvbuf_bytes} bytes "
+                               f"(raise net.core.rmem_max for {self.socket_rcvbuf})")
+        except Exception as e:
+            logger.debug(f"Receive buffer tuning failed: {e}")
+        
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, SO_RXQ_OVFL, 1)
+            self._use_recvmsg = hasattr(sock, 'recvmsg_into') and self._ancbufsize > 0
+        except Exception as e:
+            self._use_recvmsg = False
+            logger.debug(f"Kernel drop accounting unavailable: {e}")
+    
     def _connect_tcp(self, connection_string: str) -> bool:
         """Connect via TCP"""
         parts = connection_string.replace("tcp:", "").split(":")
@@ -126,6 +232,7 @@ class MAVLinkBridge:
         self.connection = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.connection.settimeout(5.0)
         self.connection.connect((host, port))
+        self._transport = "tcp"
         
         return True
     
@@ -134,12 +241,13 @@ class MAVLinkBridge:
         self._running = False
         self.is_connected = False
         
-        # Wait for threads to finish
-        if self._message_thread and self._message_thread.is_alive():
-            self._message_thread.join(timeout=2.0)
-        
-        if self._heartbeat_thread and self._heartbeat_thread.is_alive():
-            self._heartbeat_thread.join(timeout=2.0)
+        # Detach reader/protocol and heartbeat from the shared loop
+        if self._attached:
+            self._attached = False
+            try:
+                self._event_loop.call(self._detach_transport)
+            except Exception as e:
+                logger.debug(f"Transport detach error: {e}")
         
         # Close connection
         if self.connection:
@@ -148,124 +256,184 @@ class MAVLinkBridge:
             except:
                 pass
             self.connection = None
+        self._peer_address = None
         
         # Reset stats
         self.stats.is_connected = False
         logger.info("🛑 MAVLink bridge disconnected")
     
-    def _start_threads(self):
-        """Start communication threads"""
+    def _start_transport(self):
+        """Attach connection to the shared event loop (no per-connection threads)"""
         self._running = True
+        self._attached = True
+        self._event_loop.call_soon(self._attach_transport)
+    
+    def _attach_transport(self):
+        """Runs on the loop thread: register socket reader and heartbeat task"""
+        if not self._running or self.connection is None:
+            return
         
-        # Message processing thread
-        self._message_thread = threading.Thread(
-            target=self._message_loop,
-            name="MAVLink-Message-Loop",
-            daemon=True
-        )
-        self._message_thread.start()
+        loop = self._event_loop.loop
+        sock = self.connection
+        self._decoder.reset()
         
-        # Heartbeat thread
-        self._heartbeat_thread = threading.Thread(
-            target=self._heartbeat_loop,
-            name="MAVLink-Heartbeat-Loop",
-            daemon=True
-        )
-        self._heartbeat_thread.start()
+        try:
+            sock.setblocking(False)
+            if self._transport == "udp":
+                # add_reader + batched drain instead of DatagramProtocol,
+                # which would cost one recvfrom and one callback per datagram
+                loop.add_reader(sock.fileno(), self._on_datagrams_ready)
+                self._reader_fd = sock.fileno()
+            else:
+                self._stream_task = loop.create_task(self._attach_stream(sock))
+            
+            self._heartbeat_task = loop.create_task(self._heartbeat_loop())
+        except Exception as e:
+            logger.error(f"Transport setup error: {e}")
     
-    def _message_loop(self):
-        """Main message processing loop"""
-        buffer = bytearray()
+    async def _attach_stream(self, sock: socket.socket):
+        """Wrap connected TCP socket in a buffered protocol"""
+        loop = asyncio.get_running_loop()
+        try:
+            transport, _ = await loop.create_connection(
+                lambda: _MAVLinkStreamProtocol(self), sock=sock
+            )
+            self._stream_transport = transport
+        except Exception as e:
+            logger.error(f"Transport setup error: {e}")
+    
+    def _detach_transport(self):
+        """Runs on the loop thread: undo _attach_transport"""
+        loop = self._event_loop.loop
         
-        while self._running and self.connection:
-            try:
-                # Receive data
-                data, addr = self.connection.recvfrom(1024)
-                
-                if not data:
-                    continue
-                
-                buffer.extend(data)
-                self.stats.bytes_received += len(data)
-                
-                # Process complete MAVLink messages
-                while len(buffer) >= 12:  # Minimum MAVLink v2 packet size
-                    message = self._parse_mavlink_packet(buffer)
-                    if message:
-                        self._handle_message(message)
-                        self.stats.messages_received += 1
-                    else:
-                        break
-                
-            except socket.timeout:
-                continue
-            except Exception as e:
-                if self._running:
-                    logger.error(f"Message loop error: {e}")
-                break
+        for task in (self._heartbeat_task, self._stream_task):
+            if task is not None:
+                task.cancel()
+        self._heartbeat_task = None
+        self._stream_task = None
+        
+        if self._reader_fd is not None:
+            loop.remove_reader(self._reader_fd)
+            self._reader_fd = None
+        
+        if self._stream_transport is not None:
+            self._stream_transport.abort()
+            self._stream_transport = None
     
-    def _parse_mavlink_packet(self, buffer: bytearray) -> Optional[Dict[str, Any]]:
-        """Parse MAVLink packet from buffer"""
-        if len(buffer) < 12:
-            return None
-        
-        # Check for MAVLink v2 magic byte
-        if buffer[0] != 0xFD:
-            # Remove invalid byte and continue
-            buffer.pop(0)
-            return None
-        
-        # Extract payload length
-        payload_len = buffer[1]
-        packet_len = payload_len + 12  # Header + payload + checksum
-        
-        if len(buffer) < packet_len:
-            return None
-        
-        # Extract packet
-        packet = buffer[:packet_len]
-        del buffer[:packet_len]
-        
-        # Parse basic message info
-        message = {
-            'payload_length': payload_len,
-            'sequence': packet[2],
-            'system_id': packet[3],
-            'component_id': packet[4],
-            'message_id': int.from_bytes(packet[5:8], 'little'),
-            'payload': packet[10:10+payload_len],
-            'timestamp': time.time()
-        }
+    def _on_datagrams_ready(self):
+        """Loop reader callback: socket readable"""
+        self.stats.recv_syscalls += 1  # epoll wakeup
+        try:
+            size = self._receive_datagrams()
+            if size:
+                self._process_received(size)
+        except Exception as e:
+            if self._running:
+                logger.error(f"Message loop error: {e}")
+    
+    def _on_stream_closed(self, exc: Optional[Exception]):
+        """TCP protocol lost its connection"""
+        self._stream_transport = None
+        if self._running:
+            logger.warning(f"MAVLink stream closed by remote{f': {exc}' if exc else ''}")
+    
+    def _process_received(self, size: int):
+        """Decode one received batch from the receive buffer and dispatch its frames"""
+        # One clock read per received batch, shared by all its frames
+        decoder = self._decoder
+        decoder.feed(self._rx_view[:size], time.monotonic())
+        self.stats.bytes_received += size
+        self.stats.recv_batches += 1
         
-        return message
+        # Process complete MAVLink frames
+        recorder = self.recorder
+        for frame in decoder:
+            if recorder is not None:
+                recorder.write(frame.raw, frame.timestamp + self._clock_offset)
+            self._handle_message(frame)
+            self.stats.messages_received += 1
+    
+    def submit_frame(self, frame: MAVLinkFrame):
+        """Hand a frame decoded elsewhere to the handler registry (thread-safe)"""
+        self._event_loop.call_soon(self._dispatch_submitted, frame)
+    
+    def _dispatch_submitted(self, frame: MAVLinkFrame):
+        self._handle_message(frame)
+        self.stats.messages_received += 1
     
-    def _handle_message(self, message: Dict[str, Any]):
-        """Handle parsed MAVLink message"""
-        # Add to history
-        self.raw_message_history.append(message)
+    def _receive_datagrams(self) -> int:
+        """Drain every ready datagram into the receive buffer; returns bytes read"""
+        sock = self.connection
+        view = self._rx_view
+        limit = len(view) - self.max_datagram_size
+        filled = 0
+        address = None
+        
+        while filled <= limit:
+            self.stats.recv_syscalls += 1
+            try:
+                if self._use_recvmsg:
+                    nbytes, ancdata, flags, address = sock.recvmsg_into([view[filled:]], self._ancbufsize)
+                    if ancdata:
+                        self._update_kernel_drops(ancdata)
+                    if flags & socket.MSG_TRUNC:
+                        self.stats.truncated_datagrams += 1
+                else:
+                    nbytes, address = sock.recvfrom_into(view[filled:])
+            except (BlockingIOError, InterruptedError):
+                break
+            
+            filled += nbytes
+            self.stats.datagrams_received += 1
+        
+        # Replies (heartbeat, commands, forwarded frames) go back to the sender
+        if address is not None:
+            self._peer_address = address
         
+        return filled
+    
+    def _update_kernel_drops(self, ancdata):
+        """Read SO_RXQ_OVFL counter (cumulative drops for this socket)"""
+        for level, kind, data in ancdata:
+            if level == socket.SOL_SOCKET and kind == SO_RXQ_OVFL and len(data) >= 4:
+                self.stats.kernel_drops = struct.unpack('=I', data[:4])[0]
+    
+    def _handle_message(self, frame: MAVLinkFrame):
+        """Handle parsed MAVLink frame"""
         # Call registered handlers
-        message_id = message.get('message_id')
-        if message_id in self.message_handlers:
+        message_id = frame.message_id
+        handler = self.message_handlers.get(message_id)
+        if handler is not None:
             try:
-                self.message_handlers[message_id](message)
+                handler(frame)
             except Exception as e:
                 logger.error(f"Message handler error: {e}")
         
         # Update heartbeat timestamp for HEARTBEAT messages (ID 0)
         if message_id == 0:
-            self.stats.last_heartbeat = time.time()
+            self.stats.last_heartbeat = frame.timestamp + self._clock_offset
+        
+        # Forward raw frame to the other router endpoints
+        router = self.router
+        if router is not None:
+            router.route_frame(frame, self.router_endpoint)
+        
+        # Add to history; the evicted frame goes back to the pool
+        history = self.raw_message_history
+        with self._lock:
+            if len(history) == history.maxlen:
+                self._frame_pool.release(history.popleft())
+            history.append(frame)
     
-    def _heartbeat_loop(self):
-        """Send periodic heartbeat"""
+    async def _heartbeat_loop(self):
+        """Send periodic heartbeat (1Hz task on the shared loop)"""
         while self._running:
             try:
                 self._send_heartbeat()
-                time.sleep(1.0)  # 1Hz heartbeat
             except Exception as e:
                 if self._running:
                     logger.error(f"Heartbeat error: {e}")
-            time.sleep(1.0)
+            await asyncio.sleep(1.0)
     
     def _send_heartbeat(self):
         """Send GCS heartbeat message"""
@@ -273,39 +441,50 @@ class MAVLinkBridge:
             return
         
         try:
-            # MAVLink v2 HEARTBEAT message
-            payload = bytearray([
-                0x00, 0x00, 0x00, 0x00,  # custom_mode
-                0x06,  # type (GCS)
-                0x08,  # autopilot (INVALID)
-                0x00,  # base_mode
-                0x00,  # system_status
-                0x03   # mavlink_version
-            ])
-            
-            packet = bytearray([
-                0xFD,  # magic
-                len(payload),  # payload length
-                0x00,  # sequence
-                0xFF,  # system_id (GCS)
-                0xBE,  # component_id
-                0x00, 0x00, 0x00,  # message_id (HEARTBEAT = 0)
-                0x00, 0x00  # compatibility flags
-            ])
+            # MAVLink v2 HEARTBEAT from the GCS (CRC_EXTRA checksum, sequence numbered)
+            self._write(self._encoder.encode_message(
+                HEARTBEAT,
+                type=MAV_TYPE_GCS,
+                autopilot=MAV_AUTOPILOT_INVALID,
+                mavlink_version=3
+            ))
             
-            packet.extend(payload)
-            
-            # Calculate and append checksum
-            checksum = sum(packet[1:]) & 0xFF
-            packet.extend([checksum, 0])
+        except Exception as e:
+            logger.debug(f"Heartbeat send error: {e}")
+    
+    def send_raw(self, data: Union[bytes, bytearray, memoryview]) -> bool:
+        """Send encoded MAVLink frame over the autopilot link (thread-safe)"""
+        if not self.connection:
+            return False
+        
+        if not self._event_loop.in_loop_thread():
+            self._event_loop.call_soon(self._write, bytes(data))
+            return True
+        return self._write(data)
+    
+    def _write(self, data: Union[bytes, bytearray, memoryview]) -> bool:
+        """Write frame on the loop thread"""
+        try:
+            if self._stream_transport is not None:
+                # Transport may keep the object queued; never hand it a decoder view
+                self._stream_transport.write(bytes(data))
+            elif self.connection:
+                self.connection.sendto(data, self._peer_address or self.heartbeat_target)
+            else:
+                return False
             
-            # Send to autopilot (adjust target as needed)
-            self.connection.sendto(packet, ('127.0.0.1', 14551))
             self.stats.messages_sent += 1
-            self.stats.bytes_sent += len(packet)
+            self.stats.bytes_sent += len(data)
+            return True
             
         except Exception as e:
-            logger.debug(f"Heartbeat send error: {e}")
+            logger.debug(f"MAVLink send error: {e}")
+            return False
+    
+    def attach_router(self, router, name: str = "autopilot"):
+        """Register this link as a router endpoint"""
+        self.router = router
+        self.router_endpoint = router.add_endpoint(name, self.send_raw)
     
     def send_command(self, command: str, params: Dict[str, Any] = None) -> bool:
         """Send command to autopilot (placeholder for command implementation)"""
@@ -318,12 +497,44 @@ class MAVLinkBridge:
     
     def get_connection_stats(self) -> Dict[str, Any]:
         """Get connection statistics"""
-        return SerializationUtils.add_timestamp(self.stats.to_dict())
+        stats = self.stats.to_dict()
+        stats['syscalls_per_message'] = (
+            self.stats.recv_syscalls / self.stats.messages_received
+            if self.stats.messages_received else 0.0
+        )
+        stats['decoder'] = self._decoder.stats.to_dict()
+        stats['decoder']['frame_pool_misses'] = self._frame_pool.misses
+        recorder = self.recorder
+        if recorder is not None:
+            stats['recorder'] = {'path': recorder.path, **recorder.stats.to_dict()}
+        return SerializationUtils.add_timestamp(stats)
     
     def get_message_history(self, count: int = 10) -> List[Dict[str, Any]]:
-        """Get recent message history"""
+        """Get recent message history (dicts are built on demand)"""
         with self._lock:
-            return list(self.raw_message_history)[-count:]
+            frames = list(self.raw_message_history)[-count:]
+            return [frame.to_dict(self._clock_offset) for frame in frames]
+
+
+class _MAVLinkStreamProtocol(asyncio.BufferedProtocol):
+    """TCP protocol reading straight into the bridge receive buffer"""
+    
+    def __init__(self, bridge: MAVLinkBridge):
+        self.bridge = bridge
+    
+    def get_buffer(self, sizehint: int) -> memoryview:
+        return self.bridge._rx_view
+    
+    def buffer_updated(self, nbytes: int):
+        bridge = self.bridge
+        bridge.stats.recv_syscalls += 1
+        try:
+            bridge._process_received(nbytes)
+        except Exception as e:
+            logger.error(f"Message loop error: {e}")
+    
+    def connection_lost(self, exc: Optional[Exception]):
+        self.bridge._on_stream_closed(exc)
 
 
 # Singleton instance for global use
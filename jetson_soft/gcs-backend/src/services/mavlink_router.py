@@ -0,0 +1,307 @@
+"""
+MAVLink Router Service - Multi-vehicle demultiplexing and frame forwarding
+Learns which endpoint each (system_id, component_id) lives on and forwards
+raw frames between endpoints without re-encoding
+"""
+
+import asyncio
+import time
+import logging
+import threading
+from typing import Dict, Any, List, Optional, Callable, Tuple, Set
+from dataclasses import dataclass, asdict
+
+from ..utils.mavlink_parser import MAVLinkFrameDecoder, MAVLinkFrame
+from ..utils.serialization import SerializationUtils
+from .event_loop import EventLoopThread, mavlink_event_loop
+
+logger = logging.getLogger(__name__)
+
+VehicleKey = Tuple[int, int]
+
+
+@dataclass
+class RouterStats:
+    """Router statistics"""
+    frames_routed: int = 0
+    frames_forwarded: int = 0
+    frames_targeted: int = 0
+    frames_broadcast: int = 0
+    frames_unrouted: int = 0
+    frames_dropped: int = 0
+    send_errors: int = 0
+    endpoints: int = 0
+    vehicles: int = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class MAVLinkEndpoint:
+    """
+    One side of the router (autopilot link, GCS TCP client, companion component)
+    send() is always called on the event loop thread
+    """
+
+    __slots__ = ('name', 'send', 'systems', 'frames_in', 'frames_out', 'bytes_out', 'errors')
+
+    def __init__(self, name: str, send: Callable[[bytes], Any]):
+        self.name = name
+        self.send = send
+        self.systems: Set[VehicleKey] = set()
+        self.frames_in = 0
+        self.frames_out = 0
+        self.bytes_out = 0
+        self.errors = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'systems': sorted(self.systems),
+            'frames_in': self.frames_in,
+            'frames_out': self.frames_out,
+            'bytes_out': self.bytes_out,
+            'errors': self.errors
+        }
+
+    def __repr__(self) -> str:
+        return f"MAVLinkEndpoint({self.name})"
+
+
+class MAVLinkRouter:
+    """
+    Routes MAVLink frames by (system_id, component_id)
+
+    - Routes are learned from the source address of every frame
+    - Targeted messages go only to endpoints that host the target system
+      (unknown targets and broadcasts go to every endpoint except the source)
+    - Vehicle state objects are created by vehicle_factory when the caller asks
+      for it (autopilot HEARTBEAT); other lookups only find known vehicles
+    """
+
+    def __init__(self,
+                 vehicle_factory: Optional[Callable[[int, int], Any]] = None,
+                 event_loop: Optional[EventLoopThread] = None,
+                 client_write_limit: int = 256 * 1024):
+        self.vehicle_factory = vehicle_factory
+        self._event_loop = event_loop or mavlink_event_loop
+        self.client_write_limit = client_write_limit
+
+        # system_id -> component_id -> endpoint
+        self._routes: Dict[int, Dict[int, MAVLinkEndpoint]] = {}
+        self.endpoints: List[MAVLinkEndpoint] = []
+
+        # Per-vehicle state, keyed by (system_id, component_id)
+        self.vehicles: Dict[VehicleKey, Any] = {}
+        self._vehicles_lock = threading.Lock()
+
+        self._servers: List[asyncio.AbstractServer] = []
+        self.stats = RouterStats()
+
+    # ------------------------------------------------------------------
+    # Vehicles
+    # ------------------------------------------------------------------
+
+    def get_vehicle(self, system_id: int, component_id: int, create: bool = False) -> Any:
+        """Get vehicle state for (system_id, component_id); create=True makes it on first use"""
+        key = (system_id, component_id)
+        vehicle = self.vehicles.get(key)
+        if vehicle is not None or not create or self.vehicle_factory is None:
+            return vehicle
+
+        with self._vehicles_lock:
+            vehicle = self.vehicles.get(key)
+            if vehicle is None:
+                vehicle = self.vehicle_factory(system_id, component_id)
+                vehicles = dict(self.vehicles)
+                vehicles[key] = vehicle
+                self.vehicles = vehicles
+                self.stats.vehicles = len(vehicles)
+                logger.info(f"🛩️ New vehicle: sysid={system_id} compid={component_id}")
+        return vehicle
+
+    # ------------------------------------------------------------------
+    # Endpoints
+    # ------------------------------------------------------------------
+
+    def add_endpoint(self, name: str, send: Callable[[bytes], Any]) -> MAVLinkEndpoint:
+        """Register endpoint; send(data) receives raw encoded frames"""
+        endpoint = MAVLinkEndpoint(name, send)
+        self.endpoints = self.endpoints + [endpoint]
+        self.stats.endpoints = len(self.endpoints)
+        logger.info(f"🔀 Router endpoint added: {name}")
+        return endpoint
+
+    def remove_endpoint(self, endpoint: MAVLinkEndpoint):
+        """Unregister endpoint and forget its routes"""
+        self.endpoints = [e for e in self.endpoints if e is not endpoint]
+        self.stats.endpoints = len(self.endpoints)
+
+        for system_id, components in list(self._routes.items()):
+            remaining = {c: e for c, e in components.items() if e is not endpoint}
+            if remaining:
+                self._routes[system_id] = remaining
+            else:
+                del self._routes[system_id]
+        logger.info(f"🔀 Router endpoint removed: {endpoint.name}")
+
+    # ------------------------------------------------------------------
+    # Routing (event loop thread)
+    # ------------------------------------------------------------------
+
+    def route_frame(self, frame: MAVLinkFrame, source: Optional[MAVLinkEndpoint] = None) -> int:
+        """Learn route from frame source and forward raw bytes; returns endpoints written"""
+        self.stats.frames_routed += 1
+
+        if source is not None:
+            source.frames_in += 1
+            components = self._routes.get(frame.system_id)
+            if components is None:
+                components = self._routes[frame.system_id] = {}
+            if components.get(frame.component_id) is not source:
+                components[frame.component_id] = source
+                source.systems.add((frame.system_id, frame.component_id))
+
+        endpoints = self.endpoints
+        if len(endpoints) < 2 and source is not None:
+            return 0
+
+        target_system, target_component = frame.target
+        if target_system == 0:
+            self.stats.frames_broadcast += 1
+            targets = endpoints
+        else:
+            targets = self._resolve(target_system, target_component)
+            if targets:
+                self.stats.frames_targeted += 1
+            else:
+                # Target not seen yet: flood, the vehicle may be behind any link
+                self.stats.frames_unrouted += 1
+                targets = endpoints
+
+        return self._forward(frame.raw, targets, source)
+
+    def send_to(self, system_id: int, component_id: int, data: bytes) -> bool:
+        """Send locally encoded frame toward a vehicle (thread-safe)"""
+        if not self._event_loop.in_loop_thread():
+            self._event_loop.call_soon(self.send_to, system_id, component_id, bytes(data))
+            return True
+
+        targets = self._resolve(system_id, component_id) or self.endpoints
+        return self._forward(data, targets, None) > 0
+
+    def _resolve(self, system_id: int, component_id: int) -> List[MAVLinkEndpoint]:
+        """Endpoints hosting target system (component 0 = any component)"""
+        components = self._routes.get(system_id)
+        if not components:
+            return []
+
+        if component_id:
+            endpoint = components.get(component_id)
+            if endpoint is not None:
+                return [endpoint]
+
+        # Unknown component: every endpoint that carries this system
+        unique = []
+        for endpoint in components.values():
+            if endpoint not in unique:
+                unique.append(endpoint)
+        return unique
+
+    def _forward(self, data, targets: List[MAVLinkEndpoint], source: Optional[MAVLinkEndpoint]) -> int:
+        written = 0
+        for endpoint in targets:
+            if endpoint is source:
+                continue
+            try:
+                if endpoint.send(data) is False:
+                    self.stats.frames_dropped += 1
+                    continue
+                endpoint.frames_out += 1
+                endpoint.bytes_out += len(data)
+                written += 1
+            except Exception as e:
+                endpoint.errors += 1
+                self.stats.send_errors += 1
+                logger.debug(f"Router send error ({endpoint.name}): {e}")
+
+        self.stats.frames_forwarded += written
+        return written
+
+    # ------------------------------------------------------------------
+    # TCP server for GCS clients (Mission Planner, QGroundControl)
+    # ------------------------------------------------------------------
+
+    def serve_tcp(self, host: str = "0.0.0.0", port: int = 5760, timeout: float = 5.0) -> bool:
+        """Accept GCS TCP clients as router endpoints"""
+        async def _start():
+            loop = asyncio.get_running_loop()
+            server = await loop.create_server(lambda: _RouterClientProtocol(self), host, port)
+            self._servers.append(server)
+
+        try:
+            self._event_loop.run_coroutine(_start()).result(timeout=timeout)
+            logger.info(f"🔀 Router listening on tcp:{host}:{port}")
+            return True
+        except Exception as e:
+            logger.error(f"❌ Router TCP server failed: {e}")
+            return False
+
+    def stop(self):
+        """Close TCP servers"""
+        servers, self._servers = self._servers, []
+        for server in servers:
+            self._event_loop.call_soon(server.close)
+
+    # ------------------------------------------------------------------
+    # Stats
+    # ------------------------------------------------------------------
+
+    def get_routes(self) -> Dict[str, str]:
+        """Learned routes as 'sysid:compid' -> endpoint name"""
+        return {
+            f"{system_id}:{component_id}": endpoint.name
+            for system_id, components in list(self._routes.items())
+            for component_id, endpoint in list(components.items())
+        }
+
+    def get_router_stats(self) -> Dict[str, Any]:
+        stats = self.stats.to_dict()
+        stats['routes'] = self.get_routes()
+        stats['endpoint_stats'] = [endpoint.to_dict() for endpoint in self.endpoints]
+        return SerializationUtils.add_timestamp(stats)
+
+
+class _RouterClientProtocol(asyncio.Protocol):
+    """TCP client attached to the router as an endpoint"""
+
+    def __init__(self, router: MAVLinkRouter):
+        self.router = router
+        self.transport: Optional[asyncio.Transport] = None
+        self.endpoint: Optional[MAVLinkEndpoint] = None
+        self.decoder = MAVLinkFrameDecoder(buffer_size=16384)
+
+    def connection_made(self, transport: asyncio.Transport):
+        self.transport = transport
+        peer = transport.get_extra_info('peername')
+        name = f"tcp:{peer[0]}:{peer[1]}" if peer else "tcp:client"
+        self.endpoint = self.router.add_endpoint(name, self.send)
+
+    def send(self, data) -> bool:
+        transport = self.transport
+        # Slow client: drop instead of buffering without bound
+        if transport is None or transport.get_write_buffer_size() > self.router.client_write_limit:
+            return False
+        transport.write(bytes(data))
+        return True
+
+    def data_received(self, data: bytes):
+        decoder = self.decoder
+        decoder.feed(data, time.monotonic())
+        for frame in decoder:
+            self.router.route_frame(frame, self.endpoint)
+
+    def connection_lost(self, exc: Optional[Exception]):
+        if self.endpoint is not None:
+            self.router.remove_endpoint(self.endpoint)
+        self.transport = None
@@ -13,6 +13,11 @@ from dataclasses import dataclass, asdict
 from collections import deque
 import logging
 
+from ..utils.mavlink_parser import MAVLinkFrameDecoder
+from ..utils.mavlink_messages import (
+    HEARTBEAT, SYS_STATUS, GPS_RAW_INT, ATTITUDE, VFR_HUD, BATTERY_STATUS, UINT16_MAX
+)
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -63,6 +68,17 @@ class OptimizedMAVLinkService:
         # Circular buffer for telemetry history (memory efficient)
         self.telemetry_history = deque(maxlen=100)  # Keep only last 100 entries
         
+        # Shared streaming frame decoder (v1/v2, CRC checked)
+        self._decoder = MAVLinkFrameDecoder()
+        self._frame_handlers = {
+            0: self._handle_heartbeat,
+            1: self._handle_sys_status,
+            24: self._handle_gps_raw,
+            30: self._handle_attitude,
+            74: self._handle_vfr_hud,
+            147: self._handle_battery_status
+        }
+        
         # Connection statistics
         self.stats = {
             'messages_received': 0,
@@ -185,6 +201,8 @@ class OptimizedMAVLinkService:
         Minimal CPU usage and memory allocation
         """
         buffer = bytearray(1024)  # Reusable buffer
+        view = memoryview(buffer)
+        self._decoder.reset()
         
         while self.is_running and self.is_connected:
             try:
@@ -194,8 +212,7 @@ class OptimizedMAVLinkService:
                 # Receive data with timeout
                 data, addr = self.connection.recvfrom_into(buffer)
                 if data > 0:
-                    self._parse_mavlink_message(buffer[:data])
-                    self.stats['messages_received'] += 1
+                    self._parse_mavlink_message(view[:data])
                 
             except socket.timeout:
                 continue
@@ -208,104 +225,78 @@ class OptimizedMAVLinkService:
         Lightweight MAVLink message parser
         Only processes essential messages for GCS
         """
-        if len(data) < 8:
-            return
+        self._decoder.feed(data)
         
-        try:
-            # Simple MAVLink v2 header parsing
-            if data[0] == 0xFD:  # MAVLink v2 magic byte
-                payload_len = data[1]
-                msg_id = struct.unpack('<I', data[5:8] + b'\x00')[0]  # 24-bit message ID
-                payload = data[10:10+payload_len]
-                
-                # Process only essential messages
-                if msg_id == 0:  # HEARTBEAT
-                    self._handle_heartbeat(payload)
-                elif msg_id == 1:  # SYS_STATUS
-                    self._handle_sys_status(payload)
-                elif msg_id == 24:  # GPS_RAW_INT
-                    self._handle_gps_raw(payload)
-                elif msg_id == 30:  # ATTITUDE
-                    self._handle_attitude(payload)
-                elif msg_id == 74:  # VFR_HUD
-                    self._handle_vfr_hud(payload)
-                elif msg_id == 147:  # BATTERY_STATUS
-                    self._handle_battery_status(payload)
-                
-        except Exception as e:
-            logger.debug(f"Error parsing MAVLink message: {e}")
+        for frame in self._decoder:
+            self.stats['messages_received'] += 1
+            
+            # Process only essential messages
+            handler = self._frame_handlers.get(frame.message_id)
+            if handler is None:
+                continue
+            
+            try:
+                handler(frame.payload)
+            except Exception as e:
+                logger.debug(f"Error parsing MAVLink message: {e}")
     
     def _handle_heartbeat(self, payload: bytes):
         """Handle HEARTBEAT message"""
-        if len(payload) >= 9:
-            custom_mode, type_val, autopilot, base_mode, system_status, mavlink_version = \
-                struct.unpack('<IBBBBBB', payload[:9])
-            
-            self.telemetry.armed = bool(base_mode & 0x80)  # MAV_MODE_FLAG_SAFETY_ARMED
-            
-            # Update flight mode
-            if custom_mode in self.flight_modes:
-                self.telemetry.mode = self.flight_modes[custom_mode]
-            
-            self.stats['last_heartbeat'] = time.time()
+        heartbeat = HEARTBEAT.decode(payload)
+        
+        self.telemetry.armed = bool(heartbeat.base_mode & 0x80)  # MAV_MODE_FLAG_SAFETY_ARMED
+        
+        # Update flight mode
+        if heartbeat.custom_mode in self.flight_modes:
+            self.telemetry.mode = self.flight_modes[heartbeat.custom_mode]
+        
+        self.stats['last_heartbeat'] = time.time()
     
     def _handle_sys_status(self, payload: bytes):
         """Handle SYS_STATUS message"""
-        if len(payload) >= 31:
-            data = struct.unpack('<IIIHHHHHHHHHBBB', payload[:31])
-            voltage_battery = data[4]  # mV
-            current_battery = data[5]  # cA (10mA)
-            battery_remaining = data[6]  # %
-            
-            self.telemetry.battery_voltage = voltage_battery / 1000.0  # Convert to V
-            self.telemetry.battery_current = current_battery / 100.0   # Convert to A
-            self.telemetry.battery_remaining = battery_remaining
+        status = SYS_STATUS.decode(payload)
+        
+        self.telemetry.battery_voltage = status.voltage_battery / 1000.0  # Convert to V
+        self.telemetry.battery_current = status.current_battery / 100.0   # Convert to A
+        self.telemetry.battery_remaining = status.battery_remaining
     
     def _handle_gps_raw(self, payload: bytes):
         """Handle GPS_RAW_INT message"""
-        if len(payload) >= 30:
-            data = struct.unpack('<QiiiiHHHHB', payload[:30])
-            time_usec, lat, lon, alt, eph, epv, vel, cog, fix_type, satellites_visible = data
-            
-            self.telemetry.gps_lat = lat / 1e7
-            self.telemetry.gps_lon = lon / 1e7
-            self.telemetry.gps_alt = alt / 1000.0  # Convert to meters
-            self.telemetry.gps_satellites = satellites_visible
-            self.telemetry.gps_fix_type = fix_type
+        gps = GPS_RAW_INT.decode(payload)
+        
+        self.telemetry.gps_lat = gps.lat / 1e7
+        self.telemetry.gps_lon = gps.lon / 1e7
+        self.telemetry.gps_alt = gps.alt / 1000.0  # Convert to meters
+        self.telemetry.gps_satellites = gps.satellites_visible
+        self.telemetry.gps_fix_type = gps.fix_type
     
     def _handle_attitude(self, payload: bytes):
         """Handle ATTITUDE message"""
-        if len(payload) >= 28:
-            data = struct.unpack('<Iffffff', payload[:28])
-            time_boot_ms, roll, pitch, yaw, rollspeed, pitchspeed, yawspeed = data
-            
-            # Convert from radians to degrees
-            self.telemetry.roll = roll * 57.2958  # rad to deg
-            self.telemetry.pitch = pitch * 57.2958
-            self.telemetry.yaw = yaw * 57.2958
+        attitude = ATTITUDE.decode(payload)
+        
+        # Convert from radians to degrees
+        self.telemetry.roll = attitude.roll * 57.2958  # rad to deg
+        self.telemetry.pitch = attitude.pitch * 57.2958
+        self.telemetry.yaw = attitude.yaw * 57.2958
     
     def _handle_vfr_hud(self, payload: bytes):
         """Handle VFR_HUD message"""
-        if len(payload) >= 20:
-            data = struct.unpack('<ffffhhH', payload[:20])
-            airspeed, groundspeed, heading, throttle, alt, climb = data[:6]
-            
-            self.telemetry.airspeed = airspeed
-            self.telemetry.groundspeed = groundspeed
-            self.telemetry.altitude = alt
-            self.telemetry.climb_rate = climb
-            self.telemetry.throttle = throttle
+        hud = VFR_HUD.decode(payload)
+        
+        self.telemetry.airspeed = hud.airspeed
+        self.telemetry.groundspeed = hud.groundspeed
+        self.telemetry.altitude = hud.alt
+        self.telemetry.climb_rate = hud.climb
+        self.telemetry.throttle = hud.throttle
     
     def _handle_battery_status(self, payload: bytes):
         """Handle BATTERY_STATUS message"""
-        if len(payload) >= 36:
-            # More detailed battery information
-            data = struct.unpack('<IBBBBhhhhhhhhhhhhB', payload[:36])
-            current_consumed, energy_consumed, temperature, voltages = data[0], data[1], data[2], data[3:13]
-            
-            # Update with more accurate battery data if available
-            if voltages[0] != 65535:  # Valid voltage
-                self.telemetry.battery_voltage = voltages[0] / 1000.0
+        battery = BATTERY_STATUS.decode(payload)
+        
+        # Update with more accurate battery data if available
+        first_cell = battery.voltages[0]
+        if first_cell != UINT16_MAX:  # Valid voltage
+            self.telemetry.battery_voltage = first_cell / 1000.0
     
     def _heartbeat_loop(self):
         """Send periodic heartbeat to maintain connection"""
@@ -3,15 +3,24 @@
 Использует новую архитектуру с разделением ответственности
 """
 
+import math
 import time
 import logging
-from typing import Dict, Any, Optional
-from dataclasses import dataclass, asdict
+import threading
+from typing import Dict, Any, List, Optional
+from dataclasses import dataclass, asdict, fields
 
 from .mavlink_bridge import mavlink_bridge, MAVLinkBridge
+from .mavlink_router import MAVLinkRouter
+from .event_loop import mavlink_event_loop
 from .telemetry_buffer import telemetry_buffer, TelemetryBuffer, TelemetryRecord
 from .central_server_sync import central_server_sync, CentralServerSync
 from ..utils.serialization import SerializationUtils
+from ..utils.mavlink_parser import MAVLinkFrame
+from ..utils.mavlink_messages import (
+    HEARTBEAT, SYS_STATUS, GPS_RAW_INT, ATTITUDE, VFR_HUD, BATTERY_STATUS,
+    UINT16_MAX, INT16_UNKNOWN, MAV_AUTOPILOT_INVALID, MAV_COMP_ID_AUTOPILOT1, MAV_TYPE_GCS
+)
 
 logger = logging.getLogger(__name__)
 
@@ -40,20 +49,113 @@ class TelemetryData:
         return asdict(self)
 
 
+# Dirty bit per TelemetryData field
+TELEMETRY_FIELD_BITS: Dict[str, int] = {
+    field.name: 1 << index for index, field in enumerate(fields(TelemetryData))
+}
+
+
+class VehicleState:
+    """Телеметрия одного аппарата (system_id, component_id) с отслеживанием изменений"""
+    
+    def __init__(self, drone_id: str, system_id: Optional[int] = None, component_id: Optional[int] = None):
+        self.drone_id = drone_id
+        self.system_id = system_id
+        self.component_id = component_id
+        self.telemetry = TelemetryData()
+        # Обработчики работают в потоке event loop, SocketIO читает из своих потоков
+        self.lock = threading.Lock()
+        
+        # Коалесценция: поля, изменённые с последней записи
+        self.dirty: int = 0
+        self.last_emit: float = 0.0  # monotonic
+        self.flush_pending: bool = False
+        self.updates_received: int = 0
+        self.records_emitted: int = 0
+    
+    def update(self, **values) -> int:
+        """Обновить поля; возвращает биты реально изменившихся полей"""
+        telemetry = self.telemetry
+        changed = 0
+        with self.lock:
+            for name, value in values.items():
+                if getattr(telemetry, name) != value:
+                    setattr(telemetry, name, value)
+                    changed |= TELEMETRY_FIELD_BITS[name]
+            self.dirty |= changed
+            self.updates_received += 1
+        return changed
+    
+    def take_record(self, delta: bool = False, force: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Снимок для записи (полный или только изменённые поля) и сброс dirty-битов
+        None, если с прошлой записи ничего не изменилось и force не задан
+        """
+        with self.lock:
+            dirty = self.dirty
+            if not dirty and not force:
+                return None
+            
+            telemetry = self.telemetry
+            telemetry.timestamp = time.time()
+            if delta:
+                record = {name: getattr(telemetry, name)
+                          for name, bit in TELEMETRY_FIELD_BITS.items() if dirty & bit}
+                record['timestamp'] = telemetry.timestamp
+            else:
+                record = telemetry.to_dict()
+            
+            self.dirty = 0
+            self.last_emit = time.monotonic()
+            self.records_emitted += 1
+            return record
+    
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            return self.telemetry.to_dict()
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'drone_id': self.drone_id,
+            'system_id': self.system_id,
+            'component_id': self.component_id,
+            'telemetry': self.snapshot()
+        }
+
+
 class ModularMAVLinkService:
     """
     Модульный MAVLink сервис с разделением ответственности
     Интегрирует MAVLink Bridge, Telemetry Buffer и Central Server Sync
     """
     
-    def __init__(self, drone_id: str = "jetson_drone_001"):
+    def __init__(self,
+                 drone_id: str = "jetson_drone_001",
+                 coalesce_interval: float = 0.1,
+                 max_record_interval: float = 5.0,
+                 delta_updates: bool = False):
         self.drone_id = drone_id
-        self.telemetry = TelemetryData()
+        
+        # Не больше одной записи на аппарат за coalesce_interval (сек);
+        # без изменений - одна запись раз в max_record_interval
+        self.coalesce_interval = coalesce_interval
+        self.max_record_interval = max_record_interval
+        # Real-time канал получает только изменённые поля
+        self.delta_updates = delta_updates
+        self._event_loop = mavlink_event_loop
+        
+        # Первый обнаруженный аппарат получает drone_id, остальные - производные
+        self.primary_vehicle = VehicleState(drone_id)
         
         # Подключаем модульные сервисы
         self.bridge = mavlink_bridge
         self.buffer = telemetry_buffer  
         self.sync = central_server_sync
+        self.buffer.attach_sync_client(self.sync)
+        
+        # Маршрутизатор: аппараты по (sysid, compid), пересылка кадров между endpoint'ами
+        self.router = MAVLinkRouter(vehicle_factory=self._create_vehicle)
+        self.bridge.attach_router(self.router)
         
         # Регистрируем обработчики сообщений
         self._register_message_handlers()
@@ -81,148 +183,236 @@ class ModularMAVLinkService:
         # BATTERY_STATUS (ID: 147)
         self.bridge.register_message_handler(147, self._handle_battery_status)
     
-    def _handle_heartbeat(self, message: Dict[str, Any]):
+    @property
+    def telemetry(self) -> TelemetryData:
+        """Телеметрия основного аппарата"""
+        return self.primary_vehicle.telemetry
+    
+    def _create_vehicle(self, system_id: int, component_id: int) -> VehicleState:
+        """Фабрика состояния аппарата для маршрутизатора"""
+        vehicle = self.primary_vehicle
+        if vehicle.system_id is None:
+            vehicle.system_id = system_id
+            vehicle.component_id = component_id
+            return vehicle
+        
+        drone_id = f"{self.drone_id}_sys{system_id}"
+        if component_id != MAV_COMP_ID_AUTOPILOT1:
+            drone_id += f"_comp{component_id}"
+        return VehicleState(drone_id, system_id, component_id)
+    
+    def _vehicle_for(self, frame: MAVLinkFrame, create: bool = False) -> Optional[VehicleState]:
+        """Аппарат источника кадра; создаётся только по HEARTBEAT автопилота"""
+        return self.router.get_vehicle(frame.system_id, frame.component_id, create)
+    
+    def get_vehicle(self, drone_id: Optional[str] = None) -> Optional[VehicleState]:
+        """Поиск аппарата по drone_id (по умолчанию - основной)"""
+        if drone_id is None or drone_id == self.drone_id:
+            return self.primary_vehicle
+        for vehicle in self.router.vehicles.values():
+            if vehicle.drone_id == drone_id:
+                return vehicle
+        return None
+    
+    def get_vehicles(self) -> List[Dict[str, Any]]:
+        """Телеметрия всех обнаруженных аппаратов"""
+        return [vehicle.to_dict() for vehicle in self.router.vehicles.values()]
+    
+    def _handle_heartbeat(self, frame: MAVLinkFrame):
         """Обработка HEARTBEAT сообщений"""
         try:
-            payload = message.get('payload', b'')
-            if len(payload) >= 9:
-                # Parse basic flight info
-                flight_mode_num = int.from_bytes(payload[4:5], 'little')
-                self.telemetry.flight_mode = self.bridge.flight_modes.get(flight_mode_num, "UNKNOWN")
-                self.telemetry.armed = bool(payload[6] & 0x80)  # MAV_MODE_FLAG_SAFETY_ARMED
-                
-                self._update_telemetry()
+            heartbeat = HEARTBEAT.decode(frame.payload)
+            
+            # GCS, gimbal, camera etc. report MAV_AUTOPILOT_INVALID - not a vehicle
+            if heartbeat.autopilot == MAV_AUTOPILOT_INVALID or heartbeat.type == MAV_TYPE_GCS:
+                return
+            
+            vehicle = self._vehicle_for(frame, create=True)
+            
+            # Parse basic flight info
+            vehicle.update(
+                flight_mode=self.bridge.flight_modes.get(heartbeat.custom_mode, "UNKNOWN"),
+                armed=bool(heartbeat.base_mode & 0x80)  # MAV_MODE_FLAG_SAFETY_ARMED
+            )
+            
+            self._update_telemetry(vehicle)
                 
         except Exception as e:
             logger.error(f"Heartbeat handling error: {e}")
     
-    def _handle_sys_status(self, message: Dict[str, Any]):
+    def _handle_sys_status(self, frame: MAVLinkFrame):
         """Обработка SYS_STATUS сообщений"""
         try:
-            payload = message.get('payload', b'')
-            if len(payload) >= 31:
-                # Parse system status
-                battery_voltage = int.from_bytes(payload[4:6], 'little') / 1000.0  # mV to V
-                battery_current = int.from_bytes(payload[6:8], 'little', signed=True) / 100.0  # cA to A
-                battery_remaining = int.from_bytes(payload[8:9], 'little')  # %
-                
-                self.telemetry.battery_voltage = battery_voltage
-                self.telemetry.battery_current = battery_current
-                self.telemetry.battery_level = battery_remaining
-                
-                self._update_telemetry()
+            status = SYS_STATUS.decode(frame.payload)
+            vehicle = self._vehicle_for(frame)
+            if vehicle is None:
+                return  # No autopilot HEARTBEAT from this source yet
+            
+            # Parse system status
+            vehicle.update(
+                battery_voltage=status.voltage_battery / 1000.0,  # mV to V
+                battery_current=status.current_battery / 100.0,  # cA to A
+                battery_level=status.battery_remaining  # %
+            )
+            
+            self._update_telemetry(vehicle)
                 
         except Exception as e:
             logger.error(f"SYS_STATUS handling error: {e}")
     
-    def _handle_gps_raw(self, message: Dict[str, Any]):
+    def _handle_gps_raw(self, frame: MAVLinkFrame):
         """Обработка GPS_RAW_INT сообщений"""
         try:
-            payload = message.get('payload', b'')
-            if len(payload) >= 30:
-                # Parse GPS data
-                lat = int.from_bytes(payload[8:12], 'little', signed=True) / 1e7
-                lon = int.from_bytes(payload[12:16], 'little', signed=True) / 1e7
-                alt = int.from_bytes(payload[16:20], 'little', signed=True) / 1000.0  # mm to m
-                satellites = int.from_bytes(payload[29:30], 'little')
-                
-                self.telemetry.location_latitude = lat
-                self.telemetry.location_longitude = lon
-                self.telemetry.altitude_meters = alt
-                self.telemetry.gps_satellites = satellites
-                
-                self._update_telemetry()
+            gps = GPS_RAW_INT.decode(frame.payload)
+            vehicle = self._vehicle_for(frame)
+            if vehicle is None:
+                return  # No autopilot HEARTBEAT from this source yet
+            
+            # Parse GPS data
+            vehicle.update(
+                location_latitude=gps.lat / 1e7,
+                location_longitude=gps.lon / 1e7,
+                altitude_meters=gps.alt / 1000.0,  # mm to m
+                gps_satellites=gps.satellites_visible
+            )
+            
+            self._update_telemetry(vehicle)
                 
         except Exception as e:
             logger.error(f"GPS_RAW handling error: {e}")
     
-    def _handle_attitude(self, message: Dict[str, Any]):
+    def _handle_attitude(self, frame: MAVLinkFrame):
         """Обработка ATTITUDE сообщений"""
         try:
-            payload = message.get('payload', b'')
-            if len(payload) >= 28:
-                # Parse attitude data
-                import struct
-                yaw = struct.unpack('<f', payload[16:20])[0]  # radians
-                heading = (yaw * 180.0 / 3.14159) % 360  # Convert to degrees
-                
-                self.telemetry.heading_degrees = heading
-                self._update_telemetry()
+            attitude = ATTITUDE.decode(frame.payload)
+            vehicle = self._vehicle_for(frame)
+            if vehicle is None:
+                return  # No autopilot HEARTBEAT from this source yet
+            
+            # Convert yaw (radians) to heading in degrees
+            vehicle.update(heading_degrees=math.degrees(attitude.yaw) % 360)
+            self._update_telemetry(vehicle)
                 
         except Exception as e:
             logger.error(f"ATTITUDE handling error: {e}")
     
-    def _handle_vfr_hud(self, message: Dict[str, Any]):
+    def _handle_vfr_hud(self, frame: MAVLinkFrame):
         """Обработка VFR_HUD сообщений"""
         try:
-            payload = message.get('payload', b'')
-            if len(payload) >= 20:
-                # Parse VFR HUD data
-                import struct
-                airspeed = struct.unpack('<f', payload[0:4])[0]  # m/s
-                groundspeed = struct.unpack('<f', payload[4:8])[0]  # m/s
-                alt = struct.unpack('<f', payload[8:12])[0]  # m
-                
-                self.telemetry.speed_ms = groundspeed
-                if self.telemetry.altitude_meters == 0.0:  # Use VFR alt if GPS alt not available
-                    self.telemetry.altitude_meters = alt
-                
-                self._update_telemetry()
+            hud = VFR_HUD.decode(frame.payload)
+            vehicle = self._vehicle_for(frame)
+            if vehicle is None:
+                return  # No autopilot HEARTBEAT from this source yet
+            
+            with vehicle.lock:
+                use_vfr_alt = vehicle.telemetry.altitude_meters == 0.0
+            
+            if use_vfr_alt:  # Use VFR alt if GPS alt not available
+                vehicle.update(speed_ms=hud.groundspeed, altitude_meters=hud.alt)
+            else:
+                vehicle.update(speed_ms=hud.groundspeed)  # m/s
+            
+            self._update_telemetry(vehicle)
                 
         except Exception as e:
             logger.error(f"VFR_HUD handling error: {e}")
     
-    def _handle_battery_status(self, message: Dict[str, Any]):
+    def _handle_battery_status(self, frame: MAVLinkFrame):
         """Обработка BATTERY_STATUS сообщений"""
         try:
-            payload = message.get('payload', b'')
-            if len(payload) >= 36:
-                # Parse detailed battery status
-                import struct
-                current_battery = struct.unpack('<i', payload[0:4])[0] / 100.0  # cA to A
-                
-                # Extract voltages (10 cells max)
-                voltages = []
-                for i in range(10):
-                    voltage = struct.unpack('<H', payload[4 + i*2:6 + i*2])[0]
-                    if voltage != 65535:  # Valid voltage
-                        voltages.append(voltage / 1000.0)  # mV to V
-                
-                if voltages:
-                    self.telemetry.battery_voltage = sum(voltages)
-                self.telemetry.battery_current = current_battery
-                
-                self._update_telemetry()
+            battery = BATTERY_STATUS.decode(frame.payload)
+            vehicle = self._vehicle_for(frame)
+            if vehicle is None:
+                return  # No autopilot HEARTBEAT from this source yet
+            
+            # Sum valid cell voltages (UINT16_MAX marks unused cells)
+            voltages = battery.voltages
+            invalid_cells = voltages.count(UINT16_MAX)
+            
+            if invalid_cells < len(voltages):
+                vehicle.update(battery_voltage=(sum(voltages) - invalid_cells * UINT16_MAX) / 1000.0)  # mV to V
+            
+            if battery.current_battery != INT16_UNKNOWN:
+                vehicle.update(battery_current=battery.current_battery / 100.0)  # cA to A
+            
+            self._update_telemetry(vehicle)
                 
         except Exception as e:
             logger.error(f"BATTERY_STATUS handling error: {e}")
     
-    def _update_telemetry(self):
-        """Обновление телеметрии и запись в буфер"""
-        self.telemetry.timestamp = time.time()
+    def _update_telemetry(self, vehicle: VehicleState):
+        """
+        Коалесценция обновлений: первое изменение в окне пишется сразу,
+        остальные собираются и пишутся одной записью в конце окна
+        """
+        with vehicle.lock:
+            if vehicle.flush_pending:
+                return
+            wait = vehicle.last_emit + self.coalesce_interval - time.monotonic()
+            if wait > 0:
+                vehicle.flush_pending = True
+        
+        if wait > 0:
+            self._event_loop.call_later(wait, self._flush_telemetry, vehicle)
+        else:
+            self._emit_telemetry(vehicle)
+    
+    def _flush_telemetry(self, vehicle: VehicleState):
+        """Конец окна коалесценции"""
+        with vehicle.lock:
+            vehicle.flush_pending = False
+        self._emit_telemetry(vehicle)
+    
+    def _emit_telemetry(self, vehicle: VehicleState):
+        """Запись в буфер и real-time обновление"""
+        stale = time.monotonic() - vehicle.last_emit >= self.max_record_interval
+        realtime = self.sync.stats.websocket_connected
+        delta = None
+        
+        if realtime and self.delta_updates:
+            delta = vehicle.take_record(delta=True, force=stale)
+            if delta is None:
+                return
+            snapshot = vehicle.snapshot()
+        else:
+            snapshot = vehicle.take_record(force=stale)
+            if snapshot is None:
+                return
         
         # Добавляем в буфер для store-and-forward
-        self.buffer.add_telemetry(self.drone_id, self.telemetry.to_dict())
+        self.buffer.add_telemetry(vehicle.drone_id, snapshot)
         
         # Отправляем real-time обновление (если подключены)
-        if self.sync.stats.websocket_connected:
-            self.sync.send_realtime_update(
-                'drone_telemetry',
-                'INSERT',
-                {
-                    'drone_id': self.drone_id,
-                    'telemetry': self.telemetry.to_dict()
-                }
-            )
+        if realtime:
+            update = {'drone_id': vehicle.drone_id, 'telemetry': delta or snapshot}
+            if delta is not None:
+                update['delta'] = True
+            self.sync.send_realtime_update('drone_telemetry', 'INSERT', update)
+    
+    def get_coalescing_stats(self) -> Dict[str, Any]:
+        """Статистика коалесценции телеметрии"""
+        vehicles = list(self.router.vehicles.values()) or [self.primary_vehicle]
+        updates = sum(vehicle.updates_received for vehicle in vehicles)
+        records = sum(vehicle.records_emitted for vehicle in vehicles)
+        return {
+            'coalesce_interval': self.coalesce_interval,
+            'delta_updates': self.delta_updates,
+            'updates_received': updates,
+            'records_emitted': records,
+            'coalescing_ratio': updates / records if records else 0.0
+        }
     
-    def connect(self, connection_string: str = "udp:0.0.0.0:14550") -> bool:
-        """Подключение к MAVLink источнику"""
+    def connect(self, connection_string: str = "udp:0.0.0.0:14550", gcs_port: Optional[int] = None) -> bool:
+        """Подключение к MAVLink источнику (gcs_port - TCP порт для Mission Planner/QGC)"""
         # Запускаем все сервисы
         self.sync.start()
         
         # Подключаемся к MAVLink
         success = self.bridge.connect(connection_string)
         
+        if success and gcs_port:
+            self.router.serve_tcp(port=gcs_port)
+        
         if success:
             logger.info(f"✅ Modular MAVLink service connected: {connection_string}")
             
@@ -244,17 +434,28 @@ class ModularMAVLinkService:
         self.sync.stop()
         
         # Отключаемся от MAVLink
+        self.router.stop()
         self.bridge.disconnect()
         
         logger.info("🛑 Modular MAVLink service disconnected")
     
-    def send_command(self, command: str, params: Dict[str, Any] = None) -> bool:
-        """Отправка команды автопилоту"""
-        return self.bridge.send_command(command, params or {})
+    def send_command(self, command: str, params: Dict[str, Any] = None, drone_id: Optional[str] = None) -> bool:
+        """Отправка команды автопилоту (drone_id выбирает аппарат, по умолчанию - основной)"""
+        vehicle = self.get_vehicle(drone_id)
+        if vehicle is None:
+            logger.warning(f"Unknown drone for command {command}: {drone_id}")
+            return False
+        
+        params = dict(params or {})
+        if vehicle.system_id is not None:
+            params.setdefault('target_system', vehicle.system_id)
+            params.setdefault('target_component', vehicle.component_id)
+        return self.bridge.send_command(command, params)
     
-    def get_telemetry(self) -> Dict[str, Any]:
+    def get_telemetry(self, drone_id: Optional[str] = None) -> Dict[str, Any]:
         """Получение текущей телеметрии"""
-        return SerializationUtils.add_timestamp(self.telemetry.to_dict())
+        vehicle = self.get_vehicle(drone_id) or self.primary_vehicle
+        return SerializationUtils.add_timestamp(vehicle.snapshot())
     
     def get_connection_stats(self) -> Dict[str, Any]:
         """Получение статистики подключения"""
@@ -274,6 +475,8 @@ class ModularMAVLinkService:
                 'health': self.sync.health_check(),
                 'stats': self.sync.get_sync_stats()
             },
+            'router': self.router.get_router_stats(),
+            'telemetry': self.get_coalescing_stats(),
             'timestamp': time.time()
         }
     
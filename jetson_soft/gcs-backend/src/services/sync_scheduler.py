@@ -0,0 +1,195 @@
+"""
+Sync Scheduler - Adaptive upload pacing for the telemetry buffer
+Sizes batches from measured round-trip time and a bytes/sec budget,
+backs off with jitter while the uplink is down and drains backlogs in parallel
+"""
+
+import random
+import threading
+from typing import Dict, Any
+from dataclasses import dataclass, asdict
+
+
+@dataclass
+class SchedulerStats:
+    """Scheduler statistics"""
+    link_up: bool = True
+    batch_size: int = 0
+    in_flight: int = 0
+    rtt_ms: float = 0
+    bytes_per_record: float = 0
+    consecutive_failures: int = 0
+    backoff_seconds: float = 0
+    batches_sent: int = 0
+    batches_failed: int = 0
+    records_sent: int = 0
+    drain_rate: float = 0  # records acknowledged per second
+    backlog: int = 0
+    backlog_age_seconds: float = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class SyncScheduler:
+    """
+    Decides when to upload and how many records per batch
+
+    - Batch size: one bandwidth-delay product (budget * RTT) worth of records,
+      clamped to [min_batch, max_batch]
+    - Token bucket keeps the average upload rate within bandwidth_budget bytes/sec
+    - After a failure: exponential backoff with equal jitter, one probe batch at a time
+    - While a backlog drains: up to max_in_flight concurrent batches
+    - Without a backlog: one batch per sync_interval
+
+    All methods take the monotonic time as an argument; thread-safe.
+    """
+
+    def __init__(self,
+                 sync_interval: float = 5.0,
+                 bandwidth_budget: float = 64 * 1024,
+                 max_in_flight: int = 4,
+                 min_batch: int = 10,
+                 max_batch: int = 500,
+                 base_backoff: float = 1.0,
+                 max_backoff: float = 300.0,
+                 burst_seconds: float = 2.0):
+        self.sync_interval = sync_interval
+        self.bandwidth_budget = bandwidth_budget
+        self.max_in_flight = max_in_flight
+        self.min_batch = min_batch
+        self.max_batch = max_batch
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.bucket_size = bandwidth_budget * burst_seconds
+
+        self._lock = threading.Lock()
+        self._tokens = self.bucket_size
+        self._tokens_at = 0.0
+        self._last_dispatch = float('-inf')
+        self._backoff_until = 0.0
+
+        # Estimates (EWMA)
+        self._rtt = 0.5
+        self._compression = 1.0  # wire bytes / encoded row bytes
+        self._row_bytes = 100.0
+
+        # Drain rate window
+        self._rate_records = 0
+        self._rate_since = None
+
+        self.stats = SchedulerStats()
+        self.stats.batch_size = self.batch_size()
+
+    # ------------------------------------------------------------------
+    # Decisions
+    # ------------------------------------------------------------------
+
+    def batch_size(self) -> int:
+        """Records per batch: what the budget moves in one round trip"""
+        wire_per_record = max(1.0, self._row_bytes * self._compression)
+        size = int(self.bandwidth_budget * self._rtt / wire_per_record)
+        return max(self.min_batch, min(self.max_batch, size))
+
+    def in_flight_limit(self, backlog: int) -> int:
+        if not self.stats.link_up or backlog <= self.batch_size():
+            return 1
+        return self.max_in_flight
+
+    def can_dispatch(self, backlog: int, now: float) -> bool:
+        """Whether another batch may be started now"""
+        with self._lock:
+            self.stats.backlog = backlog
+            if backlog <= 0 or now < self._backoff_until:
+                return False
+            if self.stats.in_flight >= self.in_flight_limit(backlog):
+                return False
+            # Small backlog: keep the regular cadence so batches fill up
+            if backlog < self.batch_size() and now - self._last_dispatch < self.sync_interval:
+                return False
+            self._refill(now)
+            return self._tokens > 0
+
+    def next_delay(self, now: float, cap: float) -> float:
+        """Seconds until the next dispatch could be possible (at most cap)"""
+        with self._lock:
+            delay = cap
+            if now < self._backoff_until:
+                delay = min(delay, self._backoff_until - now)
+            else:
+                delay = min(delay, max(0.0, self._last_dispatch + self.sync_interval - now))
+                if self._tokens <= 0:
+                    delay = max(delay, -self._tokens / self.bandwidth_budget)
+            return max(0.01, min(delay, cap))
+
+    # ------------------------------------------------------------------
+    # Feedback
+    # ------------------------------------------------------------------
+
+    def on_dispatch(self, records: int, row_bytes: int, now: float):
+        """Batch handed to the uploader"""
+        with self._lock:
+            self._refill(now)
+            self._tokens -= row_bytes * self._compression
+            self._last_dispatch = now
+            self.stats.in_flight += 1
+            if records:
+                self._row_bytes += 0.2 * (row_bytes / records - self._row_bytes)
+
+    def on_result(self, success: bool, records: int, rtt: float, now: float):
+        """Batch finished; rtt is the upload duration in seconds"""
+        with self._lock:
+            stats = self.stats
+            stats.in_flight = max(0, stats.in_flight - 1)
+
+            if success:
+                self._rtt += 0.3 * (rtt - self._rtt)
+                stats.batches_sent += 1
+                stats.records_sent += records
+                stats.consecutive_failures = 0
+                stats.backoff_seconds = 0
+                stats.link_up = True
+                self._backoff_until = 0.0
+                self._rate_records += records
+            else:
+                stats.batches_failed += 1
+                stats.consecutive_failures += 1
+                stats.link_up = False
+                ceiling = min(self.max_backoff, self.base_backoff * 2 ** (stats.consecutive_failures - 1))
+                # Equal jitter: spread reconnect attempts without collapsing to zero
+                delay = ceiling / 2 + random.uniform(0, ceiling / 2)
+                stats.backoff_seconds = delay
+                self._backoff_until = now + delay
+
+            stats.rtt_ms = self._rtt * 1000
+            stats.batch_size = self.batch_size()
+
+    def observe_compression(self, wire_bytes: int, row_bytes: int):
+        """Measured wire size of uploaded rows (compression + framing)"""
+        if wire_bytes > 0 and row_bytes > 0:
+            with self._lock:
+                self._compression += 0.3 * (wire_bytes / row_bytes - self._compression)
+                self.stats.bytes_per_record = self._row_bytes * self._compression
+
+    def update_rates(self, backlog_age: float, now: float):
+        """Refresh drain rate (records/s, EWMA) and backlog age"""
+        with self._lock:
+            self.stats.backlog_age_seconds = backlog_age
+            if self._rate_since is None:
+                self._rate_since = now
+                return
+            elapsed = now - self._rate_since
+            if elapsed >= 1.0:
+                rate = self._rate_records / elapsed
+                self.stats.drain_rate += 0.5 * (rate - self.stats.drain_rate)
+                self._rate_records = 0
+                self._rate_since = now
+
+    def _refill(self, now: float):
+        if self._tokens_at:
+            self._tokens = min(self.bucket_size, self._tokens + (now - self._tokens_at) * self.bandwidth_budget)
+        self._tokens_at = now
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return self.stats.to_dict()
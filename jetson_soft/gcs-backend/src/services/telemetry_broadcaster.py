@@ -0,0 +1,256 @@
+"""
+Telemetry Broadcaster - Delta telemetry for SocketIO clients
+Each client receives only the fields that changed since its last frame,
+tagged with a sequence number, plus periodic keyframes for resync.
+Update rate, delta mode and wire encoding are chosen per client by a
+subscription message.
+"""
+
+import time
+import logging
+import threading
+from typing import Dict, Any, Callable, Optional, Tuple, Iterable
+from dataclasses import dataclass, asdict
+
+from ..utils import wire_codec
+
+logger = logging.getLogger(__name__)
+
+Sections = Dict[str, Dict[str, Any]]
+
+_MISSING = object()
+
+
+@dataclass
+class BroadcasterStats:
+    """Broadcast statistics"""
+    clients: int = 0
+    snapshots: int = 0
+    frames_sent: int = 0
+    keyframes_sent: int = 0
+    unchanged_skipped: int = 0
+    bytes_sent: int = 0
+    bytes_full: int = 0  # What the same frames would cost as full JSON snapshots
+
+    def to_dict(self) -> Dict[str, Any]:
+        stats = asdict(self)
+        stats['reduction'] = self.bytes_full / self.bytes_sent if self.bytes_sent else 0.0
+        return stats
+
+
+class _Client:
+    __slots__ = ('sid', 'interval', 'delta', 'encoding', 'next_due', 'next_keyframe', 'last', 'last_seq')
+
+    def __init__(self, sid: str, interval: float, delta: bool, encoding: str):
+        self.sid = sid
+        self.interval = interval
+        self.delta = delta
+        self.encoding = encoding
+        self.next_due = 0.0
+        self.next_keyframe = 0.0
+        self.last: Optional[Sections] = None
+        self.last_seq = 0
+
+
+class TelemetryBroadcaster:
+    """
+    Per-client delta broadcaster
+
+    Frame: {'seq', 'keyframe' | 'base', <section>: {changed fields}, 'timestamp'}
+    - keyframe: every section in full
+    - delta: only changed fields (removed fields as None); applies on top of
+      the frame whose seq equals base, otherwise the client asks for a resync
+    - a delta client gets nothing while nothing changed
+    - sections listed in section_intervals (connection counters by default)
+      are refreshed at most once per interval for everyone
+    - JSON clients get the frame dict; MessagePack/CBOR clients get it encoded
+      as bytes (one binary Socket.IO attachment)
+    """
+
+    def __init__(self,
+                 emit: Callable[[str, Dict[str, Any], str], None],
+                 event: str = 'telemetry_update',
+                 default_rate: float = 10.0,
+                 min_rate: float = 0.2,
+                 max_rate: float = 20.0,
+                 keyframe_interval: float = 5.0,
+                 volatile_fields: Iterable[str] = ('timestamp',),
+                 section_intervals: Optional[Dict[str, float]] = None):
+        self.emit = emit
+        self.event = event
+        self.default_rate = default_rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.keyframe_interval = keyframe_interval
+        # Changing on every snapshot; sent with keyframes only
+        self.volatile_fields = frozenset(volatile_fields)
+        self.section_intervals = {'connection': 1.0} if section_intervals is None else section_intervals
+
+        self._clients: Dict[str, _Client] = {}
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._published: Sections = {}
+        self._section_at: Dict[str, float] = {}
+        self.stats = BroadcasterStats()
+
+    # ------------------------------------------------------------------
+    # Subscriptions
+    # ------------------------------------------------------------------
+
+    def subscribe(self, sid: str, rate: Optional[float] = None, delta: bool = False,
+                  encoding: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Add or update client subscription; returns the effective settings
+        Full snapshots unless the client opts in to delta frames (existing consumers
+        of telemetry_update expect every field in every frame)
+        """
+        rate = max(self.min_rate, min(self.max_rate, float(rate or self.default_rate)))
+        encoding = wire_codec.negotiate(encoding)
+        with self._lock:
+            client = self._clients.get(sid)
+            if client is None:
+                client = self._clients[sid] = _Client(sid, 1.0 / rate, delta, encoding)
+            else:
+                client.interval = 1.0 / rate
+                client.delta = delta
+                client.encoding = encoding
+                client.last = None  # Next frame is a keyframe
+            client.next_due = 0.0
+            self.stats.clients = len(self._clients)
+        return {
+            'rate': rate,
+            'delta': delta,
+            'encoding': encoding,
+            'encodings': wire_codec.available_encodings(),
+            'keyframe_interval': self.keyframe_interval
+        }
+
+    def unsubscribe(self, sid: str):
+        with self._lock:
+            self._clients.pop(sid, None)
+            self.stats.clients = len(self._clients)
+
+    def request_keyframe(self, sid: str):
+        """Client lost track of the sequence: send everything with the next frame"""
+        with self._lock:
+            client = self._clients.get(sid)
+            if client:
+                client.last = None
+                client.next_due = 0.0
+
+    @property
+    def client_count(self) -> int:
+        return len(self._clients)
+
+    def tick_interval(self) -> float:
+        """Snapshot period needed by the fastest client"""
+        with self._lock:
+            intervals = [client.interval for client in self._clients.values()]
+        return min(intervals) if intervals else 1.0 / self.default_rate
+
+    # ------------------------------------------------------------------
+    # Broadcast
+    # ------------------------------------------------------------------
+
+    def publish(self, sections: Sections, now: Optional[float] = None) -> int:
+        """Send the snapshot to every client that is due; returns frames sent"""
+        now = time.monotonic() if now is None else now
+        timestamp = time.time()
+        # Clients keep a reference to the snapshot they received: never mutate it
+        snapshot = {name: dict(values) for name, values in sections.items()}
+
+        with self._lock:
+            # Throttled section not due yet: keep the published version (diffs to nothing)
+            for name, interval in self.section_intervals.items():
+                if name in snapshot and name in self._published and now - self._section_at[name] < interval:
+                    snapshot[name] = self._published[name]
+                else:
+                    self._section_at[name] = now
+            self._published = snapshot
+            
+            self._seq += 1
+            seq = self._seq
+            self.stats.snapshots += 1
+            # Small tolerance: the caller's sleep jitters around the client interval
+            due = [client for client in self._clients.values()
+                   if now >= client.next_due - client.interval * 0.1]
+
+        # Clients with the same base and encoding share one frame
+        frames: Dict[Tuple[int, bool, str], Optional[Tuple[Any, int]]] = {}
+
+        def frame_for(base: int, last: Optional[Sections], keyframe: bool, encoding: str):
+            key = (0 if keyframe else base, keyframe, encoding)
+            if key not in frames:
+                if encoding == wire_codec.DEFAULT_ENCODING:
+                    frames[key] = self._build_frame(snapshot, last, base, seq, keyframe, timestamp)
+                else:
+                    built = frame_for(base, last, keyframe, wire_codec.DEFAULT_ENCODING)
+                    if built is not None:
+                        encoded = wire_codec.encode(built[0], encoding)
+                        built = (encoded, len(encoded))
+                    frames[key] = built
+            return frames[key]
+
+        sent = 0
+        for client in due:
+            keyframe = client.last is None or not client.delta or now >= client.next_keyframe
+            built = frame_for(client.last_seq, client.last, keyframe, client.encoding)
+            # Keep the client's phase; restart it after a stall
+            if now - client.next_due < client.interval:
+                client.next_due += client.interval
+            else:
+                client.next_due = now + client.interval
+            if built is None:
+                self.stats.unchanged_skipped += 1
+                continue
+
+            frame, size = built
+            try:
+                self.emit(self.event, frame, client.sid)
+            except Exception as e:
+                logger.error(f"Telemetry emit error ({client.sid}): {e}")
+                continue
+
+            client.last = snapshot
+            client.last_seq = seq
+            if keyframe:
+                client.next_keyframe = now + self.keyframe_interval
+                self.stats.keyframes_sent += 1
+            self.stats.frames_sent += 1
+            self.stats.bytes_sent += size
+            self.stats.bytes_full += frame_for(0, None, True, wire_codec.DEFAULT_ENCODING)[1]
+            sent += 1
+
+        return sent
+
+    def _build_frame(self, snapshot: Sections, last: Optional[Sections], base: int, seq: int,
+                     keyframe: bool, timestamp: float) -> Optional[Tuple[Dict[str, Any], int]]:
+        """(frame, JSON size) or None for a delta without changes"""
+        frame: Dict[str, Any] = {'seq': seq}
+        if keyframe:
+            frame['keyframe'] = True
+            frame.update(snapshot)
+        else:
+            frame['base'] = base
+            changed = False
+            for name, values in snapshot.items():
+                diff = self._diff(last.get(name, {}), values)
+                if diff:
+                    frame[name] = diff
+                    changed = True
+            if not changed:
+                return None
+        frame['timestamp'] = timestamp
+        return frame, len(wire_codec.encode(frame))
+
+    def _diff(self, old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+        volatile = self.volatile_fields
+        diff = {key: value for key, value in new.items()
+                if key not in volatile and old.get(key, _MISSING) != value}
+        for key in old:
+            if key not in new and key not in volatile:
+                diff[key] = None
+        return diff
+
+    def get_stats(self) -> Dict[str, Any]:
+        return self.stats.to_dict()
@@ -3,31 +3,79 @@ Telemetry Buffer Service - Store-and-Forward Telemetry Management
 Handles telemetry buffering, persistence, and sync with central server
 """
 
-import time
 import json
+import time
 import threading
 import logging
-from typing import Dict, Any, List, Optional, Deque
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Dict, Any, List, Optional, Deque, Set
 from collections import deque
 from dataclasses import dataclass, asdict
 from pathlib import Path
 
 from ..utils.serialization import SerializationUtils
+from ..utils.segment_log import SegmentedLog
+from ..utils.telemetry_codec import encode_row, decode_row, decode_header, check_row
+from .sync_scheduler import SyncScheduler
 
 logger = logging.getLogger(__name__)
 
 
-@dataclass
 class TelemetryRecord:
-    """Single telemetry record"""
-    timestamp: float
-    drone_id: str
-    data: Dict[str, Any]
-    synced: bool = False
-    retry_count: int = 0
+    """
+    Single telemetry record
+    Telemetry is held as a packed row (utils.telemetry_codec); data is decoded on access
+    """
+    
+    __slots__ = ('payload', 'synced', 'retry_count', 'seq', 'in_flight')
+    
+    def __init__(self,
+                 timestamp: float = 0.0,
+                 drone_id: str = "",
+                 data: Optional[Dict[str, Any]] = None,
+                 synced: bool = False,
+                 retry_count: int = 0,
+                 seq: int = 0,
+                 payload: Optional[bytes] = None):
+        self.payload = payload if payload is not None else encode_row(timestamp, drone_id, data or {})
+        self.synced = synced
+        self.retry_count = retry_count
+        self.seq = seq
+        self.in_flight = False
+    
+    @classmethod
+    def from_payload(cls, payload: bytes, seq: int = 0) -> 'TelemetryRecord':
+        """Wrap an already packed row (raises ValueError for unknown schema versions)"""
+        check_row(payload)
+        return cls(payload=payload, seq=seq)
+    
+    @property
+    def timestamp(self) -> float:
+        return decode_header(self.payload)[0]
+    
+    @property
+    def drone_id(self) -> str:
+        return decode_header(self.payload)[1]
+    
+    @property
+    def data(self) -> Dict[str, Any]:
+        return decode_row(self.payload)[2]
+    
+    @property
+    def size(self) -> int:
+        """Encoded size in bytes"""
+        return len(self.payload)
     
     def to_dict(self) -> Dict[str, Any]:
-        return asdict(self)
+        timestamp, drone_id, data = decode_row(self.payload)
+        return {
+            'timestamp': timestamp,
+            'drone_id': drone_id,
+            'data': data,
+            'synced': self.synced,
+            'retry_count': self.retry_count,
+            'seq': self.seq
+        }
 
 
 @dataclass
@@ -39,35 +87,155 @@ class BufferStats:
     last_sync_time: float = 0
     sync_failures: int = 0
     buffer_size_mb: float = 0
+    dropped_records: int = 0
     
     def to_dict(self) -> Dict[str, Any]:
         return asdict(self)
 
 
+# Sync attempts before a record is moved to the failed buffer
+MAX_SYNC_RETRIES = 3
+
+
+class TelemetryRing:
+    """
+    Fixed-capacity ring of records addressed by ever-increasing sequence numbers
+    
+    Single producer: append() takes no lock and overwrites the oldest slot when full.
+    Readers copy a range and drop whatever the producer lapped while they were copying.
+    nbytes is the encoded size of the held records, maintained by the producer.
+    """
+    
+    def __init__(self, capacity: int, start_seq: int = 0):
+        self.capacity = capacity
+        self._slots: List[Optional[TelemetryRecord]] = [None] * capacity
+        self.write_seq = start_seq  # next sequence number (written by producer only)
+        self.nbytes = 0
+    
+    @property
+    def oldest_seq(self) -> int:
+        """Oldest sequence number still held"""
+        return max(0, self.write_seq - self.capacity)
+    
+    def __len__(self) -> int:
+        return min(self.write_seq, self.capacity)
+    
+    def append(self, record: TelemetryRecord) -> int:
+        """Store record (producer only); returns its sequence number"""
+        seq = self.write_seq
+        record.seq = seq
+        index = seq % self.capacity
+        evicted = self._slots[index]
+        self._slots[index] = record
+        self.nbytes += len(record.payload) - (len(evicted.payload) if evicted is not None else 0)
+        self.write_seq = seq + 1  # publish after the slot is filled
+        return seq
+    
+    def get(self, seq: int) -> Optional[TelemetryRecord]:
+        """Record by sequence number, None if not written yet or overwritten"""
+        if seq < self.oldest_seq or seq >= self.write_seq:
+            return None
+        record = self._slots[seq % self.capacity]
+        return record if record is not None and record.seq == seq else None
+    
+    def read(self, start: int, stop: int) -> List[TelemetryRecord]:
+        """Copy records with start <= seq < stop that are still held"""
+        capacity = self.capacity
+        write_seq = self.write_seq
+        stop = min(stop, write_seq)
+        start = max(start, write_seq - capacity, 0)
+        if start >= stop:
+            return []
+        
+        first, last = start % capacity, stop % capacity
+        if first < last:
+            records = self._slots[first:last]
+        else:
+            records = self._slots[first:] + self._slots[:last]
+        
+        # Producer may have lapped the start of the range during the copy
+        lapped = self.write_seq - capacity - start
+        if lapped > 0:
+            records = records[lapped:]
+        
+        # Replay after a torn log can leave unused slots
+        if None in records:
+            records = [r for r in records if r is not None]
+        return records
+    
+    def snapshot(self) -> List[TelemetryRecord]:
+        """All held records, oldest first"""
+        return self.read(0, self.write_seq)
+
+
 class TelemetryBuffer:
     """
     Store-and-forward telemetry buffer with persistence
     Handles connection loss gracefully
+    
+    Records live in a TelemetryRing. Positions (sequence numbers):
+    ack cursor <= sync cursor <= write position
+    - [ack, sync)  handed out to the sync loop, waiting for mark_synced/mark_failed
+    - [sync, write) not handed out yet, except the live tail sent ahead of a backlog
+    add_telemetry never takes the lock; the lock only serializes cursor updates
+    
+    Every record is also appended to a segmented write-ahead log next to
+    buffer_file (<name>.wal/); the sync loop fsyncs it in batches and
+    checkpoints the ack position so acknowledged segments are deleted.
+    A JSON buffer_file left by older versions is imported into the log once
+    
+    Uploads go through the attached CentralServerSync, paced by a SyncScheduler
+    (batch size from RTT and bandwidth_budget, backoff, parallel backlog drain)
     """
     
     def __init__(self, 
                  max_memory_records: int = 1000,
                  max_file_records: int = 10000,
                  buffer_file: str = "/tmp/telemetry_buffer.json",
-                 sync_interval: float = 5.0):
+                 sync_interval: float = 5.0,
+                 fsync_interval: float = 1.0,
+                 segment_size: int = 4 * 1024 * 1024,
+                 sync_client=None,
+                 bandwidth_budget: float = 64 * 1024,
+                 max_in_flight: int = 4,
+                 max_batch_records: int = 500):
         
         # Configuration
         self.max_memory_records = max_memory_records
         self.max_file_records = max_file_records
         self.buffer_file = Path(buffer_file)
+        self.log_dir = self.buffer_file.with_suffix('.wal')
         self.sync_interval = sync_interval
+        self.fsync_interval = fsync_interval
         
         # Buffer storage
-        self.memory_buffer: Deque[TelemetryRecord] = deque(maxlen=max_memory_records)
+        self._ring = TelemetryRing(max_memory_records)
+        self._sync_cursor = 0
+        self._ack_cursor = 0
+        self._live_cursor = 0
+        self._retry_queue: Deque[TelemetryRecord] = deque()
         self.failed_buffer: Deque[TelemetryRecord] = deque(maxlen=100)
         
-        # Threading
+        # Write-ahead log; records overwritten in memory before sync stay on disk from here
+        self._log = SegmentedLog(self.log_dir, segment_size=segment_size)
+        self._overrun_seq: Optional[int] = None
+        
+        # Uplink (CentralServerSync or anything with sync_telemetry_batch)
+        self.sync_client = sync_client
+        self.scheduler = SyncScheduler(
+            sync_interval=sync_interval,
+            bandwidth_budget=bandwidth_budget,
+            max_in_flight=max_in_flight,
+            max_batch=max_batch_records
+        )
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._uploads: Set[Future] = set()
+        self._uploaded_row_bytes = 0
+        self._client_bytes_sent: Optional[int] = None
+        
+        # Threading (consumer side only)
         self._lock = threading.RLock()
+        self._wakeup = threading.Event()
         self._sync_thread: Optional[threading.Thread] = None
         self._running = False
         
@@ -75,7 +243,8 @@ class TelemetryBuffer:
         self.stats = BufferStats()
         
         # Persistence
-        self._load_from_file()
+        self._import_json_buffer()
+        self._replay_log()
         
         # Start background sync
         self.start()
@@ -86,6 +255,10 @@ class TelemetryBuffer:
             return
         
         self._running = True
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.scheduler.max_in_flight,
+            thread_name_prefix="Telemetry-Upload"
+        )
         self._sync_thread = threading.Thread(
             target=self._sync_loop,
             name="Telemetry-Sync-Loop",
@@ -97,76 +270,141 @@ class TelemetryBuffer:
     def stop(self):
         """Stop background synchronization"""
         self._running = False
+        self._wakeup.set()
         
         if self._sync_thread and self._sync_thread.is_alive():
             self._sync_thread.join(timeout=3.0)
         
-        self._save_to_file()
+        # Uploads still queued are dropped; their records stay unacknowledged in the log
+        for future in list(self._uploads):
+            future.cancel()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        
+        self._persist()
+        self._log.close()
         logger.info("🛑 Telemetry buffer service stopped")
     
+    def attach_sync_client(self, sync_client):
+        """Upload through sync_client.sync_telemetry_batch (CentralServerSync)"""
+        self.sync_client = sync_client
+        self._client_bytes_sent = None
+        self._wakeup.set()
+    
+    @property
+    def memory_buffer(self) -> List[TelemetryRecord]:
+        """Snapshot of records held in memory, oldest first"""
+        return self._ring.snapshot()
+    
     def add_telemetry(self, drone_id: str, telemetry_data: Dict[str, Any]):
-        """Add telemetry record to buffer"""
+        """Add telemetry record to buffer (single producer, lock-free)"""
         record = TelemetryRecord(
             timestamp=time.time(),
             drone_id=drone_id,
             data=SerializationUtils.sanitize_telemetry(telemetry_data)
         )
         
-        with self._lock:
-            self.memory_buffer.append(record)
-            self.stats.total_records += 1
-            self.stats.pending_sync += 1
+        ring = self._ring
+        seq = ring.append(record)
+        self._log.append(seq, record.payload)
+        self.stats.total_records += 1
+        self.stats.pending_sync = ring.write_seq - max(self._ack_cursor, ring.oldest_seq) + len(self._retry_queue)
         
         logger.debug(f"📊 Telemetry added for drone {drone_id}")
     
     def get_latest_telemetry(self, drone_id: Optional[str] = None, count: int = 10) -> List[Dict[str, Any]]:
-        """Get latest telemetry records"""
+        """Get latest telemetry records (snapshot read, never blocks the producer)"""
+        ring = self._ring
+        
+        if not drone_id:
+            write_seq = ring.write_seq
+            return [r.to_dict() for r in ring.read(write_seq - count, write_seq)]
+        
+        latest = []
+        for record in reversed(ring.snapshot()):
+            if record.drone_id == drone_id:
+                latest.append(record)
+                if len(latest) == count:
+                    break
+        return [r.to_dict() for r in reversed(latest)]
+    
+    def get_pending_records(self, max_count: int = 50, newest_first: bool = False) -> List[TelemetryRecord]:
+        """
+        Hand out records for synchronization (advances the sync cursor)
+        newest_first: start with records added since the previous live batch,
+        then continue the backlog from the sync cursor
+        """
         with self._lock:
-            records = list(self.memory_buffer)
+            ring = self._ring
+            records = []
             
-            if drone_id:
-                records = [r for r in records if r.drone_id == drone_id]
+            if newest_first:
+                write_seq = ring.write_seq
+                start = max(self._live_cursor, self._sync_cursor, write_seq - max_count, ring.oldest_seq)
+                if start < write_seq:
+                    records.extend(r for r in ring.read(start, write_seq) if not (r.synced or r.in_flight))
+                    self._live_cursor = write_seq
             
-            # Return most recent records
-            latest = records[-count:] if len(records) > count else records
-            return [r.to_dict() for r in latest]
-    
-    def get_pending_records(self, max_count: int = 50) -> List[TelemetryRecord]:
-        """Get records pending synchronization"""
-        with self._lock:
-            pending = [r for r in self.memory_buffer if not r.synced]
-            return pending[:max_count]
+            while self._retry_queue and len(records) < max_count:
+                records.append(self._retry_queue.popleft())
+            
+            if len(records) < max_count:
+                start = max(self._sync_cursor, ring.oldest_seq)
+                batch = ring.read(start, start + max_count - len(records))
+                if batch:
+                    self._sync_cursor = batch[-1].seq + 1
+                    # After a rewind (or a live batch) the range may contain records already sent
+                    fresh = [r for r in batch if not (r.synced or r.in_flight)]
+                    records.extend(fresh)
+                    if len(fresh) < len(batch):
+                        # Skipped records may already be settled: let the ack cursor pass them
+                        self._advance_ack_cursor()
+            
+            for record in records:
+                record.in_flight = True
+            return records
     
     def mark_synced(self, records: List[TelemetryRecord]):
         """Mark records as successfully synced"""
         with self._lock:
             synced_count = 0
             for record in records:
+                record.in_flight = False
                 if not record.synced:
                     record.synced = True
                     synced_count += 1
             
-            self.stats.pending_sync = max(0, self.stats.pending_sync - synced_count)
+            self._advance_ack_cursor()
             self.stats.last_sync_time = time.time()
         
         logger.debug(f"✅ Marked {synced_count} records as synced")
     
-    def mark_failed(self, records: List[TelemetryRecord]):
-        """Mark records as failed to sync"""
+    def mark_failed(self, records: List[TelemetryRecord], count_retry: bool = True):
+        """Mark records as failed to sync (count_retry=False: link outage, not the records' fault)"""
         with self._lock:
+            ring = self._ring
+            rewind = None
+            
             for record in records:
-                record.retry_count += 1
+                record.in_flight = False
+                if count_retry:
+                    record.retry_count += 1
                 
                 # Move to failed buffer if too many retries
-                if record.retry_count >= 3:
+                if record.retry_count >= MAX_SYNC_RETRIES:
                     self.failed_buffer.append(record)
-                    try:
-                        self.memory_buffer.remove(record)
-                        self.stats.failed_sync += 1
-                        self.stats.pending_sync = max(0, self.stats.pending_sync - 1)
-                    except ValueError:
-                        pass  # Record already removed
+                    self.stats.failed_sync += 1
+                elif ring.get(record.seq) is record:
+                    # Still in the ring: send again from its position
+                    rewind = record.seq if rewind is None else min(rewind, record.seq)
+                else:
+                    self._retry_queue.append(record)
             
+            if rewind is not None:
+                self._sync_cursor = min(self._sync_cursor, rewind)
+            
+            self._advance_ack_cursor()
             self.stats.sync_failures += 1
         
         logger.warning(f"❌ Marked {len(records)} records as failed")
@@ -174,169 +412,259 @@ class TelemetryBuffer:
     def retry_failed_records(self) -> List[TelemetryRecord]:
         """Get failed records for retry"""
         with self._lock:
-            # Reset retry count and move back to main buffer
+            # Reset retry count and queue ahead of the ring
             retry_records = []
             while self.failed_buffer and len(retry_records) < 10:
                 record = self.failed_buffer.popleft()
                 record.retry_count = 0
                 record.synced = False
-                self.memory_buffer.append(record)
+                self._retry_queue.append(record)
                 retry_records.append(record)
                 
                 self.stats.failed_sync = max(0, self.stats.failed_sync - 1)
-                self.stats.pending_sync += 1
             
+            self._update_pending()
             return retry_records
     
+    def _advance_ack_cursor(self):
+        """Move ack cursor over settled records (O(records acked))"""
+        ring = self._ring
+        oldest = ring.oldest_seq
+        ack = self._ack_cursor
+        
+        if ack < oldest:
+            # Producer overwrote records before they were acknowledged
+            self.stats.dropped_records += oldest - ack
+            if self._overrun_seq is None:
+                self._overrun_seq = ack
+            ack = oldest
+            self._sync_cursor = max(self._sync_cursor, oldest)
+        
+        while ack < self._sync_cursor:
+            record = ring.get(ack)
+            if record is None or not (record.synced or record.retry_count >= MAX_SYNC_RETRIES):
+                break
+            ack += 1
+        
+        self._ack_cursor = ack
+        self._update_pending()
+    
+    def _update_pending(self):
+        ring = self._ring
+        self.stats.pending_sync = ring.write_seq - max(self._ack_cursor, ring.oldest_seq) + len(self._retry_queue)
+    
     def _sync_loop(self):
-        """Background synchronization loop"""
+        """Background synchronization loop (uploads paced by the scheduler, log fsync batching)"""
+        persist_interval = min(self.sync_interval, self.fsync_interval)
+        next_persist = 0.0
         while self._running:
+            now = time.monotonic()
             try:
-                self._attempt_sync()
-                
-                # Update buffer statistics
-                self._update_stats()
+                self._dispatch_uploads(now)
                 
-                # Periodic cleanup
-                self._cleanup_old_records()
-                
-                # Save to file periodically
-                if self.stats.total_records % 100 == 0:
-                    self._save_to_file()
+                # One fsync per batch of appended records
+                if now >= next_persist:
+                    next_persist = now + persist_interval
+                    self._persist()
+                    
+                    # Update buffer statistics
+                    self._update_stats()
                 
             except Exception as e:
                 logger.error(f"Sync loop error: {e}")
             
-            time.sleep(self.sync_interval)
+            # Woken early when an upload completes
+            self._wakeup.wait(self.scheduler.next_delay(now, persist_interval))
+            self._wakeup.clear()
     
-    def _attempt_sync(self):
-        """Attempt to sync pending records"""
-        pending_records = self.get_pending_records()
-        
-        if not pending_records:
+    def _backlog(self) -> int:
+        """Records not handed out yet"""
+        ring = self._ring
+        return ring.write_seq - max(self._sync_cursor, ring.oldest_seq) + len(self._retry_queue)
+    
+    def _dispatch_uploads(self, now: float):
+        """Start as many batches as the scheduler allows"""
+        if self.sync_client is None or self._executor is None:
             return
         
-        # Simulate sync to central server (replace with actual implementation)
-        success = self._sync_to_central_server(pending_records)
-        
-        if success:
-            self.mark_synced(pending_records)
-        else:
-            self.mark_failed(pending_records)
+        scheduler = self.scheduler
+        while scheduler.can_dispatch(self._backlog(), now):
+            size = scheduler.batch_size()
+            records = self.get_pending_records(size, newest_first=self._backlog() > size)
+            if not records:
+                break
             
-            # Retry some failed records
-            retry_records = self.retry_failed_records()
-            if retry_records:
-                logger.info(f"🔄 Retrying {len(retry_records)} failed records")
+            row_bytes = sum(r.size for r in records)
+            scheduler.on_dispatch(len(records), row_bytes, now)
+            future = self._executor.submit(self._upload_batch, records, row_bytes)
+            self._uploads.add(future)
+            future.add_done_callback(self._uploads.discard)
     
-    def _sync_to_central_server(self, records: List[TelemetryRecord]) -> bool:
-        """
-        Sync records to central server (Supabase)
-        Replace this with actual implementation
-        """
+    def _upload_batch(self, records: List[TelemetryRecord], row_bytes: int):
+        """Upload one batch (upload thread)"""
+        started = time.monotonic()
         try:
-            # This would be actual sync logic to Supabase
-            # For now, simulate success/failure
-            sync_data = [r.to_dict() for r in records]
-            
-            # Simulate network condition
-            import random
-            success_rate = 0.9  # 90% success rate
-            return random.random() < success_rate
-            
+            success = self._sync_to_central_server(records)
         except Exception as e:
             logger.error(f"Central server sync error: {e}")
+            success = False
+        finished = time.monotonic()
+        
+        if success:
+            self.mark_synced(records)
+            with self._lock:
+                self._uploaded_row_bytes += row_bytes
+            # Link is back: give records that ran out of retries another chance
+            if self.failed_buffer:
+                retry_records = self.retry_failed_records()
+                logger.info(f"🔄 Retrying {len(retry_records)} failed records")
+        else:
+            # Probes during a known outage do not use up the records' retries
+            self.mark_failed(records, count_retry=self.scheduler.stats.link_up)
+        
+        self.scheduler.on_result(success, len(records), finished - started, finished)
+        self._wakeup.set()
+    
+    def _sync_to_central_server(self, records: List[TelemetryRecord]) -> bool:
+        """Sync records to central server (Supabase ingest-telemetry function)"""
+        sync_client = self.sync_client
+        if sync_client is None:
             return False
+        return sync_client.sync_telemetry_batch([decode_row(r.payload) for r in records])
     
     def _update_stats(self):
-        """Update buffer statistics"""
-        with self._lock:
-            self.stats.pending_sync = len([r for r in self.memory_buffer if not r.synced])
-            self.stats.failed_sync = len(self.failed_buffer)
-            
-            # Calculate buffer size
-            total_size = 0
-            for record in self.memory_buffer:
-                total_size += len(json.dumps(record.to_dict()).encode('utf-8'))
-            
-            self.stats.buffer_size_mb = total_size / (1024 * 1024)
+        """Update buffer statistics (sizes come from encoded byte lengths)"""
+        ring = self._ring
+        self.stats.failed_sync = len(self.failed_buffer)
+        self.stats.buffer_size_mb = ring.nbytes / (1024 * 1024)
+        
+        # Wire bytes per encoded row byte, from the client's own counter
+        bytes_sent = getattr(getattr(self.sync_client, 'stats', None), 'bytes_sent', None)
+        if isinstance(bytes_sent, int):
+            with self._lock:
+                row_bytes, self._uploaded_row_bytes = self._uploaded_row_bytes, 0
+            if self._client_bytes_sent is not None:
+                self.scheduler.observe_compression(bytes_sent - self._client_bytes_sent, row_bytes)
+            self._client_bytes_sent = bytes_sent
+        
+        # Age of the oldest record not acknowledged yet
+        oldest = ring.get(max(self._ack_cursor, ring.oldest_seq))
+        backlog_age = time.time() - oldest.timestamp if oldest is not None and not oldest.synced else 0.0
+        self.scheduler.update_rates(backlog_age, time.monotonic())
     
-    def _cleanup_old_records(self):
-        """Remove old synced records to save memory"""
+    def _durable_ack(self) -> int:
+        """Log position below which records are no longer needed"""
         with self._lock:
-            # Remove synced records older than 1 hour
-            cutoff_time = time.time() - 3600
-            
-            to_remove = []
-            for record in self.memory_buffer:
-                if record.synced and record.timestamp < cutoff_time:
-                    to_remove.append(record)
-            
-            for record in to_remove:
-                try:
-                    self.memory_buffer.remove(record)
-                except ValueError:
-                    pass
+            floor = self._ack_cursor
+            if self._overrun_seq is not None:
+                floor = min(floor, self._overrun_seq)
+            for record in list(self.failed_buffer) + list(self._retry_queue):
+                floor = min(floor, record.seq)
+        
+        # Cap on-disk backlog
+        return max(floor, self._log.write_seq - self.max_file_records)
     
-    def _save_to_file(self):
-        """Save buffer to file for persistence"""
+    def _persist(self):
+        """Fsync appended records and checkpoint the ack position (deletes acked segments)"""
         try:
-            with self._lock:
-                buffer_data = {
-                    'memory_buffer': [r.to_dict() for r in self.memory_buffer],
-                    'failed_buffer': [r.to_dict() for r in self.failed_buffer],
-                    'stats': self.stats.to_dict(),
-                    'saved_at': time.time()
-                }
-            
-            with open(self.buffer_file, 'w') as f:
-                json.dump(buffer_data, f)
-            
-            logger.debug(f"💾 Buffer saved to {self.buffer_file}")
-            
+            self._log.sync()
+            self._log.checkpoint(self._durable_ack())
         except Exception as e:
-            logger.error(f"Failed to save buffer: {e}")
+            logger.error(f"Failed to persist buffer: {e}")
     
-    def _load_from_file(self):
-        """Load buffer from file"""
-        if not self.buffer_file.exists():
+    def _import_json_buffer(self):
+        """Move unsynced records from a JSON buffer_file (older versions) into the log, then remove it"""
+        if not self.buffer_file.is_file() or self.buffer_file.stat().st_size == 0:
             return
         
         try:
             with open(self.buffer_file, 'r') as f:
                 buffer_data = json.load(f)
             
-            # Restore buffers
-            for record_data in buffer_data.get('memory_buffer', []):
-                record = TelemetryRecord(**record_data)
-                self.memory_buffer.append(record)
+            records = [record for record in buffer_data.get('memory_buffer', []) + buffer_data.get('failed_buffer', [])
+                       if not record.get('synced')]
+            records.sort(key=lambda record: record.get('timestamp', 0.0))
             
-            for record_data in buffer_data.get('failed_buffer', []):
-                record = TelemetryRecord(**record_data)
-                self.failed_buffer.append(record)
+            # Continue after records already in the log (checkpoint may lag behind the segments)
+            replayed = self._log.stats.records_replayed
+            for _ in self._log.replay():
+                pass
+            self._log.stats.records_replayed = replayed
             
-            # Restore stats
-            stats_data = buffer_data.get('stats', {})
-            for key, value in stats_data.items():
-                if hasattr(self.stats, key):
-                    setattr(self.stats, key, value)
+            seq = self._log.write_seq
+            for record in records:
+                self._log.append(seq, encode_row(record.get('timestamp', 0.0), record.get('drone_id', ''),
+                                                 record.get('data') or {}))
+                seq += 1
+            self._log.sync()
             
-            logger.info(f"📂 Buffer loaded from {self.buffer_file}")
+            self.buffer_file.unlink()
+            logger.info(f"📂 Imported {len(records)} unsynced records from {self.buffer_file} into {self.log_dir}")
+            
+        except Exception as e:
+            logger.error(f"Failed to import buffer file {self.buffer_file}: {e}")
+    
+    def _replay_log(self):
+        """Load unacknowledged records from the log (only unacked segments are read)"""
+        try:
+            ring = None
+            replayed = skipped = 0
+            for seq, payload in self._log.replay():
+                try:
+                    record = TelemetryRecord.from_payload(payload)
+                except ValueError:
+                    skipped += 1
+                    continue
+                if ring is None:
+                    ring = TelemetryRing(self.max_memory_records, start_seq=seq)
+                # Keep ring positions equal to log positions
+                ring.write_seq = max(ring.write_seq, seq)
+                ring.append(record)
+                replayed += 1
+            
+            start_seq = max(self._log.write_seq, self._log.acked_seq)
+            if ring is None:
+                ring = TelemetryRing(self.max_memory_records, start_seq=start_seq)
+            elif ring.oldest_seq > self._log.acked_seq:
+                # More backlog than memory: the rest stays on disk until next start
+                self._overrun_seq = self._log.acked_seq
+            
+            ring.write_seq = max(ring.write_seq, start_seq)
+            self._ring = ring
+            self._sync_cursor = self._ack_cursor = ring.oldest_seq if replayed else ring.write_seq
+            self._live_cursor = ring.write_seq
+            self.stats.total_records = self._log.write_seq
+            self._update_pending()
+            
+            if replayed:
+                logger.info(f"📂 Replayed {replayed} unsynced records from {self.log_dir}")
+            if skipped:
+                logger.warning(f"⚠️ Skipped {skipped} log records with unsupported format")
             
         except Exception as e:
             logger.error(f"Failed to load buffer: {e}")
     
     def get_buffer_stats(self) -> Dict[str, Any]:
         """Get buffer statistics"""
-        return SerializationUtils.add_timestamp(self.stats.to_dict())
+        self._update_stats()
+        stats = self.stats.to_dict()
+        stats['log'] = self._log.stats.to_dict()
+        stats['scheduler'] = self.scheduler.get_stats()
+        return SerializationUtils.add_timestamp(stats)
     
     def clear_buffer(self):
         """Clear all buffer data"""
         with self._lock:
-            self.memory_buffer.clear()
+            write_seq = self._ring.write_seq
+            self._ring = TelemetryRing(self.max_memory_records, start_seq=write_seq)
+            self._sync_cursor = self._ack_cursor = self._live_cursor = write_seq
+            self._overrun_seq = None
+            self._retry_queue.clear()
             self.failed_buffer.clear()
             self.stats = BufferStats()
         
+        self._persist()
+        
         logger.info("🗑️ Telemetry buffer cleared")
 
 
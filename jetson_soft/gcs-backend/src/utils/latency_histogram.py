@@ -0,0 +1,58 @@
+"""
+Latency Histogram - Fixed-bucket latency statistics (ms)
+Shared by the HTTP pool (per endpoint) and the WebSocket MAVLink bridge
+(TCP receive -> WebSocket send).
+"""
+
+from bisect import bisect_left
+from typing import Dict, Any, Sequence, Tuple
+
+# Upper bounds of histogram buckets (ms); the last bucket is open-ended
+LATENCY_BUCKETS_MS: Tuple[float, ...] = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# Sub-millisecond resolution for in-process pipelines
+FINE_LATENCY_BUCKETS_MS: Tuple[float, ...] = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 1000)
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram (ms)"""
+
+    __slots__ = ('buckets', 'counts', 'count', 'sum_ms', 'max_ms')
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS_MS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, latency_ms: float):
+        self.counts[bisect_left(self.buckets, latency_ms)] += 1
+        self.count += 1
+        self.sum_ms += latency_ms
+        if latency_ms > self.max_ms:
+            self.max_ms = latency_ms
+
+    def percentile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th percentile (max for the open bucket)"""
+        if not self.count:
+            return 0.0
+        rank = q / 100.0 * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return float(self.buckets[index]) if index < len(self.buckets) else self.max_ms
+        return self.max_ms
+
+    def to_dict(self) -> Dict[str, Any]:
+        labels = [f"le_{bound}" for bound in self.buckets] + [f"gt_{self.buckets[-1]}"]
+        return {
+            'count': self.count,
+            'mean_ms': self.sum_ms / self.count if self.count else 0.0,
+            'max_ms': self.max_ms,
+            'p50_ms': self.percentile(50),
+            'p95_ms': self.percentile(95),
+            'p99_ms': self.percentile(99),
+            'buckets': dict(zip(labels, self.counts))
+        }
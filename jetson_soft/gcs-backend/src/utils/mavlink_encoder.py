@@ -0,0 +1,56 @@
+"""
+MAVLink frame encoder for Tiger CRM Jetson GCS
+MAVLink v2 framing (truncated payload, CRC_EXTRA, sequence numbering) for
+messages sent by the GCS; the counterpart of MAVLinkFrameDecoder.
+"""
+
+from typing import Any, Dict, Optional, Union
+
+from .mavlink_parser import CRC_EXTRA, MAVLINK_STX_V2, crc_x25, crc_accumulate
+from .mavlink_messages import MessageDefinition, get_message_definition
+
+# Default GCS identity (QGroundControl / MAVProxy convention)
+GCS_SYSTEM_ID = 255
+GCS_COMPONENT_ID = 190
+
+
+class MAVLinkFrameEncoder:
+    """
+    Encodes frames from one (system, component) with its own sequence counter
+    Not thread-safe: use one encoder per link / event loop.
+    """
+
+    __slots__ = ('system_id', 'component_id', 'sequence', 'frames_encoded')
+
+    def __init__(self, system_id: int = GCS_SYSTEM_ID, component_id: int = GCS_COMPONENT_ID):
+        self.system_id = system_id
+        self.component_id = component_id
+        self.sequence = 0
+        self.frames_encoded = 0
+
+    def encode(self, message_id: int, payload: Union[bytes, bytearray, memoryview]) -> bytes:
+        """Frame an already packed payload (trailing zeros truncated per MAVLink v2)"""
+        crc_extra = CRC_EXTRA.get(message_id)
+        if crc_extra is None:
+            raise ValueError(f"Unknown MAVLink message ID {message_id} (no CRC_EXTRA)")
+
+        # v2 drops trailing zero bytes; at least one payload byte is kept
+        payload = bytes(payload).rstrip(b'\x00') or b'\x00'
+
+        header = bytes((
+            len(payload), 0, 0, self.sequence, self.system_id, self.component_id,
+            message_id & 0xFF, (message_id >> 8) & 0xFF, (message_id >> 16) & 0xFF
+        ))
+        crc = crc_accumulate(crc_extra, crc_x25(payload, crc_x25(header)))
+
+        self.sequence = (self.sequence + 1) & 0xFF
+        self.frames_encoded += 1
+        return bytes((MAVLINK_STX_V2,)) + header + payload + crc.to_bytes(2, 'little')
+
+    def encode_message(self, message: Union[int, str, MessageDefinition],
+                       values: Optional[Dict[str, Any]] = None, **fields) -> bytes:
+        """Pack and frame a registered message from field values"""
+        definition = message if isinstance(message, MessageDefinition) else get_message_definition(message)
+        if definition is None:
+            raise ValueError(f"Unknown MAVLink message: {message}")
+        return self.encode(definition.message_id, definition.encode(values, **fields))
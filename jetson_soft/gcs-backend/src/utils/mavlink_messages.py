@@ -0,0 +1,302 @@
+"""
+MAVLink message definitions for Tiger CRM Jetson GCS
+Precompiled struct decoders with lazily evaluated __slots__ records,
+and payload encoders for the messages the GCS sends
+"""
+
+import struct
+from typing import Dict, Any, List, Optional, Tuple, Union
+
+from .mavlink_parser import CRC_EXTRA
+
+# Sentinel values used by MAVLink for "not available"
+UINT16_MAX = 0xFFFF
+INT16_UNKNOWN = -1
+
+# Enum values referenced by the GCS
+MAV_TYPE_GCS = 6
+MAV_AUTOPILOT_INVALID = 8
+MAV_COMP_ID_AUTOPILOT1 = 1
+
+
+class MAVLinkRecord:
+    """
+    Decoded message payload
+    Holds the unpacked tuple; named fields are resolved only when accessed
+    """
+
+    __slots__ = ('_values',)
+
+    message_id: int = -1
+    name: str = ''
+    fieldnames: Tuple[str, ...] = ()
+
+    def __init__(self, values: tuple):
+        self._values = values
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {field: getattr(self, field) for field in self.fieldnames}
+
+    def __repr__(self) -> str:
+        fields = ', '.join(f"{field}={getattr(self, field)!r}" for field in self.fieldnames)
+        return f"{self.name}({fields})"
+
+
+def _scalar_field(index: int) -> property:
+    return property(lambda self: self._values[index])
+
+
+def _array_field(start: int, stop: int) -> property:
+    return property(lambda self: self._values[start:stop])
+
+
+def _string_field(index: int) -> property:
+    return property(lambda self: self._values[index].split(b'\x00', 1)[0].decode('ascii', 'replace'))
+
+
+class MessageDefinition:
+    """Wire layout of a single message ID, compiled once at import time"""
+
+    __slots__ = ('message_id', 'name', 'struct', 'size', 'record_type', 'crc_extra', 'layout', 'fieldnames')
+
+    def __init__(self, message_id: int, name: str, fields: List[tuple]):
+        self.message_id = message_id
+        self.name = name
+        self.crc_extra = CRC_EXTRA.get(message_id)
+
+        fmt = ['<']
+        attributes: Dict[str, Any] = {'__slots__': ()}
+        layout = []
+        index = 0
+
+        for field in fields:
+            field_name, field_type = field[0], field[1]
+            count = field[2] if len(field) > 2 else 1
+            layout.append((field_name, field_type, count))
+
+            if field_type.endswith('s'):
+                # char[N] - single bytes item, decoded to str on access
+                fmt.append(field_type)
+                attributes[field_name] = _string_field(index)
+                index += 1
+            elif count > 1:
+                fmt.append(f"{count}{field_type}")
+                attributes[field_name] = _array_field(index, index + count)
+                index += count
+            else:
+                fmt.append(field_type)
+                attributes[field_name] = _scalar_field(index)
+                index += 1
+
+        attributes['message_id'] = message_id
+        attributes['name'] = name
+        attributes['fieldnames'] = tuple(field[0] for field in fields)
+
+        self.layout = tuple(layout)
+        self.fieldnames = attributes['fieldnames']
+        self.struct = struct.Struct(''.join(fmt))
+        self.size = self.struct.size
+        self.record_type = type(f"{name.title().replace('_', '')}Record", (MAVLinkRecord,), attributes)
+
+    def decode(self, payload: Union[bytes, bytearray, memoryview]) -> MAVLinkRecord:
+        """Decode payload in a single unpack_from call (v2 truncated payloads are zero-extended)"""
+        if len(payload) < self.size:
+            padded = bytearray(self.size)
+            padded[:len(payload)] = payload
+            payload = padded
+        return self.record_type(self.struct.unpack_from(payload))
+
+    def encode(self, values: Optional[Dict[str, Any]] = None, **fields) -> bytes:
+        """Pack full-length payload from field values (missing fields are zero)"""
+        if values:
+            fields = {**values, **fields}
+        unknown = set(fields).difference(self.fieldnames)
+        if unknown:
+            raise ValueError(f"{self.name} has no field(s): {', '.join(sorted(unknown))}")
+
+        args = []
+        for field_name, field_type, count in self.layout:
+            value = fields.get(field_name)
+            if field_type.endswith('s'):
+                args.append(value.encode('ascii') if isinstance(value, str) else bytes(value or b''))
+            elif count > 1:
+                items = list(value or ())[:count]
+                args.extend(_coerce(field_type, item) for item in items + [0] * (count - len(items)))
+            else:
+                args.append(_coerce(field_type, value or 0))
+        return self.struct.pack(*args)
+
+
+def _coerce(field_type: str, value: Any) -> Union[int, float]:
+    return float(value) if field_type in 'fd' else int(value)
+
+
+# Registry: message ID / name -> compiled definition
+MESSAGE_DEFINITIONS: Dict[int, MessageDefinition] = {}
+MESSAGE_NAMES: Dict[str, MessageDefinition] = {}
+
+
+def register_message(message_id: int, name: str, fields: List[tuple]) -> MessageDefinition:
+    """Register message layout (fields in wire order, including extensions)"""
+    definition = MessageDefinition(message_id, name, fields)
+    MESSAGE_DEFINITIONS[message_id] = definition
+    MESSAGE_NAMES[name] = definition
+    return definition
+
+
+def get_message_definition(message: Union[int, str]) -> Optional[MessageDefinition]:
+    """Get compiled definition for message ID or name"""
+    if isinstance(message, str):
+        return MESSAGE_NAMES.get(message.upper())
+    return MESSAGE_DEFINITIONS.get(message)
+
+
+def decode_message(message_id: int, payload: Union[bytes, bytearray, memoryview]) -> Optional[MAVLinkRecord]:
+    """Decode payload for a registered message ID, or None if unknown"""
+    definition = MESSAGE_DEFINITIONS.get(message_id)
+    if definition is None:
+        return None
+    return definition.decode(payload)
+
+
+# ============================================================================
+# Message layouts used by the GCS (wire order: sorted by type size)
+# ============================================================================
+
+HEARTBEAT = register_message(0, 'HEARTBEAT', [
+    ('custom_mode', 'I'), ('type', 'B'), ('autopilot', 'B'), ('base_mode', 'B'),
+    ('system_status', 'B'), ('mavlink_version', 'B')
+])
+
+SYS_STATUS = register_message(1, 'SYS_STATUS', [
+    ('onboard_control_sensors_present', 'I'), ('onboard_control_sensors_enabled', 'I'),
+    ('onboard_control_sensors_health', 'I'), ('load', 'H'), ('voltage_battery', 'H'),
+    ('current_battery', 'h'), ('drop_rate_comm', 'H'), ('errors_comm', 'H'),
+    ('errors_count1', 'H'), ('errors_count2', 'H'), ('errors_count3', 'H'),
+    ('errors_count4', 'H'), ('battery_remaining', 'b'),
+    ('onboard_control_sensors_present_extended', 'I'),
+    ('onboard_control_sensors_enabled_extended', 'I'),
+    ('onboard_control_sensors_health_extended', 'I')
+])
+
+SYSTEM_TIME = register_message(2, 'SYSTEM_TIME', [
+    ('time_unix_usec', 'Q'), ('time_boot_ms', 'I')
+])
+
+SET_MODE = register_message(11, 'SET_MODE', [
+    ('custom_mode', 'I'), ('target_system', 'B'), ('base_mode', 'B')
+])
+
+PARAM_REQUEST_READ = register_message(20, 'PARAM_REQUEST_READ', [
+    ('param_index', 'h'), ('target_system', 'B'), ('target_component', 'B'), ('param_id', '16s')
+])
+
+PARAM_REQUEST_LIST = register_message(21, 'PARAM_REQUEST_LIST', [
+    ('target_system', 'B'), ('target_component', 'B')
+])
+
+PARAM_VALUE = register_message(22, 'PARAM_VALUE', [
+    ('param_value', 'f'), ('param_count', 'H'), ('param_index', 'H'),
+    ('param_id', '16s'), ('param_type', 'B')
+])
+
+PARAM_SET = register_message(23, 'PARAM_SET', [
+    ('param_value', 'f'), ('target_system', 'B'), ('target_component', 'B'),
+    ('param_id', '16s'), ('param_type', 'B')
+])
+
+GPS_RAW_INT = register_message(24, 'GPS_RAW_INT', [
+    ('time_usec', 'Q'), ('lat', 'i'), ('lon', 'i'), ('alt', 'i'), ('eph', 'H'),
+    ('epv', 'H'), ('vel', 'H'), ('cog', 'H'), ('fix_type', 'B'),
+    ('satellites_visible', 'B'), ('alt_ellipsoid', 'i'), ('h_acc', 'I'),
+    ('v_acc', 'I'), ('vel_acc', 'I'), ('hdg_acc', 'I'), ('yaw', 'H')
+])
+
+ATTITUDE = register_message(30, 'ATTITUDE', [
+    ('time_boot_ms', 'I'), ('roll', 'f'), ('pitch', 'f'), ('yaw', 'f'),
+    ('rollspeed', 'f'), ('pitchspeed', 'f'), ('yawspeed', 'f')
+])
+
+GLOBAL_POSITION_INT = register_message(33, 'GLOBAL_POSITION_INT', [
+    ('time_boot_ms', 'I'), ('lat', 'i'), ('lon', 'i'), ('alt', 'i'),
+    ('relative_alt', 'i'), ('vx', 'h'), ('vy', 'h'), ('vz', 'h'), ('hdg', 'H')
+])
+
+MISSION_REQUEST = register_message(40, 'MISSION_REQUEST', [
+    ('seq', 'H'), ('target_system', 'B'), ('target_component', 'B'), ('mission_type', 'B')
+])
+
+MISSION_SET_CURRENT = register_message(41, 'MISSION_SET_CURRENT', [
+    ('seq', 'H'), ('target_system', 'B'), ('target_component', 'B')
+])
+
+MISSION_CURRENT = register_message(42, 'MISSION_CURRENT', [
+    ('seq', 'H'), ('total', 'H'), ('mission_state', 'B'), ('mission_mode', 'B')
+])
+
+MISSION_REQUEST_LIST = register_message(43, 'MISSION_REQUEST_LIST', [
+    ('target_system', 'B'), ('target_component', 'B'), ('mission_type', 'B')
+])
+
+MISSION_COUNT = register_message(44, 'MISSION_COUNT', [
+    ('count', 'H'), ('target_system', 'B'), ('target_component', 'B'), ('mission_type', 'B'),
+    ('opaque_id', 'I')
+])
+
+MISSION_CLEAR_ALL = register_message(45, 'MISSION_CLEAR_ALL', [
+    ('target_system', 'B'), ('target_component', 'B'), ('mission_type', 'B')
+])
+
+MISSION_ACK = register_message(47, 'MISSION_ACK', [
+    ('target_system', 'B'), ('target_component', 'B'), ('type', 'B'), ('mission_type', 'B'),
+    ('opaque_id', 'I')
+])
+
+MISSION_REQUEST_INT = register_message(51, 'MISSION_REQUEST_INT', [
+    ('seq', 'H'), ('target_system', 'B'), ('target_component', 'B'), ('mission_type', 'B')
+])
+
+NAV_CONTROLLER_OUTPUT = register_message(62, 'NAV_CONTROLLER_OUTPUT', [
+    ('nav_roll', 'f'), ('nav_pitch', 'f'), ('alt_error', 'f'), ('aspd_error', 'f'),
+    ('xtrack_error', 'f'), ('nav_bearing', 'h'), ('target_bearing', 'h'), ('wp_dist', 'H')
+])
+
+MISSION_ITEM_INT = register_message(73, 'MISSION_ITEM_INT', [
+    ('param1', 'f'), ('param2', 'f'), ('param3', 'f'), ('param4', 'f'), ('x', 'i'), ('y', 'i'),
+    ('z', 'f'), ('seq', 'H'), ('command', 'H'), ('target_system', 'B'), ('target_component', 'B'),
+    ('frame', 'B'), ('current', 'B'), ('autocontinue', 'B'), ('mission_type', 'B')
+])
+
+VFR_HUD = register_message(74, 'VFR_HUD', [
+    ('airspeed', 'f'), ('groundspeed', 'f'), ('alt', 'f'), ('climb', 'f'),
+    ('heading', 'h'), ('throttle', 'H')
+])
+
+COMMAND_INT = register_message(75, 'COMMAND_INT', [
+    ('param1', 'f'), ('param2', 'f'), ('param3', 'f'), ('param4', 'f'), ('x', 'i'), ('y', 'i'),
+    ('z', 'f'), ('command', 'H'), ('target_system', 'B'), ('target_component', 'B'),
+    ('frame', 'B'), ('current', 'B'), ('autocontinue', 'B')
+])
+
+COMMAND_LONG = register_message(76, 'COMMAND_LONG', [
+    ('param1', 'f'), ('param2', 'f'), ('param3', 'f'), ('param4', 'f'), ('param5', 'f'),
+    ('param6', 'f'), ('param7', 'f'), ('command', 'H'), ('target_system', 'B'),
+    ('target_component', 'B'), ('confirmation', 'B')
+])
+
+COMMAND_ACK = register_message(77, 'COMMAND_ACK', [
+    ('command', 'H'), ('result', 'B'), ('progress', 'B'), ('result_param2', 'i'),
+    ('target_system', 'B'), ('target_component', 'B')
+])
+
+BATTERY_STATUS = register_message(147, 'BATTERY_STATUS', [
+    ('current_consumed', 'i'), ('energy_consumed', 'i'), ('temperature', 'h'),
+    ('voltages', 'H', 10), ('current_battery', 'h'), ('id', 'B'),
+    ('battery_function', 'B'), ('type', 'B'), ('battery_remaining', 'b'),
+    ('time_remaining', 'i'), ('charge_state', 'B'), ('voltages_ext', 'H', 4),
+    ('mode', 'B'), ('fault_bitmask', 'I')
+])
+
+STATUSTEXT = register_message(253, 'STATUSTEXT', [
+    ('severity', 'B'), ('text', '50s'), ('id', 'H'), ('chunk_seq', 'B')
+])
@@ -0,0 +1,416 @@
+"""
+MAVLink frame decoder for Tiger CRM Jetson GCS
+Shared streaming v1/v2 framing with CRC-X25 validation for all MAVLink ingress paths
+"""
+
+from dataclasses import dataclass, asdict
+from typing import Dict, Any, List, Optional, Tuple, Union
+
+# Frame start markers
+MAVLINK_STX_V1 = 0xFE
+MAVLINK_STX_V2 = 0xFD
+
+# Frame layout constants
+MAVLINK_V1_HEADER_LEN = 6
+MAVLINK_V2_HEADER_LEN = 10
+MAVLINK_CHECKSUM_LEN = 2
+MAVLINK_SIGNATURE_LEN = 13
+MAVLINK_IFLAG_SIGNED = 0x01
+MAVLINK_MAX_FRAME_LEN = MAVLINK_V2_HEADER_LEN + 255 + MAVLINK_CHECKSUM_LEN + MAVLINK_SIGNATURE_LEN
+
+_MAGIC_V1 = bytes([MAVLINK_STX_V1])
+_MAGIC_V2 = bytes([MAVLINK_STX_V2])
+
+# CRC_EXTRA seeds per message ID (common + ardupilotmega dialects)
+CRC_EXTRA: Dict[int, int] = {
+    0: 50, 1: 124, 2: 137, 4: 237, 5: 217, 6: 104, 7: 119, 11: 89, 20: 214, 21: 159,
+    22: 220, 23: 168, 24: 24, 25: 23, 26: 170, 27: 144, 28: 67, 29: 115, 30: 39, 31: 246,
+    32: 185, 33: 104, 34: 237, 35: 244, 36: 222, 37: 212, 38: 9, 39: 254, 40: 230, 41: 28,
+    42: 28, 43: 132, 44: 221, 45: 232, 46: 11, 47: 153, 48: 41, 49: 39, 50: 78, 51: 196,
+    54: 15, 55: 3, 61: 167, 62: 183, 63: 119, 64: 191, 65: 118, 66: 148, 67: 21, 69: 243,
+    70: 124, 73: 38, 74: 20, 75: 158, 76: 152, 77: 143, 81: 106, 82: 49, 83: 22, 84: 143,
+    85: 140, 86: 5, 87: 150, 89: 231, 90: 183, 91: 63, 92: 54, 93: 47, 100: 175, 101: 102,
+    102: 158, 103: 208, 104: 56, 105: 93, 106: 138, 107: 108, 108: 32, 109: 185, 110: 84, 111: 34,
+    112: 174, 113: 124, 114: 237, 115: 4, 116: 76, 117: 128, 118: 56, 119: 116, 120: 134, 121: 237,
+    122: 203, 123: 250, 124: 87, 125: 203, 126: 220, 127: 25, 128: 226, 129: 46, 130: 29, 131: 223,
+    132: 85, 133: 6, 134: 229, 135: 203, 136: 1, 137: 195, 138: 109, 139: 168, 140: 181, 141: 47,
+    142: 72, 143: 131, 144: 127, 146: 103, 147: 154, 148: 178, 149: 200, 150: 134, 151: 219, 152: 208,
+    153: 188, 154: 84, 155: 22, 156: 19, 157: 21, 158: 134, 160: 78, 161: 68, 162: 189, 163: 127,
+    164: 154, 165: 21, 166: 21, 167: 144, 168: 1, 169: 234, 170: 73, 171: 181, 172: 22, 173: 83,
+    174: 167, 175: 138, 176: 234, 177: 240, 178: 47, 179: 189, 180: 52, 181: 174, 182: 229, 183: 85,
+    184: 159, 185: 186, 186: 72, 191: 92, 192: 36, 193: 71, 194: 98, 195: 120, 200: 134, 201: 205,
+    214: 69, 215: 101, 216: 50, 217: 202, 218: 17, 219: 162, 225: 208, 226: 207, 230: 163, 231: 105,
+    232: 151, 233: 35, 234: 150, 235: 179, 241: 90, 242: 104, 243: 85, 244: 95, 245: 130, 246: 184,
+    247: 81, 248: 8, 249: 204, 250: 49, 251: 170, 252: 44, 253: 83, 254: 46, 256: 71, 257: 131,
+    258: 187, 259: 92, 260: 146, 261: 179, 262: 12, 263: 133, 264: 49, 265: 26, 266: 193, 267: 35,
+    268: 14, 269: 109, 270: 59, 271: 22, 275: 126, 276: 18, 277: 62, 280: 70, 281: 48, 282: 123,
+    283: 74, 284: 99, 285: 137, 286: 210, 287: 1, 288: 20, 295: 234, 296: 158, 299: 19, 301: 243,
+    310: 28, 311: 95, 320: 243, 321: 88, 322: 243, 323: 78, 324: 132, 330: 23, 331: 91, 332: 236,
+    333: 231, 335: 225, 339: 199, 340: 99, 345: 209, 350: 232, 360: 11, 370: 75, 373: 117, 375: 251,
+    376: 199, 385: 147, 386: 132, 387: 4, 388: 8, 390: 156, 9000: 113, 9005: 117, 10001: 209, 10002: 186,
+    10003: 4, 10004: 133, 10005: 103, 10006: 193, 10007: 71, 10008: 240, 10151: 195, 11000: 134, 11001: 15, 11002: 234,
+    11003: 64, 11004: 11, 11005: 93, 11010: 46, 11011: 106, 11020: 205, 11030: 144, 11031: 133, 11032: 85, 11033: 195,
+    11034: 79, 11035: 128, 11036: 177, 11037: 130, 11038: 47, 11039: 142, 11040: 132, 11041: 208, 11042: 201, 11043: 193,
+    11044: 189, 11060: 162, 12900: 114, 12901: 254, 12902: 140, 12903: 249, 12904: 77, 12905: 49, 12915: 94, 12918: 139,
+    12919: 7, 12920: 20, 42000: 227, 42001: 239, 50001: 246, 50002: 181, 50003: 62, 50004: 240, 50005: 152, 52000: 13,
+    52001: 239
+}
+
+# Payload offsets of (target_system, target_component) for addressed messages;
+# -1 when the message has no target_component field
+MESSAGE_TARGETS: Dict[int, Tuple[int, int]] = {
+    4: (12, 13), 5: (0, -1), 11: (4, -1), 20: (2, 3), 21: (0, 1), 23: (4, 5), 37: (4, 5),
+    38: (4, 5), 39: (32, 33), 40: (2, 3), 41: (2, 3), 43: (0, 1), 44: (2, 3), 45: (0, 1),
+    47: (0, 1), 48: (12, -1), 50: (18, 19), 51: (2, 3), 54: (24, 25), 66: (2, 3), 70: (16, 17),
+    73: (32, 33), 75: (30, 31), 76: (30, 31), 77: (8, 9), 82: (36, 37), 84: (50, 51), 86: (50, 51),
+    110: (1, 2), 117: (4, 5), 119: (10, 11), 121: (0, 1), 122: (0, 1), 123: (0, 1), 139: (41, 42),
+    151: (6, 7), 154: (6, 7), 155: (4, 5), 156: (0, 1), 157: (12, 13), 158: (12, 13), 160: (8, 9),
+    161: (0, 1), 175: (14, 15), 176: (0, 1), 179: (26, -1), 180: (42, -1), 183: (0, 1), 184: (4, 5),
+    185: (4, 5), 186: (0, 1), 200: (40, 41), 201: (12, 13), 214: (6, 7), 216: (0, 1), 218: (0, 1),
+    243: (52, -1), 248: (3, 4), 256: (8, 9), 258: (0, 1), 266: (2, 3), 267: (2, 3), 268: (2, 3),
+    282: (32, 33), 284: (30, 31), 285: (38, 39), 286: (50, 51), 287: (20, 21), 288: (20, 21),
+    296: (36, 37), 320: (2, 3), 321: (0, 1), 323: (0, 1), 345: (2, 3), 385: (2, 3), 386: (4, 5),
+    387: (4, 5), 388: (32, 33), 11000: (4, 5), 11002: (4, 5), 11004: (8, 9), 11033: (16, 17),
+    11035: (4, 5), 12900: (0, 1), 12901: (30, 31), 12902: (4, 5), 12903: (0, 1), 12904: (28, 29),
+    12905: (0, 1), 12915: (0, 1), 12919: (16, 17), 50004: (8, 9), 50005: (4, 5)
+}
+
+
+def _build_crc_table():
+    """Build lookup table for CRC-16/MCRF4XX (MAVLink X.25 checksum)"""
+    table = []
+    for byte in range(256):
+        tmp = byte
+        for _ in range(8):
+            tmp = (tmp >> 1) ^ 0x8408 if tmp & 1 else tmp >> 1
+        table.append(tmp)
+    return tuple(table)
+
+
+_CRC_TABLE = _build_crc_table()
+
+
+def crc_x25(data: Union[bytes, bytearray, memoryview], crc: int = 0xFFFF) -> int:
+    """Calculate MAVLink CRC-X25 checksum over data"""
+    table = _CRC_TABLE
+    for byte in data:
+        crc = (crc >> 8) ^ table[(crc ^ byte) & 0xFF]
+    return crc
+
+
+def crc_accumulate(byte: int, crc: int) -> int:
+    """Accumulate single byte into CRC-X25 checksum (used for CRC_EXTRA)"""
+    return (crc >> 8) ^ _CRC_TABLE[(crc ^ byte) & 0xFF]
+
+
+@dataclass
+class DecoderStats:
+    """Frame decoder statistics"""
+    bytes_received: int = 0
+    frames_decoded: int = 0
+    bytes_discarded: int = 0
+    crc_errors: int = 0
+    unknown_messages: int = 0
+    buffer_swaps: int = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class MAVLinkFrame:
+    """
+    Decoded MAVLink frame
+    payload/signature/raw are memoryview slices into the decoder buffer (no copy)
+    """
+
+    __slots__ = (
+        'version', 'payload_length', 'incompat_flags', 'compat_flags',
+        'sequence', 'system_id', 'component_id', 'message_id',
+        'payload', 'signature', 'raw', 'crc_checked', 'timestamp'
+    )
+
+    def __init__(self, version: int = 2, payload_length: int = 0, incompat_flags: int = 0,
+                 compat_flags: int = 0, sequence: int = 0, system_id: int = 0,
+                 component_id: int = 0, message_id: int = 0,
+                 payload: Union[bytes, memoryview] = b'', signature: Optional[memoryview] = None,
+                 raw: Union[bytes, memoryview] = b'', crc_checked: bool = False,
+                 timestamp: float = 0.0):
+        self.version = version
+        self.payload_length = payload_length
+        self.incompat_flags = incompat_flags
+        self.compat_flags = compat_flags
+        self.sequence = sequence
+        self.system_id = system_id
+        self.component_id = component_id
+        self.message_id = message_id
+        self.payload = payload
+        self.signature = signature
+        self.raw = raw
+        self.crc_checked = crc_checked
+        self.timestamp = timestamp
+
+    @property
+    def is_signed(self) -> bool:
+        return self.signature is not None
+
+    @property
+    def target(self) -> Tuple[int, int]:
+        """(target_system, target_component); (0, 0) for broadcast or unaddressed messages"""
+        offsets = MESSAGE_TARGETS.get(self.message_id)
+        if offsets is None:
+            return 0, 0
+
+        # Truncated v2 payloads drop trailing zeros, so missing bytes read as 0
+        payload = self.payload
+        size = len(payload)
+        system_offset, component_offset = offsets
+        target_system = payload[system_offset] if system_offset < size else 0
+        target_component = payload[component_offset] if 0 <= component_offset < size else 0
+        return target_system, target_component
+
+    def to_dict(self, clock_offset: float = 0.0) -> Dict[str, Any]:
+        """Detached dict view (payload copied); clock_offset maps timestamp to wall clock"""
+        return {
+            'payload_length': self.payload_length,
+            'sequence': self.sequence,
+            'system_id': self.system_id,
+            'component_id': self.component_id,
+            'message_id': self.message_id,
+            'payload': bytes(self.payload),
+            'timestamp': self.timestamp + clock_offset
+        }
+
+    def __repr__(self) -> str:
+        return (f"MAVLinkFrame(v{self.version}, msg_id={self.message_id}, "
+                f"sys={self.system_id}, comp={self.component_id}, seq={self.sequence}, "
+                f"len={self.payload_length})")
+
+
+class MAVLinkFramePool:
+    """
+    Fixed-size free list of MAVLinkFrame objects
+    Frames are recycled instead of allocated per message to keep GC quiet
+    """
+
+    def __init__(self, size: int = 256):
+        self.size = size
+        self._free: List[MAVLinkFrame] = [MAVLinkFrame() for _ in range(size)]
+        self.misses = 0
+
+    @property
+    def available(self) -> int:
+        return len(self._free)
+
+    def acquire(self) -> MAVLinkFrame:
+        """Take frame from free list (allocates only when the pool is exhausted)"""
+        try:
+            return self._free.pop()
+        except IndexError:
+            self.misses += 1
+            return MAVLinkFrame()
+
+    def release(self, frame: MAVLinkFrame):
+        """Return frame to free list; caller must not use it afterwards"""
+        if len(self._free) < self.size:
+            # Drop buffer references so retired decoder buffers can be freed
+            frame.payload = frame.raw = b''
+            frame.signature = None
+            self._free.append(frame)
+
+
+class MAVLinkFrameDecoder:
+    """
+    Incremental MAVLink v1/v2 stream decoder
+
+    - Linear buffer with read/write offsets: consumed bytes are skipped, never shifted
+    - When the tail is full, unconsumed bytes move to a fresh buffer; the old buffer
+      stays alive only while frames still reference it, so memoryview slices handed
+      out earlier remain valid
+    - Resync after noise uses bytes.find() on the magic bytes instead of per-byte pops
+    - CRC-X25 is verified against CRC_EXTRA; frames with unknown IDs are passed
+      through unchecked unless strict=True
+    """
+
+    def __init__(self,
+                 buffer_size: int = 65536,
+                 crc_extra: Optional[Dict[int, int]] = None,
+                 check_crc: bool = True,
+                 strict: bool = False,
+                 pool: Optional[MAVLinkFramePool] = None):
+        self.buffer_size = max(buffer_size, MAVLINK_MAX_FRAME_LEN * 2)
+        self.crc_extra = CRC_EXTRA if crc_extra is None else crc_extra
+        self.check_crc = check_crc
+        self.strict = strict
+        self.pool = pool
+
+        # Receive timestamp stamped on every frame decoded from the current batch
+        self.timestamp = 0.0
+
+        self._buffer = bytearray(self.buffer_size)
+        self._view = memoryview(self._buffer)
+        self._start = 0
+        self._end = 0
+
+        self.stats = DecoderStats()
+
+    @property
+    def pending_bytes(self) -> int:
+        """Bytes buffered but not yet decoded"""
+        return self._end - self._start
+
+    def reset(self):
+        """Drop all buffered bytes"""
+        self._start = 0
+        self._end = 0
+
+    def feed(self, data: Union[bytes, bytearray, memoryview], timestamp: Optional[float] = None):
+        """Append received bytes to the decode buffer (timestamp applies to the whole batch)"""
+        if timestamp is not None:
+            self.timestamp = timestamp
+
+        size = len(data)
+        if not size:
+            return
+
+        if self._end + size > len(self._buffer):
+            self._swap_buffer(size)
+
+        self._view[self._end:self._end + size] = data
+        self._end += size
+        self.stats.bytes_received += size
+
+    def _swap_buffer(self, incoming: int):
+        """Move unconsumed bytes into a fresh buffer with room for incoming data"""
+        pending = self._end - self._start
+        capacity = max(self.buffer_size, pending + incoming)
+
+        buffer = bytearray(capacity)
+        view = memoryview(buffer)
+        view[:pending] = self._view[self._start:self._end]
+
+        self._buffer = buffer
+        self._view = view
+        self._start = 0
+        self._end = pending
+        self.stats.buffer_swaps += 1
+
+    def _resync(self, start: int) -> int:
+        """Skip to next candidate magic byte after start"""
+        buffer = self._buffer
+        end = self._end
+        v2 = buffer.find(_MAGIC_V2, start + 1, end)
+        v1 = buffer.find(_MAGIC_V1, start + 1, end)
+
+        if v2 < 0:
+            position = v1
+        elif v1 < 0:
+            position = v2
+        else:
+            position = min(v1, v2)
+
+        if position < 0:
+            position = end
+
+        self.stats.bytes_discarded += position - start
+        return position
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> MAVLinkFrame:
+        frame = self.next_frame()
+        if frame is None:
+            raise StopIteration
+        return frame
+
+    def next_frame(self) -> Optional[MAVLinkFrame]:
+        """Decode next complete frame from buffer, or None if more data is needed"""
+        buffer = self._buffer
+        view = self._view
+
+        while True:
+            start = self._start
+            available = self._end - start
+            if available <= 0:
+                return None
+
+            stx = buffer[start]
+            if stx == MAVLINK_STX_V2:
+                if available < MAVLINK_V2_HEADER_LEN:
+                    return None
+                header_len = MAVLINK_V2_HEADER_LEN
+                payload_len = buffer[start + 1]
+                incompat_flags = buffer[start + 2]
+                if incompat_flags & ~MAVLINK_IFLAG_SIGNED:
+                    # Unknown incompatibility flag - not a frame we can handle
+                    self._start = self._resync(start)
+                    continue
+                signature_len = MAVLINK_SIGNATURE_LEN if incompat_flags & MAVLINK_IFLAG_SIGNED else 0
+                message_id = buffer[start + 7] | (buffer[start + 8] << 8) | (buffer[start + 9] << 16)
+            elif stx == MAVLINK_STX_V1:
+                if available < MAVLINK_V1_HEADER_LEN:
+                    return None
+                header_len = MAVLINK_V1_HEADER_LEN
+                payload_len = buffer[start + 1]
+                incompat_flags = 0
+                signature_len = 0
+                message_id = buffer[start + 5]
+            else:
+                self._start = self._resync(start)
+                continue
+
+            crc_offset = start + header_len + payload_len
+            frame_len = header_len + payload_len + MAVLINK_CHECKSUM_LEN + signature_len
+            if available < frame_len:
+                return None
+
+            crc_checked = False
+            if self.check_crc:
+                extra = self.crc_extra.get(message_id)
+                if extra is None:
+                    self.stats.unknown_messages += 1
+                    if self.strict:
+                        self._start = self._resync(start)
+                        continue
+                else:
+                    crc = crc_accumulate(extra, crc_x25(view[start + 1:crc_offset]))
+                    if crc != (buffer[crc_offset] | (buffer[crc_offset + 1] << 8)):
+                        self.stats.crc_errors += 1
+                        self._start = self._resync(start)
+                        continue
+                    crc_checked = True
+
+            self._start = start + frame_len
+            self.stats.frames_decoded += 1
+
+            if stx == MAVLINK_STX_V2:
+                compat_flags = buffer[start + 3]
+                sequence = buffer[start + 4]
+                system_id = buffer[start + 5]
+                component_id = buffer[start + 6]
+            else:
+                compat_flags = 0
+                sequence = buffer[start + 2]
+                system_id = buffer[start + 3]
+                component_id = buffer[start + 4]
+
+            signature = None
+            if signature_len:
+                signature_offset = crc_offset + MAVLINK_CHECKSUM_LEN
+                signature = view[signature_offset:signature_offset + signature_len]
+
+            frame = self.pool.acquire() if self.pool is not None else MAVLinkFrame()
+            frame.version = 2 if stx == MAVLINK_STX_V2 else 1
+            frame.payload_length = payload_len
+            frame.incompat_flags = incompat_flags
+            frame.compat_flags = compat_flags
+            frame.sequence = sequence
+            frame.system_id = system_id
+            frame.component_id = component_id
+            frame.message_id = message_id
+            frame.payload = view[start + header_len:crc_offset]
+            frame.signature = signature
+            frame.raw = view[start:start + frame_len]
+            frame.crc_checked = crc_checked
+            frame.timestamp = self.timestamp
+            return frame
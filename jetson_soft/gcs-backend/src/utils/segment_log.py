@@ -0,0 +1,246 @@
+"""
+Append-only segmented log for store-and-forward persistence
+Length-prefixed, CRC-checked records; fsync batching; acked segments are deleted
+"""
+
+import os
+import struct
+import threading
+import logging
+import zlib
+from pathlib import Path
+from typing import Dict, Any, Iterator, List, Optional, Tuple, BinaryIO
+from dataclasses import dataclass, asdict
+
+logger = logging.getLogger(__name__)
+
+# Record: payload length, crc32(seq + payload), seq
+RECORD_HEADER = struct.Struct('<IIQ')
+# Checkpoint: acked seq, write seq, crc32 of both
+CHECKPOINT = struct.Struct('<QQI')
+
+SEGMENT_SUFFIX = '.seg'
+CHECKPOINT_FILE = 'checkpoint'
+
+
+@dataclass
+class LogStats:
+    """Segment log statistics"""
+    records_written: int = 0
+    bytes_written: int = 0
+    fsyncs: int = 0
+    segments: int = 0
+    segments_compacted: int = 0
+    records_replayed: int = 0
+    corrupt_records: int = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class SegmentedLog:
+    """
+    Write-ahead log split into segment files named by their first sequence number
+
+    - append() only writes into the OS buffer; sync() flushes and fsyncs (batched)
+    - checkpoint(acked) persists the ack position atomically and deletes segments
+      whose records are all acknowledged
+    - replay() reads only segments that still hold unacknowledged records and stops
+      at a torn or corrupt record (power loss mid-write), truncating the segment there
+    """
+
+    def __init__(self, directory: str, segment_size: int = 4 * 1024 * 1024):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.segment_size = segment_size
+
+        self._lock = threading.Lock()
+        self._file: Optional[BinaryIO] = None
+        self._file_size = 0
+        self._retired: List[BinaryIO] = []
+        self._dirty = False
+
+        self.acked_seq, self.write_seq = self._read_checkpoint()
+        self._checkpointed = (self.acked_seq, self.write_seq)
+        self.stats = LogStats(segments=len(self._segments()))
+
+    # ------------------------------------------------------------------
+    # Writing
+    # ------------------------------------------------------------------
+
+    def append(self, seq: int, payload: bytes):
+        """Append record (buffered, durable after the next sync())"""
+        header = RECORD_HEADER.pack(len(payload), zlib.crc32(payload, zlib.crc32(seq.to_bytes(8, 'little'))), seq)
+
+        with self._lock:
+            if self._file is None or self._file_size >= self.segment_size:
+                self._rotate(seq)
+            self._file.write(header)
+            self._file.write(payload)
+            self._file_size += len(header) + len(payload)
+            self._dirty = True
+
+        self.write_seq = seq + 1
+        self.stats.records_written += 1
+        self.stats.bytes_written += len(header) + len(payload)
+
+    def _rotate(self, seq: int):
+        """Start a new segment (called under lock); the old one is fsynced by sync()"""
+        if self._file is not None:
+            self._file.flush()
+            self._retired.append(self._file)
+
+        path = self.directory / f"{seq:020d}{SEGMENT_SUFFIX}"
+        if path.exists():
+            # Segment left by a crash (torn first record keeps write_seq at its start):
+            # cut it back to the last good record so new records stay readable
+            for _ in self._read_segment(path):
+                pass
+        self._file = open(path, 'ab')
+        self._file_size = self._file.tell()
+        self.stats.segments += 1
+
+    def sync(self):
+        """Flush buffered records and fsync (one fsync per batch, off the producer path)"""
+        with self._lock:
+            retired, self._retired = self._retired, []
+            current = self._file
+            dirty = self._dirty
+            if current is not None and dirty:
+                current.flush()
+                fd = current.fileno()
+            self._dirty = False
+
+        for segment in retired:
+            os.fsync(segment.fileno())
+            segment.close()
+            self.stats.fsyncs += 1
+
+        if current is not None and dirty:
+            try:
+                os.fsync(fd)
+                self.stats.fsyncs += 1
+            except OSError as e:
+                # Segment rotated and closed meanwhile; already fsynced on retire
+                logger.debug(f"Segment fsync skipped: {e}")
+
+    def checkpoint(self, acked_seq: int):
+        """Persist ack position and delete fully acknowledged segments"""
+        acked_seq = max(acked_seq, self.acked_seq)
+        state = (acked_seq, self.write_seq)
+        if state == self._checkpointed:
+            return
+
+        data = struct.pack('<QQ', *state)
+        path = self.directory / CHECKPOINT_FILE
+        tmp_path = path.with_suffix('.tmp')
+        with open(tmp_path, 'wb') as f:
+            f.write(data + zlib.crc32(data).to_bytes(4, 'little'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        self._fsync_directory()
+
+        self.acked_seq = acked_seq
+        self._checkpointed = state
+        self._compact()
+
+    def _compact(self):
+        """Delete segments whose successor starts at or before the ack position"""
+        segments = self._segments()
+        active = self._file.name if self._file is not None else None
+
+        for (first_seq, path), (next_seq, _) in zip(segments, segments[1:]):
+            if next_seq > self.acked_seq or str(path) == active:
+                break
+            try:
+                path.unlink()
+                self.stats.segments_compacted += 1
+                self.stats.segments -= 1
+            except FileNotFoundError:
+                pass
+
+    def _fsync_directory(self):
+        try:
+            fd = os.open(self.directory, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        except OSError:
+            pass  # Not supported on every filesystem
+
+    def close(self):
+        """Sync and close active segment"""
+        self.sync()
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    # ------------------------------------------------------------------
+    # Reading
+    # ------------------------------------------------------------------
+
+    def _segments(self) -> List[Tuple[int, Path]]:
+        segments = []
+        for path in self.directory.glob(f"*{SEGMENT_SUFFIX}"):
+            try:
+                segments.append((int(path.stem), path))
+            except ValueError:
+                continue
+        segments.sort()
+        return segments
+
+    def _read_checkpoint(self) -> Tuple[int, int]:
+        path = self.directory / CHECKPOINT_FILE
+        try:
+            raw = path.read_bytes()
+            acked_seq, write_seq, crc = CHECKPOINT.unpack(raw)
+            if zlib.crc32(raw[:16]) == crc:
+                return acked_seq, write_seq
+            logger.warning(f"⚠️ Corrupt log checkpoint ignored: {path}")
+        except FileNotFoundError:
+            pass
+        except struct.error:
+            logger.warning(f"⚠️ Truncated log checkpoint ignored: {path}")
+        return 0, 0
+
+    def replay(self) -> Iterator[Tuple[int, bytes]]:
+        """Yield (seq, payload) of unacknowledged records, oldest first"""
+        segments = self._segments()
+        acked_seq = self.acked_seq
+
+        for index, (first_seq, path) in enumerate(segments):
+            # Skip segments that are entirely acknowledged
+            if index + 1 < len(segments) and segments[index + 1][0] <= acked_seq:
+                continue
+
+            for seq, payload in self._read_segment(path):
+                self.write_seq = max(self.write_seq, seq + 1)
+                if seq >= acked_seq:
+                    self.stats.records_replayed += 1
+                    yield seq, payload
+
+    def _read_segment(self, path: Path) -> Iterator[Tuple[int, bytes]]:
+        with open(path, 'rb') as f:
+            data = f.read()
+
+        offset = 0
+        header_size = RECORD_HEADER.size
+        while offset < len(data):
+            if offset + header_size <= len(data):
+                length, crc, seq = RECORD_HEADER.unpack_from(data, offset)
+                start = offset + header_size
+                payload = data[start:start + length]
+                if len(payload) == length and zlib.crc32(payload, zlib.crc32(seq.to_bytes(8, 'little'))) == crc:
+                    yield seq, payload
+                    offset = start + length
+                    continue
+            
+            # Torn write at the tail: everything after it is unusable; cut it off so
+            # records appended to this segment after restart are not hidden behind it
+            self.stats.corrupt_records += 1
+            logger.warning(f"⚠️ Log segment {path.name} truncated at offset {offset}")
+            os.truncate(path, offset)
+            return
@@ -0,0 +1,361 @@
+"""
+Compact binary encoding for telemetry snapshots
+Shared by the telemetry buffer (in memory), its write-ahead log and uplink batches
+
+Row (one record), little-endian:
+    version u8 | timestamp f64 | present u16 | null u16 | drone_id len u8 | drone_id
+    | schema fields that are present, packed in schema order
+    | strings: len u8 + utf-8 each
+    | extras: compact JSON object with keys outside the schema (optional, rest of row)
+
+Batch (columnar, for uploads):
+    magic 'TLMC' | version u8 | rows u32 | drone ids u16 + (len u8 + utf-8) each
+    | drone index u16[rows] | timestamp deltas[rows] | present u16[rows] | null u16[rows]
+    | one column per schema field holding only the rows where it is present
+    | extras: len u32 + JSON per row (0 = none)
+    Timestamps (microseconds) and coordinates (1e-7 degrees, MAVLink GPS resolution)
+    are scaled to integers and stored as zigzag LEB128 deltas from the previous row,
+    so slowly changing columns shrink to a byte or two per row before compression.
+    The uplink compresses the whole batch (deflate or lzma), see compress_batch().
+
+Sensor values are stored as float32 and rounded to 7 significant digits on decode,
+so 12.43 reads back as 12.43; coordinates and timestamps are float64 in rows
+"""
+
+import json
+import math
+import struct
+import zlib
+from typing import Dict, Any, Iterable, List, Tuple
+
+try:
+    import lzma
+except ImportError:  # Python built without liblzma
+    lzma = None
+
+SCHEMA_VERSION = 1
+
+# Field order is part of the format: append new fields and bump SCHEMA_VERSION
+TELEMETRY_SCHEMA: Tuple[Tuple[str, str], ...] = (
+    ('battery_level', 'f'),
+    ('battery_voltage', 'f'),
+    ('battery_current', 'f'),
+    ('altitude_meters', 'f'),
+    ('speed_ms', 'f'),
+    ('location_latitude', 'd'),
+    ('location_longitude', 'd'),
+    ('heading_degrees', 'f'),
+    ('armed', '?'),
+    ('flight_mode', 's'),
+    ('gps_satellites', 'B'),
+    ('temperature_celsius', 'f'),
+    ('humidity_percent', 'f'),
+    ('vibration_level', 'f'),
+    ('signal_strength', 'f'),
+    ('timestamp', 'd'),
+)
+
+FIELD_INDEX: Dict[str, int] = {name: index for index, (name, _) in enumerate(TELEMETRY_SCHEMA)}
+
+ROW_HEADER = struct.Struct('<BdHHB')
+BATCH_HEADER = struct.Struct('<4sBIH')
+BATCH_MAGIC = b'TLMC'
+
+# Batch columns stored as integer deltas: field -> scale
+DELTA_SCALES: Dict[str, float] = {
+    'location_latitude': 1e7,
+    'location_longitude': 1e7,
+    'timestamp': 1e6,
+}
+TIMESTAMP_SCALE = 1e6
+
+# Uplink content negotiation (see CentralServerSync.sync_telemetry_batch)
+BATCH_CONTENT_TYPE = 'application/vnd.tiger.telemetry-batch'
+BATCH_ENCODINGS: Tuple[str, ...] = ('deflate', 'lzma') if lzma is not None else ('deflate',)
+
+Row = Tuple[float, str, Dict[str, Any]]
+
+
+def _pack_string(value: str) -> bytes:
+    encoded = value.encode('utf-8')
+    if len(encoded) > 255:
+        raise ValueError(f"String too long for telemetry row: {value[:32]}...")
+    return bytes((len(encoded),)) + encoded
+
+
+def _round_float32(value: float) -> float:
+    """Drop the binary noise float32 adds beyond its ~7 significant digits"""
+    if value == 0 or not math.isfinite(value):
+        return value
+    return round(value, 6 - math.floor(math.log10(abs(value))))
+
+
+def _accepts(fmt: str, value: Any) -> bool:
+    """Whether value can be stored in a schema column without changing its type"""
+    if fmt == 's':
+        return isinstance(value, str) and len(value.encode('utf-8')) <= 255
+    if isinstance(value, bool):
+        return fmt == '?'
+    if fmt == '?':
+        return False
+    if fmt == 'B':
+        return isinstance(value, int) and 0 <= value <= 255
+    if isinstance(value, (int, float)):
+        # float32 overflows to an error, keep huge and non-finite values lossless in extras
+        return math.isfinite(value) and (fmt == 'd' or abs(value) < 3.0e38)
+    return False
+
+
+_STRUCT_CACHE: Dict[int, Tuple[struct.Struct, Tuple[int, ...], Tuple[int, ...]]] = {}
+
+
+def _row_layout(present: int) -> Tuple[struct.Struct, Tuple[int, ...], Tuple[int, ...]]:
+    """Struct for the fixed-size fields of a presence mask, plus field indexes"""
+    layout = _STRUCT_CACHE.get(present)
+    if layout is None:
+        fixed, strings, fmt = [], [], '<'
+        for index, (_, code) in enumerate(TELEMETRY_SCHEMA):
+            if present & (1 << index):
+                if code == 's':
+                    strings.append(index)
+                else:
+                    fixed.append(index)
+                    fmt += code
+        layout = _STRUCT_CACHE[present] = (struct.Struct(fmt), tuple(fixed), tuple(strings))
+    return layout
+
+
+def _split(data: Dict[str, Any]) -> Tuple[int, int, Dict[int, Any], Dict[str, Any]]:
+    """Presence mask, null mask, schema values by field index and keys that stay in extras"""
+    present = nulls = 0
+    values = {}
+    for index, (name, code) in enumerate(TELEMETRY_SCHEMA):
+        if name not in data:
+            continue
+        value = data[name]
+        if value is None:
+            nulls |= 1 << index
+        elif _accepts(code, value):
+            present |= 1 << index
+            values[index] = value
+
+    extras = {}
+    if len(values) + bin(nulls).count('1') != len(data):
+        extras = {
+            key: value for key, value in data.items()
+            if key not in FIELD_INDEX or not (present | nulls) & (1 << FIELD_INDEX[key])
+        }
+    return present, nulls, values, extras
+
+
+def encode_row(timestamp: float, drone_id: str, data: Dict[str, Any]) -> bytes:
+    """Pack one telemetry snapshot"""
+    present, nulls, values, extras = _split(data)
+    drone = drone_id.encode('utf-8')
+    if len(drone) > 255:
+        raise ValueError(f"drone_id too long for telemetry row: {drone_id[:32]}...")
+
+    layout, fixed, strings = _row_layout(present)
+    parts = [
+        ROW_HEADER.pack(SCHEMA_VERSION, timestamp, present, nulls, len(drone)),
+        drone,
+        layout.pack(*[values[index] for index in fixed])
+    ]
+    for index in strings:
+        parts.append(_pack_string(values[index]))
+
+    if extras:
+        parts.append(json.dumps(extras, separators=(',', ':')).encode('utf-8'))
+    return b''.join(parts)
+
+
+def check_row(payload: bytes):
+    """Raise ValueError if payload is not a row of the current schema"""
+    if len(payload) < ROW_HEADER.size or payload[0] != SCHEMA_VERSION:
+        raise ValueError(f"Unsupported telemetry row (version {payload[0] if payload else None})")
+
+
+def decode_header(payload: bytes) -> Tuple[float, str]:
+    """Timestamp and drone_id without unpacking the fields"""
+    _, timestamp, _, _, drone_len = ROW_HEADER.unpack_from(payload)
+    start = ROW_HEADER.size
+    return timestamp, payload[start:start + drone_len].decode('utf-8')
+
+
+def decode_row(payload: bytes) -> Row:
+    """Unpack one row into (timestamp, drone_id, data)"""
+    check_row(payload)
+    _, timestamp, present, nulls, drone_len = ROW_HEADER.unpack_from(payload)
+    offset = ROW_HEADER.size
+    drone_id = payload[offset:offset + drone_len].decode('utf-8')
+    offset += drone_len
+
+    layout, fixed, strings = _row_layout(present)
+    data: Dict[str, Any] = {}
+    for index, value in zip(fixed, layout.unpack_from(payload, offset)):
+        name, code = TELEMETRY_SCHEMA[index]
+        data[name] = _round_float32(value) if code == 'f' else value
+    offset += layout.size
+
+    for index in strings:
+        length = payload[offset]
+        data[TELEMETRY_SCHEMA[index][0]] = payload[offset + 1:offset + 1 + length].decode('utf-8')
+        offset += 1 + length
+
+    if nulls:
+        for index, (name, _) in enumerate(TELEMETRY_SCHEMA):
+            if nulls & (1 << index):
+                data[name] = None
+
+    if offset < len(payload):
+        data.update(json.loads(payload[offset:]))
+    return timestamp, drone_id, data
+
+
+def _pack_deltas(values: List[float], scale: float) -> bytes:
+    """Scaled integers as zigzag LEB128 deltas"""
+    out = bytearray()
+    previous = 0
+    for value in values:
+        current = round(value * scale)
+        delta = current - previous
+        previous = current
+        zigzag = delta * 2 if delta >= 0 else -delta * 2 - 1
+        while zigzag >= 0x80:
+            out.append((zigzag & 0x7F) | 0x80)
+            zigzag >>= 7
+        out.append(zigzag)
+    return bytes(out)
+
+
+def _unpack_deltas(payload: bytes, offset: int, count: int, scale: float) -> Tuple[List[float], int]:
+    values = []
+    current = 0
+    for _ in range(count):
+        zigzag = shift = 0
+        while True:
+            byte = payload[offset]
+            offset += 1
+            zigzag |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                break
+            shift += 7
+        current += (zigzag >> 1) if not zigzag & 1 else -((zigzag + 1) >> 1)
+        values.append(current / scale)
+    return values, offset
+
+
+def encode_batch(rows: Iterable[Row]) -> bytes:
+    """Transpose rows into the columnar batch layout"""
+    drone_ids: Dict[str, int] = {}
+    drone_index, timestamps, presents, null_masks = [], [], [], []
+    columns: List[List[Any]] = [[] for _ in TELEMETRY_SCHEMA]
+    extras_column: List[bytes] = []
+
+    for timestamp, drone_id, data in rows:
+        present, nulls, values, extras = _split(data)
+        drone_index.append(drone_ids.setdefault(drone_id, len(drone_ids)))
+        timestamps.append(timestamp)
+        presents.append(present)
+        null_masks.append(nulls)
+
+        for index, value in values.items():
+            columns[index].append(value)
+        extras_column.append(json.dumps(extras, separators=(',', ':')).encode('utf-8') if extras else b'')
+
+    count = len(timestamps)
+    parts = [BATCH_HEADER.pack(BATCH_MAGIC, SCHEMA_VERSION, count, len(drone_ids))]
+    parts.extend(_pack_string(drone_id) for drone_id in drone_ids)
+
+    parts.append(struct.pack(f'<{count}H', *drone_index))
+    parts.append(_pack_deltas(timestamps, TIMESTAMP_SCALE))
+    parts.append(struct.pack(f'<{count}H', *presents))
+    parts.append(struct.pack(f'<{count}H', *null_masks))
+
+    for (name, code), column in zip(TELEMETRY_SCHEMA, columns):
+        if name in DELTA_SCALES:
+            parts.append(_pack_deltas(column, DELTA_SCALES[name]))
+        elif code == 's':
+            parts.extend(_pack_string(value) for value in column)
+        else:
+            parts.append(struct.pack(f'<{len(column)}{code}', *column))
+
+    for encoded in extras_column:
+        parts.append(len(encoded).to_bytes(4, 'little') + encoded)
+    return b''.join(parts)
+
+
+def decode_batch(payload: bytes) -> List[Row]:
+    """Rebuild rows from a columnar batch"""
+    magic, version, count, drone_count = BATCH_HEADER.unpack_from(payload)
+    if magic != BATCH_MAGIC or version != SCHEMA_VERSION:
+        raise ValueError(f"Unsupported telemetry batch ({magic!r}, version {version})")
+    offset = BATCH_HEADER.size
+
+    drone_ids = []
+    for _ in range(drone_count):
+        length = payload[offset]
+        drone_ids.append(payload[offset + 1:offset + 1 + length].decode('utf-8'))
+        offset += 1 + length
+
+    def column(code: str, size: int) -> Tuple[Any, ...]:
+        nonlocal offset
+        values = struct.unpack_from(f'<{size}{code}', payload, offset)
+        offset += struct.calcsize(f'<{size}{code}')
+        return values
+
+    drone_index = column('H', count)
+    timestamps, offset = _unpack_deltas(payload, offset, count, TIMESTAMP_SCALE)
+    presents = column('H', count)
+    null_masks = column('H', count)
+    datas: List[Dict[str, Any]] = [{} for _ in range(count)]
+
+    for index, (name, code) in enumerate(TELEMETRY_SCHEMA):
+        bit = 1 << index
+        rows = [row for row in range(count) if presents[row] & bit]
+        if name in DELTA_SCALES:
+            values, offset = _unpack_deltas(payload, offset, len(rows), DELTA_SCALES[name])
+            for row, value in zip(rows, values):
+                datas[row][name] = value
+        elif code == 's':
+            for row in rows:
+                length = payload[offset]
+                datas[row][name] = payload[offset + 1:offset + 1 + length].decode('utf-8')
+                offset += 1 + length
+        else:
+            for row, value in zip(rows, column(code, len(rows))):
+                datas[row][name] = _round_float32(value) if code == 'f' else value
+        for row in range(count):
+            if null_masks[row] & bit:
+                datas[row][name] = None
+
+    for row in range(count):
+        length = int.from_bytes(payload[offset:offset + 4], 'little')
+        offset += 4
+        if length:
+            datas[row].update(json.loads(payload[offset:offset + length]))
+            offset += length
+
+    return [(timestamps[row], drone_ids[drone_index[row]], datas[row]) for row in range(count)]
+
+
+def compress_batch(batch: bytes, encoding: str = 'deflate') -> bytes:
+    """Compress an encoded batch for upload (Content-Encoding: deflate | lzma | identity)"""
+    if encoding == 'deflate':
+        return zlib.compress(batch, 6)
+    if encoding == 'lzma' and lzma is not None:
+        return lzma.compress(batch, format=lzma.FORMAT_XZ, preset=6)
+    if encoding == 'identity':
+        return batch
+    raise ValueError(f"Unsupported batch encoding: {encoding}")
+
+
+def decompress_batch(body: bytes, encoding: str = 'deflate') -> bytes:
+    """Inverse of compress_batch"""
+    if encoding == 'deflate':
+        return zlib.decompress(body)
+    if encoding == 'lzma' and lzma is not None:
+        return lzma.decompress(body, format=lzma.FORMAT_XZ)
+    if encoding == 'identity':
+        return body
+    raise ValueError(f"Unsupported batch encoding: {encoding}")
@@ -0,0 +1,306 @@
+"""
+MAVLink telemetry log (.tlog) recording and replay
+Record = 8-byte big-endian timestamp (microseconds since epoch) + raw MAVLink frame,
+the format Mission Planner and MAVProxy write, so captures open in either tool and
+field captures can be fed back into any bridge offline.
+
+Replay: python -m src.utils.tlog capture.tlog --udp 127.0.0.1:14550 --speed 10
+        python -m src.utils.tlog capture.tlog --tcp-listen 5760 --speed 0
+"""
+
+import argparse
+import socket
+import struct
+import threading
+import time
+import logging
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+from .mavlink_parser import (
+    MAVLINK_STX_V1, MAVLINK_STX_V2, MAVLINK_V1_HEADER_LEN, MAVLINK_V2_HEADER_LEN,
+    MAVLINK_CHECKSUM_LEN, MAVLINK_SIGNATURE_LEN, MAVLINK_IFLAG_SIGNED
+)
+
+logger = logging.getLogger(__name__)
+
+TLOG_TIMESTAMP = struct.Struct('>Q')
+
+TlogRecord = Tuple[float, bytes]  # (seconds since epoch, raw frame)
+
+
+@dataclass
+class TlogStats:
+    """Recorder / reader statistics"""
+    frames: int = 0
+    bytes: int = 0
+    flushes: int = 0
+    corrupt_records: int = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class TlogWriter:
+    """
+    Buffered .tlog appender, safe to call from the ingestion path
+    Records accumulate in memory and reach the file in buffer_size writes;
+    write() after close() is ignored so a recorder can be stopped from any thread.
+    """
+
+    def __init__(self, path: str, buffer_size: int = 65536):
+        self.path = path
+        self.buffer_size = buffer_size
+        self._file = open(path, 'ab')
+        self._buffer = bytearray()
+        self._lock = threading.Lock()
+        self.stats = TlogStats()
+
+    def write(self, frame: Union[bytes, bytearray, memoryview], timestamp: Optional[float] = None):
+        """Append one raw frame; timestamp in seconds since epoch (now if omitted)"""
+        usec = int((time.time() if timestamp is None else timestamp) * 1_000_000)
+        with self._lock:
+            if self._file is None:
+                return
+            buffer = self._buffer
+            buffer += TLOG_TIMESTAMP.pack(usec)
+            buffer += frame
+            self.stats.frames += 1
+            self.stats.bytes += TLOG_TIMESTAMP.size + len(frame)
+            if len(buffer) >= self.buffer_size:
+                self._flush_locked()
+
+    def flush(self):
+        with self._lock:
+            if self._file is not None:
+                self._flush_locked()
+                self._file.flush()
+
+    def _flush_locked(self):
+        if self._buffer:
+            self._file.write(self._buffer)
+            self._buffer.clear()
+            self.stats.flushes += 1
+
+    def close(self):
+        with self._lock:
+            if self._file is None:
+                return
+            self._flush_locked()
+            self._file.close()
+            self._file = None
+
+    def __enter__(self) -> 'TlogWriter':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _frame_length(data: bytes, offset: int) -> int:
+    """Length of the frame starting at offset, 0 if it is not a frame start"""
+    stx = data[offset]
+    if stx == MAVLINK_STX_V2:
+        length = MAVLINK_V2_HEADER_LEN + data[offset + 1] + MAVLINK_CHECKSUM_LEN
+        if data[offset + 2] & MAVLINK_IFLAG_SIGNED:
+            length += MAVLINK_SIGNATURE_LEN
+        return length
+    if stx == MAVLINK_STX_V1:
+        return MAVLINK_V1_HEADER_LEN + data[offset + 1] + MAVLINK_CHECKSUM_LEN
+    return 0
+
+
+def parse_tlog(data: bytes, stats: Optional[TlogStats] = None) -> Iterator[TlogRecord]:
+    """
+    Split .tlog contents into (timestamp, frame) records
+    tlog has no record lengths: each length comes from the frame header. Parsing
+    stops at the first record that is not a frame or is cut off (capture killed mid-write).
+    """
+    stats = stats if stats is not None else TlogStats()
+    offset = 0
+    size = len(data)
+    header = TLOG_TIMESTAMP.size
+
+    while offset + header + 3 <= size:
+        start = offset + header
+        length = _frame_length(data, start)
+        if not length or start + length > size:
+            stats.corrupt_records += 1
+            logger.warning(f"⚠️ tlog record at byte {offset} is not a complete MAVLink frame, stopping")
+            return
+
+        yield TLOG_TIMESTAMP.unpack_from(data, offset)[0] / 1_000_000, data[start:start + length]
+        stats.frames += 1
+        stats.bytes += header + length
+        offset = start + length
+
+    if offset != size:
+        stats.corrupt_records += 1
+
+
+def read_tlog(path: str, stats: Optional[TlogStats] = None) -> List[TlogRecord]:
+    """Load a whole capture (field captures are a few MB)"""
+    with open(path, 'rb') as f:
+        return list(parse_tlog(f.read(), stats))
+
+
+@dataclass
+class ReplayStats:
+    """Replay statistics"""
+    frames_sent: int = 0
+    bytes_sent: int = 0
+    sends: int = 0
+    elapsed: float = 0.0
+    capture_duration: float = 0.0
+
+    @property
+    def frames_per_second(self) -> float:
+        return self.frames_sent / self.elapsed if self.elapsed else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        stats = asdict(self)
+        stats['frames_per_second'] = self.frames_per_second
+        return stats
+
+
+class TlogReplay:
+    """
+    Stand-in autopilot: feeds a capture to a bridge over a local UDP or TCP link
+
+    speed: 1.0 - capture timing, N - N times faster, 0 - as fast as the link accepts.
+    Frames that are due together go out in one send of up to chunk_size bytes
+    (one datagram for UDP, so keep it under the receiver's max datagram size).
+    Calls block; run them in a thread next to the bridge under test.
+    """
+
+    def __init__(self, records: List[TlogRecord], speed: float = 1.0, chunk_size: int = 1024):
+        self.records = records
+        self.speed = speed
+        self.chunk_size = chunk_size
+        self.stats = ReplayStats()
+        self._listener: Optional[socket.socket] = None
+        self._stopped = threading.Event()
+
+    @classmethod
+    def from_file(cls, path: str, **kwargs) -> 'TlogReplay':
+        return cls(read_tlog(path), **kwargs)
+
+    def stop(self):
+        self._stopped.set()
+
+    def _chunks(self) -> Iterator[Tuple[bytes, int]]:
+        """(bytes, frame count) per send, released at capture time / speed"""
+        records = self.records
+        if not records:
+            return
+        first = records[0][0]
+        self.stats.capture_duration = records[-1][0] - first
+        started = time.perf_counter()
+        chunk = bytearray()
+        count = 0
+
+        for timestamp, frame in records:
+            if self._stopped.is_set():
+                break
+            if self.speed > 0:
+                delay = started + (timestamp - first) / self.speed - time.perf_counter()
+                if delay > 0:
+                    if chunk:
+                        yield bytes(chunk), count
+                        chunk.clear()
+                        count = 0
+                    time.sleep(delay)
+            if chunk and len(chunk) + len(frame) > self.chunk_size:
+                yield bytes(chunk), count
+                chunk.clear()
+                count = 0
+            chunk += frame
+            count += 1
+
+        if chunk:
+            yield bytes(chunk), count
+
+    def _run(self, send) -> ReplayStats:
+        started = time.perf_counter()
+        for chunk, count in self._chunks():
+            send(chunk)
+            self.stats.frames_sent += count
+            self.stats.bytes_sent += len(chunk)
+            self.stats.sends += 1
+        self.stats.elapsed = time.perf_counter() - started
+        logger.info(f"📼 Replayed {self.stats.frames_sent} frames in {self.stats.elapsed:.2f}s "
+                    f"({self.stats.frames_per_second:.0f} msg/s)")
+        return self.stats
+
+    def send_udp(self, address: Tuple[str, int]) -> ReplayStats:
+        """Send the capture as datagrams to a bridge listening on address"""
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            return self._run(lambda chunk: sock.sendto(chunk, address))
+
+    def listen_tcp(self, host: str = '127.0.0.1', port: int = 0) -> int:
+        """Open the TCP listener a bridge connects to; returns the bound port"""
+        self._listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._listener.bind((host, port))
+        self._listener.listen(1)
+        return self._listener.getsockname()[1]
+
+    def serve_tcp(self, timeout: float = 10.0) -> ReplayStats:
+        """Wait for one bridge connection, stream the capture, close (sendall = link backpressure)"""
+        if self._listener is None:
+            self.listen_tcp()
+        self._listener.settimeout(timeout)
+        try:
+            connection, address = self._listener.accept()
+        finally:
+            self._listener.close()
+            self._listener = None
+
+        with connection:
+            connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            logger.info(f"📼 Replay client connected: {address}")
+            stats = self._run(connection.sendall)
+            self._finish_tcp(connection)
+            return stats
+
+    @staticmethod
+    def _finish_tcp(connection: socket.socket, timeout: float = 1.0):
+        """
+        Half-close and drain until the bridge hangs up: closing with its heartbeats
+        still unread sends RST, which discards the tail of the capture on the bridge side
+        """
+        connection.shutdown(socket.SHUT_WR)
+        connection.settimeout(timeout)
+        try:
+            while connection.recv(4096):
+                pass
+        except OSError:
+            pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay a MAVLink .tlog capture into a bridge')
+    parser.add_argument('tlog', help='Capture file (.tlog)')
+    parser.add_argument('--speed', type=float, default=1.0, help='1 = real time, N = N times faster, 0 = max')
+    parser.add_argument('--udp', metavar='HOST:PORT', help='Send datagrams to a bridge listening here')
+    parser.add_argument('--tcp-listen', type=int, metavar='PORT', help='Serve the capture to one TCP client')
+    parser.add_argument('--chunk-size', type=int, default=1024, help='Bytes per send')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    stats = TlogStats()
+    replay = TlogReplay(read_tlog(args.tlog, stats), speed=args.speed, chunk_size=args.chunk_size)
+    logger.info(f"📼 Loaded {stats.frames} frames from {args.tlog}")
+
+    if args.udp:
+        host, _, port = args.udp.rpartition(':')
+        replay.send_udp((host or '127.0.0.1', int(port)))
+    elif args.tcp_listen is not None:
+        replay.listen_tcp('0.0.0.0', args.tcp_listen)
+        replay.serve_tcp(timeout=None)
+    else:
+        parser.error('one of --udp or --tcp-listen is required')
+
+
+if __name__ == '__main__':
+    main()
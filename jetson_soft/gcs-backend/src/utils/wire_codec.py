@@ -0,0 +1,73 @@
+"""
+Wire Codec - Message encodings for realtime clients (SocketIO, WebSocket bridge)
+JSON text by default; MessagePack or CBOR binary when a client negotiates it
+and the library is installed. Binary encodings carry bytes (raw MAVLink frames)
+as-is, JSON carries them as hex strings.
+"""
+
+import json
+from typing import Any, Iterable, List, Union
+
+try:
+    import msgpack  # Optional: pip install msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import cbor2  # Optional: pip install cbor2
+except ImportError:
+    cbor2 = None
+
+DEFAULT_ENCODING = 'json'
+
+
+def available_encodings() -> List[str]:
+    """Encodings this process can produce, in order of preference for binary clients"""
+    encodings = [DEFAULT_ENCODING]
+    if msgpack is not None:
+        encodings.append('msgpack')
+    if cbor2 is not None:
+        encodings.append('cbor')
+    return encodings
+
+
+def negotiate(requested: Union[str, Iterable[str], None]) -> str:
+    """First requested encoding that is available (list or comma-separated); JSON otherwise"""
+    if isinstance(requested, str):
+        requested = requested.split(',')
+    available = available_encodings()
+    for name in requested or ():
+        name = str(name).strip().lower()
+        if name in available:
+            return name
+    return DEFAULT_ENCODING
+
+
+def is_binary(encoding: str) -> bool:
+    return encoding != DEFAULT_ENCODING
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return bytes(value).hex()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def encode(data: Any, encoding: str = DEFAULT_ENCODING) -> Union[str, bytes]:
+    """str for JSON (text frame), bytes for binary encodings"""
+    if encoding == 'msgpack':
+        return msgpack.packb(data, use_bin_type=True)
+    if encoding == 'cbor':
+        return cbor2.dumps(data)
+    return json.dumps(data, separators=(',', ':'), default=_json_default)
+
+
+def decode(message: Union[str, bytes], encoding: str = DEFAULT_ENCODING) -> Any:
+    """Text frames are always JSON; binary frames use the negotiated encoding"""
+    if isinstance(message, str) or encoding == DEFAULT_ENCODING:
+        return json.loads(message)
+    if encoding == 'msgpack':
+        return msgpack.unpackb(message, raw=False)
+    if encoding == 'cbor':
+        return cbor2.loads(message)
+    raise ValueError(f"Unsupported wire encoding: {encoding}")
@@ -0,0 +1,129 @@
+"""
+Локальная замена edge-функции ingest-telemetry для тестов и ручной проверки выгрузки
+Декодирует колоночные пакеты и JSON, проверяет, что пакет перекодируется байт-в-байт
+
+Запуск: python tests/ingest_server.py --port 8787 [--json-only] [--encodings deflate]
+"""
+
+import json
+import threading
+import argparse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, Any, List, Optional, Sequence
+
+# Import services
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.utils.telemetry_codec import (
+    Row, encode_batch, decode_batch, decompress_batch, BATCH_CONTENT_TYPE, BATCH_ENCODINGS
+)
+from src.services.central_server_sync import ENCODINGS_HEADER
+
+INGEST_PATH = '/functions/v1/ingest-telemetry'
+
+
+class IngestTestServer:
+    """HTTP сервер, принимающий выгрузку телеметрии так же, как edge-функция"""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0,
+                 encodings: Sequence[str] = BATCH_ENCODINGS, json_only: bool = False,
+                 failures: Sequence[int] = ()):
+        self.encodings = list(encodings)
+        self.json_only = json_only
+        self.failures = list(failures)  # Statuses answered to the next uploads (outage, auth)
+        self.rows: List[Row] = []
+        self.requests: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> 'IngestTestServer':
+        self._thread = threading.Thread(target=self._server.serve_forever, name="Ingest-Test-Server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def ingest(self, content_type: str, encoding: str, body: bytes):
+        """(status, response dict, advertise encodings) for one upload"""
+        request = {'content_type': content_type, 'encoding': encoding, 'size': len(body)}
+        with self._lock:
+            self.requests.append(request)
+            if self.failures:
+                return self.failures.pop(0), {'error': 'Service unavailable'}, False
+
+        if content_type == BATCH_CONTENT_TYPE:
+            if self.json_only:
+                # Function without batch support refuses the binary body
+                return 400, {'error': 'Missing required fields: drone_id, telemetry'}, False
+            if encoding not in self.encodings:
+                return 415, {'error': f'Unsupported encoding: {encoding}'}, True
+
+            batch = decompress_batch(body, encoding)
+            rows = decode_batch(batch)
+            if encode_batch(rows) != batch:
+                return 422, {'error': 'Batch does not round-trip'}, True
+        else:
+            payload = json.loads(body)
+            rows = [(r.get('timestamp', 0.0), r.get('drone_id', ''), r.get('data', r))
+                    for r in payload.get('records', [])]
+
+        with self._lock:
+            self.rows.extend(rows)
+        request['rows'] = len(rows)
+        return 200, {'success': True, 'processed': len(rows)}, not self.json_only
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                if self.path != INGEST_PATH:
+                    self.send_error(404)
+                    return
+
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                status, response, advertise = server.ingest(
+                    self.headers.get('Content-Type', 'application/json').split(';')[0].strip(),
+                    self.headers.get('Content-Encoding', 'identity'),
+                    body
+                )
+
+                data = json.dumps(response).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                if advertise:
+                    self.send_header(ENCODINGS_HEADER, ', '.join(server.encodings))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local ingest-telemetry stand-in')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8787)
+    parser.add_argument('--json-only', action='store_true', help='Behave like the legacy JSON-only function')
+    parser.add_argument('--encodings', default=','.join(BATCH_ENCODINGS))
+    args = parser.parse_args()
+
+    server = IngestTestServer(args.host, args.port, args.encodings.split(','), args.json_only).start()
+    print(f"Ingest test server on {server.url}{INGEST_PATH}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.stop()
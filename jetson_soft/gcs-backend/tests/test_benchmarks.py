@@ -0,0 +1,85 @@
+"""
+Тесты набора бенчмарков конвейера: все случаи выполняются без автопилота, базовая линия и пороги регрессии
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+# Import services
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'benchmarks'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import bench_pipeline
+from src.utils.tlog import TlogWriter
+
+
+class TestPipelineBenchmark(unittest.TestCase):
+    """Тест бенчмарков: синтетический и записанный трафик, сравнение с базовой линией"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.results = bench_pipeline.run(quick=True, rounds=1)
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_all_cases_run(self):
+        """Тест: все стадии конвейера измерены"""
+        names = [result['name'] for result in self.results]
+        self.assertEqual(names, ['decode', 'bridge_ingest', 'buffer_add_1000', 'buffer_pending_1000',
+                                 'buffer_ack_1000', 'broadcast_10', 'sync_encode_batch', 'sync_encode_json'])
+        for result in self.results:
+            self.assertGreater(result['median_us'], 0, result['name'])
+            self.assertGreater(result['ops_per_sec'], 0, result['name'])
+        sync = {result['name']: result for result in self.results}
+        self.assertLess(sync['sync_encode_batch']['bytes'], sync['sync_encode_json']['bytes'])
+
+    def test_baseline_round_trip_and_regression(self):
+        """Тест: базовая линия сохраняется в JSON; замедление сверх допуска - регрессия"""
+        path = os.path.join(self.tmpdir, 'baseline.json')
+        bench_pipeline.save_baseline(path, self.results, quick=True)
+        baseline = bench_pipeline.load_baseline(path)
+        self.assertEqual(baseline['results'], self.results)
+
+        comparison = bench_pipeline.compare(self.results, baseline, tolerance=0.25)
+        self.assertEqual(len(comparison), len(self.results))
+        self.assertFalse(any(entry['regressed'] for entry in comparison))
+
+        slower = [dict(result, median_us=result['median_us'] * 1.5) for result in self.results]
+        regressed = {entry['name'] for entry in bench_pipeline.compare(slower, baseline, 0.25) if entry['regressed']}
+        # Sub-microsecond cases stay under the absolute noise floor
+        expected = {result['name'] for result in self.results if result['median_us'] * 0.5 > 0.05}
+        self.assertEqual(regressed, expected)
+        self.assertIn('bridge_ingest', regressed)
+
+        within = [dict(result, median_us=result['median_us'] * 1.2) for result in self.results]
+        self.assertFalse(any(entry['regressed'] for entry in bench_pipeline.compare(within, baseline, 0.25)))
+
+    def test_recorded_traffic(self):
+        """Тест: декодер и мост измеряются на записанном .tlog"""
+        path = os.path.join(self.tmpdir, 'capture.tlog')
+        stream = bench_pipeline.synthetic_stream(500)
+        frames = []
+        offset = 0
+        while offset < len(stream):
+            length = stream[offset + 1] + 12
+            frames.append(stream[offset:offset + length])
+            offset += length
+        with TlogWriter(path) as writer:
+            for frame in frames:
+                writer.write(frame)
+
+        results = bench_pipeline.run(quick=True, tlog=path, rounds=1)
+        self.assertEqual(results[0]['name'], 'decode')
+        self.assertEqual(results[0]['ops'], 500)
+        self.assertEqual(results[1]['ops'], 500)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
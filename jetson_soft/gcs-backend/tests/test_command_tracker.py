@@ -0,0 +1,247 @@
+"""
+Тесты отправки MAVLink команд: сопоставление ответов, таймауты, повторы
+"""
+
+import asyncio
+import unittest
+
+# Import services
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.services.command_tracker import CommandTracker
+from src.utils.mavlink_encoder import MAVLinkFrameEncoder
+from src.utils.mavlink_messages import decode_message
+from src.utils.mavlink_parser import MAVLinkFrameDecoder
+
+
+class FakeAutopilot:
+    """Автопилот: декодирует команды и отвечает через reply(record) -> [(message, fields)]"""
+
+    def __init__(self, tracker, reply=None, delay=0.01, drop_first=0):
+        self.tracker = tracker
+        self.reply = reply or (lambda record: [])
+        self.delay = delay
+        self.drop_first = drop_first
+        self.decoder = MAVLinkFrameDecoder()
+        self.encoder = MAVLinkFrameEncoder(1, 1)
+        self.received = []
+
+    def send(self, data):
+        self.decoder.feed(data)
+        for frame in self.decoder:
+            record = decode_message(frame.message_id, frame.payload)
+            self.received.append(record)
+            if len(self.received) <= self.drop_first:
+                continue
+            for message, fields in self.reply(record):
+                asyncio.get_running_loop().call_later(self.delay, self.deliver, message, fields)
+        return True
+
+    def deliver(self, message, fields):
+        decoder = MAVLinkFrameDecoder()
+        decoder.feed(self.encoder.encode_message(message, fields))
+        self.tracker.handle_frame(decoder.next_frame())
+
+
+def ack(record, result=0, **fields):
+    return [('COMMAND_ACK', {'command': record.command, 'result': result, 'target_system': 255, **fields})]
+
+
+class TestCommandTracker(unittest.TestCase):
+    """Тест таблицы исходящих команд"""
+
+    def setUp(self):
+        self.tracker = CommandTracker(None, timeout=0.1, retries=2)
+
+    def run_with(self, autopilot, coro):
+        self.tracker.send = autopilot.send
+        return asyncio.run(coro)
+
+    def test_command_long_accepted(self):
+        """Тест: COMMAND_LONG -> COMMAND_ACK, цель по умолчанию"""
+        autopilot = FakeAutopilot(self.tracker, ack)
+        result = self.run_with(autopilot, self.tracker.execute('COMMAND_LONG', {'command': 400, 'params': [1]}))
+
+        self.assertEqual(result.status, 'accepted')
+        self.assertEqual(result.attempts, 1)
+        self.assertEqual(result.result_name, 'ACCEPTED')
+        self.assertEqual((autopilot.received[0].target_system, autopilot.received[0].param1), (1, 1.0))
+        self.assertEqual(self.tracker.stats.in_flight, 0)
+        self.assertEqual(self.tracker.outstanding(), [])
+
+    def test_retry_numbers_confirmation(self):
+        """Тест: повтор после потери, confirmation увеличивается"""
+        autopilot = FakeAutopilot(self.tracker, ack, drop_first=1)
+        result = self.run_with(autopilot, self.tracker.execute('COMMAND_LONG', {'command': 22}))
+
+        self.assertEqual(result.status, 'accepted')
+        self.assertEqual(result.attempts, 2)
+        self.assertEqual([record.confirmation for record in autopilot.received], [0, 1])
+        self.assertEqual(self.tracker.stats.retries, 1)
+
+    def test_timeout_after_retries(self):
+        """Тест: без ответа — timeout после всех попыток"""
+        autopilot = FakeAutopilot(self.tracker)
+        result = self.run_with(autopilot, self.tracker.execute('COMMAND_LONG', {'command': 22}))
+
+        self.assertEqual(result.status, 'timeout')
+        self.assertEqual(result.attempts, 3)
+        self.assertEqual(self.tracker.stats.timeouts, 1)
+
+    def test_in_progress_extends_wait(self):
+        """Тест: IN_PROGRESS продлевает ожидание без повторной отправки"""
+        autopilot = FakeAutopilot(self.tracker)
+
+        async def scenario():
+            # Progress every 80 ms (timeout 100 ms), final ACK at 300 ms
+            loop = asyncio.get_running_loop()
+            for progress, delay in ((25, 0.08), (50, 0.16), (75, 0.24)):
+                loop.call_later(delay, autopilot.deliver, 'COMMAND_ACK',
+                                {'command': 241, 'result': 5, 'progress': progress})
+            loop.call_later(0.3, autopilot.deliver, 'COMMAND_ACK', {'command': 241})
+            return await self.tracker.execute('COMMAND_LONG', {'command': 241})
+
+        result = self.run_with(autopilot, scenario())
+
+        self.assertEqual(result.status, 'accepted')
+        self.assertEqual(result.attempts, 1)
+        self.assertGreater(result.latency_ms, 250)
+
+    def test_many_in_flight(self):
+        """Тест: команды выполняются параллельно, каждая ждёт только свой ответ"""
+        commands = [400, 176, 22, 21, 20, 183, 178, 511]
+        autopilot = FakeAutopilot(self.tracker, lambda record: ack(record, result=record.command % 2), delay=0.05)
+
+        async def scenario():
+            tasks = [asyncio.ensure_future(self.tracker.execute('COMMAND_LONG', {'command': command}))
+                     for command in commands]
+            await asyncio.sleep(0.01)
+            outstanding = self.tracker.outstanding()
+            return outstanding, await asyncio.gather(*tasks)
+
+        outstanding, results = self.run_with(autopilot, scenario())
+
+        self.assertEqual(len(outstanding), len(commands))
+        self.assertEqual([result.status for result in results],
+                         ['accepted' if command % 2 == 0 else 'rejected' for command in commands])
+        self.assertTrue(all(result.attempts == 1 for result in results))
+        self.assertLess(max(result.latency_ms for result in results), 100)
+
+    def test_same_reply_key_serialized(self):
+        """Тест: одинаковые команды одной цели ждут друг друга"""
+        autopilot = FakeAutopilot(self.tracker, ack, delay=0.03)
+
+        async def scenario():
+            return await asyncio.gather(*[self.tracker.execute('COMMAND_LONG', {'command': 400, 'params': [p]})
+                                          for p in (1, 0)])
+
+        results = self.run_with(autopilot, scenario())
+
+        self.assertEqual([result.status for result in results], ['accepted', 'accepted'])
+        self.assertEqual(self.tracker.stats.waited, 1)
+        self.assertEqual(len(autopilot.received), 2)
+
+    def test_ack_for_other_gcs_ignored(self):
+        """Тест: COMMAND_ACK для другой GCS не завершает команду"""
+        autopilot = FakeAutopilot(self.tracker, lambda record: ack(record, target_system=42))
+        result = self.run_with(autopilot, self.tracker.execute('COMMAND_LONG', {'command': 400}, retries=0))
+
+        self.assertEqual(result.status, 'timeout')
+
+    def test_param_set_and_set_mode(self):
+        """Тест: PARAM_SET -> PARAM_VALUE, SET_MODE -> COMMAND_ACK"""
+        def reply(record):
+            if record.name == 'PARAM_SET':
+                return [('PARAM_VALUE', {'param_id': record.param_id, 'param_value': record.param_value,
+                                         'param_count': 900, 'param_index': 12})]
+            return [('COMMAND_ACK', {'command': 11, 'result': 0})]
+
+        autopilot = FakeAutopilot(self.tracker, reply)
+
+        async def scenario():
+            return await asyncio.gather(
+                self.tracker.execute('PARAM_SET', {'param_id': 'RTL_ALT', 'param_value': 3000, 'param_type': 9}),
+                self.tracker.execute('SET_MODE', {'base_mode': 1, 'custom_mode': 4})
+            )
+
+        param, mode = self.run_with(autopilot, scenario())
+
+        self.assertEqual(param.status, 'completed')
+        self.assertEqual(param.reply['param_value'], 3000.0)
+        self.assertEqual(mode.status, 'accepted')
+
+    def test_param_request_read(self):
+        """Тест: PARAM_REQUEST_READ по имени уходит с param_index=-1, по индексу - с индексом"""
+        params = ['SYSID_THISMAV', 'RTL_ALT']
+
+        def reply(record):
+            # Autopilot semantics: param_id is used only when param_index is -1
+            index = params.index(record.param_id) if record.param_index == -1 else record.param_index
+            return [('PARAM_VALUE', {'param_id': params[index], 'param_value': 100.0 + index,
+                                     'param_count': len(params), 'param_index': index})]
+
+        autopilot = FakeAutopilot(self.tracker, reply)
+
+        async def scenario():
+            return await asyncio.gather(
+                self.tracker.execute('PARAM_REQUEST_READ', {'param_id': 'RTL_ALT'}),
+                self.tracker.execute('PARAM_REQUEST_READ', {'param_index': 0})
+            )
+
+        by_name, by_index = self.run_with(autopilot, scenario())
+
+        self.assertEqual(autopilot.received[0].param_index, -1)
+        self.assertEqual(by_name.status, 'completed')
+        self.assertEqual(by_name.reply['param_value'], 101.0)
+        self.assertEqual(by_name.attempts, 1)
+        self.assertEqual(by_index.status, 'completed')
+        self.assertEqual(by_index.reply['param_value'], 100.0)
+
+    def test_mission_upload(self):
+        """Тест: MISSION_COUNT / MISSION_ITEM_INT / MISSION_ACK"""
+        items = 3
+
+        def reply(record):
+            if record.name == 'MISSION_COUNT':
+                return [('MISSION_REQUEST_INT', {'seq': 0, 'target_system': 255})]
+            if record.seq + 1 < items:
+                return [('MISSION_REQUEST_INT', {'seq': record.seq + 1, 'target_system': 255})]
+            return [('MISSION_ACK', {'type': 0, 'target_system': 255})]
+
+        autopilot = FakeAutopilot(self.tracker, reply)
+
+        async def upload():
+            results = [await self.tracker.execute('MISSION_COUNT', {'count': items})]
+            for seq in range(items):
+                results.append(await self.tracker.execute('MISSION_ITEM_INT', {
+                    'seq': seq, 'command': 16, 'frame': 6, 'x': 557512345, 'y': 376123456, 'z': 50
+                }))
+            return results
+
+        results = self.run_with(autopilot, upload())
+
+        self.assertEqual([result.reply['msg_type'] for result in results],
+                         ['MISSION_REQUEST_INT'] * 3 + ['MISSION_ACK'])
+        self.assertEqual(results[-1].status, 'accepted')
+        self.assertEqual(autopilot.received[2].x, 557512345)
+
+    def test_fire_and_forget_and_errors(self):
+        """Тест: сообщения без ответа, неизвестные поля и разрыв связи"""
+        autopilot = FakeAutopilot(self.tracker)
+        result = self.run_with(autopilot, self.tracker.execute('PARAM_REQUEST_LIST'))
+        self.assertEqual((result.status, result.attempts), ('sent', 1))
+
+        with self.assertRaises(ValueError):
+            asyncio.run(self.tracker.execute('COMMAND_LONG', {'cmd': 400}))
+        with self.assertRaises(ValueError):
+            asyncio.run(self.tracker.execute('HEARTBEAT_V3'))
+
+        self.tracker.send = lambda data: False
+        result = asyncio.run(self.tracker.execute('COMMAND_LONG', {'command': 400}))
+        self.assertEqual(result.status, 'failed')
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
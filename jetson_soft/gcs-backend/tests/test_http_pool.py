@@ -0,0 +1,177 @@
+"""
+Тесты пула HTTP соединений к центральному серверу
+"""
+
+import json
+import threading
+import time
+import unittest
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Import services
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.services.http_pool import HTTPPool, LatencyHistogram, httpx
+from src.services.central_server_sync import CentralServerSync
+
+
+class SlowServer:
+    """HTTP/1.1 сервер: /slow отвечает с задержкой, считает TCP соединения"""
+
+    def __init__(self, delay=0.5):
+        self.delay = delay
+        self.connections = 0
+        self.paths = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                server.connections += 1
+
+            def _reply(self, body):
+                server.paths.append(self.path)
+                if self.path.startswith('/slow'):
+                    time.sleep(server.delay)
+                data = json.dumps({'path': self.path, 'body': body}).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._reply('')
+
+            def do_POST(self):
+                self._reply(self.rfile.read(int(self.headers.get('Content-Length', 0))).decode('utf-8'))
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class TestLatencyHistogram(unittest.TestCase):
+    """Тест гистограммы задержек"""
+
+    def test_percentiles(self):
+        """Тест оценки перцентилей по корзинам"""
+        histogram = LatencyHistogram()
+        for _ in range(90):
+            histogram.observe(3.0)
+        for _ in range(10):
+            histogram.observe(400.0)
+
+        stats = histogram.to_dict()
+        self.assertEqual(stats['count'], 100)
+        self.assertEqual(stats['p50_ms'], 5.0)
+        self.assertEqual(stats['p95_ms'], 500.0)
+        self.assertEqual(stats['max_ms'], 400.0)
+        self.assertEqual(stats['buckets']['le_5'], 90)
+        self.assertEqual(stats['buckets']['le_500'], 10)
+
+
+class TestHTTPPool(unittest.TestCase):
+    """Тест пула соединений и очередей по эндпоинтам"""
+
+    def setUp(self):
+        self.server = SlowServer()
+        self.pool = HTTPPool(self.server.url, headers={'apikey': 'test'},
+                             endpoints={'telemetry': 1, 'status': 1})
+
+    def tearDown(self):
+        self.pool.close()
+        self.server.stop()
+
+    @unittest.skipIf(httpx is not None, "httpx manages its own connections")
+    def test_keep_alive(self):
+        """Тест: последовательные запросы идут по одному соединению"""
+        for i in range(20):
+            response = self.pool.request('status', 'POST', '/status', body=f'{i}'.encode())
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()['body'], str(i))
+            self.assertEqual(response.headers.get('content-type'), 'application/json')
+
+        self.assertEqual(self.server.connections, 1)
+        self.assertEqual(self.pool.get_stats()['connections_opened'], 1)
+
+    def test_status_not_blocked_by_telemetry(self):
+        """Тест: статус не ждёт очередь медленной телеметрии"""
+        uploads = [self.pool.submit('telemetry', 'POST', '/slow', body=b'x') for _ in range(3)]
+        time.sleep(0.05)
+
+        started = time.time()
+        response = self.pool.request('status', 'GET', '/status', params={'drone': 'a'})
+        elapsed = time.time() - started
+
+        self.assertEqual(response.json()['path'], '/status?drone=a')
+        self.assertLess(elapsed, 0.4)
+        self.assertFalse(uploads[-1].done())
+
+        for upload in uploads:
+            self.assertEqual(upload.result(timeout=5).status_code, 200)
+
+        stats = self.pool.get_stats()['endpoints']
+        self.assertEqual(stats['telemetry']['requests'], 3)
+        self.assertGreaterEqual(stats['telemetry']['latency']['p50_ms'], 500)
+        self.assertLess(stats['status']['latency']['p50_ms'], 500)
+
+    def test_timeout(self):
+        """Тест: таймаут запроса не ломает следующие запросы"""
+        with self.assertRaises(TimeoutError):
+            self.pool.request('telemetry', 'GET', '/slow', timeout=0.1)
+
+        self.assertEqual(self.pool.request('telemetry', 'GET', '/fast').status_code, 200)
+        self.assertEqual(self.pool.get_stats()['endpoints']['telemetry']['timeouts'], 1)
+
+    def test_restart_after_close(self):
+        """Тест: пул работает после close()"""
+        self.assertEqual(self.pool.request('status', 'GET', '/a').status_code, 200)
+        self.pool.close()
+        self.assertEqual(self.pool.request('status', 'GET', '/b').status_code, 200)
+
+
+class TestSyncEndpoints(unittest.TestCase):
+    """Тест маршрутизации запросов CentralServerSync по эндпоинтам"""
+
+    def setUp(self):
+        self.server = SlowServer()
+        self.sync = CentralServerSync(server_url=self.server.url, api_key='test_key')
+
+    def tearDown(self):
+        self.sync.stop()
+        self.server.stop()
+
+    def test_endpoint_histograms(self):
+        """Тест: гистограммы задержек отдельно для каждого эндпоинта"""
+        self.assertTrue(self.sync.send_drone_status('drone', {'armed': False}))
+        self.assertEqual(self.sync.get_mission_updates('drone')['path'],
+                         '/rest/v1/missions_extended?org_id=eq.your-org-id')
+
+        stats = self.sync.get_sync_stats()
+        self.assertNotIn('latency_ms', stats)
+        endpoints = stats['http']['endpoints']
+        self.assertEqual(endpoints['status']['latency']['count'], 1)
+        self.assertEqual(endpoints['missions']['latency']['count'], 1)
+        self.assertEqual(endpoints['telemetry']['latency']['count'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,124 @@
+"""
+Тесты реестра определений MAVLink сообщений
+"""
+
+import unittest
+import struct
+
+# Import services
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.utils.mavlink_messages import (
+    decode_message, get_message_definition, MAVLinkRecord, MESSAGE_DEFINITIONS,
+    ATTITUDE, BATTERY_STATUS, PARAM_VALUE, GPS_RAW_INT, COMMAND_LONG, PARAM_SET
+)
+from src.utils.mavlink_encoder import MAVLinkFrameEncoder
+from src.utils.mavlink_parser import MAVLinkFrameDecoder
+
+
+class TestMessageDefinitions(unittest.TestCase):
+    """Тест предкомпилированных декодеров сообщений"""
+    
+    def test_struct_sizes_match_wire_lengths(self):
+        """Тест размеров структур (с расширениями)"""
+        self.assertEqual(get_message_definition(0).size, 9)
+        self.assertEqual(get_message_definition(1).size, 43)
+        self.assertEqual(GPS_RAW_INT.size, 52)
+        self.assertEqual(ATTITUDE.size, 28)
+        self.assertEqual(BATTERY_STATUS.size, 54)
+    
+    def test_decode_attitude(self):
+        """Тест декодирования ATTITUDE"""
+        payload = struct.pack('<Iffffff', 1000, 0.1, -0.2, 1.5, 0.0, 0.0, 0.0)
+        record = decode_message(30, memoryview(payload))
+        
+        self.assertIsInstance(record, MAVLinkRecord)
+        self.assertEqual(record.time_boot_ms, 1000)
+        self.assertAlmostEqual(record.yaw, 1.5, places=5)
+        self.assertAlmostEqual(record.to_dict()['pitch'], -0.2, places=5)
+    
+    def test_truncated_payload_zero_extended(self):
+        """Тест нулевого дополнения усечённых v2 payload"""
+        payload = struct.pack('<Qiii', 1, 557558000, 376176000, 150000)
+        record = GPS_RAW_INT.decode(payload)
+        
+        self.assertEqual(record.lat, 557558000)
+        self.assertEqual(record.satellites_visible, 0)
+        self.assertEqual(record.yaw, 0)
+    
+    def test_array_and_string_fields(self):
+        """Тест массивов и строковых полей"""
+        voltages = [4200, 4150, 4100] + [0xFFFF] * 7
+        battery = BATTERY_STATUS.decode(struct.pack('<iih10Hh', 0, 0, 0, *voltages, 1234))
+        self.assertEqual(battery.voltages, tuple(voltages))
+        self.assertEqual(battery.current_battery, 1234)
+        
+        param = PARAM_VALUE.decode(struct.pack('<fHH16sB', 1.0, 10, 3, b'ARMING_CHECK', 9))
+        self.assertEqual(param.param_id, 'ARMING_CHECK')
+    
+    def test_unknown_message(self):
+        """Тест неизвестного ID сообщения"""
+        self.assertIsNone(decode_message(65000, b'\x00' * 10))
+
+
+class TestMessageEncoding(unittest.TestCase):
+    """Тест кодирования исходящих сообщений и кадров v2"""
+
+    def decode_frames(self, data):
+        decoder = MAVLinkFrameDecoder()
+        decoder.feed(data)
+        return list(decoder), decoder.stats
+
+    def test_payload_round_trip(self):
+        """Тест: encode/decode, отсутствующие поля равны нулю"""
+        payload = COMMAND_LONG.encode(command=400, param1=1, target_system=1, target_component=1)
+        record = COMMAND_LONG.decode(payload)
+        self.assertEqual(len(payload), COMMAND_LONG.size)
+        self.assertEqual((record.command, record.param1, record.param7, record.confirmation), (400, 1.0, 0.0, 0))
+
+        param = PARAM_SET.decode(PARAM_SET.encode({'param_id': 'ARMING_CHECK', 'param_value': 0.5}))
+        self.assertEqual(param.param_id, 'ARMING_CHECK')
+        self.assertEqual(param.param_value, 0.5)
+
+        with self.assertRaises(ValueError):
+            COMMAND_LONG.encode(cmd=400)
+
+    def test_lookup_by_name(self):
+        """Тест поиска определения по имени"""
+        self.assertIs(get_message_definition('command_long'), COMMAND_LONG)
+        self.assertIsNone(get_message_definition('NOT_A_MESSAGE'))
+
+    def test_v2_frames(self):
+        """Тест: CRC_EXTRA, номер последовательности, усечение нулей, адресация"""
+        encoder = MAVLinkFrameEncoder(255, 190)
+        encoder.sequence = 254
+        data = b''.join(encoder.encode_message('COMMAND_LONG', command=22, target_system=1, target_component=1)
+                        for _ in range(3))
+
+        frames, stats = self.decode_frames(data)
+        self.assertEqual(stats.crc_errors, 0)
+        self.assertEqual([frame.sequence for frame in frames], [254, 255, 0])
+        frame = frames[0]
+        self.assertEqual((frame.system_id, frame.component_id, frame.message_id), (255, 190, 76))
+        self.assertEqual(frame.target, (1, 1))
+        self.assertEqual(frame.payload_length, 32)  # confirmation = 0 truncated
+
+    def test_all_outbound_messages_frame(self):
+        """Тест: каждое определение с целевой системой кодируется в корректный кадр"""
+        encoder = MAVLinkFrameEncoder()
+        for definition in MESSAGE_DEFINITIONS.values():
+            if 'target_system' not in definition.fieldnames:
+                continue
+            values = {'target_system': 7}
+            if 'target_component' in definition.fieldnames:
+                values['target_component'] = 3
+            frames, stats = self.decode_frames(encoder.encode_message(definition, values))
+            self.assertEqual(stats.crc_errors, 0, definition.name)
+            self.assertEqual(frames[0].target[0], 7, definition.name)
+            self.assertEqual(decode_message(definition.message_id, frames[0].payload).target_system, 7)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,125 @@
+"""
+Тесты потокового декодера MAVLink кадров
+"""
+
+import unittest
+import struct
+
+# Import services
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.utils.mavlink_parser import (
+    MAVLinkFrameDecoder, CRC_EXTRA, crc_x25, crc_accumulate,
+    MAVLINK_SIGNATURE_LEN
+)
+
+
+def build_v2_frame(msg_id, payload, seq=0, sysid=1, compid=1, signed=False):
+    """Собрать кадр MAVLink v2 с корректной CRC"""
+    incompat = 0x01 if signed else 0x00
+    header = bytes([len(payload), incompat, 0, seq, sysid, compid]) + msg_id.to_bytes(3, 'little')
+    crc = crc_accumulate(CRC_EXTRA[msg_id], crc_x25(header + payload))
+    frame = b'\xfd' + header + payload + crc.to_bytes(2, 'little')
+    if signed:
+        frame += bytes(range(MAVLINK_SIGNATURE_LEN))
+    return frame
+
+
+def build_v1_frame(msg_id, payload, seq=0, sysid=1, compid=1):
+    """Собрать кадр MAVLink v1 с корректной CRC"""
+    header = bytes([len(payload), seq, sysid, compid, msg_id])
+    crc = crc_accumulate(CRC_EXTRA[msg_id], crc_x25(header + payload))
+    return b'\xfe' + header + payload + crc.to_bytes(2, 'little')
+
+
+HEARTBEAT_PAYLOAD = struct.pack('<IBBBBB', 4, 2, 3, 0x81, 4, 3)
+
+
+class TestMAVLinkFrameDecoder(unittest.TestCase):
+    """Тест декодера MAVLink кадров"""
+    
+    def setUp(self):
+        self.decoder = MAVLinkFrameDecoder(buffer_size=1024)
+    
+    def test_crc_x25_reference(self):
+        """Тест CRC-X25 (CRC-16/MCRF4XX) на эталонной строке"""
+        self.assertEqual(crc_x25(b'123456789'), 0x6F91)
+    
+    def test_decode_v2_frame(self):
+        """Тест декодирования кадра v2"""
+        self.decoder.feed(build_v2_frame(0, HEARTBEAT_PAYLOAD, seq=7, sysid=3, compid=1))
+        frames = list(self.decoder)
+        
+        self.assertEqual(len(frames), 1)
+        frame = frames[0]
+        self.assertEqual(frame.version, 2)
+        self.assertEqual(frame.sequence, 7)
+        self.assertEqual(frame.system_id, 3)
+        self.assertEqual(frame.message_id, 0)
+        self.assertTrue(frame.crc_checked)
+        self.assertIsInstance(frame.payload, memoryview)
+        self.assertEqual(bytes(frame.payload), HEARTBEAT_PAYLOAD)
+    
+    def test_decode_v1_frame(self):
+        """Тест декодирования кадра v1"""
+        self.decoder.feed(build_v1_frame(0, HEARTBEAT_PAYLOAD, sysid=5))
+        frame = next(self.decoder)
+        
+        self.assertEqual(frame.version, 1)
+        self.assertEqual(frame.system_id, 5)
+        self.assertEqual(bytes(frame.payload), HEARTBEAT_PAYLOAD)
+    
+    def test_decode_signed_frame(self):
+        """Тест кадра v2 с подписью"""
+        signed = build_v2_frame(30, bytes(28), signed=True)
+        self.decoder.feed(signed + build_v2_frame(0, HEARTBEAT_PAYLOAD))
+        frames = list(self.decoder)
+        
+        self.assertEqual([f.message_id for f in frames], [30, 0])
+        self.assertTrue(frames[0].is_signed)
+        self.assertEqual(len(frames[0].signature), MAVLINK_SIGNATURE_LEN)
+        self.assertEqual(bytes(frames[0].raw), signed)
+    
+    def test_resync_after_noise(self):
+        """Тест ресинхронизации после мусора и битых CRC"""
+        good = build_v2_frame(0, HEARTBEAT_PAYLOAD)
+        corrupted = bytearray(good)
+        corrupted[12] ^= 0xFF
+        
+        self.decoder.feed(b'\x00\x11\xfe\x22' * 50 + bytes(corrupted) + good)
+        frames = list(self.decoder)
+        
+        self.assertEqual(len(frames), 1)
+        self.assertEqual(bytes(frames[0].payload), HEARTBEAT_PAYLOAD)
+        self.assertGreaterEqual(self.decoder.stats.crc_errors, 1)
+        self.assertGreater(self.decoder.stats.bytes_discarded, 200)
+    
+    def test_split_frames(self):
+        """Тест кадров, разорванных между чтениями"""
+        stream = b''.join(build_v2_frame(0, HEARTBEAT_PAYLOAD, seq=i) for i in range(50))
+        
+        sequences = []
+        for offset in range(0, len(stream), 7):
+            self.decoder.feed(stream[offset:offset + 7])
+            sequences.extend(frame.sequence for frame in self.decoder)
+        
+        self.assertEqual(sequences, list(range(50)))
+        self.assertEqual(self.decoder.pending_bytes, 0)
+    
+    def test_payload_views_survive_buffer_swap(self):
+        """Тест: memoryview payload остаётся валидным после смены буфера"""
+        self.decoder.feed(build_v2_frame(0, HEARTBEAT_PAYLOAD))
+        first = next(self.decoder)
+        
+        for i in range(200):
+            self.decoder.feed(build_v2_frame(30, bytes([i]) * 28))
+            list(self.decoder)
+        
+        self.assertGreater(self.decoder.stats.buffer_swaps, 0)
+        self.assertEqual(bytes(first.payload), HEARTBEAT_PAYLOAD)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,140 @@
+"""
+Тесты маршрутизатора MAVLink (несколько аппаратов, пересылка кадров)
+"""
+
+import unittest
+import socket
+import struct
+import time
+
+# Import services
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.services.mavlink_router import MAVLinkRouter
+from src.utils.mavlink_parser import MAVLinkFrameDecoder, CRC_EXTRA, crc_x25, crc_accumulate
+
+
+def build_v2_frame(msg_id, payload, sysid=1, compid=1):
+    """Собрать кадр MAVLink v2 с корректной CRC"""
+    header = bytes([len(payload), 0, 0, 0, sysid, compid]) + msg_id.to_bytes(3, 'little')
+    crc = crc_accumulate(CRC_EXTRA[msg_id], crc_x25(header + payload))
+    return b'\xfd' + header + payload + crc.to_bytes(2, 'little')
+
+
+def decode(data):
+    decoder = MAVLinkFrameDecoder()
+    decoder.feed(data)
+    return next(decoder)
+
+
+HEARTBEAT = struct.pack('<IBBBBB', 0, 2, 3, 0x81, 4, 3)
+
+
+def command_long(target_system, target_component):
+    return struct.pack('<7fHBBB', 0, 0, 0, 0, 0, 0, 0, 400, target_system, target_component, 0)
+
+
+class TestMAVLinkRouter(unittest.TestCase):
+    """Тест маршрутизации по (sysid, compid)"""
+
+    def setUp(self):
+        self.router = MAVLinkRouter()
+        self.sent = {'radio': [], 'gcs': [], 'companion': []}
+        self.endpoints = {
+            name: self.router.add_endpoint(name, out.append)
+            for name, out in self.sent.items()
+        }
+
+    def test_frame_target(self):
+        """Тест чтения target_system/target_component из payload"""
+        self.assertEqual(decode(build_v2_frame(76, command_long(3, 1))).target, (3, 1))
+        self.assertEqual(decode(build_v2_frame(0, HEARTBEAT)).target, (0, 0))
+
+    def test_broadcast_not_echoed(self):
+        """Тест широковещательной пересылки без эха источнику"""
+        frame = decode(build_v2_frame(0, HEARTBEAT, sysid=1))
+
+        written = self.router.route_frame(frame, self.endpoints['radio'])
+
+        self.assertEqual(written, 2)
+        self.assertEqual(self.sent['radio'], [])
+        self.assertEqual(bytes(self.sent['gcs'][0]), bytes(frame.raw))
+        self.assertEqual(self.router.get_routes(), {'1:1': 'radio'})
+
+    def test_targeted_routing(self):
+        """Тест адресной пересылки после изучения маршрутов"""
+        # Vehicles 1 and 2 on the radio, camera 2:100 behind the companion link
+        for sysid in (1, 2):
+            self.router.route_frame(decode(build_v2_frame(0, HEARTBEAT, sysid=sysid)), self.endpoints['radio'])
+        self.router.route_frame(decode(build_v2_frame(0, HEARTBEAT, sysid=2, compid=100)),
+                                self.endpoints['companion'])
+        for out in self.sent.values():
+            out.clear()
+
+        self.router.route_frame(decode(build_v2_frame(76, command_long(2, 1), sysid=255, compid=190)),
+                                self.endpoints['gcs'])
+        self.assertEqual((len(self.sent['radio']), len(self.sent['companion'])), (1, 0))
+
+        self.router.route_frame(decode(build_v2_frame(76, command_long(2, 100), sysid=255, compid=190)),
+                                self.endpoints['gcs'])
+        self.assertEqual((len(self.sent['radio']), len(self.sent['companion'])), (1, 1))
+
+        # Component 0: every endpoint carrying system 2
+        self.router.route_frame(decode(build_v2_frame(76, command_long(2, 0), sysid=255, compid=190)),
+                                self.endpoints['gcs'])
+        self.assertEqual((len(self.sent['radio']), len(self.sent['companion'])), (2, 2))
+        self.assertEqual(self.router.stats.frames_targeted, 3)
+
+    def test_unknown_target_floods(self):
+        """Тест пересылки на неизвестный аппарат во все endpoint'ы"""
+        self.router.route_frame(decode(build_v2_frame(76, command_long(7, 1), sysid=255)), self.endpoints['gcs'])
+
+        self.assertEqual((len(self.sent['radio']), len(self.sent['companion'])), (1, 1))
+        self.assertEqual(self.router.stats.frames_unrouted, 1)
+
+    def test_vehicle_factory(self):
+        """Тест создания состояния аппарата по (sysid, compid)"""
+        router = MAVLinkRouter(vehicle_factory=lambda sysid, compid: {'key': (sysid, compid)})
+
+        self.assertIsNone(router.get_vehicle(3, 1))
+        first = router.get_vehicle(3, 1, create=True)
+
+        self.assertIs(router.get_vehicle(3, 1), first)
+        self.assertEqual(set(router.vehicles), {(3, 1)})
+        self.assertEqual(router.stats.vehicles, 1)
+
+    def test_tcp_client_endpoint(self):
+        """Тест TCP клиента (Mission Planner) как endpoint'а"""
+        probe = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+        probe.close()
+
+        router = MAVLinkRouter()
+        to_radio = []
+        radio = router.add_endpoint('radio', to_radio.append)
+        self.assertTrue(router.serve_tcp('127.0.0.1', port))
+
+        client = socket.create_connection(('127.0.0.1', port), timeout=3.0)
+        try:
+            client.sendall(build_v2_frame(76, command_long(1, 1), sysid=255, compid=190))
+            deadline = time.time() + 3.0
+            while not to_radio and time.time() < deadline:
+                time.sleep(0.01)
+
+            # Vehicle telemetry flows back to the client
+            heartbeat = build_v2_frame(0, HEARTBEAT, sysid=1)
+            router._event_loop.call(router.route_frame, decode(heartbeat), radio)
+            received = client.recv(64)
+        finally:
+            client.close()
+            router.stop()
+
+        self.assertEqual(len(to_radio), 1)
+        self.assertEqual(received, heartbeat)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -4,8 +4,11 @@
 """
 
 import unittest
+import math
+import socket
 import time
 import json
+import shutil
 import tempfile
 from unittest.mock import Mock, patch, MagicMock
 from pathlib import Path
@@ -16,10 +19,12 @@ import os
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
 
 from src.services.mavlink_bridge import MAVLinkBridge
-from src.services.telemetry_buffer import TelemetryBuffer, TelemetryRecord
+from src.services.telemetry_buffer import TelemetryBuffer, TelemetryRecord, TelemetryRing
 from src.services.central_server_sync import CentralServerSync
 from src.services.modular_mavlink_service import ModularMAVLinkService
 from src.utils.serialization import SerializationUtils
+from src.utils.mavlink_parser import CRC_EXTRA, crc_x25, crc_accumulate, MAVLinkFrame, MAVLinkFrameDecoder
+from src.utils.mavlink_messages import decode_message, MAV_TYPE_GCS
 
 
 class TestSerializationUtils(unittest.TestCase):
@@ -94,35 +99,134 @@ class TestMAVLinkBridge(unittest.TestCase):
         self.assertTrue(self.bridge.is_connected)
         mock_socket_instance.bind.assert_called_once_with(('127.0.0.1', 14550))
     
+    def test_batched_udp_ingestion(self):
+        """Тест пакетного приёма UDP датаграмм"""
+        probe = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+        probe.close()
+        
+        received = []
+        self.bridge.register_message_handler(30, lambda frame: received.append(frame.sequence))
+        self.assertTrue(self.bridge.connect(f"udp:127.0.0.1:{port}"))
+        
+        sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            for seq in range(100):
+                header = bytes([28, 0, 0, seq, 1, 1, 30, 0, 0])
+                payload = bytes(28)
+                crc = crc_accumulate(CRC_EXTRA[30], crc_x25(header + payload))
+                sender.sendto(b'\xfd' + header + payload + crc.to_bytes(2, 'little'), ('127.0.0.1', port))
+            
+            deadline = time.time() + 3.0
+            while len(received) < 100 and time.time() < deadline:
+                time.sleep(0.01)
+        finally:
+            sender.close()
+        
+        stats = self.bridge.get_connection_stats()
+        self.assertEqual(received, list(range(100)))
+        self.assertEqual(stats['datagrams_received'], 100)
+        self.assertGreater(stats['rcvbuf_bytes'], 0)
+        self.assertIn('syscalls_per_message', stats)
+
+    def test_tcp_stream_transport(self):
+        """Тест TCP транспорта на общем event loop"""
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.bind(('127.0.0.1', 0))
+        server.listen(1)
+        port = server.getsockname()[1]
+
+        received = []
+        self.bridge.register_message_handler(30, lambda frame: received.append(frame.sequence))
+        self.assertTrue(self.bridge.connect(f"tcp:127.0.0.1:{port}"))
+
+        client, _ = server.accept()
+        try:
+            stream = bytearray()
+            for seq in range(50):
+                header = bytes([28, 0, 0, seq, 1, 1, 30, 0, 0])
+                payload = bytes(28)
+                crc = crc_accumulate(CRC_EXTRA[30], crc_x25(header + payload))
+                stream += b'\xfd' + header + payload + crc.to_bytes(2, 'little')
+
+            # Frames split across TCP segments
+            client.sendall(stream[:1000])
+            time.sleep(0.05)
+            client.sendall(stream[1000:])
+
+            deadline = time.time() + 3.0
+            while len(received) < 50 and time.time() < deadline:
+                time.sleep(0.01)
+
+            # Heartbeat goes out over the same stream
+            client.settimeout(3.0)
+            heartbeat = client.recv(64)
+        finally:
+            client.close()
+            server.close()
+
+        self.assertEqual(received, list(range(50)))
+        self.assertEqual(heartbeat[0], 0xFD)
+        self.assertGreater(self.bridge.stats.messages_sent, 0)
+
+        # Valid frame: CRC with CRC_EXTRA, GCS identity
+        decoder = MAVLinkFrameDecoder()
+        decoder.feed(heartbeat)
+        frame = decoder.next_frame()
+        self.assertIsNotNone(frame)
+        self.assertEqual((frame.message_id, frame.system_id, frame.component_id), (0, 255, 190))
+        self.assertEqual(decode_message(0, frame.payload).type, MAV_TYPE_GCS)
+
     def test_parse_mavlink_packet(self):
         """Тест парсинга MAVLink пакета"""
-        # Create mock MAVLink v2 packet
-        packet = bytearray([
-            0xFD,  # magic
+        # Create MAVLink v2 HEARTBEAT packet
+        header = bytearray([
             0x09,  # payload length
+            0x00,  # incompat flags
+            0x00,  # compat flags
             0x00,  # sequence
             0x01,  # system_id
             0x01,  # component_id
             0x00, 0x00, 0x00,  # message_id (HEARTBEAT = 0)
-            0x00, 0x00,  # compatibility flags
-            # Payload (9 bytes for HEARTBEAT)
+        ])
+        payload = bytearray([
             0x00, 0x00, 0x00, 0x00,  # custom_mode
             0x02,  # type
             0x03,  # autopilot
             0x81,  # base_mode
             0x03,  # system_status
             0x03,  # mavlink_version
-            # Checksum
-            0x32, 0x00
         ])
-        
-        buffer = bytearray(packet)
-        message = self.bridge._parse_mavlink_packet(buffer)
-        
-        self.assertIsNotNone(message)
-        self.assertEqual(message['payload_length'], 9)
-        self.assertEqual(message['message_id'], 0)
-        self.assertEqual(message['system_id'], 1)
+        crc = crc_accumulate(CRC_EXTRA[0], crc_x25(header + payload))
+        packet = bytearray([0xFD]) + header + payload + crc.to_bytes(2, 'little')
+        
+        # Garbage before the frame must be skipped
+        self.bridge._decoder.feed(b'\x00\x55' + packet)
+        frame = next(self.bridge._decoder)
+        
+        self.assertIsNotNone(frame)
+        self.assertEqual(frame.payload_length, 9)
+        self.assertEqual(frame.message_id, 0)
+        self.assertEqual(frame.system_id, 1)
+        self.assertEqual(bytes(frame.payload), bytes(payload))
+    
+    def test_history_recycles_frames(self):
+        """Тест истории сообщений на переиспользуемых кадрах"""
+        for seq in range(25):
+            self.bridge._handle_message(MAVLinkFrame(sequence=seq, message_id=30, payload=b'\x01' * 28))
+        
+        history = self.bridge.get_message_history(5)
+        
+        self.assertEqual(len(self.bridge.raw_message_history), 10)
+        self.assertEqual([m['sequence'] for m in history], [20, 21, 22, 23, 24])
+        self.assertEqual(history[-1]['payload'], b'\x01' * 28)
+        self.assertIsInstance(history[-1]['timestamp'], float)
+        
+        # Evicted frames returned to the free list
+        frame = self.bridge._frame_pool.acquire()
+        self.assertEqual(frame.payload, b'')
+        self.assertEqual(self.bridge._frame_pool.misses, 0)
 
 
 class TestTelemetryBuffer(unittest.TestCase):
@@ -140,6 +244,7 @@ class TestTelemetryBuffer(unittest.TestCase):
     def tearDown(self):
         self.buffer.stop()
         os.unlink(self.temp_file.name)
+        shutil.rmtree(self.buffer.log_dir, ignore_errors=True)
     
     def test_add_telemetry(self):
         """Тест добавления телеметрии"""
@@ -171,14 +276,69 @@ class TestTelemetryBuffer(unittest.TestCase):
         self.assertEqual(self.buffer.stats.pending_sync, 0)
         self.assertTrue(pending[0].synced)
     
+    def test_sync_cursors(self):
+        """Тест курсоров синхронизации: выдача срезом, повтор после ошибки, подтверждение"""
+        # Stop background sync so cursors move only from the test
+        self.buffer._running = False
+        self.buffer._sync_thread.join()
+        
+        for i in range(5):
+            self.buffer.add_telemetry('test_drone', {'value': i})
+        
+        first = self.buffer.get_pending_records(2)
+        rest = self.buffer.get_pending_records(10)
+        self.assertEqual([r.data['value'] for r in first + rest], [0, 1, 2, 3, 4])
+        self.assertEqual(self.buffer.get_pending_records(10), [])
+        
+        self.buffer.mark_synced(rest)
+        self.assertEqual(self.buffer.stats.pending_sync, 5)
+        
+        # Failed batch is handed out again, already synced records are not
+        self.buffer.mark_failed(first)
+        retry = self.buffer.get_pending_records(10)
+        self.assertEqual([r.data['value'] for r in retry], [0, 1])
+        
+        self.buffer.mark_synced(retry)
+        self.assertEqual(self.buffer.stats.pending_sync, 0)
+    
+    def test_ring_eviction(self):
+        """Тест вытеснения старых записей кольцом"""
+        self.buffer._running = False
+        self.buffer._sync_thread.join()
+        
+        for i in range(25):
+            self.buffer.add_telemetry('test_drone', {'value': i})
+        
+        latest = self.buffer.get_latest_telemetry(count=3)
+        pending = self.buffer.get_pending_records(50)
+        self.buffer.mark_synced(pending)
+        
+        self.assertEqual([r['data']['value'] for r in latest], [22, 23, 24])
+        self.assertEqual(len(self.buffer.memory_buffer), 10)
+        self.assertEqual([r.data['value'] for r in pending], list(range(15, 25)))
+        self.assertEqual(self.buffer.stats.dropped_records, 15)
+        self.assertEqual(self.buffer.stats.pending_sync, 0)
+    
+    def test_size_accounting(self):
+        """Тест учёта размера буфера по длине закодированных записей"""
+        self.buffer._running = False
+        self.buffer._sync_thread.join()
+        
+        for i in range(25):
+            self.buffer.add_telemetry('test_drone', {'value': i})
+        
+        held = sum(r.size for r in self.buffer.memory_buffer)
+        self.assertEqual(self.buffer._ring.nbytes, held)
+        self.assertAlmostEqual(self.buffer.get_buffer_stats()['buffer_size_mb'], held / (1024 * 1024))
+    
     def test_persistence(self):
         """Тест сохранения и загрузки буфера"""
         # Add some data
         self.buffer.add_telemetry('test_drone', {'test': 'data1'})
         self.buffer.add_telemetry('test_drone', {'test': 'data2'})
         
-        # Save to file
-        self.buffer._save_to_file()
+        # Fsync log and checkpoint
+        self.buffer._persist()
         
         # Create new buffer instance with same file
         new_buffer = TelemetryBuffer(
@@ -190,6 +350,78 @@ class TestTelemetryBuffer(unittest.TestCase):
         self.assertEqual(new_buffer.stats.total_records, 2)
         
         new_buffer.stop()
+    
+    def test_import_json_buffer_file(self):
+        """Тест переноса буфера старого формата (JSON) в журнал при первом запуске"""
+        tmpdir = tempfile.mkdtemp()
+        buffer_file = os.path.join(tmpdir, 'telemetry_buffer.json')
+        record = {'drone_id': 'test_drone', 'synced': False, 'retry_count': 0}
+        with open(buffer_file, 'w') as f:
+            json.dump({
+                'memory_buffer': [dict(record, timestamp=1700000002.0, data={'altitude': 120.5}),
+                                  dict(record, timestamp=1700000000.0, data={'altitude': 99.0}, synced=True)],
+                'failed_buffer': [dict(record, timestamp=1700000001.0, data={'altitude': 110.0}, retry_count=2)],
+                'stats': {'total_records': 3},
+                'saved_at': 1700000003.0
+            }, f)
+        
+        try:
+            buffer = TelemetryBuffer(max_memory_records=10, buffer_file=buffer_file)
+            buffer.stop()
+            pending = buffer.get_pending_records()
+            self.assertEqual([(r.timestamp, r.data['altitude']) for r in pending],
+                             [(1700000001.0, 110.0), (1700000002.0, 120.5)])
+            self.assertFalse(os.path.exists(buffer_file))
+            
+            # Imported once: a restart replays the same records from the log
+            buffer = TelemetryBuffer(max_memory_records=10, buffer_file=buffer_file)
+            buffer.stop()
+            self.assertEqual(len(buffer.get_pending_records()), 2)
+        finally:
+            shutil.rmtree(tmpdir)
+    
+    def test_replay_only_unsynced(self):
+        """Тест восстановления только неподтверждённых записей после перезапуска"""
+        self.buffer._running = False
+        self.buffer._sync_thread.join()
+        
+        for i in range(5):
+            self.buffer.add_telemetry('test_drone', {'value': i})
+        self.buffer.mark_synced(self.buffer.get_pending_records(3))
+        self.buffer._persist()
+        
+        # Appended after the last fsync: lost or replayed, never corrupting the rest
+        self.buffer.add_telemetry('test_drone', {'value': 5})
+        
+        with patch.object(TelemetryBuffer, 'start'):
+            new_buffer = TelemetryBuffer(max_memory_records=10, buffer_file=self.temp_file.name)
+        try:
+            pending = new_buffer.get_pending_records(10)
+            self.assertEqual([r.data['value'] for r in pending][:2], [3, 4])
+            self.assertEqual([r.seq for r in pending][:2], [3, 4])
+            
+            # Numbering continues after the replayed records
+            new_buffer.add_telemetry('test_drone', {'value': 6})
+            self.assertGreaterEqual(new_buffer.get_pending_records(10)[0].seq, 5)
+        finally:
+            new_buffer.stop()
+
+
+class TestTelemetryRing(unittest.TestCase):
+    """Тест кольцевого буфера записей"""
+    
+    def test_read_wraps_and_drops_overwritten(self):
+        """Тест чтения через границу кольца"""
+        ring = TelemetryRing(4)
+        for i in range(6):
+            ring.append(TelemetryRecord(timestamp=i, drone_id='d', data={}))
+        
+        self.assertEqual(ring.oldest_seq, 2)
+        self.assertEqual([r.seq for r in ring.snapshot()], [2, 3, 4, 5])
+        self.assertEqual([r.seq for r in ring.read(0, 4)], [2, 3])
+        self.assertIsNone(ring.get(1))
+        self.assertIsNone(ring.get(6))
+        self.assertEqual(ring.get(5).timestamp, 5)
 
 
 class TestCentralServerSync(unittest.TestCase):
@@ -204,7 +436,7 @@ class TestCentralServerSync(unittest.TestCase):
     def tearDown(self):
         self.sync.stop()
     
-    @patch('requests.Session.post')
+    @patch('src.services.http_pool.HTTPPool.request')
     def test_sync_telemetry_batch(self, mock_post):
         """Тест синхронизации батча телеметрии"""
         mock_response = Mock()
@@ -221,8 +453,9 @@ class TestCentralServerSync(unittest.TestCase):
         self.assertTrue(success)
         self.assertEqual(self.sync.stats.total_syncs, 1)
         mock_post.assert_called_once()
+        self.assertEqual(mock_post.call_args[0][0], 'telemetry')
     
-    @patch('requests.Session.get')
+    @patch('src.services.http_pool.HTTPPool.request')
     def test_health_check(self, mock_get):
         """Тест проверки здоровья соединения"""
         mock_response = Mock()
@@ -232,6 +465,7 @@ class TestCentralServerSync(unittest.TestCase):
         health = self.sync.health_check()
         
         self.assertTrue(health['api_healthy'])
+        self.assertEqual(mock_get.call_args[0][:2], ('health', 'GET'))
         self.assertIn('websocket_connected', health)
         self.assertIn('timestamp', health)
 
@@ -241,16 +475,16 @@ class TestModularMAVLinkService(unittest.TestCase):
     
     def setUp(self):
         # Mock the singleton services to avoid interference
+        # (the service keeps the patched mocks, so registration calls stay visible)
         with patch('src.services.modular_mavlink_service.mavlink_bridge'), \
              patch('src.services.modular_mavlink_service.telemetry_buffer'), \
              patch('src.services.modular_mavlink_service.central_server_sync'):
             
             self.service = ModularMAVLinkService(drone_id='test_drone')
-            
-            # Setup mocks
-            self.service.bridge = Mock()
-            self.service.buffer = Mock()
-            self.service.sync = Mock()
+    
+    def register_vehicle(self, system_id=0, component_id=0):
+        """Аппарат, уже приславший HEARTBEAT автопилота"""
+        return self.service.router.get_vehicle(system_id, component_id, create=True)
     
     def test_initialization(self):
         """Тест инициализации сервиса"""
@@ -272,6 +506,7 @@ class TestModularMAVLinkService(unittest.TestCase):
         self.service.bridge.register_message_handler.assert_has_calls(
             expected_calls, any_order=True
         )
+        self.service.bridge.attach_router.assert_called_once_with(self.service.router)
     
     def test_heartbeat_handling(self):
         """Тест обработки HEARTBEAT сообщений"""
@@ -285,10 +520,7 @@ class TestModularMAVLinkService(unittest.TestCase):
             0x03   # mavlink_version
         ])
         
-        message = {
-            'message_id': 0,
-            'payload': heartbeat_payload
-        }
+        message = MAVLinkFrame(message_id=0, payload=heartbeat_payload)
         
         self.service._handle_heartbeat(message)
         
@@ -312,11 +544,14 @@ class TestModularMAVLinkService(unittest.TestCase):
         gps_payload[16:20] = alt.to_bytes(4, 'little', signed=True)
         gps_payload[29] = sats
         
-        message = {
-            'message_id': 24,
-            'payload': gps_payload
-        }
+        message = MAVLinkFrame(message_id=24, payload=gps_payload)
+        
+        # No vehicle before its autopilot HEARTBEAT
+        self.service._handle_gps_raw(message)
+        self.assertEqual(self.service.telemetry.gps_satellites, 0)
+        self.assertEqual(self.service.router.vehicles, {})
         
+        self.register_vehicle()
         self.service._handle_gps_raw(message)
         
         # Check GPS data was parsed correctly
@@ -325,6 +560,94 @@ class TestModularMAVLinkService(unittest.TestCase):
         self.assertEqual(self.service.telemetry.altitude_meters, 150.0)
         self.assertEqual(self.service.telemetry.gps_satellites, 12)
     
+    def test_battery_status_handling(self):
+        """Тест обработки BATTERY_STATUS сообщений"""
+        import struct
+        voltages = [4200, 4100, 4000] + [0xFFFF] * 7
+        battery_payload = struct.pack('<iih10Hh', 1500, 20, 2500, *voltages, 1250)
+        self.register_vehicle()
+        
+        self.service._handle_battery_status(MAVLinkFrame(message_id=147, payload=battery_payload))
+        
+        self.assertAlmostEqual(self.service.telemetry.battery_voltage, 12.3)
+        self.assertAlmostEqual(self.service.telemetry.battery_current, 12.5)
+    
+    def test_multi_vehicle_state(self):
+        """Тест раздельной телеметрии нескольких аппаратов"""
+        heartbeat_payload = bytes([0, 0, 0, 0, 2, 3, 0x81, 4, 3])
+        gps_payload = bytearray(30)
+        gps_payload[29] = 9
+        
+        self.service._handle_heartbeat(MAVLinkFrame(system_id=1, component_id=1, message_id=0, payload=heartbeat_payload))
+        self.service._handle_heartbeat(MAVLinkFrame(system_id=2, component_id=1, message_id=0, payload=heartbeat_payload))
+        self.service._handle_gps_raw(MAVLinkFrame(system_id=2, component_id=1, message_id=24, payload=gps_payload))
+        
+        # GCS (MAV_AUTOPILOT_INVALID or MAV_TYPE_GCS) and companion heartbeats do not create a vehicle
+        self.service._handle_heartbeat(MAVLinkFrame(system_id=255, component_id=190, message_id=0,
+                                                    payload=bytes([0, 0, 0, 0, 6, 8, 0, 0, 3])))
+        self.service._handle_heartbeat(MAVLinkFrame(system_id=254, component_id=190, message_id=0,
+                                                    payload=bytes([0, 0, 0, 0, 6, 3, 0, 0, 3])))
+        self.service._handle_heartbeat(MAVLinkFrame(system_id=1, component_id=191, message_id=0,
+                                                    payload=bytes([0, 0, 0, 0, 18, 8, 0, 4, 3])))
+        # Telemetry from a source without an autopilot HEARTBEAT is ignored
+        self.service._handle_gps_raw(MAVLinkFrame(system_id=3, component_id=1, message_id=24, payload=gps_payload))
+        
+        self.assertEqual(set(self.service.router.vehicles), {(1, 1), (2, 1)})
+        
+        vehicles = {v['drone_id']: v for v in self.service.get_vehicles()}
+        self.assertEqual(set(vehicles), {'test_drone', 'test_drone_sys2'})
+        self.assertTrue(vehicles['test_drone']['telemetry']['armed'])
+        self.assertEqual(vehicles['test_drone_sys2']['telemetry']['gps_satellites'], 9)
+        self.assertEqual(self.service.telemetry.gps_satellites, 0)
+        
+        # Commands are addressed to the selected vehicle
+        self.service.send_command('arm', {}, drone_id='test_drone_sys2')
+        _, params = self.service.bridge.send_command.call_args[0]
+        self.assertEqual((params['target_system'], params['target_component']), (2, 1))
+    
+    def test_coalesced_updates(self):
+        """Тест коалесценции: одна запись на окно вместо записи на каждое сообщение"""
+        import struct
+        self.service.coalesce_interval = 0.05
+        self.service.sync.stats.websocket_connected = False
+        self.register_vehicle()
+        
+        for step in range(50):
+            attitude = struct.pack('<I6f', step, 0, 0, step * 0.01, 0, 0, 0)
+            self.service._handle_attitude(MAVLinkFrame(message_id=30, payload=attitude))
+        
+        # Leading edge written immediately, the rest is held for the window
+        self.assertEqual(self.service.buffer.add_telemetry.call_count, 1)
+        
+        deadline = time.time() + 2.0
+        while self.service.buffer.add_telemetry.call_count < 2 and time.time() < deadline:
+            time.sleep(0.01)
+        
+        _, record = self.service.buffer.add_telemetry.call_args[0]
+        self.assertEqual(self.service.buffer.add_telemetry.call_count, 2)
+        self.assertAlmostEqual(record['heading_degrees'], math.degrees(0.49), places=3)
+        self.assertEqual(self.service.get_coalescing_stats()['updates_received'], 50)
+    
+    def test_delta_realtime_updates(self):
+        """Тест real-time обновлений только с изменёнными полями"""
+        self.service.coalesce_interval = 0
+        self.service.delta_updates = True
+        self.service.sync.stats.websocket_connected = True
+        heartbeat_payload = bytes([0, 0, 0, 0, 2, 3, 0x81, 4, 3])
+        
+        self.service._handle_heartbeat(MAVLinkFrame(message_id=0, payload=heartbeat_payload))
+        self.service._handle_heartbeat(MAVLinkFrame(message_id=0, payload=heartbeat_payload))
+        
+        # Second heartbeat changed nothing - no record, no update
+        self.assertEqual(self.service.sync.send_realtime_update.call_count, 1)
+        update = self.service.sync.send_realtime_update.call_args[0][2]
+        self.assertTrue(update['delta'])
+        self.assertEqual(set(update['telemetry']), {'armed', 'flight_mode', 'timestamp'})
+        
+        # Buffer still receives full snapshots
+        _, record = self.service.buffer.add_telemetry.call_args[0]
+        self.assertIn('battery_voltage', record)
+    
     def test_connect(self):
         """Тест подключения сервиса"""
         self.service.bridge.connect.return_value = True
@@ -409,6 +732,7 @@ class TestIntegration(unittest.TestCase):
         finally:
             buffer.stop()
             os.unlink(temp_file.name)
+            shutil.rmtree(buffer.log_dir, ignore_errors=True)
 
 
 if __name__ == '__main__':
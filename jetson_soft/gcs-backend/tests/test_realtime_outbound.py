@@ -0,0 +1,170 @@
+"""
+Тесты очереди real-time обновлений CentralServerSync
+"""
+
+import asyncio
+import json
+import threading
+import time
+import unittest
+
+import websockets
+
+# Import services
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.services.central_server_sync import CentralServerSync
+
+
+class FakeWebSocket:
+    """Записывает отправленные кадры"""
+
+    def __init__(self):
+        self.frames = []
+
+    async def send(self, frame):
+        self.frames.append(json.loads(frame))
+        await asyncio.sleep(0)
+
+
+class TestRealtimeQueue(unittest.TestCase):
+    """Тест конфляции и ограничения очереди (цикл ещё не запущен — отправка «занята»)"""
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def make_sync(self, **kwargs):
+        sync = CentralServerSync(server_url="http://localhost:8000", **kwargs)
+        sync._ws_loop = self.loop
+        sync._outbound_wakeup = asyncio.Event()
+        sync.stats.websocket_connected = True
+        return sync
+
+    def drain(self, sync):
+        websocket = FakeWebSocket()
+
+        async def run():
+            sender = asyncio.ensure_future(sync._realtime_sender(websocket))
+            await asyncio.sleep(0.05)
+            sender.cancel()
+
+        self.loop.run_until_complete(run())
+        return websocket.frames
+
+    def test_delta_conflation(self):
+        """Тест: дельты одного дрона сливаются, другой дрон идёт отдельно"""
+        sync = self.make_sync()
+        sync.send_realtime_update('drone_telemetry', 'INSERT', {'drone_id': 'a', 'telemetry': {'alt': 1, 'speed': 5}})
+        for i in range(2, 11):
+            sync.send_realtime_update('drone_telemetry', 'INSERT',
+                                      {'drone_id': 'a', 'telemetry': {'alt': i}, 'delta': True})
+        sync.send_realtime_update('drone_telemetry', 'INSERT', {'drone_id': 'b', 'telemetry': {'alt': 7}})
+        self.assertEqual(sync.stats.realtime_queue, 2)
+
+        frames = self.drain(sync)
+
+        self.assertEqual(len(frames), 2)
+        self.assertEqual(frames[0]['topic'], 'realtime:drone_telemetry')
+        self.assertEqual(frames[0]['payload']['telemetry'], {'alt': 10, 'speed': 5})
+        self.assertNotIn('delta', frames[0]['payload'])
+        self.assertEqual(frames[1]['payload']['drone_id'], 'b')
+        self.assertNotEqual(frames[0]['ref'], frames[1]['ref'])
+        self.assertEqual(sync.stats.realtime_conflated, 9)
+        self.assertEqual(sync.stats.realtime_sent, 2)
+        # Upload byte counter (compression estimate) does not include realtime frames
+        self.assertEqual(sync.stats.bytes_sent, 0)
+        self.assertGreater(sync.stats.realtime_bytes_sent, 0)
+
+    def test_bounded_queue(self):
+        """Тест: при переполнении отбрасывается самое старое обновление"""
+        sync = self.make_sync(realtime_queue_size=2)
+        for drone in ('a', 'b', 'c'):
+            sync.send_realtime_update('drone_telemetry', 'INSERT', {'drone_id': drone})
+
+        frames = self.drain(sync)
+
+        self.assertEqual([f['payload']['drone_id'] for f in frames], ['b', 'c'])
+        self.assertEqual(sync.stats.realtime_dropped, 1)
+
+    def test_batching(self):
+        """Тест: с realtime_batching обновления одного топика уходят одним кадром"""
+        sync = self.make_sync(realtime_batching=True)
+        for drone in ('a', 'b', 'c'):
+            sync.send_realtime_update('drone_telemetry', 'INSERT', {'drone_id': drone})
+        sync.send_realtime_update('drone_status', 'UPDATE', {'drone_id': 'a'})
+
+        frames = self.drain(sync)
+
+        self.assertEqual(len(frames), 2)
+        self.assertEqual([p['drone_id'] for p in frames[0]['payload']['batch']], ['a', 'b', 'c'])
+        self.assertEqual(frames[1]['payload'], {'drone_id': 'a'})
+        self.assertEqual(sync.stats.realtime_sent, 4)
+
+    def test_disconnected(self):
+        """Тест: без соединения обновление не ставится в очередь"""
+        sync = CentralServerSync(server_url="http://localhost:8000")
+        self.assertFalse(sync.send_realtime_update('drone_telemetry', 'INSERT', {'drone_id': 'a'}))
+
+
+class TestRealtimeWebSocket(unittest.TestCase):
+    """Тест отправки через настоящий WebSocket из потока без event loop"""
+
+    def setUp(self):
+        self.received = []
+        self.loop = asyncio.new_event_loop()
+        started = threading.Event()
+
+        async def handler(connection):
+            async for message in connection:
+                self.received.append(json.loads(message))
+
+        async def serve():
+            self.server = await websockets.serve(handler, '127.0.0.1', 0)
+            started.set()
+            await self.server.wait_closed()
+
+        self.thread = threading.Thread(target=self.loop.run_until_complete, args=(serve(),), daemon=True)
+        self.thread.start()
+        started.wait(5)
+        port = next(iter(self.server.sockets)).getsockname()[1]
+        self.sync = CentralServerSync(server_url="http://127.0.0.1:1", websocket_url=f"ws://127.0.0.1:{port}")
+
+    def tearDown(self):
+        self.loop.call_soon_threadsafe(self.server.close)
+        self.thread.join(5)
+
+    def wait_for(self, condition, timeout=5.0):
+        deadline = time.time() + timeout
+        while not condition() and time.time() < deadline:
+            time.sleep(0.01)
+        return condition()
+
+    def test_handler_thread_updates(self):
+        """Тест: обновления из потока обработчика доходят, последнее значение не теряется"""
+        self.sync.start()
+        self.assertTrue(self.wait_for(lambda: self.sync.stats.websocket_connected))
+
+        started = time.time()
+        for i in range(500):
+            self.assertTrue(self.sync.send_realtime_update('drone_telemetry', 'INSERT',
+                                                           {'drone_id': 'a', 'telemetry': {'seq': i}}))
+        self.assertLess(time.time() - started, 0.5)
+
+        self.assertTrue(self.wait_for(
+            lambda: self.received and self.received[-1]['payload'].get('telemetry') == {'seq': 499}))
+        self.assertEqual(self.received[0]['event'], 'phx_join')
+        self.assertEqual(self.sync.stats.realtime_sent + self.sync.stats.realtime_conflated, 500)
+
+        started = time.time()
+        self.sync.stop()
+        self.assertLess(time.time() - started, 2.0)
+        self.assertFalse(self.sync.send_realtime_update('drone_telemetry', 'INSERT', {'drone_id': 'a'}))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,111 @@
+"""
+Тесты сегментированного журнала (write-ahead log) буфера телеметрии
+"""
+
+import unittest
+import shutil
+import tempfile
+
+# Import services
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.utils.segment_log import SegmentedLog, SEGMENT_SUFFIX
+
+
+class TestSegmentedLog(unittest.TestCase):
+    """Тест журнала: запись, ротация, компакция, восстановление"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def segments(self):
+        return sorted(name for name in os.listdir(self.directory) if name.endswith(SEGMENT_SUFFIX))
+
+    def test_replay_after_reopen(self):
+        """Тест восстановления записей после перезапуска"""
+        log = SegmentedLog(self.directory)
+        for seq in range(5):
+            log.append(seq, f"record-{seq}".encode())
+        log.close()
+
+        reopened = SegmentedLog(self.directory)
+        records = list(reopened.replay())
+
+        self.assertEqual([seq for seq, _ in records], [0, 1, 2, 3, 4])
+        self.assertEqual(records[3][1], b"record-3")
+        self.assertEqual(reopened.write_seq, 5)
+
+    def test_rotation_and_compaction(self):
+        """Тест ротации сегментов и удаления подтверждённых"""
+        log = SegmentedLog(self.directory, segment_size=64)
+        for seq in range(20):
+            log.append(seq, bytes(50))
+        log.sync()
+        self.assertEqual(len(self.segments()), 20)
+
+        log.checkpoint(15)
+        log.close()
+
+        # Only segments holding records >= 15 remain, replay starts there
+        self.assertEqual(self.segments()[0], f"{15:020d}{SEGMENT_SUFFIX}")
+        reopened = SegmentedLog(self.directory, segment_size=64)
+        self.assertEqual([seq for seq, _ in reopened.replay()], [15, 16, 17, 18, 19])
+        self.assertEqual(reopened.acked_seq, 15)
+
+    def test_torn_tail_is_dropped(self):
+        """Тест обрыва записи при потере питания"""
+        log = SegmentedLog(self.directory)
+        for seq in range(3):
+            log.append(seq, b"payload")
+        log.close()
+
+        # Half-written record header at the tail
+        path = os.path.join(self.directory, self.segments()[-1])
+        with open(path, 'r+b') as f:
+            f.seek(0, os.SEEK_END)
+            f.write(b"\x07\x00\x00\x00\x00")
+
+        reopened = SegmentedLog(self.directory)
+        self.assertEqual([seq for seq, _ in reopened.replay()], [0, 1, 2])
+        self.assertEqual(reopened.stats.corrupt_records, 1)
+
+        # New appends go to a fresh segment after the torn one
+        reopened.append(3, b"payload")
+        reopened.close()
+        self.assertEqual([seq for seq, _ in SegmentedLog(self.directory).replay()], [0, 1, 2, 3])
+
+    def test_torn_first_record_then_restart(self):
+        """Тест: оборвана первая запись сегмента, после перезапуска новые записи не теряются"""
+        log = SegmentedLog(self.directory, segment_size=64)
+        for seq in range(3):
+            log.append(seq, bytes(50))
+        log.close()
+        self.assertEqual(len(self.segments()), 3)
+
+        # Crash while writing the first record of segment 3
+        path = os.path.join(self.directory, f"{3:020d}{SEGMENT_SUFFIX}")
+        with open(path, 'wb') as f:
+            f.write(b"\x32\x00\x00\x00\x00\x00")
+
+        reopened = SegmentedLog(self.directory, segment_size=64)
+        self.assertEqual([seq for seq, _ in reopened.replay()], [0, 1, 2])
+        self.assertEqual(reopened.write_seq, 3)
+        self.assertEqual(os.path.getsize(path), 0)
+
+        # Restart reuses segment 3; its records must survive the next replay
+        for seq in range(3, 6):
+            reopened.append(seq, bytes(50))
+        reopened.close()
+
+        replayed = SegmentedLog(self.directory, segment_size=64)
+        self.assertEqual([seq for seq, _ in replayed.replay()], [0, 1, 2, 3, 4, 5])
+        self.assertEqual(replayed.stats.corrupt_records, 0)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
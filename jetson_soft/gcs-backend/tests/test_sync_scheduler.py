@@ -0,0 +1,157 @@
+"""
+Тесты адаптивного планировщика выгрузки телеметрии
+"""
+
+import unittest
+import shutil
+import tempfile
+import threading
+import time
+
+# Import services
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.services.sync_scheduler import SyncScheduler
+from src.services.telemetry_buffer import TelemetryBuffer
+
+
+class FakeUplink:
+    """Замена CentralServerSync: управляемая доступность канала и задержка"""
+
+    def __init__(self, delay=0.02):
+        self.delay = delay
+        self.link_up = True
+        self.batches = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def sync_telemetry_batch(self, rows):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(self.delay)
+        with self._lock:
+            self.in_flight -= 1
+            if self.link_up:
+                self.batches.append([data['value'] for _, _, data in rows])
+            return self.link_up
+
+
+class TestSyncScheduler(unittest.TestCase):
+    """Тест решений планировщика"""
+
+    def test_batch_size_follows_rtt_and_budget(self):
+        """Тест размера пакета: бюджет * RTT, в пределах min/max"""
+        scheduler = SyncScheduler(bandwidth_budget=10000, min_batch=10, max_batch=1000)
+        scheduler.on_dispatch(10, 1000, 0.0)  # ~100 bytes per record
+
+        for _ in range(20):
+            scheduler.on_result(True, 10, 2.0, 1.0)
+        slow = scheduler.batch_size()
+        for _ in range(20):
+            scheduler.on_result(True, 10, 0.2, 1.0)
+        fast = scheduler.batch_size()
+
+        self.assertAlmostEqual(slow, 200, delta=2)
+        self.assertEqual(fast, 20)
+
+        # Compressed uplink: more records fit into the same budget
+        scheduler.observe_compression(wire_bytes=100, row_bytes=1000)
+        self.assertGreater(scheduler.batch_size(), fast)
+
+    def test_backoff_with_jitter(self):
+        """Тест экспоненциальной задержки с разбросом и сброса после успеха"""
+        scheduler = SyncScheduler(sync_interval=0.0, base_backoff=1.0, max_backoff=8.0)
+        delays = []
+        for _ in range(6):
+            scheduler.on_dispatch(1, 100, 0.0)
+            scheduler.on_result(False, 1, 0.1, 0.0)
+            delays.append(scheduler.stats.backoff_seconds)
+
+        for ceiling, delay in zip([1, 2, 4, 8, 8, 8], delays):
+            self.assertGreaterEqual(delay, ceiling / 2)
+            self.assertLessEqual(delay, ceiling)
+        self.assertFalse(scheduler.can_dispatch(100, delays[-1] - 0.01))
+        self.assertTrue(scheduler.can_dispatch(100, delays[-1] + 0.01))
+
+        # Link down: a single probe at a time
+        scheduler.on_dispatch(1, 100, 10.0)
+        self.assertFalse(scheduler.can_dispatch(10000, 20.0))
+
+        scheduler.on_result(True, 1, 0.1, 20.0)
+        self.assertTrue(scheduler.stats.link_up)
+        self.assertEqual(scheduler.stats.consecutive_failures, 0)
+        self.assertEqual(scheduler.in_flight_limit(10000), scheduler.max_in_flight)
+
+    def test_bandwidth_budget(self):
+        """Тест ограничения скорости выгрузки бюджетом байт/с"""
+        scheduler = SyncScheduler(sync_interval=0.0, bandwidth_budget=1000, burst_seconds=1.0, max_in_flight=100)
+        scheduler.on_dispatch(10, 1500, 1.0)
+
+        self.assertFalse(scheduler.can_dispatch(10000, 1.2))
+        self.assertGreaterEqual(scheduler.next_delay(1.2, 5.0), 0.3)
+        self.assertTrue(scheduler.can_dispatch(10000, 1.6))
+
+
+class TestBufferUplink(unittest.TestCase):
+    """Тест выгрузки буфера через планировщик"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.uplink = FakeUplink()
+        self.buffer = TelemetryBuffer(
+            max_memory_records=5000,
+            buffer_file=os.path.join(self.directory, 'buffer.json'),
+            sync_interval=0.05,
+            max_in_flight=4,
+            max_batch_records=100
+        )
+
+    def tearDown(self):
+        self.buffer.stop()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def wait_for(self, condition, timeout=10.0):
+        deadline = time.time() + timeout
+        while not condition() and time.time() < deadline:
+            time.sleep(0.01)
+        return condition()
+
+    def test_outage_recovery(self):
+        """Тест: отказ канала, затем свежие данные первыми и параллельная разгрузка очереди"""
+        self.uplink.link_up = False
+        self.buffer.attach_sync_client(self.uplink)
+        for i in range(1000):
+            self.buffer.add_telemetry('drone', {'value': i})
+        self.assertTrue(self.wait_for(lambda: self.buffer.scheduler.stats.batches_failed >= 2))
+        self.assertFalse(self.buffer.scheduler.stats.link_up)
+
+        self.uplink.link_up = True
+        self.buffer.add_telemetry('drone', {'value': 1000})
+        self.assertTrue(self.wait_for(lambda: self.buffer.stats.pending_sync == 0))
+
+        sent = [value for batch in self.uplink.batches for value in batch]
+        self.assertEqual(sorted(set(sent)), list(range(1001)))
+        # The newest record goes out in the first successful batches, ahead of the backlog
+        first_batches = [value for batch in self.uplink.batches[:4] for value in batch]
+        self.assertIn(1000, first_batches)
+        self.assertGreater(self.uplink.max_in_flight, 1)
+
+        stats = self.buffer.get_buffer_stats()['scheduler']
+        self.assertTrue(stats['link_up'])
+        self.assertEqual(stats['backlog_age_seconds'], 0.0)
+
+    def test_no_client_keeps_records(self):
+        """Тест: без клиента записи остаются в буфере"""
+        self.buffer.add_telemetry('drone', {'value': 1})
+        time.sleep(0.2)
+
+        self.assertEqual(self.buffer.stats.pending_sync, 1)
+        self.assertGreater(self.buffer.get_buffer_stats()['scheduler']['backlog_age_seconds'], 0.1)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
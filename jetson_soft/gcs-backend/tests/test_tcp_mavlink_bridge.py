@@ -0,0 +1,337 @@
+"""
+Тесты TCP MAVLink моста Jetson: пересылка кадров без декодирования, неблокирующие клиенты, подписки,
+единственный писатель порта автопилота
+"""
+
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import unittest
+
+# Import services
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+try:
+    from pymavlink import mavutil
+    import tcp_mavlink_bridge
+except ImportError:
+    mavutil = None
+
+from src.utils.mavlink_encoder import MAVLinkFrameEncoder
+from src.utils.mavlink_parser import MAVLinkFrameDecoder
+
+
+def read_exactly(sock, size, timeout=5.0):
+    sock.settimeout(timeout)
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            break
+        data += chunk
+    return bytes(data)
+
+
+class SlowFile:
+    """Файл записи, медленно пишущий на диск"""
+
+    def __init__(self, file):
+        self.file = file
+
+    def write(self, data):
+        time.sleep(0.05)
+        return self.file.write(data)
+
+    def close(self):
+        self.file.close()
+
+
+class TestTCPMAVLinkBridge(unittest.TestCase):
+    """Тест моста: автопилот на TCP сокете вместо последовательного порта"""
+
+    def setUp(self):
+        if mavutil is None:
+            self.skipTest("pymavlink not installed")
+
+        listener = socket.socket()
+        listener.bind(('127.0.0.1', 0))
+        listener.listen(1)
+
+        self.bridge = tcp_mavlink_bridge.TCPMAVLinkBridge(tcp_port=0, client_buffer_size=16384)
+        self.bridge.master = mavutil.mavlink_connection(f"tcp:127.0.0.1:{listener.getsockname()[1]}")
+        self.autopilot, _ = listener.accept()
+        listener.close()
+        self.encoder = MAVLinkFrameEncoder(1, 1)
+        self.assertTrue(self.bridge.start())
+        self.clients = []
+
+    def tearDown(self):
+        if mavutil is None:
+            return
+        for client in self.clients:
+            client.close()
+        self.bridge.cleanup()
+        self.autopilot.close()
+        self.bridge.master.close()
+
+    def connect(self, count=1, rcvbuf=None):
+        for _ in range(count):
+            client = socket.socket()
+            if rcvbuf:
+                client.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
+            client.connect(('127.0.0.1', self.bridge.tcp_port))
+            self.clients.append(client)
+        self.wait_for(lambda: len(self.bridge.clients) == len(self.clients))
+
+    def wait_for(self, condition, timeout=3.0):
+        deadline = time.time() + timeout
+        while not condition() and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertTrue(condition())
+
+    def telemetry(self, count):
+        return [self.encoder.encode_message('ATTITUDE', time_boot_ms=index + 1, roll=0.1) for index in range(count)]
+
+    def test_raw_fan_out(self):
+        """Тест: кадры уходят всем клиентам байт в байт, типы считаются по заголовку"""
+        frames = self.telemetry(100)
+        frames += [self.encoder.encode_message('HEARTBEAT', type=2, autopilot=3)]
+        frames += [self.encoder.encode_message('PARAM_VALUE', param_id='RTL_ALT', param_value=3000)]
+        stream = b''.join(frames)
+        self.connect(3)
+
+        # Split mid-frame: the framer must reassemble
+        self.autopilot.sendall(stream[:1001])
+        time.sleep(0.02)
+        self.autopilot.sendall(stream[1001:])
+
+        for client in self.clients:
+            self.assertEqual(read_exactly(client, len(stream)), stream)
+        self.wait_for(lambda: self.bridge.stats['messages_to_clients'] == 306)
+        self.assertEqual(self.bridge.stats['messages_from_autopilot'], 102)
+        self.assertEqual((self.bridge.stats['heartbeats'], self.bridge.stats['params']), (1, 1))
+        self.assertEqual(self.bridge.stats['messages_decoded'], 0)
+
+    def test_subscription_decodes_only_subscribed_type(self):
+        """Тест: pymavlink декодирует только подписанный тип"""
+        received = []
+        self.bridge.subscribe('HEARTBEAT', received.append)
+        with self.assertRaises(ValueError):
+            self.bridge.subscribe('NOT_A_MESSAGE', received.append)
+
+        heartbeat = self.encoder.encode_message('HEARTBEAT', type=2, autopilot=3, custom_mode=4)
+        self.autopilot.sendall(b''.join(self.telemetry(50)) + heartbeat)
+
+        self.wait_for(lambda: received)
+        self.assertEqual(received[0].get_type(), 'HEARTBEAT')
+        self.assertEqual(received[0].custom_mode, 4)
+        self.assertEqual(self.bridge.stats['messages_decoded'], 1)
+
+        self.bridge.unsubscribe('HEARTBEAT', received.append)
+        self.assertEqual(self.bridge.subscriptions, {})
+
+    def test_stalled_client_does_not_stall_reader(self):
+        """Тест: клиент, который не читает, теряет кадры; остальные и чтение автопилота не стоят"""
+        frame = self.telemetry(1)[0]
+        count = 200000
+        self.connect(1, rcvbuf=4096)
+        stalled = self.clients[0]
+        self.connect(1)
+        reader = self.clients[1]
+
+        received = []
+        thread = threading.Thread(target=lambda: received.append(read_exactly(reader, len(frame) * count, 10.0)))
+        thread.start()
+        self.autopilot.sendall(frame * count)
+        thread.join(15.0)
+
+        self.assertEqual(len(received[0]), len(frame) * count)
+        self.assertEqual(self.bridge.stats['messages_from_autopilot'], count)
+        stalled_client = next(c for c in self.bridge.clients
+                              if c.socket.getpeername() == stalled.getsockname())
+        self.assertGreater(stalled_client.dropped, 0)
+        self.assertLessEqual(len(stalled_client.buffer), 16384)
+
+    def test_commands_reach_autopilot(self):
+        """Тест: команды клиента пересылаются автопилоту без изменений"""
+        self.connect(1)
+        command = MAVLinkFrameEncoder().encode_message('COMMAND_LONG', command=400, target_system=1, param1=1)
+        self.clients[0].sendall(command)
+
+        decoder = MAVLinkFrameDecoder()
+        decoder.feed(read_exactly(self.autopilot, len(command)))
+        frame = decoder.next_frame()
+        self.assertEqual((frame.message_id, frame.system_id), (76, 255))
+
+    def test_client_frames_not_interleaved(self):
+        """Тест: команды двух клиентов, пришедшие кусками, доходят целыми кадрами"""
+        self.connect(2)
+        encoders = [MAVLinkFrameEncoder(255, 190), MAVLinkFrameEncoder(255, 191)]
+        streams = [b''.join(encoder.encode_message('COMMAND_LONG', command=400 + seq, target_system=1)
+                            for seq in range(50)) for encoder in encoders]
+        for offset in range(0, len(streams[0]), 7):
+            for client, stream in zip(self.clients, streams):
+                client.sendall(stream[offset:offset + 7])
+
+        decoder = MAVLinkFrameDecoder()
+        decoder.feed(read_exactly(self.autopilot, sum(map(len, streams))))
+        frames = [(frame.component_id, frame.sequence) for frame in decoder]
+
+        self.assertEqual(decoder.stats.crc_errors, 0)
+        self.assertEqual(sorted(frames), [(190 + index, seq) for index in range(2) for seq in range(50)])
+        self.wait_for(lambda: self.bridge.serial_writer.latency['command'].count == 100)
+        self.assertEqual(self.bridge.stats['messages_from_clients'], 100)
+
+    def test_configure_serial(self):
+        """Тест: VMIN/VTIME на настоящем tty (pty); low latency без поддержки драйвера не ломает запуск"""
+        import termios
+        master_fd, slave_fd = os.openpty()
+        bridge = tcp_mavlink_bridge.TCPMAVLinkBridge(serial_vmin=1, serial_vtime=2)
+        bridge.master = mavutil.mavlink_connection(os.ttyname(slave_fd), baud=115200)
+        try:
+            bridge.configure_serial()
+            control = termios.tcgetattr(bridge.master.port.fileno())[6]
+            self.assertEqual((control[termios.VMIN], control[termios.VTIME]), (1, 2))
+        finally:
+            bridge.master.close()
+            bridge.cleanup()
+            os.close(master_fd)
+            os.close(slave_fd)
+
+    def test_recording_closed_while_dispatching(self):
+        """Тест: закрытие записи во время рассылки не рвёт .tlog и не пишет в закрытый файл"""
+        from src.utils.tlog import TlogStats, parse_tlog
+        tmpdir = tempfile.mkdtemp()
+        path = os.path.join(tmpdir, 'capture.tlog')
+        bridge = tcp_mavlink_bridge.TCPMAVLinkBridge(record_path=path)
+        frames = self.telemetry(5)
+        errors = []
+
+        def reader():
+            try:
+                for _ in range(3):
+                    bridge.dispatch(frames)
+            except Exception as e:
+                errors.append(e)
+
+        try:
+            bridge.open_recorder()
+            bridge.recorder = SlowFile(bridge.recorder)
+            thread = threading.Thread(target=reader)
+            thread.start()
+            time.sleep(0.02)  # The reader is inside a write
+            bridge.cleanup()
+            thread.join(5.0)
+
+            self.assertEqual(errors, [])
+            with open(path, 'rb') as f:
+                stats = TlogStats()
+                records = list(parse_tlog(f.read(), stats))
+            self.assertEqual(stats.corrupt_records, 0)
+            self.assertGreater(len(records), 0)
+            self.assertEqual(len(records) % len(frames), 0)
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_client_disconnect(self):
+        """Тест: отключенный клиент удаляется, рассылка продолжается"""
+        stream = b''.join(self.telemetry(10))
+        self.connect(2)
+        self.clients.pop(0).close()
+        self.autopilot.sendall(stream)
+
+        self.wait_for(lambda: len(self.bridge.clients) == 1)
+        self.assertEqual(read_exactly(self.clients[0], len(stream)), stream)
+
+
+class TestSerialWriter(unittest.TestCase):
+    """Тест писателя порта автопилота: приоритеты и пакетная запись"""
+
+    def setUp(self):
+        if mavutil is None:
+            self.skipTest("pymavlink not installed")
+
+    def run_blocked(self, writer, first, frames):
+        """Первый кадр держит писателя в write(), остальные (frame, source) копятся и уходят одной записью"""
+        writes = []
+        release = threading.Event()
+
+        def write(data):
+            if not writes:
+                release.wait(2.0)
+            writes.append(data)
+
+        writer.write = write
+        thread = threading.Thread(target=writer.run, daemon=True)
+        thread.start()
+        writer.submit(first)
+        while writer.queued:
+            time.sleep(0.001)  # Writer holds the first frame and is blocked in write()
+        for frame, source in frames:
+            writer.submit(frame, source=source)
+        release.set()
+        deadline = time.time() + 2.0
+        while writer.stats['frames_written'] < len(frames) + 1 and time.time() < deadline:
+            time.sleep(0.001)
+        writer.stop()
+        thread.join(2.0)
+        return writes
+
+    def test_priority_and_batching(self):
+        """Тест: пока порт занят, кадры копятся; команда другого клиента уходит первой, параметры последними"""
+        writer = tcp_mavlink_bridge.SerialWriter(None, batch_bytes=4096)
+        encoder = MAVLinkFrameEncoder()
+        params = [encoder.encode_message('PARAM_SET', param_id=f'P{index}', param_value=index) for index in range(20)]
+        heartbeat = encoder.encode_message('HEARTBEAT', type=6, autopilot=8)
+        command = encoder.encode_message('COMMAND_LONG', command=400, target_system=1)
+
+        writes = self.run_blocked(writer, params[0], [(frame, 'planner') for frame in params[1:]]
+                                  + [(heartbeat, 'gcs'), (command, 'tablet')])
+
+        self.assertEqual(writes, [params[0], command + heartbeat + b''.join(params[1:])])
+        self.assertEqual(writer.stats['writes'], 2)
+        self.assertEqual(writer.stats['max_batch_frames'], 21)
+        stats = writer.get_stats()
+        self.assertEqual((stats['latency']['command']['count'], stats['latency']['bulk']['count']), (1, 20))
+
+    def test_client_order_kept(self):
+        """Тест: PARAM_SET x N и затем COMMAND_LONG одного клиента доходят в исходном порядке"""
+        writer = tcp_mavlink_bridge.SerialWriter(None, batch_bytes=4096)
+        encoder = MAVLinkFrameEncoder()
+        params = [encoder.encode_message('PARAM_SET', param_id=f'P{index}', param_value=index) for index in range(5)]
+        # MAV_CMD_PREFLIGHT_STORAGE: write the parameters just set
+        storage = encoder.encode_message('COMMAND_LONG', command=245, target_system=1, param1=1)
+        other = MAVLinkFrameEncoder(255, 191).encode_message('COMMAND_LONG', command=400, target_system=1)
+
+        writes = self.run_blocked(writer, params[0], [(frame, 'planner') for frame in params[1:] + [storage]]
+                                  + [(other, 'tablet')])
+
+        self.assertEqual(writes, [params[0], other + b''.join(params[1:]) + storage])
+
+    def test_batch_size_limit(self):
+        """Тест: одна запись не больше batch_bytes (плюс последний кадр)"""
+        writes = []
+        writer = tcp_mavlink_bridge.SerialWriter(writes.append, batch_bytes=100)
+        frame = MAVLinkFrameEncoder().encode_message('HEARTBEAT', type=6, autopilot=8)
+        for _ in range(30):
+            writer.submit(frame)
+
+        thread = threading.Thread(target=writer.run, daemon=True)
+        thread.start()
+        deadline = time.time() + 2.0
+        while writer.stats['frames_written'] < 30 and time.time() < deadline:
+            time.sleep(0.001)
+        writer.stop()
+        thread.join(2.0)
+
+        self.assertEqual(b''.join(writes), frame * 30)
+        self.assertTrue(all(len(data) < 100 + len(frame) for data in writes))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,426 @@
+"""
+Тесты MAVLink TCP прокси (VPS): один event loop, backpressure, статистика подключений,
+режим мультиплексирования кадров MAVLink
+"""
+
+import asyncio
+import hashlib
+import os
+import socket
+import time
+import unittest
+
+# Import services
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', '..', 'VPS', 'tcp_proxy'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from mavlink_tcp_proxy import MAVLinkFrameSplitter, MAVLinkTCPProxy, SPLICE_AVAILABLE, rewrite_sequence
+from src.utils.mavlink_encoder import MAVLinkFrameEncoder
+from src.utils.mavlink_parser import MAVLinkFrameDecoder
+
+MODES = [False, True] if SPLICE_AVAILABLE else [False]
+
+
+async def echo(reader, writer):
+    while data := await reader.read(65536):
+        writer.write(data)
+        await writer.drain()
+    writer.close()
+
+
+class TestMAVLinkTCPProxy(unittest.TestCase):
+    """Тест пересылки через прокси"""
+
+    def run_proxy(self, scenario, handler=echo, target_rcvbuf=None, **kwargs):
+        async def run():
+            target = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            if target_rcvbuf:
+                target.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, target_rcvbuf)
+            target.bind(('127.0.0.1', 0))
+            server = await asyncio.start_server(handler, sock=target)
+
+            proxy = MAVLinkTCPProxy(listen_port=0, listen_host='127.0.0.1', target_host='127.0.0.1',
+                                    target_port=target.getsockname()[1], **kwargs)
+            serving = asyncio.ensure_future(proxy.serve())
+            while not proxy.running:
+                await asyncio.sleep(0.01)
+            try:
+                return proxy, await scenario(proxy)
+            finally:
+                proxy.stop()
+                await serving
+                server.close()
+
+        return asyncio.run(run())
+
+    async def wait_closed(self, proxy, timeout=2.0):
+        deadline = time.time() + timeout
+        while proxy.sessions and time.time() < deadline:
+            await asyncio.sleep(0.01)
+
+    def test_round_trip_counters(self):
+        """Тест: эхо через прокси, байты считаются по каждому подключению"""
+        for use_splice in MODES:
+            with self.subTest(splice=use_splice):
+                async def scenario(proxy):
+                    clients = [await asyncio.open_connection('127.0.0.1', proxy.listen_port) for _ in range(10)]
+                    for index, (reader, writer) in enumerate(clients):
+                        writer.write(bytes([index]) * 1000)
+                    echoes = [await reader.readexactly(1000) for reader, _ in clients]
+                    during = proxy.get_stats()
+                    for _, writer in clients:
+                        writer.close()
+                    await self.wait_closed(proxy)
+                    return echoes, during
+
+                proxy, (echoes, during) = self.run_proxy(scenario, use_splice=use_splice)
+
+                self.assertEqual(echoes, [bytes([index]) * 1000 for index in range(10)])
+                self.assertEqual(during['connections_active'], 10)
+                self.assertEqual(during['mode'], 'splice' if use_splice else 'buffered')
+                for connection in during['connections']:
+                    self.assertEqual((connection['upstream']['bytes'], connection['downstream']['bytes']), (1000, 1000))
+                    self.assertGreater(connection['connect_ms'], 0)
+
+                stats = proxy.get_stats()
+                self.assertEqual((stats['connections_total'], stats['connections_active']), (10, 0))
+                self.assertEqual(stats['bytes_forwarded'], 20000)
+                self.assertEqual(stats['errors'], 0)
+
+    def test_hundreds_of_sessions(self):
+        """Тест: 300 одновременных сессий Mission Planner на одном потоке"""
+        frame = bytes(range(40))
+
+        async def client(port):
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            for _ in range(20):
+                writer.write(frame)
+                await reader.readexactly(len(frame))
+            writer.close()
+            return True
+
+        async def scenario(proxy):
+            started = time.perf_counter()
+            results = await asyncio.gather(*[client(proxy.listen_port) for _ in range(300)])
+            await self.wait_closed(proxy, timeout=5.0)
+            return results, time.perf_counter() - started
+
+        proxy, (results, elapsed) = self.run_proxy(scenario)
+
+        self.assertEqual(len(results), 300)
+        self.assertEqual(proxy.get_stats()['bytes_forwarded'], 300 * 20 * 40 * 2)
+        self.assertLess(elapsed, 10.0)
+
+    def test_backpressure_sendall(self):
+        """Тест: медленный получатель — частичные записи дописываются, данные не теряются"""
+        size = 48 * 1024 * 1024
+        payload = os.urandom(1024 * 1024)
+
+        for use_splice in MODES:
+            with self.subTest(splice=use_splice):
+                received = hashlib.sha256()
+
+                async def slow_target(reader, writer):
+                    await asyncio.sleep(0.5)
+                    total = 0
+                    while data := await reader.read(65536):
+                        received.update(data)
+                        total += len(data)
+                    writer.close()
+                    sink.append(total)
+
+                async def scenario(proxy):
+                    reader, writer = await asyncio.open_connection('127.0.0.1', proxy.listen_port)
+                    for _ in range(size // len(payload)):
+                        writer.write(payload)
+                        await writer.drain()
+                    writer.write_eof()
+                    deadline = time.time() + 10
+                    while not sink and time.time() < deadline:
+                        await asyncio.sleep(0.01)
+                    writer.close()
+                    return proxy.get_stats()
+
+                sink = []
+                sent = hashlib.sha256()
+                for _ in range(size // len(payload)):
+                    sent.update(payload)
+
+                proxy, stats = self.run_proxy(scenario, handler=slow_target, target_rcvbuf=65536,
+                                              use_splice=use_splice)
+
+                self.assertEqual(sink, [size])
+                self.assertEqual(received.hexdigest(), sent.hexdigest())
+                self.assertEqual(stats['connections_active'], 0)
+
+    def test_backpressure_pauses_reading(self):
+        """Тест: пока получатель не читает, буфер направления ограничен и чтение стоит"""
+        for use_splice in MODES:
+            with self.subTest(splice=use_splice):
+                release = []
+
+                async def stalled_target(reader, writer):
+                    while not release:
+                        await asyncio.sleep(0.01)
+                    while await reader.read(65536):
+                        pass
+                    writer.close()
+
+                async def scenario(proxy):
+                    reader, writer = await asyncio.open_connection('127.0.0.1', proxy.listen_port)
+                    chunk = b'\x00' * 65536
+                    deadline = time.time() + 2.0
+                    while time.time() < deadline:
+                        writer.write(chunk)
+                        try:
+                            await asyncio.wait_for(writer.drain(), timeout=0.2)
+                        except asyncio.TimeoutError:
+                            break  # Client itself is blocked: backpressure reached the sender
+                    upstream = proxy.get_stats()['connections'][0]['upstream']
+                    release.append(True)
+                    writer.close()
+                    return upstream
+
+                proxy, upstream = self.run_proxy(scenario, handler=stalled_target, target_rcvbuf=65536,
+                                                 use_splice=use_splice, buffer_size=65536)
+
+                self.assertGreater(upstream['pauses'], 0)
+                self.assertLessEqual(upstream['max_buffered'], 65536)
+
+    def test_target_unreachable(self):
+        """Тест: целевой сервер недоступен — клиент закрыт, ошибка учтена"""
+        unused = socket.socket()
+        unused.bind(('127.0.0.1', 0))
+        port = unused.getsockname()[1]
+        unused.close()
+
+        async def scenario(proxy):
+            proxy.target_port = port
+            reader, writer = await asyncio.open_connection('127.0.0.1', proxy.listen_port)
+            data = await asyncio.wait_for(reader.read(), timeout=2.0)
+            writer.close()
+            await self.wait_closed(proxy)
+            return data
+
+        proxy, data = self.run_proxy(scenario)
+
+        self.assertEqual(data, b'')
+        self.assertEqual(proxy.get_stats()['errors'], 1)
+
+    def test_connection_limit(self):
+        """Тест: сверх лимита подключения отклоняются"""
+        async def scenario(proxy):
+            clients = [await asyncio.open_connection('127.0.0.1', proxy.listen_port) for _ in range(3)]
+            rejected = await asyncio.wait_for(clients[2][0].read(), timeout=2.0)
+            for _, writer in clients:
+                writer.close()
+            return rejected
+
+        proxy, rejected = self.run_proxy(scenario, max_connections=2)
+
+        self.assertEqual(rejected, b'')
+        self.assertEqual(proxy.get_stats()['connections_rejected'], 1)
+
+
+class FakeUplink:
+    """Целевой сервер (ngrok туннель к Jetson): считает подключения и принятые кадры"""
+
+    def __init__(self):
+        self.connections = 0
+        self.writer = None
+        self.decoder = MAVLinkFrameDecoder()
+        self.frames = []
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        self.writer = writer
+        while data := await reader.read(65536):
+            self.decoder.feed(data)
+            self.frames.extend((frame.system_id, frame.sequence, frame.message_id) for frame in self.decoder)
+        writer.close()
+
+
+class TestMultiplexMode(unittest.TestCase):
+    """Тест режима мультиплексирования: один upstream, кадры MAVLink на границе"""
+
+    def setUp(self):
+        self.uplink = FakeUplink()
+        self.autopilot = MAVLinkFrameEncoder(1, 1)
+
+    def run_mux(self, scenario, **kwargs):
+        async def run():
+            server = await asyncio.start_server(self.uplink.handle, '127.0.0.1', 0)
+            proxy = MAVLinkTCPProxy(listen_port=0, listen_host='127.0.0.1', target_host='127.0.0.1',
+                                    target_port=server.sockets[0].getsockname()[1], multiplex=True,
+                                    reconnect_delay=0.05, **kwargs)
+            serving = asyncio.ensure_future(proxy.serve())
+            while not proxy.running or self.uplink.writer is None:
+                await asyncio.sleep(0.01)
+            try:
+                return proxy, await scenario(proxy)
+            finally:
+                proxy.stop()
+                await serving
+                server.close()
+
+        return asyncio.run(run())
+
+    def telemetry(self, count):
+        return [self.autopilot.encode_message('ATTITUDE', time_boot_ms=index + 1, roll=0.1) for index in range(count)]
+
+    def test_splitter_resync_and_partial_frames(self):
+        """Тест: кадры v1/v2 собираются из кусков, мусор между кадрами пропускается"""
+        frames = self.telemetry(3)
+        frames.append(bytes([0xFE, 2, 7, 1, 1, 0, 0xAA, 0xBB, 0x12, 0x34]))  # v1 frame
+        stream = b'\x00garbage' + frames[0] + b'\x01\x02' + b''.join(frames[1:])
+
+        splitter = MAVLinkFrameSplitter()
+        received = []
+        for index in range(len(stream)):
+            received.extend(splitter.feed(stream[index:index + 1]))
+
+        self.assertEqual(received, frames)
+        self.assertEqual(splitter.garbage_bytes, 10)
+
+    def test_rewrite_sequence_keeps_crc(self):
+        """Тест: после замены sequence CRC кадра остаётся верной"""
+        encoder = MAVLinkFrameEncoder()
+        decoder = MAVLinkFrameDecoder()
+        for sequence in (0, 1, 127, 255):
+            frame = bytearray(encoder.encode_message('COMMAND_LONG', command=400, target_system=1, param1=1.0))
+            self.assertTrue(rewrite_sequence(frame, sequence))
+            decoder.feed(frame)
+            self.assertEqual(decoder.next_frame().sequence, sequence)
+        self.assertEqual(decoder.stats.crc_errors, 0)
+
+        signed = bytearray(frame)
+        signed[2] |= 0x01
+        self.assertFalse(rewrite_sequence(signed, 9))
+
+    def test_single_upstream_fan_out(self):
+        """Тест: пять клиентов — одно соединение с целевым сервером, телеметрия у всех"""
+        frames = self.telemetry(50)
+
+        async def scenario(proxy):
+            clients = [await asyncio.open_connection('127.0.0.1', proxy.listen_port) for _ in range(5)]
+            while len(proxy.sessions) < 5:
+                await asyncio.sleep(0.01)
+            self.uplink.writer.write(b''.join(frames))
+            streams = [await asyncio.wait_for(reader.readexactly(sum(map(len, frames))), timeout=2.0)
+                       for reader, _ in clients]
+            for _, writer in clients:
+                writer.close()
+            return streams, proxy.get_stats()
+
+        proxy, (streams, stats) = self.run_mux(scenario)
+
+        self.assertEqual(self.uplink.connections, 1)
+        self.assertTrue(all(stream == b''.join(frames) for stream in streams))
+        self.assertEqual(stats['mode'], 'mavlink')
+        self.assertEqual(stats['upstream']['frames_received'], 50)
+        self.assertEqual(stats['upstream']['bytes_received'], sum(map(len, frames)))
+        self.assertTrue(all(connection['frames_sent'] == 50 for connection in stats['connections']))
+
+    def test_commands_merged_with_sequence_rewrite(self):
+        """Тест: команды двух GCS с одним system_id идут в upstream подряд по sequence, CRC верна"""
+        async def scenario(proxy):
+            clients = [await asyncio.open_connection('127.0.0.1', proxy.listen_port) for _ in range(2)]
+            encoders = [MAVLinkFrameEncoder(255, 190), MAVLinkFrameEncoder(255, 190)]
+            for index in range(10):
+                for (_, writer), encoder in zip(clients, encoders):
+                    writer.write(encoder.encode_message('COMMAND_LONG', command=400 + index, target_system=1))
+                    await writer.drain()
+                await asyncio.sleep(0.005)
+            deadline = time.time() + 2.0
+            while len(self.uplink.frames) < 20 and time.time() < deadline:
+                await asyncio.sleep(0.01)
+            for _, writer in clients:
+                writer.close()
+            return proxy.get_stats()
+
+        proxy, stats = self.run_mux(scenario)
+
+        self.assertEqual([frame[1] for frame in self.uplink.frames], list(range(20)))
+        self.assertEqual(self.uplink.decoder.stats.crc_errors, 0)
+        self.assertEqual(stats['upstream']['frames_sent'], 20)
+
+    def test_rate_limit_per_client(self):
+        """Тест: ATTITUDE ограничен частотой для каждого клиента, HEARTBEAT проходит весь"""
+        attitude = self.telemetry(100)
+        heartbeats = [self.autopilot.encode_message('HEARTBEAT', type=2, autopilot=3) for _ in range(5)]
+
+        async def scenario(proxy):
+            clients = [await asyncio.open_connection('127.0.0.1', proxy.listen_port) for _ in range(2)]
+            while len(proxy.sessions) < 2:
+                await asyncio.sleep(0.01)
+            self.uplink.writer.write(b''.join(attitude + heartbeats))
+            expected = len(attitude[0]) + sum(map(len, heartbeats))
+            streams = [await asyncio.wait_for(reader.readexactly(expected), timeout=2.0) for reader, _ in clients]
+            await asyncio.sleep(0.05)
+            stats = proxy.get_stats()
+            for _, writer in clients:
+                writer.close()
+            return streams, stats
+
+        proxy, (streams, stats) = self.run_mux(scenario, rate_limits={30: 2.0})
+
+        for stream in streams:
+            self.assertEqual(stream, attitude[0] + b''.join(heartbeats))
+        self.assertTrue(all(connection['rate_limited'] == 99 for connection in stats['connections']))
+
+    def test_slow_client_does_not_block_others(self):
+        """Тест: клиент, который не читает, теряет кадры, остальные получают всё"""
+        frames = self.telemetry(1) * 200000
+        size = sum(map(len, frames))
+
+        async def scenario(proxy):
+            slow = socket.socket()
+            slow.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+            slow.connect(('127.0.0.1', proxy.listen_port))
+            reader, writer = await asyncio.open_connection('127.0.0.1', proxy.listen_port)
+            while len(proxy.sessions) < 2:
+                await asyncio.sleep(0.01)
+            self.uplink.writer.write(b''.join(frames))
+            stream = await asyncio.wait_for(reader.readexactly(size), timeout=5.0)
+            stats = proxy.get_stats()
+            writer.close()
+            slow.close()
+            return stream, stats
+
+        proxy, (stream, stats) = self.run_mux(scenario, client_buffer_size=16384)
+
+        self.assertEqual(len(stream), size)
+        dropped = sorted(connection['dropped'] for connection in stats['connections'])
+        self.assertEqual(dropped[0], 0)
+        self.assertGreater(dropped[1], 0)
+        self.assertTrue(all(connection['max_buffered'] <= 16384 for connection in stats['connections']))
+
+    def test_upstream_reconnect(self):
+        """Тест: после разрыва upstream прокси переподключается, клиенты остаются"""
+        frames = self.telemetry(2)
+
+        async def scenario(proxy):
+            reader, writer = await asyncio.open_connection('127.0.0.1', proxy.listen_port)
+            while not proxy.sessions:
+                await asyncio.sleep(0.01)
+            first = self.uplink.writer
+            first.write(frames[0])
+            received = [await asyncio.wait_for(reader.readexactly(len(frames[0])), timeout=2.0)]
+            first.close()
+            while self.uplink.connections < 2:
+                await asyncio.sleep(0.01)
+            self.uplink.writer.write(frames[1])
+            received.append(await asyncio.wait_for(reader.readexactly(len(frames[1])), timeout=2.0))
+            writer.close()
+            return received, proxy.get_stats()
+
+        proxy, (received, stats) = self.run_mux(scenario)
+
+        self.assertEqual(received, frames)
+        self.assertEqual(stats['upstream']['connects'], 2)
+        self.assertEqual(stats['connections_active'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
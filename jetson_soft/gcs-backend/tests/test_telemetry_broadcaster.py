@@ -0,0 +1,168 @@
+"""
+Тесты дельта-рассылки телеметрии SocketIO клиентам
+"""
+
+import json
+import unittest
+
+# Import services
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.services.telemetry_broadcaster import TelemetryBroadcaster
+from src.services.modular_mavlink_service import TelemetryData
+
+
+class RecordingEmitter:
+    """Собирает кадры по клиентам и применяет их так же, как фронтенд"""
+
+    def __init__(self):
+        self.frames = {}
+        self.state = {}
+        self.bytes = 0
+
+    def __call__(self, event, data, sid):
+        self.bytes += len(json.dumps(data))
+        self.frames.setdefault(sid, []).append(data)
+        state = self.state.setdefault(sid, {'seq': None, 'telemetry': {}, 'connection': {}})
+        if 'base' in data:
+            assert data['base'] == state['seq'], (sid, data['base'], state['seq'])
+        state['seq'] = data['seq']
+        for section in ('telemetry', 'connection'):
+            state[section].update(data.get(section, {}))
+
+
+def make_snapshot(tick):
+    telemetry = TelemetryData(
+        battery_level=80.0 - tick // 50,
+        battery_voltage=12.4,
+        altitude_meters=100.0 + tick * 0.5,
+        speed_ms=12.0,
+        location_latitude=55.75 + tick * 1e-5,
+        location_longitude=37.61,
+        heading_degrees=(tick * 3) % 360,
+        armed=True,
+        flight_mode='AUTO',
+        gps_satellites=14,
+        timestamp=1700000000.0 + tick / 10
+    )
+    connection = {
+        'connected': True,
+        'connection_string': 'udp:0.0.0.0:14550',
+        'messages_received': tick * 40,
+        'messages_sent': 12,
+        'bytes_received': tick * 1400,
+        'parse_errors': 0,
+        'last_heartbeat': 1700000000.0 + tick // 10,
+        'timestamp': 1700000000.0 + tick / 10
+    }
+    return {'telemetry': telemetry.to_dict(), 'connection': connection}
+
+
+class TestTelemetryBroadcaster(unittest.TestCase):
+    """Тест дельта-кадров, ключевых кадров и частоты по клиентам"""
+
+    def setUp(self):
+        self.emitter = RecordingEmitter()
+        self.broadcaster = TelemetryBroadcaster(self.emitter, keyframe_interval=5.0)
+
+    def test_delta_frames(self):
+        """Тест: первый кадр полный, далее только изменённые поля"""
+        self.broadcaster.subscribe('ui', delta=True)
+        self.broadcaster.publish(make_snapshot(0), now=0.0)
+        self.broadcaster.publish(make_snapshot(1), now=0.1)
+
+        keyframe, delta = self.emitter.frames['ui']
+        self.assertTrue(keyframe['keyframe'])
+        self.assertEqual(keyframe['telemetry']['flight_mode'], 'AUTO')
+        self.assertNotIn('base', keyframe)
+
+        self.assertNotIn('keyframe', delta)
+        self.assertEqual(delta['base'], keyframe['seq'])
+        self.assertEqual(set(delta['telemetry']), {'altitude_meters', 'location_latitude', 'heading_degrees'})
+        # Connection counters are refreshed once per second
+        self.assertNotIn('connection', delta)
+
+        # Nothing changed: no frame
+        self.assertEqual(self.broadcaster.publish(make_snapshot(1), now=0.2), 0)
+        self.assertEqual(self.broadcaster.stats.unchanged_skipped, 1)
+
+        self.broadcaster.publish(make_snapshot(1), now=1.0)
+        self.assertEqual(set(self.emitter.frames['ui'][-1]), {'seq', 'base', 'connection', 'timestamp'})
+        self.assertEqual(set(self.emitter.frames['ui'][-1]['connection']), {'messages_received', 'bytes_received'})
+
+    def test_full_snapshots_by_default(self):
+        """Тест: клиент без subscribe_telemetry получает полные снимки, дельты - только по запросу"""
+        self.assertFalse(self.broadcaster.subscribe('tablet')['delta'])
+        for tick in range(3):
+            self.broadcaster.publish(make_snapshot(1), now=tick * 0.1)
+
+        frames = self.emitter.frames['tablet']
+        self.assertEqual(len(frames), 3)
+        for frame in frames:
+            self.assertTrue(frame['keyframe'])
+            self.assertEqual(frame['telemetry']['flight_mode'], 'AUTO')
+            self.assertIn('connection', frame)
+
+    def test_per_client_rate_and_keyframes(self):
+        """Тест: разные частоты клиентов, периодические ключевые кадры, восстановление состояния"""
+        self.assertEqual(self.broadcaster.subscribe('ui', delta=True)['rate'], 10.0)
+        self.broadcaster.subscribe('tablet', rate=2, delta=True)
+        self.broadcaster.subscribe('planner', rate=100, delta=True)  # Clamped to max_rate
+        self.assertAlmostEqual(self.broadcaster.tick_interval(), 0.05)
+
+        for tick in range(101):
+            self.broadcaster.publish(make_snapshot(tick), now=tick * 0.1)
+
+        frames = self.emitter.frames
+        self.assertEqual(len(frames['ui']), 101)
+        self.assertEqual(len(frames['tablet']), 21)
+        self.assertEqual(sum(frame.get('keyframe', False) for frame in frames['ui']), 3)
+
+        # Every client converges on the latest snapshot
+        latest = make_snapshot(100)
+        for sid in ('ui', 'tablet', 'planner'):
+            state = self.emitter.state[sid]
+            for section in ('telemetry', 'connection'):
+                expected = {k: v for k, v in latest[section].items() if k != 'timestamp'}
+                actual = {k: v for k, v in state[section].items() if k != 'timestamp'}
+                self.assertEqual(actual, expected)
+
+    def test_bytes_reduction(self):
+        """Тест: дельта-кадры в разы меньше полных снимков"""
+        for sid in ('crm', 'tablet', 'planner'):
+            self.broadcaster.subscribe(sid, delta=True)
+        full = TelemetryBroadcaster(RecordingEmitter())
+        full.subscribe('legacy')
+
+        for tick in range(300):
+            self.broadcaster.publish(make_snapshot(tick), now=tick * 0.1)
+            full.publish(make_snapshot(tick), now=tick * 0.1)
+
+        stats = self.broadcaster.get_stats()
+        self.assertGreater(stats['reduction'], 3.0)
+        self.assertEqual(full.get_stats()['reduction'], 1.0)
+        self.assertGreater(full.emit.bytes * 3 / self.emitter.bytes, 3.0)
+
+    def test_resync_and_unsubscribe(self):
+        """Тест: запрос ключевого кадра и отписка"""
+        self.broadcaster.subscribe('ui', delta=True)
+        self.broadcaster.publish(make_snapshot(0), now=0.0)
+        self.broadcaster.publish(make_snapshot(1), now=0.1)
+        self.broadcaster.request_keyframe('ui')
+        self.broadcaster.publish(make_snapshot(2), now=0.2)
+        self.assertTrue(self.emitter.frames['ui'][-1]['keyframe'])
+
+        self.broadcaster.subscribe('ui', delta=False)
+        self.broadcaster.publish(make_snapshot(3), now=0.3)
+        self.broadcaster.publish(make_snapshot(4), now=0.4)
+        self.assertTrue(all(frame['keyframe'] for frame in self.emitter.frames['ui'][-2:]))
+
+        self.broadcaster.unsubscribe('ui')
+        self.assertEqual(self.broadcaster.client_count, 0)
+        self.assertEqual(self.broadcaster.publish(make_snapshot(5), now=0.5), 0)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
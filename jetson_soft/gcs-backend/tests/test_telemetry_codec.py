@@ -0,0 +1,86 @@
+"""
+Тесты компактного бинарного формата телеметрии (строки и колоночные пакеты)
+"""
+
+import unittest
+import json
+from dataclasses import fields
+
+# Import services
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.services.modular_mavlink_service import TelemetryData
+from src.utils.serialization import SerializationUtils
+from src.utils.telemetry_codec import (
+    TELEMETRY_SCHEMA, encode_row, decode_row, decode_header, check_row, encode_batch, decode_batch
+)
+
+
+def snapshot(**values):
+    telemetry = TelemetryData(
+        battery_level=87.0, battery_voltage=12.43, battery_current=3.2, altitude_meters=120.5,
+        speed_ms=12.3, location_latitude=55.751244, location_longitude=37.618423,
+        heading_degrees=271.0, armed=True, flight_mode='AUTO', gps_satellites=14,
+        timestamp=1700000000.25
+    )
+    for name, value in values.items():
+        setattr(telemetry, name, value)
+    return SerializationUtils.sanitize_telemetry(telemetry.to_dict())
+
+
+class TestTelemetryRow(unittest.TestCase):
+    """Тест упаковки одной записи"""
+    
+    def test_schema_covers_telemetry_data(self):
+        """Тест: схема содержит все поля TelemetryData"""
+        self.assertEqual([name for name, _ in TELEMETRY_SCHEMA], [f.name for f in fields(TelemetryData)])
+    
+    def test_round_trip(self):
+        """Тест упаковки и распаковки полного снимка"""
+        data = snapshot()
+        payload = encode_row(1700000000.5, 'drone_001', data)
+        
+        self.assertEqual(decode_row(payload), (1700000000.5, 'drone_001', data))
+        self.assertEqual(decode_header(payload), (1700000000.5, 'drone_001'))
+        self.assertLess(len(payload) * 4, len(json.dumps(data)))
+    
+    def test_nulls_and_extras(self):
+        """Тест None, полей вне схемы и значений неподходящего типа"""
+        data = snapshot(location_latitude=None, location_longitude=None, gps_satellites=300)
+        data['value'] = [1, 2]
+        del data['humidity_percent']
+        
+        timestamp, drone_id, decoded = decode_row(encode_row(1.0, 'd', data))
+        
+        self.assertEqual(decoded, data)
+        self.assertNotIn('humidity_percent', decoded)
+        self.assertEqual(decode_row(encode_row(2.0, 'd', {'value': 3}))[2], {'value': 3})
+    
+    def test_unknown_version_rejected(self):
+        """Тест отказа от строк другого формата"""
+        with self.assertRaises(ValueError):
+            check_row(b'[1.0,"drone",{}]')
+
+
+class TestTelemetryBatch(unittest.TestCase):
+    """Тест колоночного пакета для выгрузки"""
+    
+    def test_round_trip(self):
+        """Тест упаковки пакета из нескольких аппаратов"""
+        rows = [
+            (1000.0 + i, f'drone_{i % 3}', snapshot(altitude_meters=100.0 + i, flight_mode='RTL' if i % 2 else 'AUTO'))
+            for i in range(50)
+        ]
+        rows.append((2000.0, 'drone_0', {'value': 1, 'armed': None}))
+        
+        batch = encode_batch(rows)
+        
+        self.assertEqual(decode_batch(batch), rows)
+        self.assertLess(len(batch) * 4, len(json.dumps([data for _, _, data in rows])))
+        self.assertEqual(decode_batch(encode_batch([])), [])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
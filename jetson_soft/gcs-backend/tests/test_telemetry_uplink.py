@@ -0,0 +1,104 @@
+"""
+Тесты выгрузки телеметрии: колоночный сжатый формат, согласование и откат на JSON
+"""
+
+import unittest
+import json
+
+# Import services
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.services.central_server_sync import CentralServerSync
+from src.utils.telemetry_codec import BATCH_CONTENT_TYPE
+from ingest_server import IngestTestServer
+
+
+def flight_records(count=200, drones=2):
+    """Записи в формате TelemetryRecord.to_dict() для полёта по прямой"""
+    records = []
+    for i in range(count):
+        records.append({
+            'timestamp': 1700000000.0 + i * 0.1,
+            'drone_id': f'drone_{i % drones}',
+            'data': {
+                'battery_level': 90.0 - i * 0.01, 'battery_voltage': 12.4, 'battery_current': 3.25,
+                'altitude_meters': 120.5, 'speed_ms': 12.0, 'heading_degrees': 271.0,
+                'location_latitude': round(55.751244 + i * 0.000011, 6),
+                'location_longitude': round(37.618423 - i * 0.000007, 6),
+                'armed': True, 'flight_mode': 'AUTO', 'gps_satellites': 14,
+                'temperature_celsius': 0.0, 'humidity_percent': 0.0, 'vibration_level': 0.0,
+                'signal_strength': 0.0, 'timestamp': 1700000000.0 + i * 0.1
+            },
+            'synced': False,
+            'retry_count': 0,
+            'seq': i
+        })
+    return records
+
+
+class TestTelemetryUplink(unittest.TestCase):
+    """Тест выгрузки через локальную замену edge-функции"""
+
+    def start_server(self, **kwargs):
+        server = IngestTestServer(**kwargs).start()
+        self.addCleanup(server.stop)
+        sync = CentralServerSync(server_url=server.url, api_key="test_key")
+        self.addCleanup(sync.stop)
+        return server, sync
+
+    def test_batch_round_trip(self):
+        """Тест колоночного сжатого пакета: данные доходят без искажений"""
+        server, sync = self.start_server()
+        records = flight_records()
+
+        self.assertTrue(sync.sync_telemetry_batch(records))
+
+        self.assertEqual(server.requests[0]['content_type'], BATCH_CONTENT_TYPE)
+        self.assertEqual(server.rows, [(r['timestamp'], r['drone_id'], r['data']) for r in records])
+
+        # Delta-encoded and deflated batch vs the JSON payload it replaces
+        json_size = len(json.dumps({'records': records}).encode('utf-8'))
+        self.assertLess(sync.stats.bytes_sent * 20, json_size)
+        self.assertEqual(sync.stats.records_sent, len(records))
+
+    def test_json_fallback(self):
+        """Тест отката на JSON для функции без поддержки пакетов"""
+        server, sync = self.start_server(json_only=True)
+
+        self.assertTrue(sync.sync_telemetry_batch(flight_records(5)))
+        self.assertTrue(sync.sync_telemetry_batch(flight_records(5)))
+
+        # One rejected probe, then JSON only
+        self.assertEqual([r['content_type'] for r in server.requests],
+                         [BATCH_CONTENT_TYPE, 'application/json', 'application/json'])
+        self.assertEqual(len(server.rows), 10)
+        self.assertEqual(sync.stats.uplink_format, 'json')
+
+    def test_transient_error_keeps_batch_format(self):
+        """Тест: 5xx/401 без заголовка кодировок - сбой выгрузки, а не переход на JSON"""
+        server, sync = self.start_server(failures=[503, 401])
+
+        self.assertFalse(sync.sync_telemetry_batch(flight_records(5)))
+        self.assertFalse(sync.sync_telemetry_batch(flight_records(5)))
+        self.assertTrue(sync.sync_telemetry_batch(flight_records(5)))
+
+        self.assertEqual([r['content_type'] for r in server.requests], [BATCH_CONTENT_TYPE] * 3)
+        self.assertEqual(len(server.rows), 5)
+        self.assertEqual(sync.stats.failed_syncs, 2)
+
+    def test_encoding_negotiation(self):
+        """Тест перехода на кодирование, объявленное сервером"""
+        server, sync = self.start_server(encodings=['deflate'])
+        sync.uplink_encoding = 'identity'
+
+        self.assertTrue(sync.sync_telemetry_batch(flight_records(5)))
+
+        self.assertEqual([r['encoding'] for r in server.requests], ['identity', 'deflate'])
+        self.assertEqual(sync.uplink_encoding, 'deflate')
+        self.assertEqual(len(server.rows), 5)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
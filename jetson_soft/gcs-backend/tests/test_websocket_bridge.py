@@ -0,0 +1,274 @@
+"""
+Тесты WebSocket моста: изоляция медленных клиентов, задержка TCP -> WebSocket
+"""
+
+import asyncio
+import json
+import statistics
+import struct
+import time
+import unittest
+
+import websockets
+
+# Import services
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+
+from websocket_mavlink_bridge import WebSocketMAVLinkBridge, ClientSession, MAVLinkMessage
+from src.utils.mavlink_parser import CRC_EXTRA, crc_x25, crc_accumulate, MAVLinkFrameDecoder
+from src.utils.mavlink_encoder import MAVLinkFrameEncoder
+from src.utils.mavlink_messages import decode_message
+
+
+class FakeClient:
+    """Клиент WebSocket: быстрый или зависший на отправке"""
+
+    def __init__(self, port, stalled=False):
+        self.remote_address = ('10.0.0.1', port)
+        self.stalled = stalled
+        self.sent = []
+        self.closed = None
+
+    async def send(self, message):
+        if self.stalled:
+            await asyncio.Event().wait()
+        self.sent.append(json.loads(message))
+
+    async def close(self, code=1000, reason=''):
+        self.closed = code
+
+
+def attitude(i, msg_id=30):
+    return MAVLinkMessage(msg_type=f"MSG_{msg_id}", system_id=1, component_id=1, timestamp=i,
+                          data={'msg_id': msg_id, 'seq': i % 256, 'payload_length': 0, 'payload': b''})
+
+
+def build_v2_frame(msg_id, payload, seq=0):
+    header = bytes([len(payload), 0, 0, seq, 1, 1]) + msg_id.to_bytes(3, 'little')
+    crc = crc_accumulate(CRC_EXTRA[msg_id], crc_x25(header + payload))
+    return b'\xfd' + header + payload + crc.to_bytes(2, 'little')
+
+
+class TestClientIsolation(unittest.TestCase):
+    """Тест: медленный клиент не задерживает остальных"""
+
+    def run_bridge(self, bridge, clients, messages, interval):
+        async def scenario():
+            bridge.running = True
+            for client in clients:
+                session = ClientSession(client, 'json', bridge.client_queue_size)
+                session.writer = asyncio.ensure_future(bridge._client_writer(session))
+                bridge.clients[client] = session
+            processor = asyncio.ensure_future(bridge._inbound_processor())
+
+            for message in messages:
+                bridge._put_inbound(message)
+                await asyncio.sleep(interval)
+            await asyncio.sleep(0.3)
+
+            bridge.running = False
+            processor.cancel()
+            for session in list(bridge.clients.values()):
+                session.writer.cancel()
+
+        asyncio.run(scenario())
+
+    def test_attitude_flows_past_stalled_client(self):
+        """Тест: 50 Гц ATTITUDE доходит до здорового клиента, зависший отключается"""
+        bridge = WebSocketMAVLinkBridge(slow_client_timeout=0.5)
+        healthy, stalled = FakeClient(1), FakeClient(2, stalled=True)
+
+        started = time.time()
+        self.run_bridge(bridge, [healthy, stalled], [attitude(i) for i in range(50)], 0.02)
+
+        self.assertEqual([m['message']['timestamp'] for m in healthy.sent], list(range(50)))
+        self.assertLess(time.time() - started, 2.0)
+
+        # Stalled client: queue conflated to one ATTITUDE until disconnected after ~0.5 s
+        self.assertEqual(stalled.closed, 1013)
+        self.assertNotIn(stalled, bridge.clients)
+        self.assertGreater(bridge.stats.messages_conflated, 15)
+        self.assertEqual(bridge.stats.slow_clients_disconnected, 1)
+        self.assertEqual(bridge.stats.messages_dropped, 0)
+
+    def test_drop_oldest_policy(self):
+        """Тест: без конфляции очередь ограничена, старые сообщения отбрасываются"""
+        bridge = WebSocketMAVLinkBridge(client_queue_size=8, client_queue_policy='drop_oldest',
+                                        slow_client_timeout=30.0)
+        healthy, stalled = FakeClient(1), FakeClient(2, stalled=True)
+
+        self.run_bridge(bridge, [healthy, stalled], [attitude(i) for i in range(40)], 0.001)
+
+        self.assertEqual(len(healthy.sent), 40)
+        stats = {client['address']: client for client in bridge.get_client_stats()}
+        self.assertEqual(stats['10.0.0.1:2']['queue_depth'], 8)
+        self.assertEqual(stats['10.0.0.1:2']['dropped'], 40 - 8 - 1)  # One message is stuck in send()
+        self.assertEqual(stats['10.0.0.1:1']['dropped'], 0)
+        self.assertGreater(stats['10.0.0.1:2']['behind_seconds'], 0)
+        self.assertEqual(bridge.stats.messages_dropped, 31)
+
+    def test_command_ack_never_conflated(self):
+        """Тест: COMMAND_ACK не заменяется более поздним"""
+        session = ClientSession(FakeClient(1), 'json', 16)
+        bridge = WebSocketMAVLinkBridge()
+
+        async def scenario():
+            bridge.clients[session.websocket] = session
+            bridge.running = True
+            processor = asyncio.ensure_future(bridge._inbound_processor())
+            for i in range(3):
+                bridge._put_inbound(attitude(i, msg_id=77))
+                bridge._put_inbound(attitude(i))
+            await asyncio.sleep(0.1)
+            bridge.running = False
+            processor.cancel()
+
+        asyncio.run(scenario())
+
+        self.assertEqual(len(session.queue), 4)  # 3 acks + latest ATTITUDE
+        self.assertEqual(session.conflated, 2)
+
+    def test_inbound_queue_bounded(self):
+        """Тест: очередь TCP -> WebSocket ограничена"""
+        bridge = WebSocketMAVLinkBridge(inbound_queue_size=10)
+        for i in range(25):
+            bridge._put_inbound(attitude(i))
+
+        self.assertEqual(bridge.inbound_queue.qsize(), 10)
+        self.assertEqual(bridge.stats.inbound_dropped, 15)
+        self.assertEqual(bridge.inbound_queue.get_nowait()[0].timestamp, 15)
+
+
+class TestStreamPipeline(unittest.TestCase):
+    """Тест: TCP поток -> декодер -> WebSocket клиент без опроса по таймаутам"""
+
+    def run_pipeline(self, scenario, **kwargs):
+        async def run():
+            bridge = WebSocketMAVLinkBridge(**kwargs)
+            connections = asyncio.Queue()
+
+            async def autopilot(reader, writer):
+                await connections.put((reader, writer))
+
+            tcp_server = await asyncio.start_server(autopilot, '127.0.0.1', 0)
+            bridge.tcp_host, bridge.tcp_port = tcp_server.sockets[0].getsockname()[:2]
+            ws_server = await websockets.serve(bridge._websocket_handler, '127.0.0.1', 0)
+            ws_port = ws_server.sockets[0].getsockname()[1]
+
+            bridge.running = True
+            tasks = [asyncio.ensure_future(bridge._tcp_reader()),
+                     asyncio.ensure_future(bridge._message_processor())]
+            try:
+                async with websockets.connect(f'ws://127.0.0.1:{ws_port}') as client:
+                    self.assertEqual(json.loads(await client.recv())['type'], 'connection_status')
+                    return bridge, await scenario(bridge, connections, client)
+            finally:
+                bridge.running = False
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                ws_server.close()
+                tcp_server.close()
+
+        return asyncio.run(run())
+
+    def test_sub_millisecond_latency(self):
+        """Тест: медианная задержка моста на localhost меньше 1 мс"""
+        async def scenario(bridge, connections, client):
+            _, writer = await connections.get()
+            latencies = []
+            for seq in range(200):
+                payload = struct.pack('<Iffffff', seq, 0.01, -0.02, 1.57, 0.0, 0.0, 0.0)
+                sent_at = time.perf_counter()
+                writer.write(build_v2_frame(30, payload, seq % 256))
+                message = json.loads(await client.recv())['message']
+                latencies.append((time.perf_counter() - sent_at) * 1000)
+                self.assertEqual(message['data']['seq'], seq % 256)
+            writer.close()
+            return latencies
+
+        bridge, latencies = self.run_pipeline(scenario)
+
+        latency = bridge.get_latency_stats()
+        self.assertEqual(latency['end_to_end']['count'], 200)
+        self.assertLessEqual(latency['end_to_end']['p50_ms'], 1.0)
+        self.assertLessEqual(latency['inbound']['p50_ms'], latency['end_to_end']['p50_ms'])
+        # Including the test's own TCP write and WebSocket receive
+        self.assertLess(statistics.median(latencies), 5.0)
+
+    def test_split_frames_and_reconnect(self):
+        """Тест: кадры, разрезанные по чтениям, и переподключение после обрыва"""
+        frames = b''.join(build_v2_frame(0, struct.pack('<IBBBBB', 0, 2, 3, 0x81, 4, 3), seq)
+                          for seq in range(3))
+
+        async def scenario(bridge, connections, client):
+            _, writer = await connections.get()
+            for i in range(0, len(frames), 7):
+                writer.write(frames[i:i + 7])
+                await writer.drain()
+                await asyncio.sleep(0.001)
+            received = [json.loads(await client.recv())['message'] for _ in range(3)]
+            writer.close()
+
+            # Remote closed: the reader reconnects and keeps forwarding
+            _, writer = await asyncio.wait_for(connections.get(), timeout=2.0)
+            writer.write(frames[:len(frames) // 3])
+            received.append(json.loads(await client.recv())['message'])
+            writer.close()
+            return received
+
+        bridge, received = self.run_pipeline(scenario, reconnect_delay=0.05)
+
+        self.assertEqual([m['msg_type'] for m in received], ['HEARTBEAT'] * 4)
+        self.assertEqual([m['data']['seq'] for m in received], [0, 1, 2, 0])
+        self.assertEqual(bridge.stats.heartbeat_count, 4)
+
+    def test_command_round_trip(self):
+        """Тест: команда клиента кодируется для автопилота, COMMAND_ACK возвращается клиенту"""
+        async def scenario(bridge, connections, client):
+            reader, writer = await connections.get()
+            autopilot = MAVLinkFrameEncoder(3, 1)
+            writer.write(autopilot.encode_message('HEARTBEAT', type=2, autopilot=3))
+            # Companion computer and another GCS must not take over the default target
+            writer.write(MAVLinkFrameEncoder(3, 191).encode_message('HEARTBEAT', type=18, autopilot=8))
+            writer.write(MAVLinkFrameEncoder(254, 190).encode_message('HEARTBEAT', type=6, autopilot=3))
+            for _ in range(3):
+                self.assertEqual(json.loads(await client.recv())['message']['msg_type'], 'HEARTBEAT')
+
+            await client.send(json.dumps({
+                'type': 'mavlink_command', 'id': 'arm-1',
+                'command': {'message': 'COMMAND_LONG', 'command': 400, 'params': [1]}
+            }))
+            decoder = MAVLinkFrameDecoder()
+            frame = None
+            while frame is None:
+                decoder.feed(await reader.read(4096))
+                frame = decoder.next_frame()
+
+            # Telemetry keeps flowing while the command waits for its ACK
+            writer.write(autopilot.encode_message('ATTITUDE', time_boot_ms=1))
+            self.assertEqual(json.loads(await client.recv())['message']['data']['msg_id'], 30)
+            self.assertEqual(bridge.commands.stats.in_flight, 1)
+
+            writer.write(autopilot.encode_message('COMMAND_ACK', command=400, result=0, target_system=255))
+            messages = [json.loads(await client.recv()) for _ in range(2)]
+            writer.close()
+            return frame, messages
+
+        bridge, (frame, messages) = self.run_pipeline(scenario, system_id=255, component_id=190)
+
+        command = decode_message(frame.message_id, frame.payload)
+        self.assertEqual((frame.system_id, frame.component_id, frame.sequence), (255, 190, 0))
+        self.assertEqual((command.name, command.command, command.param1), ('COMMAND_LONG', 400, 1.0))
+        self.assertEqual(frame.target, (3, 1))  # Learned from the autopilot heartbeat
+
+        result = next(message for message in messages if message['type'] == 'command_result')
+        self.assertEqual((result['id'], result['status'], result['attempts']), ('arm-1', 'accepted', 1))
+        self.assertEqual(bridge.stats.messages_sent, 1)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,99 @@
+"""
+Тесты кодировок сообщений для real-time клиентов (JSON / MessagePack / CBOR)
+"""
+
+import asyncio
+import unittest
+
+# Import services
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+
+from src.utils import wire_codec
+from src.services.telemetry_broadcaster import TelemetryBroadcaster
+from websocket_mavlink_bridge import WebSocketMAVLinkBridge, ClientSession
+
+BINARY_ENCODINGS = [encoding for encoding in wire_codec.available_encodings() if wire_codec.is_binary(encoding)]
+
+MESSAGE = {
+    'type': 'mavlink_message',
+    'message': {'msg_id': 30, 'payload': b'\x01\x02\xff', 'timestamp': 1.5, 'data': [1, None, True]}
+}
+
+
+class TestWireCodec(unittest.TestCase):
+    """Тест согласования и кодирования"""
+
+    def test_negotiate(self):
+        """Тест: недоступная или неизвестная кодировка — JSON"""
+        self.assertEqual(wire_codec.negotiate(None), 'json')
+        self.assertEqual(wire_codec.negotiate('protobuf'), 'json')
+        for encoding in BINARY_ENCODINGS:
+            self.assertEqual(wire_codec.negotiate(f'protobuf, {encoding.upper()}'), encoding)
+
+    def test_json_bytes_as_hex(self):
+        """Тест: JSON передаёт байты hex-строкой"""
+        encoded = wire_codec.encode(MESSAGE)
+        self.assertIsInstance(encoded, str)
+        self.assertEqual(wire_codec.decode(encoded)['message']['payload'], '0102ff')
+
+    def test_binary_round_trip(self):
+        """Тест: бинарные кодировки сохраняют байты и меньше JSON"""
+        if not BINARY_ENCODINGS:
+            self.skipTest("msgpack/cbor2 not installed")
+        for encoding in BINARY_ENCODINGS:
+            encoded = wire_codec.encode(MESSAGE, encoding)
+            self.assertIsInstance(encoded, bytes)
+            self.assertEqual(wire_codec.decode(encoded, encoding), MESSAGE)
+            self.assertLess(len(encoded), len(wire_codec.encode(MESSAGE)))
+            # Text frames from the same client are still JSON
+            self.assertEqual(wire_codec.decode('{"type": "ping"}', encoding), {'type': 'ping'})
+
+    def test_broadcaster_encoding(self):
+        """Тест: SocketIO клиент с бинарной кодировкой получает те же кадры байтами"""
+        if not BINARY_ENCODINGS:
+            self.skipTest("msgpack/cbor2 not installed")
+        sent = {}
+        broadcaster = TelemetryBroadcaster(lambda event, data, sid: sent.setdefault(sid, []).append(data))
+        broadcaster.subscribe('json')
+        self.assertEqual(broadcaster.subscribe('binary', encoding=BINARY_ENCODINGS[0])['encoding'], BINARY_ENCODINGS[0])
+
+        for tick in range(3):
+            broadcaster.publish({'telemetry': {'altitude': tick, 'mode': 'AUTO'}}, now=tick * 0.1)
+
+        self.assertEqual(len(sent['binary']), 3)
+        for frame, encoded in zip(sent['json'], sent['binary']):
+            self.assertIsInstance(encoded, bytes)
+            self.assertEqual(wire_codec.decode(encoded, BINARY_ENCODINGS[0]), frame)
+
+
+class TestBridgeEncoding(unittest.TestCase):
+    """Тест кодировок WebSocket моста"""
+
+    def test_requested_encoding(self):
+        """Тест: кодировка из URL подключения"""
+        self.assertEqual(WebSocketMAVLinkBridge._requested_encoding(None, '/'), 'json')
+        for encoding in BINARY_ENCODINGS:
+            self.assertEqual(WebSocketMAVLinkBridge._requested_encoding(None, f'/?encoding={encoding}'), encoding)
+
+    def test_broadcast_mixed_clients(self):
+        """Тест: рассылка кодируется один раз на кодировку"""
+        bridge = WebSocketMAVLinkBridge()
+        queued = {}
+        for encoding in ['json'] + BINARY_ENCODINGS:
+            session = bridge.clients[object()] = ClientSession(None, encoding, 16)
+            queued[encoding] = session.queue
+
+        asyncio.run(bridge._broadcast_to_clients(MESSAGE))
+
+        json_message, _ = next(iter(queued['json'].values()))
+        self.assertEqual(wire_codec.decode(json_message)['message']['payload'], '0102ff')
+        for encoding in BINARY_ENCODINGS:
+            message, _ = next(iter(queued[encoding].values()))
+            self.assertEqual(wire_codec.decode(message, encoding), MESSAGE)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
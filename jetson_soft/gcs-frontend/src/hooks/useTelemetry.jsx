@@ -57,6 +57,11 @@ export const TelemetryProvider = ({ children, onConnectionChange }) => {
   const updateCountRef = useRef(0)
   const updateRateIntervalRef = useRef(null)
   
+  // Delta frames: latest merged telemetry and the seq it corresponds to
+  const telemetryRef = useRef(initialTelemetry)
+  const lastSeqRef = useRef(null)
+  const resyncPendingRef = useRef(false)
+  
   // History management (keep last 300 entries = 30 seconds at 10Hz)
   const maxHistorySize = 300
   
@@ -74,21 +79,34 @@ export const TelemetryProvider = ({ children, onConnectionChange }) => {
     }
   }, [])
 
-  // Handle telemetry updates
+  // Handle telemetry updates (keyframes carry everything, deltas only changed fields)
   const handleTelemetryUpdate = useCallback((data) => {
     const now = Date.now()
     
+    // Delta on top of a frame we never got: wait for a keyframe
+    if (data.base !== undefined && data.base !== lastSeqRef.current) {
+      if (!resyncPendingRef.current) {
+        resyncPendingRef.current = true
+        emit('telemetry_resync')
+      }
+      return
+    }
+    if (data.seq !== undefined) {
+      lastSeqRef.current = data.seq
+    }
+    if (data.keyframe) {
+      resyncPendingRef.current = false
+    }
+    
     // Update telemetry data
     if (data.telemetry) {
-      setTelemetry(prev => ({
-        ...prev,
-        ...data.telemetry,
-        timestamp: now
-      }))
+      const merged = { ...telemetryRef.current, ...data.telemetry, timestamp: now }
+      telemetryRef.current = merged
+      setTelemetry(merged)
       
       // Add to history (memory efficient)
       setHistory(prev => {
-        const newHistory = [...prev, { ...data.telemetry, timestamp: now }]
+        const newHistory = [...prev, merged]
         return newHistory.length > maxHistorySize 
           ? newHistory.slice(-maxHistorySize) 
           : newHistory
@@ -103,7 +121,7 @@ export const TelemetryProvider = ({ children, onConnectionChange }) => {
       }))
       
       // Notify parent about connection changes
-      if (onConnectionChange) {
+      if (onConnectionChange && data.connection.connected !== undefined) {
         onConnectionChange(data.connection.connected)
       }
     }
@@ -118,7 +136,7 @@ export const TelemetryProvider = ({ children, onConnectionChange }) => {
       setIsReceivingData(false)
     }, 3000)
     
-  }, [onConnectionChange])
+  }, [onConnectionChange, emit])
 
   // Socket event handlers
   useEffect(() => {
@@ -134,8 +152,10 @@ export const TelemetryProvider = ({ children, onConnectionChange }) => {
       console.log('📊 System status update:', data)
     })
     
-    // Request initial telemetry data
-    emit('request_telemetry')
+    // 10Hz delta frames; the first frame is a full keyframe
+    lastSeqRef.current = null
+    resyncPendingRef.current = false
+    emit('subscribe_telemetry', { rate: 10, delta: true })
     
     return () => {
       unsubscribeTelemetry()
@@ -207,6 +227,7 @@ export const TelemetryProvider = ({ children, onConnectionChange }) => {
       if (data.success) {
         console.log('✅ MAVLink disconnected')
         setConnection(initialConnection)
+        telemetryRef.current = initialTelemetry
         setTelemetry(initialTelemetry)
         setHistory([])
         return true
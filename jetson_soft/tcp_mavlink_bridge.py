@@ -2,48 +2,424 @@
 """
 TCP MAVLink Bridge для работы через ngrok туннель
 Решает проблему UDP блокировки между Jetson и VPS
+
+Байты от автопилота читаются большими блоками (select без активного опроса),
+делятся на кадры MAVLink по заголовку и пересылаются клиентам как есть.
+Клиентские сокеты неблокирующие, у каждого свой ограниченный буфер: клиент,
+который не читает, теряет кадры, но не останавливает чтение автопилота.
+pymavlink декодирует только типы сообщений, на которые есть подписка.
+
+Кадры клиентов собираются целиком и передаются единственному писателю порта
+автопилота: очередь с приоритетом (команды раньше параметров и миссий),
+накопленные кадры уходят одной записью.
 """
 
+import argparse
+import itertools
+import select
+import selectors
 import socket
+import struct
 import threading
 import time
 import logging
+from bisect import bisect_left
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Hashable, List, Optional, Sequence
 from pymavlink import mavutil
 
-class TCPMAVLinkBridge:
+try:
+    import termios
+except ImportError:  # Not POSIX: VMIN/VTIME are not available
+    termios = None
+
+READ_CHUNK = 4096        # Байт за одно чтение от автопилота
+READ_TIMEOUT = 0.1       # Ожидание данных от автопилота, с
+CLIENT_BUFFER_SIZE = 262144
+SERIAL_BATCH_BYTES = 1024  # ~11 мс на 921600 бод: дольше команда ждать не должна
+
+# .tlog record header: big-endian microseconds since epoch (Mission Planner / MAVProxy)
+TLOG_TIMESTAMP = struct.Struct('>Q')
+
+# Sub-millisecond resolution: client socket -> serial write
+LATENCY_BUCKETS_MS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 1000)
+
+MAVLINK_STX_V1 = 0xFE
+MAVLINK_STX_V2 = 0xFD
+MAVLINK_IFLAG_SIGNED = 0x01
+MAVLINK_SIGNATURE_LEN = 13
+
+HEARTBEAT_ID = mavutil.mavlink.MAVLINK_MSG_ID_HEARTBEAT
+PARAM_MESSAGE_IDS = frozenset(
+    message_id for message_id, message_type in mavutil.mavlink.mavlink_map.items()
+    if 'PARAM' in message_type.msgname
+)
+
+# Serial write priorities: commands first, bulk transfers last
+PRIORITY_COMMAND = 0
+PRIORITY_NORMAL = 1
+PRIORITY_BULK = 2
+PRIORITY_NAMES = {PRIORITY_COMMAND: 'command', PRIORITY_NORMAL: 'normal', PRIORITY_BULK: 'bulk'}
+
+COMMAND_MESSAGE_IDS = frozenset(
+    getattr(mavutil.mavlink, f'MAVLINK_MSG_ID_{name}')
+    for name in ('COMMAND_LONG', 'COMMAND_INT', 'SET_MODE', 'MISSION_SET_CURRENT')
+)
+BULK_MESSAGE_IDS = frozenset(
+    message_id for message_id, message_type in mavutil.mavlink.mavlink_map.items()
+    if message_type.msgname.startswith(('PARAM_', 'MISSION_', 'LOG_', 'FILE_TRANSFER_PROTOCOL'))
+) - COMMAND_MESSAGE_IDS
+
+def frame_message_id(frame) -> int:
+    if frame[0] == MAVLINK_STX_V2:
+        return frame[7] | (frame[8] << 8) | (frame[9] << 16)
+    return frame[5]
+
+class MAVLinkFrameSplitter:
+    """
+    Деление потока байт на кадры MAVLink v1/v2 по заголовку
+    CRC не проверяется: кадры пересылаются клиентам как есть, Mission Planner
+    проверяет их сам; подписки получают сообщения после проверки в pymavlink.
+    """
+    
     def __init__(self):
+        self.buffer = bytearray()
+        self.garbage_bytes = 0
+    
+    def feed(self, data) -> List[bytes]:
+        """Добавить данные, вернуть все полные кадры"""
+        buffer = self.buffer
+        buffer += data
+        size = len(buffer)
+        frames = []
+        position = 0
+        
+        while position < size:
+            stx = buffer[position]
+            if stx == MAVLINK_STX_V2:
+                if size - position < 10:
+                    break
+                incompat_flags = buffer[position + 2]
+                if incompat_flags & ~MAVLINK_IFLAG_SIGNED:
+                    position = self._resync(position)
+                    continue
+                frame_len = 12 + buffer[position + 1]
+                if incompat_flags & MAVLINK_IFLAG_SIGNED:
+                    frame_len += MAVLINK_SIGNATURE_LEN
+            elif stx == MAVLINK_STX_V1:
+                if size - position < 6:
+                    break
+                frame_len = 8 + buffer[position + 1]
+            else:
+                position = self._resync(position)
+                continue
+            
+            if size - position < frame_len:
+                break
+            frames.append(bytes(buffer[position:position + frame_len]))
+            position += frame_len
+        
+        del buffer[:position]
+        return frames
+    
+    def _resync(self, position: int) -> int:
+        """Пропустить байты до следующего маркера начала кадра"""
+        candidates = [index for index in (self.buffer.find(MAVLINK_STX_V2, position + 1),
+                                          self.buffer.find(MAVLINK_STX_V1, position + 1)) if index >= 0]
+        next_position = min(candidates) if candidates else len(self.buffer)
+        self.garbage_bytes += next_position - position
+        return next_position
+
+class LatencyHistogram:
+    """Гистограмма задержек с фиксированными корзинами (мс)"""
+    
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS_MS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+    
+    def observe(self, latency_ms: float):
+        self.counts[bisect_left(self.buckets, latency_ms)] += 1
+        self.count += 1
+        self.sum_ms += latency_ms
+        if latency_ms > self.max_ms:
+            self.max_ms = latency_ms
+    
+    def percentile(self, q: float) -> float:
+        """Верхняя граница корзины с q-м процентилем (максимум для открытой корзины)"""
+        if not self.count:
+            return 0.0
+        rank = q / 100.0 * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return float(self.buckets[index]) if index < len(self.buckets) else self.max_ms
+        return self.max_ms
+    
+    def to_dict(self) -> Dict[str, Any]:
+        labels = [f"le_{bound}" for bound in self.buckets] + [f"gt_{self.buckets[-1]}"]
+        return {
+            'count': self.count,
+            'mean_ms': self.sum_ms / self.count if self.count else 0.0,
+            'max_ms': self.max_ms,
+            'p50_ms': self.percentile(50),
+            'p95_ms': self.percentile(95),
+            'p99_ms': self.percentile(99),
+            'buckets': dict(zip(labels, self.counts))
+        }
+
+class SerialWriter:
+    """
+    Единственный писатель в порт автопилота
+    Кадры приходят целиком, поэтому кадры разных клиентов не перемешиваются.
+    У каждого клиента своя очередь (FIFO): PARAM_SET x N, затем сохранение или
+    перезагрузка доходят в порт в том же порядке. Приоритет выбирает между
+    клиентами - следующим уходит первый кадр той очереди, чей кадр важнее
+    (при равенстве - пришедший раньше). Писатель забирает накопленное до
+    batch_bytes и отправляет одной записью.
+    """
+    
+    def __init__(self, write: Callable[[bytes], Any], batch_bytes: int = SERIAL_BATCH_BYTES):
+        self.write = write
+        self.batch_bytes = batch_bytes
+        self.queues: Dict[Hashable, Deque[tuple]] = {}
+        self.queued = 0
+        self.condition = threading.Condition()
+        self.order = itertools.count()
+        self.running = False
+        
+        # Client socket -> serial write, per priority
+        self.latency = {name: LatencyHistogram() for name in PRIORITY_NAMES.values()}
+        self.stats = {
+            'frames_written': 0,
+            'bytes_written': 0,
+            'writes': 0,
+            'max_batch_frames': 0,
+            'errors': 0
+        }
+    
+    @staticmethod
+    def priority(message_id: int) -> int:
+        if message_id in COMMAND_MESSAGE_IDS:
+            return PRIORITY_COMMAND
+        if message_id in BULK_MESSAGE_IDS:
+            return PRIORITY_BULK
+        return PRIORITY_NORMAL
+    
+    def submit(self, frame: bytes, received_at: Optional[float] = None, source: Hashable = None):
+        """Поставить кадр в очередь источника source (из любого потока)"""
+        priority = self.priority(frame_message_id(frame))
+        item = (priority, next(self.order), frame, received_at or time.perf_counter())
+        with self.condition:
+            pending = self.queues.get(source)
+            if pending is None:
+                pending = self.queues[source] = deque()
+            pending.append(item)
+            self.queued += 1
+            self.condition.notify()
+    
+    def take(self, timeout: float = 0.5) -> List[tuple]:
+        """Следующая пачка до batch_bytes: головы очередей клиентов по приоритету"""
+        with self.condition:
+            if not self.queued:
+                self.condition.wait(timeout)
+            
+            batch = []
+            size = 0
+            queues = self.queues
+            while self.queued and size < self.batch_bytes:
+                source = min(queues, key=lambda key: queues[key][0][:2])
+                pending = queues[source]
+                item = pending.popleft()
+                if not pending:
+                    del queues[source]
+                self.queued -= 1
+                batch.append(item)
+                size += len(item[2])
+            return batch
+    
+    def run(self):
+        """Цикл писателя (отдельный поток)"""
+        self.running = True
+        while self.running:
+            batch = self.take()
+            if batch:
+                self.write_batch(batch)
+    
+    def stop(self):
+        self.running = False
+        with self.condition:
+            self.condition.notify_all()
+    
+    def write_batch(self, batch: List[tuple]):
+        data = batch[0][2] if len(batch) == 1 else b''.join(item[2] for item in batch)
+        try:
+            self.write(data)
+        except Exception as e:
+            logging.getLogger(__name__).error(f"❌ Ошибка отправки команды автопилоту: {e}")
+            self.stats['errors'] += 1
+            return
+        
+        written_at = time.perf_counter()
+        for priority, _, _, received_at in batch:
+            self.latency[PRIORITY_NAMES[priority]].observe((written_at - received_at) * 1000)
+        self.stats['frames_written'] += len(batch)
+        self.stats['bytes_written'] += len(data)
+        self.stats['writes'] += 1
+        if len(batch) > self.stats['max_batch_frames']:
+            self.stats['max_batch_frames'] = len(batch)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            'queued': self.queued,
+            'latency': {name: histogram.to_dict() for name, histogram in self.latency.items()}
+        }
+
+class ClientConnection:
+    """
+    Подключение Mission Planner: неблокирующий сокет и ограниченный буфер
+    Поток автопилота добавляет кадры и сразу пытается отправить их; остаток
+    досылает поток ввода-вывода клиентов, когда сокет готов к записи.
+    """
+    
+    def __init__(self, client_socket: socket.socket, address, buffer_size: int,
+                 on_pending: Callable[['ClientConnection'], None]):
+        self.socket = client_socket
+        self.address = address
+        self.splitter = MAVLinkFrameSplitter()  # Команды клиента собираются в кадры
+        self.buffer = bytearray()
+        self.buffer_size = buffer_size
+        self.on_pending = on_pending
+        self.lock = threading.Lock()
+        self.closed = False
+        self.pending = False  # Остаток ждёт готовности сокета к записи
+        self.error = None
+        self.frames_sent = 0
+        self.dropped = 0
+    
+    def enqueue(self, data: bytes, frames: List[bytes]) -> int:
+        """Поставить кадры клиенту без блокировки; возвращает число принятых кадров"""
+        with self.lock:
+            if self.closed:
+                return 0
+            
+            if not self.buffer:
+                # Common case: straight from the shared chunk to the socket, no copy
+                try:
+                    sent = self.socket.send(data)
+                except BlockingIOError:
+                    sent = 0
+                except OSError as e:
+                    self.error = e
+                    sent = len(data)
+                if sent < len(data):
+                    self.buffer += memoryview(data)[sent:]
+                accepted = len(frames)
+            elif len(self.buffer) + len(data) <= self.buffer_size:
+                self.buffer += data
+                accepted = len(frames)
+            else:
+                # Slow client: drop whole frames so its stream stays frame-aligned
+                accepted = 0
+                for frame in frames:
+                    if len(self.buffer) + len(frame) > self.buffer_size:
+                        self.dropped += 1
+                        continue
+                    self.buffer += frame
+                    accepted += 1
+            
+            self.frames_sent += accepted
+            notify = (self.buffer or self.error) and not self.pending
+            if notify:
+                self.pending = True
+        
+        if notify:
+            self.on_pending(self)
+        return accepted
+    
+    def flush(self) -> bool:
+        """Дослать буфер; True - данные ещё остались"""
+        with self.lock:
+            if self.error is not None:
+                raise self.error
+            try:
+                sent = self.socket.send(self.buffer)
+            except BlockingIOError:
+                sent = 0
+            del self.buffer[:sent]
+            self.pending = bool(self.buffer)
+            return self.pending
+
+class TCPMAVLinkBridge:
+    def __init__(self, autopilot_port='/dev/ttyACM0', autopilot_baud=921600, tcp_port=14550,
+                 client_buffer_size=CLIENT_BUFFER_SIZE, serial_low_latency=True,
+                 serial_vmin=None, serial_vtime=None, serial_batch_bytes=SERIAL_BATCH_BYTES,
+                 record_path=None):
         # Конфигурация
-        self.autopilot_port = '/dev/ttyACM0'
-        self.autopilot_baud = 921600
-        self.tcp_port = 14550  # TCP порт для ngrok
+        self.autopilot_port = autopilot_port
+        self.autopilot_baud = autopilot_baud
+        self.tcp_port = tcp_port  # TCP порт для ngrok
+        self.client_buffer_size = client_buffer_size
+        
+        # Настройка последовательного порта: ASYNC_LOW_LATENCY драйвера, VMIN/VTIME (None - не менять)
+        self.serial_low_latency = serial_low_latency
+        self.serial_vmin = serial_vmin
+        self.serial_vtime = serial_vtime
+        
+        # Запись потока автопилота в .tlog (буферизированные добавления в файл)
+        self.record_path = record_path
+        self.recorder = None
+        self.recorder_lock = threading.Lock()  # dispatch() в потоке автопилота против cleanup()
         
         # Статистика
         self.stats = {
             'messages_from_autopilot': 0,
+            'bytes_from_autopilot': 0,
             'messages_to_clients': 0,
+            'messages_from_clients': 0,
+            'messages_dropped': 0,
+            'messages_decoded': 0,
             'clients_connected': 0,
             'heartbeats': 0,
             'params': 0,
             'errors': 0
         }
         
-        # Подключенные клиенты
-        self.clients = []
+        # Подключенные клиенты: список заменяется целиком, поток автопилота читает его без блокировки
+        self.clients: List[ClientConnection] = []
         self.running = True
         
+        # Подписки: message_id -> обработчики декодированных сообщений
+        self.subscriptions: Dict[int, List[Callable]] = {}
+        self.decoder = mavutil.mavlink.MAVLink(None)
+        
+        # Единственный писатель в порт автопилота
+        self.serial_writer = SerialWriter(lambda data: self.master.write(data), serial_batch_bytes)
+        
+        self.selector = selectors.DefaultSelector()
+        self._wakeup_reader, self._wakeup_writer = socket.socketpair()
+        self._wakeup_reader.setblocking(False)
+        self._wakeup_writer.setblocking(False)
+        self._flush_requests: List[ClientConnection] = []
+        self._flush_lock = threading.Lock()
+        
         # Настройка логирования
         logging.basicConfig(
             level=logging.INFO,
             format='%(asctime)s - %(levelname)s - %(message)s'
         )
         self.logger = logging.getLogger(__name__)
-        
+    
     def connect_autopilot(self):
         """Подключение к автопилоту"""
         try:
             self.logger.info(f"🔌 Подключение к автопилоту {self.autopilot_port}@{self.autopilot_baud}")
             self.master = mavutil.mavlink_connection(
-                self.autopilot_port, 
+                self.autopilot_port,
                 baud=self.autopilot_baud,
                 timeout=5
             )
@@ -52,12 +428,57 @@ class TCPMAVLinkBridge:
             self.logger.info("⏳ Ожидание heartbeat от автопилота...")
             self.master.wait_heartbeat(timeout=10)
             self.logger.info(f"✅ Heartbeat получен от system {self.master.target_system}")
+            self.configure_serial()
             return True
-            
+        
         except Exception as e:
             self.logger.error(f"❌ Ошибка подключения к автопилоту: {e}")
             return False
     
+    def configure_serial(self):
+        """Low-latency режим драйвера и VMIN/VTIME порта автопилота"""
+        port = getattr(self.master, 'port', None)
+        if port is None or not hasattr(port, 'set_low_latency_mode'):
+            return  # Not a serial link
+        
+        if self.serial_low_latency:
+            try:
+                port.set_low_latency_mode(True)
+                self.logger.info("⚡ Последовательный порт в режиме low latency")
+            except (ValueError, OSError) as e:
+                # Not every USB-serial driver implements TIOCSSERIAL (cdc_acm does not)
+                self.logger.warning(f"⚠️ Low latency режим недоступен: {e}")
+        
+        if termios is not None and (self.serial_vmin is not None or self.serial_vtime is not None):
+            attributes = termios.tcgetattr(port.fileno())
+            if self.serial_vmin is not None:
+                attributes[6][termios.VMIN] = self.serial_vmin
+            if self.serial_vtime is not None:
+                attributes[6][termios.VTIME] = self.serial_vtime
+            termios.tcsetattr(port.fileno(), termios.TCSANOW, attributes)
+            self.logger.info(f"⚙️ VMIN={attributes[6][termios.VMIN]} VTIME={attributes[6][termios.VTIME]}")
+    
+    def subscribe(self, msg_type: str, callback: Callable):
+        """Получать декодированные pymavlink сообщения типа msg_type (например 'ATTITUDE')"""
+        message_id = getattr(mavutil.mavlink, f'MAVLINK_MSG_ID_{msg_type}', None)
+        if message_id is None:
+            raise ValueError(f"Unknown MAVLink message type: {msg_type}")
+        
+        callbacks = list(self.subscriptions.get(message_id, []))
+        callbacks.append(callback)
+        self.subscriptions = {**self.subscriptions, message_id: callbacks}
+    
+    def unsubscribe(self, msg_type: str, callback: Callable):
+        """Отменить подписку"""
+        message_id = getattr(mavutil.mavlink, f'MAVLINK_MSG_ID_{msg_type}', None)
+        callbacks = [cb for cb in self.subscriptions.get(message_id, []) if cb != callback]
+        subscriptions = dict(self.subscriptions)
+        if callbacks:
+            subscriptions[message_id] = callbacks
+        else:
+            subscriptions.pop(message_id, None)
+        self.subscriptions = subscriptions
+    
     def start_tcp_server(self):
         """Запуск TCP сервера для клиентов"""
         try:
@@ -65,106 +486,236 @@ class TCPMAVLinkBridge:
             self.tcp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
             self.tcp_socket.bind(('0.0.0.0', self.tcp_port))
             self.tcp_socket.listen(5)
+            self.tcp_socket.setblocking(False)
+            self.tcp_port = self.tcp_socket.getsockname()[1]
+            
+            self.selector.register(self.tcp_socket, selectors.EVENT_READ)
+            self.selector.register(self._wakeup_reader, selectors.EVENT_READ)
             
             self.logger.info(f"🌐 TCP сервер запущен на порту {self.tcp_port}")
             self.logger.info("📡 Готов к подключению Mission Planner через ngrok")
             
-            # Поток для принятия подключений
-            accept_thread = threading.Thread(target=self.accept_clients, daemon=True)
-            accept_thread.start()
+            # Поток ввода-вывода клиентов: подключения, команды, досылка телеметрии
+            io_thread = threading.Thread(target=self.client_io, daemon=True)
+            io_thread.start()
             
             return True
-            
+        
         except Exception as e:
             self.logger.error(f"❌ Ошибка запуска TCP сервера: {e}")
             return False
     
-    def accept_clients(self):
-        """Принятие подключений клиентов"""
+    def client_io(self):
+        """Обслуживание неблокирующих сокетов клиентов"""
         while self.running:
             try:
-                client_socket, addr = self.tcp_socket.accept()
-                self.logger.info(f"📱 Mission Planner подключен: {addr}")
-                
-                # Добавляем клиента
-                self.clients.append(client_socket)
-                self.stats['clients_connected'] += 1
-                
-                # Поток для обработки клиента
-                client_thread = threading.Thread(
-                    target=self.handle_client, 
-                    args=(client_socket, addr),
-                    daemon=True
-                )
-                client_thread.start()
-                
-            except Exception as e:
-                if self.running:
-                    self.logger.error(f"❌ Ошибка принятия подключения: {e}")
+                events = self.selector.select(timeout=1.0)
+            except (OSError, ValueError):
+                break  # Selector closed by cleanup()
+            
+            for key, mask in events:
+                if key.fileobj is self.tcp_socket:
+                    self.accept_client()
+                elif key.fileobj is self._wakeup_reader:
+                    self.process_flush_requests()
+                else:
+                    client = key.data
+                    if mask & selectors.EVENT_READ:
+                        self.handle_client(client)
+                    if mask & selectors.EVENT_WRITE and not client.closed:
+                        self.flush_client(client)
     
-    def handle_client(self, client_socket, addr):
-        """Обработка клиента Mission Planner"""
+    def accept_client(self):
+        """Принятие подключения клиента"""
         try:
-            while self.running:
-                # Получаем команды от Mission Planner
-                data = client_socket.recv(1024)
-                if not data:
-                    break
-                
-                # Отправляем команды автопилоту
-                try:
-                    self.master.write(data)
-                    self.logger.debug(f"📤 Команда от {addr} отправлена автопилоту: {len(data)} байт")
-                except Exception as e:
-                    self.logger.error(f"❌ Ошибка отправки команды автопилоту: {e}")
-                    self.stats['errors'] += 1
-                    
-        except Exception as e:
-            self.logger.error(f"❌ Ошибка обработки клиента {addr}: {e}")
-        finally:
-            # Удаляем клиента
-            if client_socket in self.clients:
-                self.clients.remove(client_socket)
-            client_socket.close()
-            self.logger.info(f"📱 Mission Planner отключен: {addr}")
+            client_socket, addr = self.tcp_socket.accept()
+        except BlockingIOError:
+            return
+        except OSError as e:
+            if self.running:
+                self.logger.error(f"❌ Ошибка принятия подключения: {e}")
+            return
+        
+        self.logger.info(f"📱 Mission Planner подключен: {addr}")
+        client_socket.setblocking(False)
+        client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        
+        client = ClientConnection(client_socket, addr, self.client_buffer_size, self.request_flush)
+        self.selector.register(client_socket, selectors.EVENT_READ, client)
+        self.clients = self.clients + [client]
+        self.stats['clients_connected'] += 1
+    
+    def handle_client(self, client: ClientConnection):
+        """Команды от Mission Planner"""
+        try:
+            data = client.socket.recv(READ_CHUNK)
+            received_at = time.perf_counter()
+        except BlockingIOError:
+            return
+        except OSError as e:
+            self.logger.error(f"❌ Ошибка обработки клиента {client.address}: {e}")
+            self.close_client(client)
+            return
+        
+        if not data:
+            self.close_client(client)
+            return
+        
+        # Целые кадры - писателю порта автопилота
+        frames = client.splitter.feed(data)
+        for frame in frames:
+            self.serial_writer.submit(frame, received_at, client)
+        self.stats['messages_from_clients'] += len(frames)
+        self.logger.debug(f"📤 Команды от {client.address} поставлены в очередь: {len(frames)} кадров")
+    
+    def request_flush(self, client: ClientConnection):
+        """Из потока автопилота: передать досылку остатка потоку ввода-вывода"""
+        with self._flush_lock:
+            self._flush_requests.append(client)
+        try:
+            self._wakeup_writer.send(b'\x00')
+        except BlockingIOError:
+            pass  # A wakeup is already pending
+    
+    def process_flush_requests(self):
+        try:
+            while self._wakeup_reader.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+        
+        with self._flush_lock:
+            requests, self._flush_requests = self._flush_requests, []
+        for client in requests:
+            if not client.closed:
+                self.flush_client(client)
+    
+    def flush_client(self, client: ClientConnection):
+        """Дослать буфер клиента; пока остаток есть, ждём готовности сокета к записи"""
+        try:
+            pending = client.flush()
+        except OSError as e:
+            self.logger.error(f"❌ Ошибка отправки клиенту {client.address}: {e}")
+            self.stats['errors'] += 1
+            self.close_client(client)
+            return
+        
+        events = selectors.EVENT_READ | (selectors.EVENT_WRITE if pending else 0)
+        if self.selector.get_key(client.socket).events != events:
+            self.selector.modify(client.socket, events, client)
+    
+    def close_client(self, client: ClientConnection):
+        """Удаляем клиента"""
+        with client.lock:
+            if client.closed:
+                return
+            client.closed = True
+        
+        self.clients = [c for c in self.clients if c is not client]
+        self.stats['messages_dropped'] += client.dropped
+        try:
+            self.selector.unregister(client.socket)
+        except (KeyError, ValueError):
+            pass
+        client.socket.close()
+        self.logger.info(f"📱 Mission Planner отключен: {client.address}")
+    
+    def read_autopilot(self) -> bytes:
+        """Прочитать доступные байты от автопилота; ждёт данных до READ_TIMEOUT без опроса в цикле"""
+        fd = self.master.fd
+        if fd is None:
+            # No selectable descriptor (e.g. serial on Windows): poll through pymavlink
+            data = self.master.recv(READ_CHUNK)
+            if not data:
+                time.sleep(0.001)
+            return data
+        
+        readable, _, _ = select.select([fd], [], [], READ_TIMEOUT)
+        if not readable:
+            return b''
+        return self.master.recv(READ_CHUNK)
     
     def autopilot_reader(self):
         """Чтение данных от автопилота и отправка клиентам"""
         self.logger.info("📡 Запуск чтения данных от автопилота...")
+        splitter = MAVLinkFrameSplitter()
         
         while self.running:
             try:
-                # Получаем сообщение от автопилота
-                msg = self.master.recv_match(blocking=False, timeout=0.1)
-                if msg:
-                    self.stats['messages_from_autopilot'] += 1
-                    
-                    # Подсчет типов сообщений
-                    msg_type = msg.get_type()
-                    if msg_type == 'HEARTBEAT':
-                        self.stats['heartbeats'] += 1
-                    elif 'PARAM' in msg_type:
-                        self.stats['params'] += 1
-                        self.logger.debug(f"📊 Параметр: {msg_type}")
-                    
-                    # Отправляем всем подключенным клиентам
-                    msg_buf = msg.get_msgbuf()
-                    for client in self.clients[:]:  # Копия списка для безопасности
-                        try:
-                            client.send(msg_buf)
-                            self.stats['messages_to_clients'] += 1
-                        except Exception as e:
-                            self.logger.error(f"❌ Ошибка отправки клиенту: {e}")
-                            self.clients.remove(client)
-                            self.stats['errors'] += 1
-                
-                time.sleep(0.001)  # Минимальная задержка
+                data = self.read_autopilot()
+                if not data:
+                    continue
                 
+                self.stats['bytes_from_autopilot'] += len(data)
+                frames = splitter.feed(data)
+                if frames:
+                    self.dispatch(frames)
+            
             except Exception as e:
                 self.logger.error(f"❌ Ошибка чтения от автопилота: {e}")
                 self.stats['errors'] += 1
                 time.sleep(0.1)
     
+    def dispatch(self, frames: List[bytes]):
+        """Подсчёт типов по заголовку, декодирование подписанных типов, рассылка клиентам"""
+        self.stats['messages_from_autopilot'] += len(frames)
+        subscriptions = self.subscriptions
+        
+        if self.recorder is not None:
+            self.record(frames)
+        
+        for frame in frames:
+            message_id = frame_message_id(frame)
+            if message_id == HEARTBEAT_ID:
+                self.stats['heartbeats'] += 1
+            elif message_id in PARAM_MESSAGE_IDS:
+                self.stats['params'] += 1
+            
+            callbacks = subscriptions.get(message_id)
+            if callbacks:
+                self.deliver(frame, callbacks)
+        
+        # One shared chunk for all clients
+        data = frames[0] if len(frames) == 1 else b''.join(frames)
+        for client in self.clients:
+            self.stats['messages_to_clients'] += client.enqueue(data, frames)
+    
+    def record(self, frames: List[bytes]):
+        """Запись кадров в .tlog; запись целиком под блокировкой, после закрытия игнорируется"""
+        timestamp = TLOG_TIMESTAMP.pack(int(time.time() * 1_000_000))
+        data = b''.join(timestamp + frame for frame in frames)
+        with self.recorder_lock:
+            if self.recorder is not None:
+                self.recorder.write(data)
+    
+    def open_recorder(self):
+        with self.recorder_lock:
+            self.recorder = open(self.record_path, 'ab', buffering=65536)
+        self.logger.info(f"📼 Запись MAVLink в {self.record_path}")
+    
+    def close_recorder(self):
+        with self.recorder_lock:
+            recorder, self.recorder = self.recorder, None
+            if recorder is not None:
+                recorder.close()
+    
+    def deliver(self, frame: bytes, callbacks: List[Callable]):
+        """Полное декодирование pymavlink только для подписанных типов"""
+        try:
+            msg = self.decoder.decode(bytearray(frame))
+        except Exception as e:
+            self.logger.debug(f"⚠️ Кадр не декодирован: {e}")
+            self.stats['errors'] += 1
+            return
+        
+        self.stats['messages_decoded'] += 1
+        for callback in callbacks:
+            try:
+                callback(msg)
+            except Exception as e:
+                self.logger.error(f"❌ Ошибка обработчика {msg.get_type()}: {e}")
+                self.stats['errors'] += 1
+    
     def print_stats(self):
         """Вывод статистики"""
         while self.running:
@@ -173,12 +724,34 @@ class TCPMAVLinkBridge:
             self.logger.info("📊 === СТАТИСТИКА TCP MAVLINK BRIDGE ===")
             self.logger.info(f"📡 Сообщений от автопилота: {self.stats['messages_from_autopilot']}")
             self.logger.info(f"📱 Сообщений клиентам: {self.stats['messages_to_clients']}")
+            self.logger.info(f"🗑️ Отброшено для медленных клиентов: "
+                             f"{self.stats['messages_dropped'] + sum(c.dropped for c in self.clients)}")
             self.logger.info(f"💓 Heartbeat сообщений: {self.stats['heartbeats']}")
             self.logger.info(f"📋 Параметров: {self.stats['params']}")
             self.logger.info(f"👥 Подключенных клиентов: {len(self.clients)}")
+            command_latency = self.serial_writer.latency['command']
+            self.logger.info(f"⏱️ Команды → автопилот: {command_latency.count}, "
+                             f"p50 {command_latency.percentile(50)} мс, p99 {command_latency.percentile(99)} мс")
             self.logger.info(f"❌ Ошибок: {self.stats['errors']}")
             self.logger.info("=" * 45)
     
+    def start(self):
+        """Запуск TCP сервера и потоков (автопилот уже подключен)"""
+        if not self.start_tcp_server():
+            return False
+        
+        if self.record_path:
+            self.open_recorder()
+        
+        autopilot_thread = threading.Thread(target=self.autopilot_reader, daemon=True)
+        writer_thread = threading.Thread(target=self.serial_writer.run, daemon=True)
+        stats_thread = threading.Thread(target=self.print_stats, daemon=True)
+        
+        autopilot_thread.start()
+        writer_thread.start()
+        stats_thread.start()
+        return True
+    
     def run(self):
         """Основной цикл работы"""
         self.logger.info("🚀 Запуск TCP MAVLink Bridge...")
@@ -187,17 +760,10 @@ class TCPMAVLinkBridge:
         if not self.connect_autopilot():
             return False
         
-        # Запуск TCP сервера
-        if not self.start_tcp_server():
+        # Запуск TCP сервера и потоков
+        if not self.start():
             return False
         
-        # Запуск потоков
-        autopilot_thread = threading.Thread(target=self.autopilot_reader, daemon=True)
-        stats_thread = threading.Thread(target=self.print_stats, daemon=True)
-        
-        autopilot_thread.start()
-        stats_thread.start()
-        
         self.logger.info("✅ TCP MAVLink Bridge запущен успешно!")
         self.logger.info("🔗 Настройте ngrok: ngrok tcp 14550")
         self.logger.info("📱 Подключите Mission Planner к ngrok URL")
@@ -206,11 +772,11 @@ class TCPMAVLinkBridge:
             # Основной цикл
             while self.running:
                 time.sleep(1)
-                
+        
         except KeyboardInterrupt:
             self.logger.info("🛑 Получен сигнал остановки...")
             self.running = False
-            
+        
         finally:
             self.cleanup()
     
@@ -219,11 +785,14 @@ class TCPMAVLinkBridge:
         self.logger.info("🧹 Очистка ресурсов...")
         
         self.running = False
+        self.serial_writer.stop()
+        
+        self.close_recorder()
         
         # Закрываем соединения с клиентами
         for client in self.clients:
             try:
-                client.close()
+                self.close_client(client)
             except:
                 pass
         
@@ -233,9 +802,36 @@ class TCPMAVLinkBridge:
         except:
             pass
         
+        try:
+            self.selector.close()
+            self._wakeup_reader.close()
+            self._wakeup_writer.close()
+        except:
+            pass
+        
         self.logger.info("✅ TCP MAVLink Bridge остановлен")
 
 if __name__ == "__main__":
-    bridge = TCPMAVLinkBridge()
+    parser = argparse.ArgumentParser(description='TCP MAVLink Bridge')
+    parser.add_argument('--device', default='/dev/ttyACM0')
+    parser.add_argument('--baud', type=int, default=921600)
+    parser.add_argument('--tcp-port', type=int, default=14550)
+    parser.add_argument('--no-low-latency', action='store_true', help='Keep the driver default latency')
+    parser.add_argument('--vmin', type=int, help='termios VMIN of the autopilot port')
+    parser.add_argument('--vtime', type=int, help='termios VTIME of the autopilot port (0.1 s units)')
+    parser.add_argument('--batch-bytes', type=int, default=SERIAL_BATCH_BYTES,
+                        help='Maximum bytes per serial write')
+    parser.add_argument('--record', metavar='TLOG', help='Record the autopilot stream to a .tlog file')
+    args = parser.parse_args()
+    
+    bridge = TCPMAVLinkBridge(
+        autopilot_port=args.device,
+        autopilot_baud=args.baud,
+        tcp_port=args.tcp_port,
+        serial_low_latency=not args.no_low_latency,
+        serial_vmin=args.vmin,
+        serial_vtime=args.vtime,
+        serial_batch_bytes=args.batch_bytes,
+        record_path=args.record
+    )
     bridge.run()
-
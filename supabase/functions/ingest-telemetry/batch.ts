@@ -0,0 +1,179 @@
+// Decoder for the columnar telemetry batch uploaded by the Jetson GCS backend
+// Mirrors jetson_soft/gcs-backend/src/utils/telemetry_codec.py (encode_batch / compress_batch)
+
+export const BATCH_CONTENT_TYPE = 'application/vnd.tiger.telemetry-batch'
+export const BATCH_ENCODINGS = ['deflate', 'identity']
+export const ENCODINGS_HEADER = 'X-Telemetry-Encodings'
+
+const SCHEMA_VERSION = 1
+const BATCH_MAGIC = 'TLMC'
+
+// Field order is part of the format and must match TELEMETRY_SCHEMA
+const TELEMETRY_SCHEMA: [string, string][] = [
+  ['battery_level', 'f'],
+  ['battery_voltage', 'f'],
+  ['battery_current', 'f'],
+  ['altitude_meters', 'f'],
+  ['speed_ms', 'f'],
+  ['location_latitude', 'd'],
+  ['location_longitude', 'd'],
+  ['heading_degrees', 'f'],
+  ['armed', '?'],
+  ['flight_mode', 's'],
+  ['gps_satellites', 'B'],
+  ['temperature_celsius', 'f'],
+  ['humidity_percent', 'f'],
+  ['vibration_level', 'f'],
+  ['signal_strength', 'f'],
+  ['timestamp', 'd'],
+]
+
+// Columns stored as zigzag LEB128 deltas of scaled integers
+const DELTA_SCALES: Record<string, number> = {
+  location_latitude: 1e7,
+  location_longitude: 1e7,
+  timestamp: 1e6,
+}
+const TIMESTAMP_SCALE = 1e6
+
+export interface TelemetryRow {
+  timestamp: number;
+  drone_id: string;
+  data: Record<string, unknown>;
+}
+
+export async function decompressBatch(body: Uint8Array, encoding: string): Promise<Uint8Array> {
+  if (encoding === 'identity') {
+    return body
+  }
+  if (encoding !== 'deflate') {
+    throw new Error(`Unsupported batch encoding: ${encoding}`)
+  }
+  // 'deflate' in the Compression Streams API is the zlib format produced by zlib.compress
+  const stream = new Blob([body]).stream().pipeThrough(new DecompressionStream('deflate'))
+  return new Uint8Array(await new Response(stream).arrayBuffer())
+}
+
+// float32 carries ~7 significant digits; drop the binary noise like the Python decoder
+function roundFloat32(value: number): number {
+  if (value === 0 || !Number.isFinite(value)) {
+    return value
+  }
+  return Number(value.toPrecision(7))
+}
+
+export function decodeBatch(payload: Uint8Array): TelemetryRow[] {
+  const view = new DataView(payload.buffer, payload.byteOffset, payload.byteLength)
+  const text = new TextDecoder()
+  let offset = 0
+
+  const magic = text.decode(payload.subarray(0, 4))
+  const version = view.getUint8(4)
+  if (magic !== BATCH_MAGIC || version !== SCHEMA_VERSION) {
+    throw new Error(`Unsupported telemetry batch (${magic}, version ${version})`)
+  }
+  const count = view.getUint32(5, true)
+  const droneCount = view.getUint16(9, true)
+  offset = 11
+
+  const readString = (): string => {
+    const length = payload[offset]
+    const value = text.decode(payload.subarray(offset + 1, offset + 1 + length))
+    offset += 1 + length
+    return value
+  }
+
+  const readUint16 = (size: number): number[] => {
+    const values = new Array<number>(size)
+    for (let i = 0; i < size; i++) {
+      values[i] = view.getUint16(offset + i * 2, true)
+    }
+    offset += size * 2
+    return values
+  }
+
+  // Scaled integers stay below 2^53, so plain number arithmetic is exact (no bitwise ops)
+  const readDeltas = (size: number, scale: number): number[] => {
+    const values = new Array<number>(size)
+    let current = 0
+    for (let i = 0; i < size; i++) {
+      let zigzag = 0
+      let multiplier = 1
+      for (;;) {
+        const byte = payload[offset++]
+        zigzag += (byte & 0x7f) * multiplier
+        if (byte < 0x80) break
+        multiplier *= 128
+      }
+      current += zigzag % 2 === 0 ? zigzag / 2 : -(zigzag + 1) / 2
+      values[i] = current / scale
+    }
+    return values
+  }
+
+  const droneIds: string[] = []
+  for (let i = 0; i < droneCount; i++) {
+    droneIds.push(readString())
+  }
+
+  const droneIndex = readUint16(count)
+  const timestamps = readDeltas(count, TIMESTAMP_SCALE)
+  const presents = readUint16(count)
+  const nullMasks = readUint16(count)
+  const datas: Record<string, unknown>[] = Array.from({ length: count }, () => ({}))
+
+  TELEMETRY_SCHEMA.forEach(([name, code], index) => {
+    const bit = 1 << index
+    const rows: number[] = []
+    for (let row = 0; row < count; row++) {
+      if (presents[row] & bit) rows.push(row)
+    }
+
+    if (name in DELTA_SCALES) {
+      readDeltas(rows.length, DELTA_SCALES[name]).forEach((value, i) => { datas[rows[i]][name] = value })
+    } else {
+      for (const row of rows) {
+        switch (code) {
+          case 's':
+            datas[row][name] = readString()
+            break
+          case 'f':
+            datas[row][name] = roundFloat32(view.getFloat32(offset, true))
+            offset += 4
+            break
+          case 'd':
+            datas[row][name] = view.getFloat64(offset, true)
+            offset += 8
+            break
+          case '?':
+            datas[row][name] = view.getUint8(offset) !== 0
+            offset += 1
+            break
+          case 'B':
+            datas[row][name] = view.getUint8(offset)
+            offset += 1
+            break
+        }
+      }
+    }
+
+    for (let row = 0; row < count; row++) {
+      if (nullMasks[row] & bit) datas[row][name] = null
+    }
+  })
+
+  for (let row = 0; row < count; row++) {
+    const length = view.getUint32(offset, true)
+    offset += 4
+    if (length) {
+      Object.assign(datas[row], JSON.parse(text.decode(payload.subarray(offset, offset + length))))
+      offset += length
+    }
+  }
+
+  return datas.map((data, row) => ({
+    timestamp: timestamps[row],
+    drone_id: droneIds[droneIndex[row]],
+    data,
+  }))
+}
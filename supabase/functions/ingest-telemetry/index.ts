@@ -1,9 +1,20 @@
 import { serve } from "https://deno.land/std@0.168.0/http/server.ts"
 import { createClient } from 'https://esm.sh/@supabase/supabase-js@2'
+import {
+  BATCH_CONTENT_TYPE,
+  BATCH_ENCODINGS,
+  ENCODINGS_HEADER,
+  TelemetryRow,
+  decodeBatch,
+  decompressBatch,
+} from './batch.ts'
 
 const corsHeaders = {
   'Access-Control-Allow-Origin': '*',
-  'Access-Control-Allow-Headers': 'authorization, x-client-info, apikey, content-type',
+  'Access-Control-Allow-Headers': 'authorization, x-client-info, apikey, content-type, content-encoding',
+  'Access-Control-Expose-Headers': ENCODINGS_HEADER,
+  // Advertise the columnar batch format to the Jetson uplink
+  [ENCODINGS_HEADER]: BATCH_ENCODINGS.join(', '),
 }
 
 interface TelemetryPayload {
@@ -21,6 +32,87 @@ interface TelemetryPayload {
   }[];
 }
 
+// Jetson GCS JSON fallback: TelemetryRecord dicts
+interface RecordsPayload {
+  records: { timestamp?: number; drone_id: string; data?: Record<string, any> }[];
+}
+
+type TelemetryInsert = Record<string, unknown> & { drone_id: string }
+
+function rowToInsert(row: TelemetryRow): TelemetryInsert {
+  const t = row.data as Record<string, any>
+  return {
+    drone_id: row.drone_id,
+    lat: t.location_latitude,
+    lon: t.location_longitude,
+    alt: t.altitude_meters,
+    vel: t.speed_ms,
+    hdg: t.heading_degrees,
+    batt_v: t.battery_voltage,
+    temp: t.temperature_celsius,
+    health: {
+      battery_level: t.battery_level,
+      battery_current: t.battery_current,
+      armed: t.armed,
+      flight_mode: t.flight_mode,
+      gps_satellites: t.gps_satellites,
+      vibration_level: t.vibration_level,
+      signal_strength: t.signal_strength,
+      humidity_percent: t.humidity_percent,
+    },
+    ts: new Date((row.timestamp || Date.now() / 1000) * 1000).toISOString()
+  }
+}
+
+function jsonResponse(body: unknown, status: number) {
+  return new Response(
+    JSON.stringify(body),
+    { status, headers: { ...corsHeaders, 'Content-Type': 'application/json' } }
+  )
+}
+
+// Columnar batch, Jetson JSON records or the original {drone_id, telemetry} payload
+async function parseTelemetry(req: Request): Promise<TelemetryInsert[] | Response> {
+  const contentType = (req.headers.get('content-type') ?? '').split(';')[0].trim()
+
+  if (contentType === BATCH_CONTENT_TYPE) {
+    const encoding = req.headers.get('content-encoding') ?? 'identity'
+    if (!BATCH_ENCODINGS.includes(encoding)) {
+      return jsonResponse({ error: `Unsupported encoding: ${encoding}` }, 415)
+    }
+    const body = new Uint8Array(await req.arrayBuffer())
+    return decodeBatch(await decompressBatch(body, encoding)).map(rowToInsert)
+  }
+
+  const payload = await req.json()
+
+  if (Array.isArray((payload as RecordsPayload).records)) {
+    return (payload as RecordsPayload).records.map(r => rowToInsert({
+      timestamp: r.timestamp ?? 0,
+      drone_id: r.drone_id,
+      data: r.data ?? r,
+    }))
+  }
+
+  const legacy = payload as TelemetryPayload
+  if (!legacy.drone_id || !legacy.telemetry) {
+    return jsonResponse({ error: 'Missing required fields: drone_id, telemetry' }, 400)
+  }
+  return legacy.telemetry.map(t => ({
+    drone_id: legacy.drone_id,
+    lat: t.lat,
+    lon: t.lon,
+    alt: t.alt,
+    vel: t.vel,
+    hdg: t.hdg,
+    batt_v: t.batt_v,
+    temp: t.temp,
+    health: t.health,
+    payload_state: t.payload_state,
+    ts: new Date().toISOString()
+  }))
+}
+
 serve(async (req) => {
   // Handle CORS preflight requests
   if (req.method === 'OPTIONS') {
@@ -34,48 +126,36 @@ serve(async (req) => {
     )
 
     // Parse request body
-    const payload: TelemetryPayload = await req.json()
-    
-    if (!payload.drone_id || !payload.telemetry) {
-      return new Response(
-        JSON.stringify({ error: 'Missing required fields: drone_id, telemetry' }),
-        { status: 400, headers: { ...corsHeaders, 'Content-Type': 'application/json' } }
-      )
+    const telemetryRecords = await parseTelemetry(req)
+    if (telemetryRecords instanceof Response) {
+      return telemetryRecords
     }
 
-    // Validate drone exists
-    const { data: drone, error: droneError } = await supabaseClient
+    // Validate drones exist; rows of unknown drones (e.g. derived <drone_id>_sys{N} ids
+    // not registered yet) are skipped and reported instead of failing the whole batch
+    const requestedIds = [...new Set(telemetryRecords.map(t => t.drone_id))]
+    const { data: drones, error: droneError } = await supabaseClient
       .from('drones_extended')
       .select('id')
-      .eq('id', payload.drone_id)
-      .single()
+      .in('id', requestedIds)
 
-    if (droneError || !drone) {
-      console.error('Drone not found:', droneError)
-      return new Response(
-        JSON.stringify({ error: 'Drone not found' }),
-        { status: 404, headers: { ...corsHeaders, 'Content-Type': 'application/json' } }
-      )
+    if (droneError || !drones) {
+      console.error('Drone lookup failed:', droneError)
+      return jsonResponse({ error: 'Drone lookup failed' }, 500)
     }
 
-    // Batch insert telemetry data
-    const telemetryRecords = payload.telemetry.map(t => ({
-      drone_id: payload.drone_id,
-      lat: t.lat,
-      lon: t.lon,
-      alt: t.alt,
-      vel: t.vel,
-      hdg: t.hdg,
-      batt_v: t.batt_v,
-      temp: t.temp,
-      health: t.health,
-      payload_state: t.payload_state,
-      ts: new Date().toISOString()
-    }))
+    const knownIds = new Set(drones.map(d => d.id))
+    const droneIds = requestedIds.filter(id => knownIds.has(id))
+    const unknownDrones = requestedIds.filter(id => !knownIds.has(id))
+    const rows = telemetryRecords.filter(t => knownIds.has(t.drone_id))
+    const skipped = telemetryRecords.length - rows.length
+    if (unknownDrones.length) {
+      console.warn(`Skipped ${skipped} telemetry records for unknown drones ${unknownDrones.join(', ')}`)
+    }
 
-    const { error: insertError } = await supabaseClient
-      .from('telemetry')
-      .insert(telemetryRecords)
+    const { error: insertError } = rows.length
+      ? await supabaseClient.from('telemetry').insert(rows)
+      : { error: null }
 
     if (insertError) {
       console.error('Failed to insert telemetry:', insertError)
@@ -86,20 +166,24 @@ serve(async (req) => {
     }
 
     // Update drone heartbeat
-    await supabaseClient
-      .from('drones_extended')
-      .update({ 
-        last_heartbeat_at: new Date().toISOString(),
-        status: 'online'
-      })
-      .eq('id', payload.drone_id)
+    if (droneIds.length) {
+      await supabaseClient
+        .from('drones_extended')
+        .update({ 
+          last_heartbeat_at: new Date().toISOString(),
+          status: 'online'
+        })
+        .in('id', droneIds)
+    }
 
-    console.log(`Processed ${telemetryRecords.length} telemetry records for drone ${payload.drone_id}`)
+    console.log(`Processed ${rows.length} telemetry records for drones ${droneIds.join(', ')}`)
 
     return new Response(
       JSON.stringify({ 
         success: true, 
-        processed: telemetryRecords.length,
+        processed: rows.length,
+        skipped,
+        unknown_drones: unknownDrones,
         timestamp: new Date().toISOString()
       }),
       { 
@@ -14,15 +14,28 @@ Date: August 19, 2025
 
 import asyncio
 import websockets
-import socket
 import json
 import logging
-import time
+import struct
 import threading
-from typing import Dict, List, Optional, Any
-from dataclasses import dataclass, asdict
+import time
+import itertools
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Dict, List, Optional, Any, Callable, Hashable, Iterable, Sequence, Tuple, Union
+from dataclasses import dataclass, asdict, field, fields as dataclass_fields
 from datetime import datetime
-import struct
+from urllib.parse import urlparse, parse_qs
+
+try:
+    import msgpack  # Optional: pip install msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import cbor2  # Optional: pip install cbor2
+except ImportError:
+    cbor2 = None
 
 # Configure logging
 logging.basicConfig(
@@ -31,6 +44,823 @@ logging.basicConfig(
 )
 logger = logging.getLogger('WebSocketMAVLinkBridge')
 
+# ============================================================================
+# MAVLink framing, messages and command replies. This file is deployed to the
+# VPS or Jetson on its own (only websockets is required), so it carries its own
+# copies of the GCS backend's mavlink_parser / mavlink_messages / command_tracker
+# instead of importing them.
+# ============================================================================
+
+MAVLINK_STX_V1 = 0xFE
+MAVLINK_STX_V2 = 0xFD
+MAVLINK_V1_HEADER_LEN = 6
+MAVLINK_V2_HEADER_LEN = 10
+MAVLINK_CHECKSUM_LEN = 2
+MAVLINK_SIGNATURE_LEN = 13
+MAVLINK_IFLAG_SIGNED = 0x01
+MAVLINK_MAX_FRAME_LEN = MAVLINK_V2_HEADER_LEN + 255 + MAVLINK_CHECKSUM_LEN + MAVLINK_SIGNATURE_LEN
+
+# Default GCS identity (QGroundControl / MAVProxy convention)
+GCS_SYSTEM_ID = 255
+GCS_COMPONENT_ID = 190
+
+# Enum values referenced by the bridge
+MAV_TYPE_GCS = 6
+MAV_AUTOPILOT_INVALID = 8
+MAV_COMP_ID_AUTOPILOT1 = 1
+
+# CRC_EXTRA seeds per message ID (common + ardupilotmega dialects)
+CRC_EXTRA: Dict[int, int] = {
+    0: 50, 1: 124, 2: 137, 4: 237, 5: 217, 6: 104, 7: 119, 11: 89, 20: 214, 21: 159,
+    22: 220, 23: 168, 24: 24, 25: 23, 26: 170, 27: 144, 28: 67, 29: 115, 30: 39, 31: 246,
+    32: 185, 33: 104, 34: 237, 35: 244, 36: 222, 37: 212, 38: 9, 39: 254, 40: 230, 41: 28,
+    42: 28, 43: 132, 44: 221, 45: 232, 46: 11, 47: 153, 48: 41, 49: 39, 50: 78, 51: 196,
+    54: 15, 55: 3, 61: 167, 62: 183, 63: 119, 64: 191, 65: 118, 66: 148, 67: 21, 69: 243,
+    70: 124, 73: 38, 74: 20, 75: 158, 76: 152, 77: 143, 81: 106, 82: 49, 83: 22, 84: 143,
+    85: 140, 86: 5, 87: 150, 89: 231, 90: 183, 91: 63, 92: 54, 93: 47, 100: 175, 101: 102,
+    102: 158, 103: 208, 104: 56, 105: 93, 106: 138, 107: 108, 108: 32, 109: 185, 110: 84, 111: 34,
+    112: 174, 113: 124, 114: 237, 115: 4, 116: 76, 117: 128, 118: 56, 119: 116, 120: 134, 121: 237,
+    122: 203, 123: 250, 124: 87, 125: 203, 126: 220, 127: 25, 128: 226, 129: 46, 130: 29, 131: 223,
+    132: 85, 133: 6, 134: 229, 135: 203, 136: 1, 137: 195, 138: 109, 139: 168, 140: 181, 141: 47,
+    142: 72, 143: 131, 144: 127, 146: 103, 147: 154, 148: 178, 149: 200, 150: 134, 151: 219, 152: 208,
+    153: 188, 154: 84, 155: 22, 156: 19, 157: 21, 158: 134, 160: 78, 161: 68, 162: 189, 163: 127,
+    164: 154, 165: 21, 166: 21, 167: 144, 168: 1, 169: 234, 170: 73, 171: 181, 172: 22, 173: 83,
+    174: 167, 175: 138, 176: 234, 177: 240, 178: 47, 179: 189, 180: 52, 181: 174, 182: 229, 183: 85,
+    184: 159, 185: 186, 186: 72, 191: 92, 192: 36, 193: 71, 194: 98, 195: 120, 200: 134, 201: 205,
+    214: 69, 215: 101, 216: 50, 217: 202, 218: 17, 219: 162, 225: 208, 226: 207, 230: 163, 231: 105,
+    232: 151, 233: 35, 234: 150, 235: 179, 241: 90, 242: 104, 243: 85, 244: 95, 245: 130, 246: 184,
+    247: 81, 248: 8, 249: 204, 250: 49, 251: 170, 252: 44, 253: 83, 254: 46, 256: 71, 257: 131,
+    258: 187, 259: 92, 260: 146, 261: 179, 262: 12, 263: 133, 264: 49, 265: 26, 266: 193, 267: 35,
+    268: 14, 269: 109, 270: 59, 271: 22, 275: 126, 276: 18, 277: 62, 280: 70, 281: 48, 282: 123,
+    283: 74, 284: 99, 285: 137, 286: 210, 287: 1, 288: 20, 295: 234, 296: 158, 299: 19, 301: 243,
+    310: 28, 311: 95, 320: 243, 321: 88, 322: 243, 323: 78, 324: 132, 330: 23, 331: 91, 332: 236,
+    333: 231, 335: 225, 339: 199, 340: 99, 345: 209, 350: 232, 360: 11, 370: 75, 373: 117, 375: 251,
+    376: 199, 385: 147, 386: 132, 387: 4, 388: 8, 390: 156, 9000: 113, 9005: 117, 10001: 209, 10002: 186,
+    10003: 4, 10004: 133, 10005: 103, 10006: 193, 10007: 71, 10008: 240, 10151: 195, 11000: 134, 11001: 15, 11002: 234,
+    11003: 64, 11004: 11, 11005: 93, 11010: 46, 11011: 106, 11020: 205, 11030: 144, 11031: 133, 11032: 85, 11033: 195,
+    11034: 79, 11035: 128, 11036: 177, 11037: 130, 11038: 47, 11039: 142, 11040: 132, 11041: 208, 11042: 201, 11043: 193,
+    11044: 189, 11060: 162, 12900: 114, 12901: 254, 12902: 140, 12903: 249, 12904: 77, 12905: 49, 12915: 94, 12918: 139,
+    12919: 7, 12920: 20, 42000: 227, 42001: 239, 50001: 246, 50002: 181, 50003: 62, 50004: 240, 50005: 152, 52000: 13,
+    52001: 239
+}
+
+def _build_crc_table():
+    """Build lookup table for CRC-16/MCRF4XX (MAVLink X.25 checksum)"""
+    table = []
+    for byte in range(256):
+        tmp = byte
+        for _ in range(8):
+            tmp = (tmp >> 1) ^ 0x8408 if tmp & 1 else tmp >> 1
+        table.append(tmp)
+    return tuple(table)
+
+_CRC_TABLE = _build_crc_table()
+
+def crc_x25(data: Union[bytes, bytearray, memoryview], crc: int = 0xFFFF) -> int:
+    """Calculate MAVLink CRC-X25 checksum over data"""
+    table = _CRC_TABLE
+    for byte in data:
+        crc = (crc >> 8) ^ table[(crc ^ byte) & 0xFF]
+    return crc
+
+def crc_accumulate(byte: int, crc: int) -> int:
+    """Accumulate single byte into CRC-X25 checksum (used for CRC_EXTRA)"""
+    return (crc >> 8) ^ _CRC_TABLE[(crc ^ byte) & 0xFF]
+
+class MAVLinkFrame:
+    """Decoded MAVLink frame; payload and raw are memoryview slices into the decoder buffer"""
+
+    __slots__ = ('version', 'payload_length', 'sequence', 'system_id', 'component_id',
+                 'message_id', 'payload', 'raw')
+
+    def __init__(self, version: int, payload_length: int, sequence: int, system_id: int,
+                 component_id: int, message_id: int, payload: memoryview, raw: memoryview):
+        self.version = version
+        self.payload_length = payload_length
+        self.sequence = sequence
+        self.system_id = system_id
+        self.component_id = component_id
+        self.message_id = message_id
+        self.payload = payload
+        self.raw = raw
+
+class MAVLinkFrameDecoder:
+    """
+    Incremental MAVLink v1/v2 stream decoder with CRC-X25 validation
+
+    Consumed bytes are skipped, never shifted; when the buffer tail is full the
+    unconsumed bytes move to a fresh buffer, so frames handed out earlier stay
+    valid. Frames with unknown message IDs are passed through unchecked.
+    """
+
+    def __init__(self, buffer_size: int = 65536):
+        self.buffer_size = max(buffer_size, MAVLINK_MAX_FRAME_LEN * 2)
+        self._buffer = bytearray(self.buffer_size)
+        self._view = memoryview(self._buffer)
+        self._start = 0
+        self._end = 0
+        self.bytes_discarded = 0
+        self.crc_errors = 0
+
+    def feed(self, data: Union[bytes, bytearray, memoryview]):
+        """Append received bytes to the decode buffer"""
+        size = len(data)
+        if not size:
+            return
+        if self._end + size > len(self._buffer):
+            pending = self._end - self._start
+            buffer = bytearray(max(self.buffer_size, pending + size))
+            view = memoryview(buffer)
+            view[:pending] = self._view[self._start:self._end]
+            self._buffer = buffer
+            self._view = view
+            self._start = 0
+            self._end = pending
+        self._view[self._end:self._end + size] = data
+        self._end += size
+
+    def _resync(self, start: int) -> int:
+        """Skip to next candidate magic byte after start"""
+        candidates = [position for position in (
+            self._buffer.find(b'\xfd', start + 1, self._end),
+            self._buffer.find(b'\xfe', start + 1, self._end)
+        ) if position >= 0]
+        position = min(candidates) if candidates else self._end
+        self.bytes_discarded += position - start
+        return position
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> MAVLinkFrame:
+        buffer = self._buffer
+        view = self._view
+
+        while True:
+            start = self._start
+            available = self._end - start
+            if available <= 0:
+                raise StopIteration
+
+            stx = buffer[start]
+            if stx == MAVLINK_STX_V2:
+                if available < MAVLINK_V2_HEADER_LEN:
+                    raise StopIteration
+                header_len = MAVLINK_V2_HEADER_LEN
+                incompat_flags = buffer[start + 2]
+                if incompat_flags & ~MAVLINK_IFLAG_SIGNED:
+                    self._start = self._resync(start)
+                    continue
+                signature_len = MAVLINK_SIGNATURE_LEN if incompat_flags & MAVLINK_IFLAG_SIGNED else 0
+                sequence, system_id, component_id = buffer[start + 4], buffer[start + 5], buffer[start + 6]
+                message_id = buffer[start + 7] | (buffer[start + 8] << 8) | (buffer[start + 9] << 16)
+            elif stx == MAVLINK_STX_V1:
+                if available < MAVLINK_V1_HEADER_LEN:
+                    raise StopIteration
+                header_len = MAVLINK_V1_HEADER_LEN
+                signature_len = 0
+                sequence, system_id, component_id = buffer[start + 2], buffer[start + 3], buffer[start + 4]
+                message_id = buffer[start + 5]
+            else:
+                self._start = self._resync(start)
+                continue
+
+            payload_len = buffer[start + 1]
+            crc_offset = start + header_len + payload_len
+            frame_len = header_len + payload_len + MAVLINK_CHECKSUM_LEN + signature_len
+            if available < frame_len:
+                raise StopIteration
+
+            extra = CRC_EXTRA.get(message_id)
+            if extra is not None:
+                crc = crc_accumulate(extra, crc_x25(view[start + 1:crc_offset]))
+                if crc != (buffer[crc_offset] | (buffer[crc_offset + 1] << 8)):
+                    self.crc_errors += 1
+                    self._start = self._resync(start)
+                    continue
+
+            self._start = start + frame_len
+            return MAVLinkFrame(2 if stx == MAVLINK_STX_V2 else 1, payload_len, sequence,
+                                system_id, component_id, message_id,
+                                view[start + header_len:crc_offset], view[start:start + frame_len])
+
+class MAVLinkRecord:
+    """Decoded message payload; named fields are resolved from the unpacked tuple on access"""
+
+    __slots__ = ('_values',)
+
+    message_id: int = -1
+    name: str = ''
+    fieldnames: Tuple[str, ...] = ()
+
+    def __init__(self, values: tuple):
+        self._values = values
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.fieldnames}
+
+def _record_field(index: int, is_string: bool) -> property:
+    if is_string:
+        return property(lambda self: self._values[index].split(b'\x00', 1)[0].decode('ascii', 'replace'))
+    return property(lambda self: self._values[index])
+
+class MessageDefinition:
+    """Wire layout of one message ID (scalar and char[N] fields only)"""
+
+    def __init__(self, message_id: int, name: str, fields: List[Tuple[str, str]]):
+        self.message_id = message_id
+        self.name = name
+        self.layout = tuple(fields)
+        self.fieldnames = tuple(field_name for field_name, _ in fields)
+        self.struct = struct.Struct('<' + ''.join(field_type for _, field_type in fields))
+        attributes: Dict[str, Any] = {'__slots__': (), 'message_id': message_id, 'name': name,
+                                      'fieldnames': self.fieldnames}
+        for index, (field_name, field_type) in enumerate(fields):
+            attributes[field_name] = _record_field(index, field_type.endswith('s'))
+        self.record_type = type(f"{name.title().replace('_', '')}Record", (MAVLinkRecord,), attributes)
+
+    def decode(self, payload: Union[bytes, bytearray, memoryview]) -> MAVLinkRecord:
+        """Decode payload (v2 truncated payloads are zero-extended)"""
+        if len(payload) < self.struct.size:
+            padded = bytearray(self.struct.size)
+            padded[:len(payload)] = payload
+            payload = padded
+        return self.record_type(self.struct.unpack_from(payload))
+
+    def encode(self, values: Optional[Dict[str, Any]] = None, **fields) -> bytes:
+        """Pack full-length payload from field values (missing fields are zero)"""
+        if values:
+            fields = {**values, **fields}
+        unknown = set(fields).difference(self.fieldnames)
+        if unknown:
+            raise ValueError(f"{self.name} has no field(s): {', '.join(sorted(unknown))}")
+
+        args = []
+        for field_name, field_type in self.layout:
+            value = fields.get(field_name)
+            if field_type.endswith('s'):
+                args.append(value.encode('ascii') if isinstance(value, str) else bytes(value or b''))
+            else:
+                args.append(float(value or 0) if field_type in 'fd' else int(value or 0))
+        return self.struct.pack(*args)
+
+# Messages the bridge decodes or sends (wire order: sorted by type size)
+MESSAGE_DEFINITIONS: Dict[int, MessageDefinition] = {}
+MESSAGE_NAMES: Dict[str, MessageDefinition] = {}
+
+def register_message(message_id: int, name: str, fields: List[Tuple[str, str]]) -> MessageDefinition:
+    definition = MessageDefinition(message_id, name, fields)
+    MESSAGE_DEFINITIONS[message_id] = definition
+    MESSAGE_NAMES[name] = definition
+    return definition
+
+def get_message_definition(message: Union[int, str]) -> Optional[MessageDefinition]:
+    """Definition for message ID or name"""
+    if isinstance(message, str):
+        return MESSAGE_NAMES.get(message.upper())
+    return MESSAGE_DEFINITIONS.get(message)
+
+HEARTBEAT = register_message(0, 'HEARTBEAT', [
+    ('custom_mode', 'I'), ('type', 'B'), ('autopilot', 'B'), ('base_mode', 'B'),
+    ('system_status', 'B'), ('mavlink_version', 'B')
+])
+register_message(11, 'SET_MODE', [
+    ('custom_mode', 'I'), ('target_system', 'B'), ('base_mode', 'B')
+])
+register_message(20, 'PARAM_REQUEST_READ', [
+    ('param_index', 'h'), ('target_system', 'B'), ('target_component', 'B'), ('param_id', '16s')
+])
+register_message(21, 'PARAM_REQUEST_LIST', [
+    ('target_system', 'B'), ('target_component', 'B')
+])
+register_message(22, 'PARAM_VALUE', [
+    ('param_value', 'f'), ('param_count', 'H'), ('param_index', 'H'),
+    ('param_id', '16s'), ('param_type', 'B')
+])
+register_message(23, 'PARAM_SET', [
+    ('param_value', 'f'), ('target_system', 'B'), ('target_component', 'B'),
+    ('param_id', '16s'), ('param_type', 'B')
+])
+register_message(40, 'MISSION_REQUEST', [
+    ('seq', 'H'), ('target_system', 'B'), ('target_component', 'B'), ('mission_type', 'B')
+])
+register_message(41, 'MISSION_SET_CURRENT', [
+    ('seq', 'H'), ('target_system', 'B'), ('target_component', 'B')
+])
+register_message(42, 'MISSION_CURRENT', [
+    ('seq', 'H'), ('total', 'H'), ('mission_state', 'B'), ('mission_mode', 'B')
+])
+register_message(43, 'MISSION_REQUEST_LIST', [
+    ('target_system', 'B'), ('target_component', 'B'), ('mission_type', 'B')
+])
+register_message(44, 'MISSION_COUNT', [
+    ('count', 'H'), ('target_system', 'B'), ('target_component', 'B'), ('mission_type', 'B'),
+    ('opaque_id', 'I')
+])
+register_message(45, 'MISSION_CLEAR_ALL', [
+    ('target_system', 'B'), ('target_component', 'B'), ('mission_type', 'B')
+])
+register_message(47, 'MISSION_ACK', [
+    ('target_system', 'B'), ('target_component', 'B'), ('type', 'B'), ('mission_type', 'B'),
+    ('opaque_id', 'I')
+])
+register_message(51, 'MISSION_REQUEST_INT', [
+    ('seq', 'H'), ('target_system', 'B'), ('target_component', 'B'), ('mission_type', 'B')
+])
+register_message(73, 'MISSION_ITEM_INT', [
+    ('param1', 'f'), ('param2', 'f'), ('param3', 'f'), ('param4', 'f'), ('x', 'i'), ('y', 'i'),
+    ('z', 'f'), ('seq', 'H'), ('command', 'H'), ('target_system', 'B'), ('target_component', 'B'),
+    ('frame', 'B'), ('current', 'B'), ('autocontinue', 'B'), ('mission_type', 'B')
+])
+register_message(75, 'COMMAND_INT', [
+    ('param1', 'f'), ('param2', 'f'), ('param3', 'f'), ('param4', 'f'), ('x', 'i'), ('y', 'i'),
+    ('z', 'f'), ('command', 'H'), ('target_system', 'B'), ('target_component', 'B'),
+    ('frame', 'B'), ('current', 'B'), ('autocontinue', 'B')
+])
+COMMAND_LONG = register_message(76, 'COMMAND_LONG', [
+    ('param1', 'f'), ('param2', 'f'), ('param3', 'f'), ('param4', 'f'), ('param5', 'f'),
+    ('param6', 'f'), ('param7', 'f'), ('command', 'H'), ('target_system', 'B'),
+    ('target_component', 'B'), ('confirmation', 'B')
+])
+register_message(77, 'COMMAND_ACK', [
+    ('command', 'H'), ('result', 'B'), ('progress', 'B'), ('result_param2', 'i'),
+    ('target_system', 'B'), ('target_component', 'B')
+])
+
+class MAVLinkFrameEncoder:
+    """MAVLink v2 frames from one (system, component) with its own sequence counter"""
+
+    def __init__(self, system_id: int = GCS_SYSTEM_ID, component_id: int = GCS_COMPONENT_ID):
+        self.system_id = system_id
+        self.component_id = component_id
+        self.sequence = 0
+
+    def encode_message(self, definition: MessageDefinition, values: Dict[str, Any]) -> bytes:
+        """Pack and frame a message (trailing zeros truncated per MAVLink v2)"""
+        payload = definition.encode(values).rstrip(b'\x00') or b'\x00'
+        message_id = definition.message_id
+        header = bytes((
+            len(payload), 0, 0, self.sequence, self.system_id, self.component_id,
+            message_id & 0xFF, (message_id >> 8) & 0xFF, (message_id >> 16) & 0xFF
+        ))
+        crc = crc_accumulate(CRC_EXTRA[message_id], crc_x25(payload, crc_x25(header)))
+        self.sequence = (self.sequence + 1) & 0xFF
+        return bytes((MAVLINK_STX_V2,)) + header + payload + crc.to_bytes(2, 'little')
+
+# ============================================================================
+# Latency histogram and .tlog recorder
+# ============================================================================
+
+# Upper bounds of histogram buckets (ms); the last bucket is open-ended
+LATENCY_BUCKETS_MS: Tuple[float, ...] = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# Sub-millisecond resolution for the TCP -> WebSocket path
+FINE_LATENCY_BUCKETS_MS: Tuple[float, ...] = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 1000)
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram (ms)"""
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS_MS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, latency_ms: float):
+        self.counts[bisect_left(self.buckets, latency_ms)] += 1
+        self.count += 1
+        self.sum_ms += latency_ms
+        if latency_ms > self.max_ms:
+            self.max_ms = latency_ms
+
+    def percentile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th percentile (max for the open bucket)"""
+        if not self.count:
+            return 0.0
+        rank = q / 100.0 * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return float(self.buckets[index]) if index < len(self.buckets) else self.max_ms
+        return self.max_ms
+
+    def to_dict(self) -> Dict[str, Any]:
+        labels = [f"le_{bound}" for bound in self.buckets] + [f"gt_{self.buckets[-1]}"]
+        return {
+            'count': self.count,
+            'mean_ms': self.sum_ms / self.count if self.count else 0.0,
+            'max_ms': self.max_ms,
+            'p50_ms': self.percentile(50),
+            'p95_ms': self.percentile(95),
+            'p99_ms': self.percentile(99),
+            'buckets': dict(zip(labels, self.counts))
+        }
+
+TLOG_TIMESTAMP = struct.Struct('>Q')
+
+class TlogWriter:
+    """
+    Buffered .tlog appender (8-byte big-endian microsecond timestamp + raw frame)
+    write() after close() is ignored so the recorder can be stopped at any time.
+    """
+
+    def __init__(self, path: str, buffer_size: int = 65536):
+        self.path = path
+        self.buffer_size = buffer_size
+        self._file = open(path, 'ab')
+        self._buffer = bytearray()
+        self._lock = threading.Lock()
+
+    def write(self, frame: Union[bytes, bytearray, memoryview], timestamp: Optional[float] = None):
+        usec = int((time.time() if timestamp is None else timestamp) * 1_000_000)
+        with self._lock:
+            if self._file is None:
+                return
+            self._buffer += TLOG_TIMESTAMP.pack(usec)
+            self._buffer += frame
+            if len(self._buffer) >= self.buffer_size:
+                self._file.write(self._buffer)
+                self._buffer.clear()
+
+    def close(self):
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(self._buffer)
+            self._buffer.clear()
+            self._file.close()
+            self._file = None
+
+# ============================================================================
+# Wire encodings: JSON text by default, MessagePack / CBOR binary when a client
+# negotiates it and the library is installed
+# ============================================================================
+
+DEFAULT_ENCODING = 'json'
+
+def available_encodings() -> List[str]:
+    """Encodings this process can produce, in order of preference for binary clients"""
+    encodings = [DEFAULT_ENCODING]
+    if msgpack is not None:
+        encodings.append('msgpack')
+    if cbor2 is not None:
+        encodings.append('cbor')
+    return encodings
+
+def negotiate_encoding(requested: Union[str, Iterable[str], None]) -> str:
+    """First requested encoding that is available (list or comma-separated); JSON otherwise"""
+    if isinstance(requested, str):
+        requested = requested.split(',')
+    available = available_encodings()
+    for name in requested or ():
+        name = str(name).strip().lower()
+        if name in available:
+            return name
+    return DEFAULT_ENCODING
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return bytes(value).hex()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def encode_wire(data: Any, encoding: str = DEFAULT_ENCODING) -> Union[str, bytes]:
+    """str for JSON (text frame), bytes for binary encodings"""
+    if encoding == 'msgpack':
+        return msgpack.packb(data, use_bin_type=True)
+    if encoding == 'cbor':
+        return cbor2.dumps(data)
+    return json.dumps(data, separators=(',', ':'), default=_json_default)
+
+def decode_wire(message: Union[str, bytes], encoding: str = DEFAULT_ENCODING) -> Any:
+    """Text frames are always JSON; binary frames use the negotiated encoding"""
+    if isinstance(message, str) or encoding == DEFAULT_ENCODING:
+        return json.loads(message)
+    if encoding == 'msgpack':
+        return msgpack.unpackb(message, raw=False)
+    if encoding == 'cbor':
+        return cbor2.loads(message)
+    raise ValueError(f"Unsupported wire encoding: {encoding}")
+
+# ============================================================================
+# Outbound commands: each request is matched to the autopilot's reply
+# (COMMAND_ACK, MISSION_ACK / MISSION_REQUEST, PARAM_VALUE, ...) through a
+# table of outstanding requests and resent on timeout
+# ============================================================================
+
+MAV_RESULT_IN_PROGRESS = 5
+
+MAV_RESULT = {
+    0: 'ACCEPTED', 1: 'TEMPORARILY_REJECTED', 2: 'DENIED', 3: 'UNSUPPORTED', 4: 'FAILED',
+    5: 'IN_PROGRESS', 6: 'CANCELLED', 7: 'COMMAND_LONG_ONLY', 8: 'COMMAND_INT_ONLY',
+    9: 'COMMAND_UNSUPPORTED_MAV_FRAME'
+}
+
+MAV_MISSION_RESULT = {
+    0: 'ACCEPTED', 1: 'ERROR', 2: 'UNSUPPORTED_FRAME', 3: 'UNSUPPORTED', 4: 'NO_SPACE',
+    5: 'INVALID', 6: 'INVALID_PARAM1', 7: 'INVALID_PARAM2', 8: 'INVALID_PARAM3',
+    9: 'INVALID_PARAM4', 10: 'INVALID_PARAM5_X', 11: 'INVALID_PARAM6_Y', 12: 'INVALID_PARAM7',
+    13: 'INVALID_SEQUENCE', 14: 'DENIED', 15: 'OPERATION_CANCELLED'
+}
+
+# (reply message ID, replying system or None for any, discriminator)
+ReplyKey = Tuple[int, Optional[int], Hashable]
+
+def _param_key(value: Any) -> str:
+    if isinstance(value, (bytes, bytearray)):
+        value = bytes(value).split(b'\x00', 1)[0].decode('ascii', 'replace')
+    return value or ''
+
+def _expected_replies(message_id: int, values: Dict[str, Any]) -> List[Tuple[int, Hashable]]:
+    """Replies that complete an outbound message: [(reply message ID, discriminator)]"""
+    mission_type = int(values.get('mission_type') or 0)
+    seq = int(values.get('seq') or 0)
+
+    if message_id in (75, 76):  # COMMAND_INT / COMMAND_LONG -> COMMAND_ACK
+        return [(77, int(values.get('command') or 0))]
+    if message_id == 11:  # SET_MODE -> COMMAND_ACK carrying the message ID
+        return [(77, 11)]
+    if message_id in (20, 23):  # PARAM_REQUEST_READ / PARAM_SET -> PARAM_VALUE
+        param_id = _param_key(values.get('param_id'))
+        if param_id:
+            return [(22, param_id)]
+        return [(22, ('index', int(values.get('param_index', -1))))]
+    if message_id == 41:  # MISSION_SET_CURRENT -> MISSION_CURRENT
+        return [(42, seq)]
+    if message_id == 43:  # MISSION_REQUEST_LIST -> MISSION_COUNT
+        return [(44, mission_type)]
+    if message_id == 44:  # MISSION_COUNT -> request for item 0 (or ACK for an empty / refused upload)
+        return [(51, (mission_type, 0)), (40, (mission_type, 0)), (47, mission_type)]
+    if message_id == 45:  # MISSION_CLEAR_ALL -> MISSION_ACK
+        return [(47, mission_type)]
+    if message_id == 51:  # MISSION_REQUEST_INT -> MISSION_ITEM_INT
+        return [(73, (mission_type, seq))]
+    if message_id == 73:  # MISSION_ITEM_INT -> request for the next item, ACK after the last
+        return [(51, (mission_type, seq + 1)), (40, (mission_type, seq + 1)), (47, mission_type)]
+    return []  # PARAM_REQUEST_LIST, MISSION_ACK, ...: no single reply
+
+# Reply message ID -> discriminators of a received reply
+_REPLY_KEYS: Dict[int, Callable[[MAVLinkRecord], List[Hashable]]] = {
+    77: lambda record: [record.command],
+    22: lambda record: [record.param_id, ('index', record.param_index)],
+    42: lambda record: [record.seq],
+    44: lambda record: [record.mission_type],
+    47: lambda record: [record.mission_type],
+    40: lambda record: [(record.mission_type, record.seq)],
+    51: lambda record: [(record.mission_type, record.seq)],
+    73: lambda record: [(record.mission_type, record.seq)],
+}
+
+# Replies addressed to a GCS: ones for another GCS on the link are ignored
+_ADDRESSED_REPLIES = frozenset({40, 44, 47, 51, 73, 77})
+
+@dataclass
+class CommandResult:
+    """Outcome of one outbound request"""
+    message: str
+    status: str = 'sent'  # sent | accepted | rejected | completed | timeout | failed
+    attempts: int = 0
+    latency_ms: float = 0.0
+    result: Optional[int] = None
+    result_name: Optional[str] = None
+    reply: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+@dataclass
+class CommandStats:
+    """Command statistics"""
+    frames_sent: int = 0
+    retries: int = 0
+    accepted: int = 0
+    rejected: int = 0
+    completed: int = 0
+    timeouts: int = 0
+    failed: int = 0
+    waited: int = 0  # Requests that queued behind one expecting the same reply
+    in_flight: int = 0
+    latency: LatencyHistogram = field(default_factory=LatencyHistogram)
+
+    def to_dict(self) -> Dict[str, Any]:
+        stats = {item.name: getattr(self, item.name) for item in dataclass_fields(self) if item.name != 'latency'}
+        stats['latency'] = self.latency.to_dict()
+        return stats
+
+class _Pending:
+    __slots__ = ('message', 'keys', 'future', 'started', 'attempts', 'in_progress', 'progress')
+
+    def __init__(self, message: str, keys: List[ReplyKey], future: asyncio.Future):
+        self.message = message
+        self.keys = keys
+        self.future = future
+        self.started = time.perf_counter()
+        self.attempts = 0
+        self.in_progress = False
+        self.progress = 0
+
+class CommandTracker:
+    """
+    Outstanding request table for one MAVLink link
+
+    execute() runs on an asyncio loop and never blocks it: a request is one
+    non-blocking send plus a wait on its own future. handle_frame() is called
+    for every received frame and only decodes the few reply message types
+    while requests are outstanding.
+    """
+
+    def __init__(self,
+                 send: Callable[[bytes], bool],
+                 encoder: Optional[MAVLinkFrameEncoder] = None,
+                 timeout: float = 1.5,
+                 retries: int = 3,
+                 target: Tuple[int, int] = (1, MAV_COMP_ID_AUTOPILOT1)):
+        """
+        Args:
+            send: Writes an encoded frame to the link; False when it is down
+            encoder: Frame encoder (GCS system/component ID, sequence numbers)
+            timeout: Seconds to wait for a reply per attempt
+            retries: Resends after the first attempt times out
+            target: Default (target_system, target_component) for requests without one
+        """
+        self.send = send
+        self.encoder = encoder or MAVLinkFrameEncoder()
+        self.timeout = timeout
+        self.retries = retries
+        self.default_target = target
+        self.stats = CommandStats()
+        self._pending: Dict[ReplyKey, _Pending] = {}
+
+    def prepare(self, message: Any, values: Optional[Dict[str, Any]] = None) -> Tuple[MessageDefinition, Dict[str, Any]]:
+        """Resolve message and field values ('params' list -> param1..N, default target)"""
+        definition = get_message_definition(message)
+        if definition is None:
+            raise ValueError(f"Unknown MAVLink message: {message}")
+
+        values = dict(values or {})
+        params = values.pop('params', None)
+        if params is not None:
+            for index, value in enumerate(params, 1):
+                values[f'param{index}'] = value
+        if 'target_system' in definition.fieldnames:
+            values.setdefault('target_system', self.default_target[0])
+        if 'target_component' in definition.fieldnames:
+            values.setdefault('target_component', self.default_target[1])
+        if definition.message_id == 20 and values.get('param_id'):
+            # PARAM_REQUEST_READ: the autopilot only looks at param_id when param_index is -1
+            values.setdefault('param_index', -1)
+
+        definition.encode(values)  # Reject bad fields before anything is queued
+        return definition, values
+
+    async def execute(self, message: Any = 'COMMAND_LONG', values: Optional[Dict[str, Any]] = None,
+                      timeout: Optional[float] = None, retries: Optional[int] = None) -> CommandResult:
+        """Send a request and wait for its reply (raises ValueError for unknown messages / fields)"""
+        definition, values = self.prepare(message, values)
+        timeout = self.timeout if timeout is None else timeout
+        retries = self.retries if retries is None else retries
+        result = CommandResult(definition.name)
+
+        target = values.get('target_system') or None
+        keys = [(reply_id, target, discriminator)
+                for reply_id, discriminator in _expected_replies(definition.message_id, values)]
+
+        if not keys:
+            result.attempts = 1
+            if not self._send(definition, values):
+                return self._finish(result, 'failed', error='Link not connected')
+            return result
+
+        # One outstanding request per expected reply: later ones wait their turn
+        while True:
+            busy = [self._pending[key].future for key in keys
+                    if key in self._pending and not self._pending[key].future.done()]
+            if not busy:
+                break
+            self.stats.waited += 1
+            await asyncio.wait(busy)
+
+        pending = _Pending(definition.name, keys, asyncio.get_running_loop().create_future())
+        for key in keys:
+            self._pending[key] = pending
+        self.stats.in_flight += 1
+
+        try:
+            reply = None
+            for attempt in range(retries + 1):
+                if definition is COMMAND_LONG:
+                    values['confirmation'] = attempt  # Retransmissions are numbered
+                if attempt:
+                    self.stats.retries += 1
+                result.attempts = pending.attempts = attempt + 1
+
+                if not self._send(definition, values):
+                    return self._finish(result, 'failed', error='Link not connected')
+
+                reply = await self._wait_reply(pending, timeout)
+                if reply is not None:
+                    break
+
+            if reply is None:
+                logger.warning(f"⏱️ {definition.name} timed out after {result.attempts} attempt(s)")
+                return self._finish(result, 'timeout', pending, error=f"No reply after {result.attempts} attempt(s)")
+            return self._finish_reply(result, pending, reply)
+
+        finally:
+            for key in keys:
+                if self._pending.get(key) is pending:
+                    del self._pending[key]
+            if not pending.future.done():
+                pending.future.cancel()
+            self.stats.in_flight -= 1
+
+    def _send(self, definition: MessageDefinition, values: Dict[str, Any]) -> bool:
+        if not self.send(self.encoder.encode_message(definition, values)):
+            return False
+        self.stats.frames_sent += 1
+        return True
+
+    async def _wait_reply(self, pending: _Pending, timeout: float) -> Optional[MAVLinkRecord]:
+        """Reply record, or None on timeout; IN_PROGRESS acks extend the wait without a resend"""
+        while True:
+            pending.in_progress = False
+            try:
+                return await asyncio.wait_for(asyncio.shield(pending.future), timeout)
+            except asyncio.TimeoutError:
+                if not pending.in_progress:
+                    return None
+
+    def _finish_reply(self, result: CommandResult, pending: _Pending, record: MAVLinkRecord) -> CommandResult:
+        result.reply = {'msg_type': record.name, **record.to_dict()}
+        if record.message_id == 77:
+            result.result = record.result
+            result.result_name = MAV_RESULT.get(record.result)
+            status = 'accepted' if record.result == 0 else 'rejected'
+        elif record.message_id == 47:
+            result.result = record.type
+            result.result_name = MAV_MISSION_RESULT.get(record.type)
+            status = 'accepted' if record.type == 0 else 'rejected'
+        else:
+            status = 'completed'
+        return self._finish(result, status, pending)
+
+    def _finish(self, result: CommandResult, status: str, pending: Optional[_Pending] = None,
+                error: Optional[str] = None) -> CommandResult:
+        result.status = status
+        result.error = error
+        counter = 'timeouts' if status == 'timeout' else status
+        setattr(self.stats, counter, getattr(self.stats, counter) + 1)
+        if pending is not None:
+            result.latency_ms = (time.perf_counter() - pending.started) * 1000
+            if status != 'timeout':
+                self.stats.latency.observe(result.latency_ms)
+        return result
+
+    def handle_frame(self, frame) -> bool:
+        """Match a received frame against outstanding requests; True when it was a reply"""
+        if not self._pending:
+            return False
+        reply_keys = _REPLY_KEYS.get(frame.message_id)
+        if reply_keys is None:
+            return False
+
+        record = MESSAGE_DEFINITIONS[frame.message_id].decode(frame.payload)
+        if frame.message_id in _ADDRESSED_REPLIES and record.target_system not in (0, self.encoder.system_id):
+            return False
+
+        for discriminator in reply_keys(record):
+            for source in (frame.system_id, None):
+                pending = self._pending.get((frame.message_id, source, discriminator))
+                if pending is None or pending.future.done():
+                    continue
+                if frame.message_id == 77 and record.result == MAV_RESULT_IN_PROGRESS:
+                    pending.in_progress = True
+                    pending.progress = record.progress
+                else:
+                    pending.future.set_result(record)
+                return True
+        return False
+
+    def outstanding(self) -> List[Dict[str, Any]]:
+        """Requests waiting for a reply"""
+        now = time.perf_counter()
+        requests = {id(pending): pending for pending in self._pending.values() if not pending.future.done()}
+        return [{
+            'message': pending.message,
+            'attempts': pending.attempts,
+            'age_ms': (now - pending.started) * 1000,
+            'in_progress': pending.in_progress,
+            'progress': pending.progress,
+            'awaiting': [f"{reply_id}:{source or '*'}:{discriminator}" for reply_id, source, discriminator in pending.keys]
+        } for pending in requests.values()]
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = self.stats.to_dict()
+        stats['outstanding'] = self.outstanding()
+        return stats
+
 @dataclass
 class MAVLinkMessage:
     """MAVLink message structure"""
@@ -52,6 +882,69 @@ class ConnectionStats:
     last_heartbeat: Optional[float] = None
     uptime: float = 0
     start_time: float = 0
+    inbound_dropped: int = 0
+    messages_dropped: int = 0
+    messages_conflated: int = 0
+    slow_clients_disconnected: int = 0
+
+# Message IDs that are never conflated: each one matters (acks, text, mission/param protocol)
+UNCONFLATED_MESSAGE_IDS = frozenset({22, 39, 40, 44, 47, 51, 73, 77, 253})
+
+class ClientSession:
+    """
+    Outbound state of one WebSocket client
+
+    Messages wait in a bounded queue drained by the client's own writer task,
+    so a slow client never delays the others. Entries with the same key
+    (message type) are conflated to the latest; on overflow the oldest entry
+    is dropped.
+    """
+
+    def __init__(self, websocket, encoding: str, max_queue: int):
+        self.websocket = websocket
+        self.encoding = encoding
+        self.max_queue = max_queue
+        # key -> (encoded message, perf_counter() when its frame arrived over TCP)
+        self.queue: 'OrderedDict[Hashable, Tuple[Union[str, bytes], Optional[float]]]' = OrderedDict()
+        self.wakeup = asyncio.Event()
+        self.writer: Optional[asyncio.Task] = None
+        self.behind_since: Optional[float] = None
+        self.closing = False
+
+        # Statistics
+        self.sent = 0
+        self.dropped = 0
+        self.conflated = 0
+        self.max_depth = 0
+
+    def enqueue(self, key: Hashable, message: Union[str, bytes],
+                received_at: Optional[float] = None) -> Optional[str]:
+        """Queue message; returns 'conflated' / 'dropped' when the queue absorbed pressure"""
+        result = None
+        if key in self.queue:
+            self.conflated += 1
+            result = 'conflated'
+        elif len(self.queue) >= self.max_queue:
+            self.queue.popitem(last=False)
+            self.dropped += 1
+            result = 'dropped'
+        self.queue[key] = (message, received_at)
+        self.max_depth = max(self.max_depth, len(self.queue))
+        self.wakeup.set()
+        return result
+
+    def to_dict(self) -> Dict[str, Any]:
+        address = self.websocket.remote_address
+        return {
+            'address': f"{address[0]}:{address[1]}" if address else '',
+            'encoding': self.encoding,
+            'queue_depth': len(self.queue),
+            'max_depth': self.max_depth,
+            'sent': self.sent,
+            'dropped': self.dropped,
+            'conflated': self.conflated,
+            'behind_seconds': time.time() - self.behind_since if self.behind_since else 0.0
+        }
 
 class WebSocketMAVLinkBridge:
     """WebSocket to TCP MAVLink Bridge"""
@@ -60,7 +953,17 @@ class WebSocketMAVLinkBridge:
                  websocket_host: str = '0.0.0.0',
                  websocket_port: int = 8765,
                  tcp_host: str = '6.tcp.eu.ngrok.io',
-                 tcp_port: int = 12189):
+                 tcp_port: int = 12189,
+                 client_queue_size: int = 256,
+                 client_queue_policy: str = 'conflate',
+                 slow_client_timeout: float = 10.0,
+                 inbound_queue_size: int = 1000,
+                 reconnect_delay: float = 5.0,
+                 system_id: int = GCS_SYSTEM_ID,
+                 component_id: int = GCS_COMPONENT_ID,
+                 command_timeout: float = 1.5,
+                 command_retries: int = 3,
+                 record_path: Optional[str] = None):
         """
         Initialize WebSocket MAVLink Bridge
         
@@ -69,27 +972,57 @@ class WebSocketMAVLinkBridge:
             websocket_port: WebSocket server port
             tcp_host: TCP MAVLink bridge host (ngrok tunnel)
             tcp_port: TCP MAVLink bridge port
+            client_queue_size: Per-client send queue length
+            client_queue_policy: 'conflate' (latest per message type and source) or 'drop_oldest'
+            slow_client_timeout: Disconnect a client whose queue stays over half full this long
+            inbound_queue_size: TCP -> WebSocket queue length (oldest dropped when full)
+            reconnect_delay: Seconds between TCP reconnect attempts
+            system_id: MAVLink system ID of commands sent by the bridge
+            component_id: MAVLink component ID of commands sent by the bridge
+            command_timeout: Seconds to wait for a command reply before resending
+            command_retries: Resends before a command is reported as timed out
+            record_path: Record every frame from the TCP link to this .tlog file
         """
         self.websocket_host = websocket_host
         self.websocket_port = websocket_port
         self.tcp_host = tcp_host
         self.tcp_port = tcp_port
+        self.client_queue_size = client_queue_size
+        self.client_queue_policy = client_queue_policy
+        self.slow_client_timeout = slow_client_timeout
+        self.reconnect_delay = reconnect_delay
         
         # Connection management
-        self.websocket_clients: set = set()
-        self.tcp_socket: Optional[socket.socket] = None
+        self.clients: Dict[Any, ClientSession] = {}
+        self.tcp_writer: Optional[asyncio.StreamWriter] = None
         self.tcp_connected = False
+        self._message_keys = itertools.count()
         
         # Statistics
         self.stats = ConnectionStats(start_time=time.time())
         
+        # Latency from TCP receive: until queued for every client / until sent to a client
+        self.latency = {
+            'inbound': LatencyHistogram(FINE_LATENCY_BUCKETS_MS),
+            'end_to_end': LatencyHistogram(FINE_LATENCY_BUCKETS_MS)
+        }
+        
+        # Outbound commands: encoded here, replies matched by the tracker
+        self.encoder = MAVLinkFrameEncoder(system_id, component_id)
+        self.commands = CommandTracker(self._send_frame, self.encoder,
+                                       timeout=command_timeout, retries=command_retries)
+        self._command_tasks = set()
+        
+        # Optional .tlog capture of the TCP stream
+        self.record_path = record_path
+        self.recorder: Optional[TlogWriter] = None
+        
         # Message queues
         self.outbound_queue = asyncio.Queue()
-        self.inbound_queue = asyncio.Queue()
+        self.inbound_queue = asyncio.Queue(maxsize=inbound_queue_size)
         
         # Control flags
         self.running = False
-        self.tcp_thread: Optional[threading.Thread] = None
         
         logger.info(f"WebSocket MAVLink Bridge initialized")
         logger.info(f"WebSocket: {websocket_host}:{websocket_port}")
@@ -100,10 +1033,9 @@ class WebSocketMAVLinkBridge:
         logger.info("Starting WebSocket MAVLink Bridge...")
         self.running = True
         self.stats.start_time = time.time()
-        
-        # Start TCP connection in background thread
-        self.tcp_thread = threading.Thread(target=self._tcp_connection_handler, daemon=True)
-        self.tcp_thread.start()
+        if self.record_path and self.recorder is None:
+            self.recorder = TlogWriter(self.record_path)
+            logger.info(f"Recording MAVLink to {self.record_path}")
         
         # Start WebSocket server
         logger.info(f"Starting WebSocket server on {self.websocket_host}:{self.websocket_port}")
@@ -118,12 +1050,19 @@ class WebSocketMAVLinkBridge:
             ):
                 logger.info("WebSocket MAVLink Bridge started successfully")
                 
-                # Start background tasks
-                await asyncio.gather(
+                # Start background tasks; they wait on data, so cancel them once stopped
+                tasks = [asyncio.ensure_future(coro) for coro in (
+                    self._tcp_reader(),
                     self._message_processor(),
-                    self._stats_reporter(),
-                    self._keep_running()
-                )
+                    self._stats_reporter()
+                )]
+                try:
+                    await self._keep_running()
+                finally:
+                    tasks.extend(self._command_tasks)
+                    for task in tasks:
+                        task.cancel()
+                    await asyncio.gather(*tasks, return_exceptions=True)
         except Exception as e:
             logger.error(f"Failed to start WebSocket server: {e}")
             raise
@@ -133,169 +1072,98 @@ class WebSocketMAVLinkBridge:
         logger.info("Stopping WebSocket MAVLink Bridge...")
         self.running = False
         
+        # Abandon commands still waiting for a reply
+        for task in list(self._command_tasks):
+            task.cancel()
+        
         # Close TCP connection
-        if self.tcp_socket:
-            try:
-                self.tcp_socket.close()
-            except:
-                pass
+        if self.tcp_writer:
+            self.tcp_writer.close()
+        
+        if self.recorder is not None:
+            self.recorder.close()
+            self.recorder = None
         
         # Close all WebSocket connections
-        if self.websocket_clients:
+        if self.clients:
             await asyncio.gather(
-                *[client.close() for client in self.websocket_clients],
+                *[client.close() for client in list(self.clients)],
                 return_exceptions=True
             )
         
         logger.info("WebSocket MAVLink Bridge stopped")
 
-    def _tcp_connection_handler(self):
-        """Handle TCP connection to MAVLink bridge (runs in separate thread)"""
+    async def _tcp_reader(self):
+        """Read the TCP MAVLink bridge stream; reconnects until stopped"""
         while self.running:
             try:
-                if not self.tcp_connected:
-                    self._connect_tcp()
-                
-                if self.tcp_connected:
-                    self._tcp_receive_loop()
-                    
-            except Exception as e:
-                logger.error(f"TCP connection error: {e}")
-                self.tcp_connected = False
-                if self.tcp_socket:
-                    try:
-                        self.tcp_socket.close()
-                    except:
-                        pass
-                    self.tcp_socket = None
+                logger.info(f"Connecting to TCP MAVLink bridge at {self.tcp_host}:{self.tcp_port}")
+                reader, self.tcp_writer = await asyncio.wait_for(
+                    asyncio.open_connection(self.tcp_host, self.tcp_port), timeout=10)
                 
-                # Wait before reconnecting
-                time.sleep(5)
-
-    def _connect_tcp(self):
-        """Connect to TCP MAVLink bridge"""
-        try:
-            logger.info(f"Connecting to TCP MAVLink bridge at {self.tcp_host}:{self.tcp_port}")
-            
-            self.tcp_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.tcp_socket.settimeout(10)
-            self.tcp_socket.connect((self.tcp_host, self.tcp_port))
-            self.tcp_socket.settimeout(None)  # Remove timeout for data operations
-            
-            self.tcp_connected = True
-            self.stats.tcp_connected = True
-            
-            logger.info("Successfully connected to TCP MAVLink bridge")
-            
-        except Exception as e:
-            logger.error(f"Failed to connect to TCP MAVLink bridge: {e}")
-            self.tcp_connected = False
-            self.stats.tcp_connected = False
-            if self.tcp_socket:
-                try:
-                    self.tcp_socket.close()
-                except:
-                    pass
-                self.tcp_socket = None
-
-    def _tcp_receive_loop(self):
-        """Receive data from TCP MAVLink bridge"""
-        buffer = b''
-        
-        while self.running and self.tcp_connected:
-            try:
-                # Receive data
-                data = self.tcp_socket.recv(4096)
-                if not data:
-                    logger.warning("TCP connection closed by remote")
-                    break
+                self.tcp_connected = True
+                self.stats.tcp_connected = True
+                logger.info("Successfully connected to TCP MAVLink bridge")
                 
-                buffer += data
+                await self._tcp_receive_loop(reader)
                 
-                # Process complete MAVLink messages
-                while len(buffer) >= 8:  # Minimum MAVLink message size
-                    # Simple MAVLink message detection (starts with 0xFE or 0xFD)
-                    if buffer[0] in [0xFE, 0xFD]:
-                        # MAVLink v1 (0xFE) or v2 (0xFD)
-                        if buffer[0] == 0xFE and len(buffer) >= 8:
-                            # MAVLink v1: header(6) + payload + checksum(2)
-                            payload_len = buffer[1]
-                            msg_len = 6 + payload_len + 2
-                            
-                            if len(buffer) >= msg_len:
-                                msg_bytes = buffer[:msg_len]
-                                buffer = buffer[msg_len:]
-                                self._process_mavlink_message(msg_bytes)
-                            else:
-                                break
-                                
-                        elif buffer[0] == 0xFD and len(buffer) >= 10:
-                            # MAVLink v2: header(10) + payload + checksum(2) + signature(13, optional)
-                            payload_len = buffer[1]
-                            incompat_flags = buffer[2]
-                            
-                            # Check if signature is present
-                            signature_len = 13 if (incompat_flags & 0x01) else 0
-                            msg_len = 10 + payload_len + 2 + signature_len
-                            
-                            if len(buffer) >= msg_len:
-                                msg_bytes = buffer[:msg_len]
-                                buffer = buffer[msg_len:]
-                                self._process_mavlink_message(msg_bytes)
-                            else:
-                                break
-                        else:
-                            break
-                    else:
-                        # Invalid start byte, skip
-                        buffer = buffer[1:]
-                        
-            except socket.timeout:
-                continue
+            except asyncio.CancelledError:
+                raise
+            except (OSError, asyncio.TimeoutError) as e:
+                logger.error(f"TCP connection error: {e}")
             except Exception as e:
                 logger.error(f"TCP receive error: {e}")
-                break
+            finally:
+                self.tcp_connected = False
+                self.stats.tcp_connected = False
+                if self.tcp_writer:
+                    self.tcp_writer.close()
+                    self.tcp_writer = None
+            
+            # Wait before reconnecting
+            if self.running:
+                await asyncio.sleep(self.reconnect_delay)
+
+    async def _tcp_receive_loop(self, reader: asyncio.StreamReader):
+        """Decode frames as soon as bytes arrive"""
+        decoder = MAVLinkFrameDecoder()
         
-        self.tcp_connected = False
-        self.stats.tcp_connected = False
+        while self.running:
+            data = await reader.read(65536)
+            if not data:
+                logger.warning("TCP connection closed by remote")
+                return
+            
+            received_at = time.perf_counter()
+            decoder.feed(data)
+            recorder = self.recorder
+            wall_time = time.time()
+            
+            # Process complete MAVLink frames (v1/v2, signed or not)
+            for frame in decoder:
+                if recorder is not None:
+                    recorder.write(frame.raw, wall_time)
+                self._process_mavlink_message(frame, received_at)
 
-    def _process_mavlink_message(self, msg_bytes: bytes):
+    def _process_mavlink_message(self, frame: MAVLinkFrame, received_at: Optional[float] = None):
         """Process received MAVLink message"""
         try:
-            # Basic MAVLink parsing
-            if msg_bytes[0] == 0xFE:  # MAVLink v1
-                payload_len = msg_bytes[1]
-                seq = msg_bytes[2]
-                system_id = msg_bytes[3]
-                component_id = msg_bytes[4]
-                msg_id = msg_bytes[5]
-                payload = msg_bytes[6:6+payload_len]
-                
-            elif msg_bytes[0] == 0xFD:  # MAVLink v2
-                payload_len = msg_bytes[1]
-                incompat_flags = msg_bytes[2]
-                compat_flags = msg_bytes[3]
-                seq = msg_bytes[4]
-                system_id = msg_bytes[5]
-                component_id = msg_bytes[6]
-                msg_id = struct.unpack('<I', msg_bytes[7:10] + b'\x00')[0]  # 24-bit message ID
-                payload = msg_bytes[10:10+payload_len]
-            else:
-                return
+            msg_id = frame.message_id
+            payload = frame.payload
             
             # Create MAVLink message object
             mavlink_msg = MAVLinkMessage(
                 msg_type=f"MSG_{msg_id}",
-                system_id=system_id,
-                component_id=component_id,
+                system_id=frame.system_id,
+                component_id=frame.component_id,
                 timestamp=time.time(),
                 data={
                     'msg_id': msg_id,
-                    'seq': seq,
-                    'payload_length': payload_len,
-                    'payload': payload.hex() if payload else ''
+                    'seq': frame.sequence,
+                    'payload_length': frame.payload_length,
+                    'payload': bytes(payload)  # hex string for JSON clients
                 },
-                raw_bytes=msg_bytes
+                raw_bytes=bytes(frame.raw)
             )
             
             # Update statistics
@@ -306,39 +1174,56 @@ class WebSocketMAVLinkBridge:
                 self.stats.heartbeat_count += 1
                 self.stats.last_heartbeat = time.time()
                 mavlink_msg.msg_type = "HEARTBEAT"
+                
+                # Commands without an explicit target go to the autopilot we hear
+                # (companions, gimbals and other GCSs also send HEARTBEAT)
+                heartbeat = HEARTBEAT.decode(payload)
+                if heartbeat.autopilot != MAV_AUTOPILOT_INVALID and heartbeat.type != MAV_TYPE_GCS:
+                    self.commands.default_target = (frame.system_id, frame.component_id)
+            
+            # Replies to outstanding commands (cheap no-op while none are waiting)
+            self.commands.handle_frame(frame)
             
             # Queue message for WebSocket clients
-            asyncio.run_coroutine_threadsafe(
-                self.inbound_queue.put(mavlink_msg),
-                asyncio.get_event_loop()
-            )
+            self._put_inbound(mavlink_msg, received_at)
             
         except Exception as e:
             logger.error(f"Error processing MAVLink message: {e}")
 
-    async def _websocket_handler(self, websocket, path):
+    def _put_inbound(self, mavlink_msg: MAVLinkMessage, received_at: Optional[float] = None):
+        """Queue received message; drop the oldest when clients cannot keep up"""
+        if self.inbound_queue.full():
+            self.inbound_queue.get_nowait()
+            self.stats.inbound_dropped += 1
+        self.inbound_queue.put_nowait((mavlink_msg, received_at or time.perf_counter()))
+
+    async def _websocket_handler(self, websocket, path=None):
         """Handle WebSocket client connections"""
         client_addr = f"{websocket.remote_address[0]}:{websocket.remote_address[1]}"
         logger.info(f"New WebSocket client connected: {client_addr}")
         
-        self.websocket_clients.add(websocket)
-        self.stats.websocket_clients = len(self.websocket_clients)
+        session = ClientSession(websocket, self._requested_encoding(websocket, path), self.client_queue_size)
+        session.writer = asyncio.ensure_future(self._client_writer(session))
+        self.clients[websocket] = session
+        self.stats.websocket_clients = len(self.clients)
         
         try:
             # Send initial connection status
             await self._send_to_client(websocket, {
                 'type': 'connection_status',
                 'connected': self.tcp_connected,
+                'encoding': session.encoding,
+                'encodings': available_encodings(),
                 'stats': asdict(self.stats)
             })
             
-            # Handle incoming messages from client
+            # Handle incoming messages from client (text: JSON, binary: negotiated encoding)
             async for message in websocket:
                 try:
-                    data = json.loads(message)
+                    data = decode_wire(message, session.encoding)
                     await self._handle_client_message(websocket, data)
-                except json.JSONDecodeError:
-                    logger.warning(f"Invalid JSON from client {client_addr}: {message}")
+                except ValueError:
+                    logger.warning(f"Invalid message from client {client_addr}: {message!r}")
                 except Exception as e:
                     logger.error(f"Error handling client message: {e}")
                     
@@ -347,22 +1232,45 @@ class WebSocketMAVLinkBridge:
         except Exception as e:
             logger.error(f"WebSocket error for client {client_addr}: {e}")
         finally:
-            self.websocket_clients.discard(websocket)
-            self.stats.websocket_clients = len(self.websocket_clients)
+            self.clients.pop(websocket, None)
+            session.writer.cancel()
+            self.stats.websocket_clients = len(self.clients)
+
+    @staticmethod
+    def _requested_encoding(websocket, path: Optional[str]) -> str:
+        """Encoding from the connect URL (?encoding=msgpack); JSON by default"""
+        if path is None:
+            request = getattr(websocket, 'request', None)
+            path = getattr(request, 'path', None) or getattr(websocket, 'path', '') or ''
+        query = parse_qs(urlparse(path).query)
+        return negotiate_encoding(query.get('encoding', []))
 
     async def _handle_client_message(self, websocket, data: dict):
         """Handle message from WebSocket client"""
         msg_type = data.get('type')
         
         if msg_type == 'mavlink_command':
-            # Forward MAVLink command to TCP bridge
-            await self._forward_to_tcp(data.get('command', {}))
+            # Forward MAVLink command to TCP bridge; the reply comes back as command_result
+            await self._forward_to_tcp(websocket, data)
             
         elif msg_type == 'request_stats':
             # Send current statistics
             await self._send_to_client(websocket, {
                 'type': 'stats_update',
-                'stats': asdict(self.stats)
+                'stats': asdict(self.stats),
+                'clients': self.get_client_stats(),
+                'latency': self.get_latency_stats(),
+                'commands': self.commands.get_stats()
+            })
+            
+        elif msg_type == 'set_encoding':
+            # Switch encoding; the reply already uses the new one
+            encoding = negotiate_encoding(data.get('encoding'))
+            self.clients[websocket].encoding = encoding
+            await self._send_to_client(websocket, {
+                'type': 'encoding',
+                'encoding': encoding,
+                'encodings': available_encodings()
             })
             
         elif msg_type == 'ping':
@@ -372,66 +1280,186 @@ class WebSocketMAVLinkBridge:
                 'timestamp': time.time()
             })
 
-    async def _forward_to_tcp(self, command: dict):
-        """Forward command to TCP MAVLink bridge"""
+    async def _forward_to_tcp(self, websocket, request: dict):
+        """
+        Queue a client command for the TCP MAVLink bridge
+        
+        request: {'type': 'mavlink_command', 'id': <echoed>, 'timeout': s, 'retries': n,
+                  'command': {'message': 'COMMAND_LONG', 'command': 400, 'params': [1], ...}}
+        """
         if not self.tcp_connected:
             logger.warning("Cannot forward command: TCP not connected")
+            await self._send_to_client(websocket, {
+                'type': 'command_result',
+                'id': request.get('id'),
+                'status': 'failed',
+                'error': 'TCP not connected'
+            })
             return
         
+        await self.outbound_queue.put((websocket, request))
+
+    async def _execute_command(self, websocket, request: dict):
+        """Send one command and report its reply, timeout or error to the client"""
+        command = dict(request.get('command') or {})
+        message = command.pop('message', 'COMMAND_LONG')
+        
         try:
-            # Add to outbound queue for TCP sending
-            await self.outbound_queue.put(command)
-            self.stats.messages_sent += 1
-            
-        except Exception as e:
-            logger.error(f"Error forwarding command to TCP: {e}")
+            result = (await self.commands.execute(
+                message, command,
+                timeout=request.get('timeout'),
+                retries=request.get('retries')
+            )).to_dict()
+        except (ValueError, TypeError) as e:
+            result = {'message': message, 'status': 'failed', 'error': str(e)}
+        
+        await self._send_to_client(websocket, {'type': 'command_result', 'id': request.get('id'), **result})
+
+    def _send_frame(self, frame: bytes) -> bool:
+        """Write an encoded frame to the TCP link without waiting (False when down)"""
+        if self.tcp_writer is None or self.tcp_writer.is_closing():
+            return False
+        self.tcp_writer.write(frame)
+        self.stats.messages_sent += 1
+        return True
 
     async def _send_to_client(self, websocket, data: dict):
-        """Send data to specific WebSocket client"""
+        """Queue data for specific WebSocket client (never conflated)"""
+        session = self.clients.get(websocket)
+        if session is None:
+            return
+        
         try:
-            await websocket.send(json.dumps(data))
+            self._enqueue(session, next(self._message_keys), encode_wire(data, session.encoding))
         except Exception as e:
             logger.error(f"Error sending to client: {e}")
 
-    async def _broadcast_to_clients(self, data: dict):
-        """Broadcast data to all WebSocket clients"""
-        if not self.websocket_clients:
+    async def _broadcast_to_clients(self, data: dict, key: Optional[Hashable] = None,
+                                    received_at: Optional[float] = None):
+        """
+        Queue data for all WebSocket clients without waiting for any of them
+        
+        Messages with the same key replace each other while waiting in a
+        client's queue; no key means the message is never conflated.
+        received_at (perf_counter) marks MAVLink data for latency statistics.
+        """
+        if not self.clients:
             return
         
-        message = json.dumps(data)
-        await asyncio.gather(
-            *[client.send(message) for client in self.websocket_clients],
-            return_exceptions=True
-        )
+        if key is None:
+            key = next(self._message_keys)
+        
+        # Encode once per encoding in use (MessagePack/CBOR carry raw bytes, JSON hex)
+        messages = {}
+        for session in list(self.clients.values()):
+            if session.encoding not in messages:
+                messages[session.encoding] = encode_wire(data, session.encoding)
+            self._enqueue(session, key, messages[session.encoding], received_at)
+
+    def _enqueue(self, session: ClientSession, key: Hashable, message: Union[str, bytes],
+                 received_at: Optional[float] = None):
+        result = session.enqueue(key, message, received_at)
+        if result == 'dropped':
+            self.stats.messages_dropped += 1
+        elif result == 'conflated':
+            self.stats.messages_conflated += 1
+        
+        # Slow consumer: queue stays over half full past the threshold
+        if len(session.queue) * 2 >= session.max_queue:
+            now = time.time()
+            if session.behind_since is None:
+                session.behind_since = now
+            elif now - session.behind_since > self.slow_client_timeout:
+                self._disconnect_slow_client(session, 'too far behind')
+
+    async def _client_writer(self, session: ClientSession):
+        """Send one client's queue; a stuck send only delays this client"""
+        websocket = session.websocket
+        try:
+            while True:
+                await session.wakeup.wait()
+                session.wakeup.clear()
+                
+                while session.queue:
+                    _, (message, received_at) = session.queue.popitem(last=False)
+                    try:
+                        await asyncio.wait_for(websocket.send(message), self.slow_client_timeout)
+                    except asyncio.TimeoutError:
+                        self._disconnect_slow_client(session, 'send timed out')
+                        return
+                    session.sent += 1
+                    if received_at is not None:
+                        self.latency['end_to_end'].observe((time.perf_counter() - received_at) * 1000)
+                    if len(session.queue) * 4 < session.max_queue:
+                        session.behind_since = None
+        except asyncio.CancelledError:
+            pass
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        except Exception as e:
+            logger.error(f"Error sending to client: {e}")
+
+    def _disconnect_slow_client(self, session: ClientSession, reason: str):
+        if session.closing:
+            return
+        session.closing = True
+        session.queue.clear()
+        self.clients.pop(session.websocket, None)
+        self.stats.websocket_clients = len(self.clients)
+        self.stats.slow_clients_disconnected += 1
+        logger.warning(f"Disconnecting slow WebSocket client {session.to_dict()['address']}: {reason}")
+        # 1013: try again later
+        asyncio.ensure_future(session.websocket.close(code=1013, reason='Client too slow'))
+
+    def get_client_stats(self) -> List[Dict[str, Any]]:
+        """Queue depth and drops per connected client"""
+        return [session.to_dict() for session in list(self.clients.values())]
+
+    def get_latency_stats(self) -> Dict[str, Any]:
+        """Bridge latency histograms (ms) from TCP receive"""
+        return {stage: histogram.to_dict() for stage, histogram in self.latency.items()}
 
     async def _message_processor(self):
-        """Process messages between WebSocket and TCP"""
+        """Process messages between WebSocket and TCP (each direction on its own)"""
+        await asyncio.gather(self._inbound_processor(), self._outbound_processor())
+
+    async def _inbound_processor(self):
+        """TCP -> WebSocket (wakes on each queued message)"""
         while self.running:
             try:
-                # Process inbound messages (TCP -> WebSocket)
-                try:
-                    mavlink_msg = await asyncio.wait_for(self.inbound_queue.get(), timeout=0.1)
-                    
-                    # Broadcast to all WebSocket clients
-                    await self._broadcast_to_clients({
-                        'type': 'mavlink_message',
-                        'message': asdict(mavlink_msg)
-                    })
-                    
-                except asyncio.TimeoutError:
-                    pass
+                mavlink_msg, received_at = await self.inbound_queue.get()
                 
-                # Process outbound messages (WebSocket -> TCP)
-                try:
-                    command = await asyncio.wait_for(self.outbound_queue.get(), timeout=0.1)
-                    
-                    # Send to TCP bridge (implement actual MAVLink encoding here)
-                    # For now, just log the command
-                    logger.info(f"Forwarding command to TCP: {command}")
-                    
-                except asyncio.TimeoutError:
-                    pass
-                    
+                # Broadcast to all WebSocket clients; periodic messages conflate per type and source
+                msg_id = mavlink_msg.data.get('msg_id')
+                key = None
+                if self.client_queue_policy == 'conflate' and msg_id not in UNCONFLATED_MESSAGE_IDS:
+                    key = ('mavlink', msg_id, mavlink_msg.system_id, mavlink_msg.component_id)
+                
+                await self._broadcast_to_clients({
+                    'type': 'mavlink_message',
+                    'message': asdict(mavlink_msg)
+                }, key=key, received_at=received_at)
+                self.latency['inbound'].observe((time.perf_counter() - received_at) * 1000)
+                
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error in message processor: {e}")
+                await asyncio.sleep(1)
+
+    async def _outbound_processor(self):
+        """WebSocket -> TCP (wakes on each queued command)"""
+        while self.running:
+            try:
+                websocket, request = await self.outbound_queue.get()
+                
+                # Each command waits for its reply in its own task, so many can be in flight
+                task = asyncio.ensure_future(self._execute_command(websocket, request))
+                self._command_tasks.add(task)
+                task.add_done_callback(self._command_tasks.discard)
+                
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
                 logger.error(f"Error in message processor: {e}")
                 await asyncio.sleep(1)
@@ -446,15 +1474,19 @@ class WebSocketMAVLinkBridge:
                 # Broadcast stats to clients
                 await self._broadcast_to_clients({
                     'type': 'stats_update',
-                    'stats': asdict(self.stats)
-                })
+                    'stats': asdict(self.stats),
+                    'clients': self.get_client_stats(),
+                    'latency': self.get_latency_stats(),
+                    'commands': self.commands.get_stats()
+                }, key='stats_update')
                 
                 # Log stats
                 logger.info(
                     f"Stats: {self.stats.websocket_clients} WS clients, "
                     f"TCP: {'connected' if self.stats.tcp_connected else 'disconnected'}, "
                     f"Messages: {self.stats.messages_received} in / {self.stats.messages_sent} out, "
-                    f"Heartbeats: {self.stats.heartbeat_count}"
+                    f"Heartbeats: {self.stats.heartbeat_count}, "
+                    f"Latency p50: {self.latency['end_to_end'].percentile(50)} ms"
                 )
                 
                 await asyncio.sleep(30)  # Report every 30 seconds
@@ -477,6 +1509,7 @@ def main():
     parser.add_argument('--ws-port', type=int, default=8765, help='WebSocket port')
     parser.add_argument('--tcp-host', default='6.tcp.eu.ngrok.io', help='TCP MAVLink bridge host')
     parser.add_argument('--tcp-port', type=int, default=12189, help='TCP MAVLink bridge port')
+    parser.add_argument('--record', metavar='TLOG', help='Record the TCP MAVLink stream to a .tlog file')
     parser.add_argument('--log-level', default='INFO', help='Log level')
     
     args = parser.parse_args()
@@ -489,7 +1522,8 @@ def main():
         websocket_host=args.ws_host,
         websocket_port=args.ws_port,
         tcp_host=args.tcp_host,
-        tcp_port=args.tcp_port
+        tcp_port=args.tcp_port,
+        record_path=args.record
     )
     
     try: